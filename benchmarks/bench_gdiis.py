@@ -0,0 +1,165 @@
+"""
+Compare the number of gradients needed by RS-RFO and the RS-RFO + GDIIS hybrid (and L-BFGS) for
+Lennard-Jones clusters and for the molecules of optking/tests. No QC program is needed: the test
+molecules are optimized on the force field surrogate (``surrogate.ForceFieldSurrogate``) built
+from the test geometry, starting from a randomly distorted geometry.
+
+Run from the top of the repository with optking importable::
+
+    python benchmarks/bench_gdiis.py
+"""
+
+import ast
+import json
+import logging
+import pathlib
+
+import numpy as np
+from qcelemental.models import Molecule
+
+import optking
+from optking import surrogate
+from optking.exceptions import AlgError, OptError
+
+SIGMA = 6.4
+EPSILON = 0.0004
+STEP_TYPES = ("RFO", "GDIIS", "LBFGS")
+TESTS = pathlib.Path(__file__).resolve().parents[1] / "optking" / "tests"
+
+
+def lj_cluster(natom, seed):
+    """Perturbed simple cubic arrangement of Ar atoms near the LJ minimum distance (bohr)"""
+    rng = np.random.default_rng(seed)
+    side = int(np.ceil(natom ** (1 / 3)))
+    grid = np.array([[i, j, k] for i in range(side) for j in range(side) for k in range(side)], dtype=float)
+    geom = 7.0 * grid[:natom] + rng.normal(scale=0.3, size=(natom, 3))
+    return Molecule(symbols=["Ar"] * natom, geometry=geom.ravel(), fix_com=True, fix_orientation=True)
+
+
+def load_molecules():
+    """The distinct Cartesian geometries given to ``psi4.geometry`` in optking/tests and the
+    geometries of the JSON inputs. Z-matrix inputs cannot be read without psi4 and are skipped.
+
+    Returns
+    -------
+    dict[str, Molecule]
+        molecules with at least two atoms by "<test file> <formula>"
+    """
+    molecules = {}
+    for path in sorted(TESTS.glob("test_*.py")):
+        for node in ast.walk(ast.parse(path.read_text())):
+            if not (isinstance(node, ast.Call) and getattr(node.func, "attr", "") == "geometry" and node.args):
+                continue
+            if not (isinstance(node.args[0], ast.Constant) and isinstance(node.args[0].value, str)):
+                continue
+            if "pubchem" in node.args[0].value:
+                continue
+            try:
+                molecule = Molecule.from_data(node.args[0].value, dtype="psi4")
+            except Exception:
+                continue
+            molecules.setdefault(f"{path.stem[5:]} {molecule.get_molecular_formula()}", molecule)
+
+    for path in sorted(TESTS.glob("json_*.json")):
+        data = json.loads(path.read_text())["initial_molecule"]
+        molecule = Molecule(symbols=data["symbols"], geometry=data["geometry"])
+        molecules.setdefault(f"{path.stem[5:]} {molecule.get_molecular_formula()}", molecule)
+
+    unique = {}
+    for name, molecule in molecules.items():
+        key = (tuple(molecule.symbols), tuple(np.round(molecule.geometry.ravel(), 3)))
+        if len(molecule.symbols) > 1:
+            unique.setdefault(key, (name, molecule))
+    return dict(unique.values())
+
+
+def distorted(molecule, seed, scale=0.15):
+    """The force field surrogate of the molecule and a randomly distorted starting molecule"""
+    geom = molecule.geometry.reshape(-1, 3)
+    potential = surrogate.ForceFieldSurrogate(geom, molecule.atomic_numbers)
+    start = geom + np.random.default_rng(seed).normal(scale=scale, size=geom.shape)
+    start = Molecule(
+        symbols=molecule.symbols,
+        geometry=start.ravel(),
+        molecular_charge=molecule.molecular_charge,
+        molecular_multiplicity=molecule.molecular_multiplicity,
+        fix_com=True,
+        fix_orientation=True,
+    )
+    return potential, start
+
+
+def lj_potential(geom):
+    return optking.lj_functions.calc_energy_and_gradient(geom, SIGMA, EPSILON, True)
+
+
+def count_gradients(molecule, params, potential=lj_potential, maxiter=300):
+    opt = optking.CustomHelper(molecule, params)
+    for step in range(1, maxiter + 1):
+        opt.E, opt.gX = potential(opt.geom)
+        opt.compute()
+        try:
+            opt.take_step()
+        except (AlgError, OptError):
+            return None, opt.E
+        if opt.test_convergence() is True:
+            break
+    else:
+        return None, opt.E
+    E = opt.E
+    result = opt.close()
+    return step if result["success"] else None, E
+
+
+def compare_lj(sizes=(3, 4, 5, 6), seeds=(1, 2, 3), g_convergence="GAU_TIGHT"):
+    print(f"{'atoms':>6}{'seed':>6}" + "".join(f"{step_type:>16}" for step_type in STEP_TYPES))
+    totals = dict.fromkeys(STEP_TYPES, 0)
+    for natom in sizes:
+        for seed in seeds:
+            row = f"{natom:>6}{seed:>6}"
+            for step_type in STEP_TYPES:
+                params = {"step_type": step_type, "g_convergence": g_convergence}
+                nsteps, E = count_gradients(lj_cluster(natom, seed), params)
+                totals[step_type] += nsteps or 0
+                row += f"{nsteps if nsteps else 'failed':>8}{E / EPSILON:>8.3f}"
+            print(row)
+    print(f"{'total':>12}" + "".join(f"{totals[step_type]:>16}" for step_type in STEP_TYPES))
+    print("Each column is the number of gradients and the final energy / epsilon")
+
+
+def compare_molecules(seeds=(1, 2), g_convergence="GAU_TIGHT"):
+    molecules = load_molecules()
+    width = max(len(name) for name in molecules) + 2
+
+    print(f"{'molecule':<{width}}{'seed':>6}" + "".join(f"{step_type:>8}" for step_type in STEP_TYPES))
+    totals = dict.fromkeys(STEP_TYPES, 0)
+    fewer = dict.fromkeys(STEP_TYPES, 0)
+    for name, molecule in molecules.items():
+        for seed in seeds:
+            counts = {}
+            for step_type in STEP_TYPES:
+                potential, start = distorted(molecule, seed)
+                params = {"step_type": step_type, "g_convergence": g_convergence}
+                counts[step_type] = count_gradients(start, params, potential)[0]
+            if all(counts.values()):
+                for step_type in STEP_TYPES:
+                    totals[step_type] += counts[step_type]
+            for step_type in STEP_TYPES:
+                if counts[step_type] and (not counts["RFO"] or counts[step_type] < counts["RFO"]):
+                    fewer[step_type] += 1
+            print(f"{name:<{width}}{seed:>6}" + "".join(f"{counts[s] or 'failed':>8}" for s in STEP_TYPES))
+    print(f"{'total':<{width + 6}}" + "".join(f"{totals[step_type]:>8}" for step_type in STEP_TYPES))
+    print(f"{'fewer than RFO':<{width + 6}}" + "".join(f"{fewer[step_type]:>8}" for step_type in STEP_TYPES))
+    print("Each column is the number of gradients on the force field surrogate. The totals are over the runs")
+    print("where every step type converged")
+
+
+def main():
+    logging.disable(logging.CRITICAL)
+    compare_lj()
+    print()
+    compare_molecules()
+
+
+if __name__ == "__main__":
+    main()
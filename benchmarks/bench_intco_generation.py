@@ -0,0 +1,73 @@
+"""
+Time the generation of redundant internal coordinates for linear alkanes of increasing size.
+
+Run from the top of the repository with optking importable::
+
+    python benchmarks/bench_intco_generation.py [max_carbons]
+
+The time to build the connectivity matrix and the coordinates should grow roughly linearly with
+the number of atoms.
+"""
+
+import sys
+import time
+
+import numpy as np
+import qcelemental as qcel
+
+from optking import addIntcos, op
+from optking.intcoSet import IntcoSet
+
+BOHR = qcel.constants.conversion_factor("angstrom", "bohr")
+
+
+def alkane(n_carbon):
+    """Zig-zag C(n)H(2n+2) geometry (bohr) and atomic numbers"""
+    geom, Z = [], []
+    for i in range(n_carbon):
+        y = 0.445 if i % 2 else -0.445
+        side = np.sign(y)
+        geom.append([1.26 * i, y, 0.0])
+        geom.append([1.26 * i, y + 0.63 * side, 0.89])
+        geom.append([1.26 * i, y + 0.63 * side, -0.89])
+        Z += [6, 1, 1]
+
+    last_y = 0.445 if (n_carbon - 1) % 2 else -0.445
+    geom.append([-1.09, -0.445, 0.0])
+    geom.append([1.26 * (n_carbon - 1) + 1.09, last_y, 0.0])
+    Z += [1, 1]
+    return np.array(geom) * BOHR, np.array(Z)
+
+
+def time_generation(n_carbon, repeat=3):
+    """Best of repeat timings for connectivity and coordinate generation"""
+    geom, Z = alkane(n_carbon)
+    best_connect, best_intcos = np.inf, np.inf
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        C = addIntcos.connectivity_from_distances(geom, Z)
+        middle = time.perf_counter()
+        intcos = IntcoSet()
+        addIntcos.add_intcos_from_connectivity(C, intcos, geom)
+        end = time.perf_counter()
+
+        best_connect = min(best_connect, middle - start)
+        best_intcos = min(best_intcos, end - middle)
+
+    return len(geom), len(intcos), best_connect, best_intcos
+
+
+def main(max_carbons=256):
+    op.Params = op.OptParams()
+
+    print(f"{'atoms':>8}{'intcos':>10}{'connect (s)':>14}{'intcos (s)':>14}{'us / intco':>14}")
+    n_carbon = 4
+    while n_carbon <= max_carbons:
+        natom, nintco, t_connect, t_intcos = time_generation(n_carbon)
+        print(f"{natom:>8}{nintco:>10}{t_connect:>14.4f}{t_intcos:>14.4f}{1e6 * t_intcos / nintco:>14.1f}")
+        n_carbon *= 2
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,280 @@
+"""
+Time optking's hot paths and end-to-end optimizations on synthetic systems of increasing size.
+No QC program is needed.
+
+Run from the top of the repository with optking importable::
+
+    python benchmarks/bench_suite.py [--quick] [--filter Bmat] [--save results.json]
+    python benchmarks/bench_suite.py --compare results.json [--threshold 1.25]
+
+Kernels (best time per call, in seconds):
+
+=====================  ========================================================================
+make_internal_coords   ``optimize.make_internal_coords`` (connectivity, fragments, coordinates)
+Bmat                   ``Molsys.Bmat``
+q_array                ``Molsys.q_array``
+gradient_to_internals  ``Molsys.gradient_to_internals``
+hessian_to_internals   ``Molsys.hessian_to_internals`` (Lindh model Cartesian Hessian)
+back_transformation    ``displace.back_transformation`` of a small random step
+hessian_update         ``History.hessian_update`` (BFGS) from two stored steps
+rsrfo_step             ``stepAlgorithms.RestrictedStepRFO.step``
+dq_irc                 ``IntrinsicReactionCoordinate.dq_irc`` from a pivot point
+=====================  ========================================================================
+
+on linear alkanes, water clusters and argon (Lennard-Jones) clusters. End-to-end ``CustomHelper``
+minimizations of LJ clusters driven by ``lj_functions`` report the wall time and the number of
+gradients.
+
+``--save`` writes every result with the numpy, optking and platform versions as json.
+``--compare`` reruns the same cases and reports the ratio to a saved file. The exit status is 1 if
+any case is slower than ``--threshold`` times its saved value.
+"""
+
+import argparse
+import copy
+import fnmatch
+import json
+import logging
+import platform
+import sys
+import time
+import timeit
+
+import numpy as np
+import qcelemental as qcel
+from qcelemental.models import Molecule
+
+import optking
+from optking import displace, hessian, history, lj_functions, op
+from optking.exceptions import AlgError
+from optking.IRCfollowing import IntrinsicReactionCoordinate
+from optking.molsys import Molsys
+from optking.optimize import make_internal_coords
+from optking.stepAlgorithms import RestrictedStepRFO
+
+from bench_gdiis import EPSILON, SIGMA, count_gradients, lj_cluster
+from bench_intco_generation import alkane
+
+# atoms of an LJ cluster are all connected to each other, so its coordinates grow as natom**4
+SIZES = {"alkane": (4, 16, 48), "water": (4, 16, 48), "lj": (4, 6, 8)}
+QUICK_SIZES = {"alkane": (4, 8), "water": (4, 8), "lj": (4, 6)}
+END_TO_END_SIZES = (6, 13, 19)
+QUICK_END_TO_END_SIZES = (6,)
+
+
+def water_cluster(n_water, seed=1):
+    """Randomly oriented waters on a cubic grid 5.6 bohr apart. Geometry (bohr) and Z"""
+    rng = np.random.default_rng(seed)
+    side = int(np.ceil(n_water ** (1 / 3)))
+    water = np.array([[0.0, 0.0, 0.0], [1.81, 0.0, 0.0], [-0.45, 1.75, 0.0]])
+    geom = []
+    for i in range(n_water):
+        center = 5.6 * np.array([i // side**2, (i // side) % side, i % side], dtype=float)
+        rotation = np.linalg.qr(rng.normal(size=(3, 3)))[0]
+        geom.append(water @ rotation.T + center)
+    return np.vstack(geom), np.array([8, 1, 1] * n_water)
+
+
+def make_system(kind, size):
+    """(geometry (bohr), Z) of the synthetic system. size is carbons, waters or atoms"""
+    if kind == "alkane":
+        return alkane(size)
+    if kind == "water":
+        return water_cluster(size)
+    molecule = lj_cluster(size, seed=1)
+    return np.array(molecule.geometry), np.array(molecule.atomic_numbers)
+
+
+def make_molsys(geom, Z):
+    molecule = Molecule(
+        symbols=[qcel.periodictable.to_E(z) for z in Z],
+        geometry=np.ravel(geom),
+        fix_com=True,
+        fix_orientation=True,
+    )
+    return Molsys.from_schema(json.loads(molecule.json()))
+
+
+class Case:
+    """A system with internal coordinates and the data the kernels need"""
+
+    def __init__(self, kind, size):
+        op.Params = op.OptParams()
+        self.params = op.Params
+        self.kind = kind
+        self.geom, self.Z = make_system(kind, size)
+        self.molsys = make_molsys(self.geom, self.Z)
+        make_internal_coords(self.molsys, self.params)
+
+        rng = np.random.default_rng(7)
+        self.natom = len(self.Z)
+        self.nintco = self.molsys.num_intcos
+        self.g_x = rng.normal(scale=1.0e-3, size=3 * self.natom)
+        self.f_q = self.molsys.gradient_to_internals(self.g_x, -1.0)
+        if kind == "lj":
+            self.H_x = lj_functions.calc_energy_and_gradient(self.geom, SIGMA, EPSILON, do_hessian=True)[2]
+        else:
+            self.H_x = hessian.lindh_cartesian(self.geom, self.Z)
+        self.H_q = self.molsys.hessian_to_internals(self.H_x)
+        # consistent with a Cartesian displacement so the back-transformation converges normally
+        self.dq = self.molsys.Bmat() @ rng.normal(scale=1.0e-3, size=3 * self.natom)
+
+        # two earlier steps with forces that differ from f_q by a positive definite curvature
+        self.history = history.History(self.params)
+        curvature = self.H_q + 0.1 * np.eye(self.nintco)
+        for scale in (2.0e-2, 1.0e-2):
+            dx = rng.normal(scale=scale, size=3 * self.natom)
+            f_q = self.f_q + curvature @ self.molsys.Bmat() @ dx
+            self.history.append(self.molsys.geom - dx.reshape(-1, 3), -1.0, f_q, self.g_x)
+
+    def kernels(self):
+        molsys, params = self.molsys, self.params
+
+        def back_transformation():
+            for i, frag in enumerate(molsys.fragments):
+                start = molsys.frag_1st_intco(i)
+                dq = self.dq[start : start + frag.num_intcos].copy()
+                # with the optimizer's convergence settings, as in displace_molsys
+                displace.back_transformation(frag.intcos, frag.geom.copy(), dq, **params.__dict__)
+
+        rfo = RestrictedStepRFO(molsys, self.history, params)
+        try:
+            irc, irc_error = self._irc(), None
+        except AlgError as error:  # the steps to the guess point failed. Reported with the kernel
+            irc, irc_error = None, error
+
+        def dq_irc():
+            if irc is None:
+                raise irc_error
+            return irc.dq_irc(self.f_q, self.H_q)
+
+
+        return {
+            "make_internal_coords": self._make_internal_coords,
+            "Bmat": molsys.Bmat,
+            "q_array": molsys.q_array,
+            "gradient_to_internals": lambda: molsys.gradient_to_internals(self.g_x, -1.0),
+            "hessian_to_internals": lambda: molsys.hessian_to_internals(self.H_x),
+            "back_transformation": back_transformation,
+            "hessian_update": lambda: self.history.hessian_update(self.H_q.copy(), self.f_q, molsys),
+            "rsrfo_step": lambda: rfo.step(self.f_q, self.H_q),
+            "dq_irc": dq_irc,
+        }
+
+    def _make_internal_coords(self):
+        molsys = make_molsys(self.geom, self.Z)
+        make_internal_coords(molsys, self.params)
+
+    def _irc(self):
+        """IRC object with one point whose molsys sits at the guess point of the next step"""
+        params = op.OptParams(opt_type="IRC")
+        molsys = copy.deepcopy(self.molsys)
+        irc = IntrinsicReactionCoordinate(molsys, history.History(params), params)
+        irc.irc_history.add_irc_point(0, molsys.q_array(), molsys.geom, self.f_q, self.g_x, -1.0)
+        irc.compute_pivot_and_guess_points(-self.f_q, self.f_q, return_str=True)
+        return irc
+
+
+def time_call(fn, repeat=5):
+    """Best and median time per call. Each of the repeats runs for at least 0.2 s"""
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    times = np.array(timer.repeat(repeat=repeat, number=number)) / number
+    return {"best": float(times.min()), "median": float(np.median(times)), "number": number}
+
+
+def run_kernels(sizes, pattern, repeat):
+    results = {}
+    for kind, kind_sizes in sizes.items():
+        for size in kind_sizes:
+            case = Case(kind, size)
+            for name, fn in case.kernels().items():
+                key = f"{name}[{kind}-{case.natom}]"
+                if not fnmatch.fnmatch(key, pattern):
+                    continue
+                try:
+                    timing = time_call(fn, repeat=repeat)
+                except Exception as error:  # report and continue with the other kernels
+                    print(f"{key:<44}failed: {type(error).__name__}: {error}")
+                    continue
+                results[key] = {"natom": case.natom, "nintco": case.nintco, **timing}
+                report(key, results[key])
+    return results
+
+
+def run_end_to_end(sizes, pattern):
+    results = {}
+    for natom in sizes:
+        key = f"lj_optimization[lj-{natom}]"
+        if not fnmatch.fnmatch(key, pattern):
+            continue
+        start = time.perf_counter()
+        nsteps, E = count_gradients(lj_cluster(natom, seed=1), {"g_convergence": "GAU_TIGHT"})
+        elapsed = time.perf_counter() - start
+        results[key] = {"natom": natom, "best": elapsed, "median": elapsed, "number": 1, "gradients": nsteps}
+        report(key, results[key])
+    return results
+
+
+def report(key, result, reference=None):
+    line = f"{key:<44}{result['best']:>12.3e}{result['median']:>12.3e}"
+    if "gradients" in result:
+        line += f"{result['gradients'] or 'failed':>8} gradients"
+    if reference is not None:
+        line += f"{result['best'] / reference['best']:>10.2f}x"
+    print(line)
+
+
+def metadata():
+    return {
+        "optking": optking.__version__,
+        "numpy": np.__version__,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--quick", action="store_true", help="smaller systems only")
+    parser.add_argument("--filter", default="*", help="glob on case names such as 'Bmat*' or '*water*'")
+    parser.add_argument("--repeat", type=int, help="timing repeats (default 3 with --quick, else 5)")
+    parser.add_argument("--save", help="write results to this json file")
+    parser.add_argument("--compare", help="json file from --save to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25)
+    parser.add_argument("--logging", action="store_true", help="keep optking's logging on")
+    args = parser.parse_args(argv)
+
+    if not args.logging:
+        logging.disable(logging.CRITICAL)
+    pattern = args.filter if any(c in args.filter for c in "*?[") else f"*{args.filter}*"
+
+    print(f"{'case':<44}{'best (s)':>12}{'median (s)':>12}")
+    repeat = args.repeat or (3 if args.quick else 5)
+    results = run_kernels(QUICK_SIZES if args.quick else SIZES, pattern, repeat)
+    results.update(run_end_to_end(QUICK_END_TO_END_SIZES if args.quick else END_TO_END_SIZES, pattern))
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"metadata": metadata(), "results": results}, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            reference = json.load(f)["results"]
+        print(f"\nCompared to {args.compare}")
+        slower = []
+        for key, result in results.items():
+            if key in reference:
+                report(key, result, reference[key])
+                if result["best"] > args.threshold * reference[key]["best"]:
+                    slower.append(key)
+        if slower:
+            print(f"\n{len(slower)} case(s) slower than {args.threshold}x: " + ", ".join(slower))
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
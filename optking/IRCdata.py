@@ -1,26 +1,22 @@
 import logging
 import os
-import copy
-from typing import List, Tuple
 
 import numpy as np
+import qcelemental as qcel
 
 from .exceptions import OptError
 from .printTools import print_geom_string
 from .linearAlgebra import symm_mat_inv, rms
 from .molsys import Molsys
-from .frag import Frag
-from . import addIntcos
+from .history import StepArrays, StepList, StoredArray, StoredScalar
+from . import graph
 from . import log_name
-from . import addIntcos
-from . import molsys
-from . import frag
 
 logger = logging.getLogger(f"{log_name}{__name__}")
 
 
 class IRCpoint(object):
-    """Holds data for one step on the IRC.
+    """Holds data for one step on the IRC. The arrays are views into a ``StepArrays``.
     Parameters
     ----------
     step_number : int
@@ -44,6 +40,27 @@ class IRCpoint(object):
     line_dist :  float
     """
 
+    array_fields = {"q": None, "x": 3, "f_q": None, "f_x": None, "q_pivot": None, "x_pivot": 3}
+    scalar_fields = {
+        "step_number": int,
+        "energy": float,
+        "step_dist": float,
+        "arc_dist": float,
+        "line_dist": float,
+    }
+
+    q = StoredArray()
+    x = StoredArray()
+    f_q = StoredArray()
+    f_x = StoredArray()
+    q_pivot = StoredArray()
+    x_pivot = StoredArray()
+    step_number = StoredScalar()
+    energy = StoredScalar()
+    step_dist = StoredScalar()
+    arc_dist = StoredScalar()
+    line_dist = StoredScalar()
+
     def __init__(
         self,
         step_number,
@@ -57,7 +74,11 @@ class IRCpoint(object):
         step_dist,
         arc_dist,
         line_dist,
+        storage=None,
     ):
+        if storage is None:
+            storage = IRCpoint.new_storage(capacity=1)
+        self._bind(storage, storage.new_row())
         self.step_number = step_number
         self.q = q
         self.x = x
@@ -69,6 +90,29 @@ class IRCpoint(object):
         self.step_dist = step_dist
         self.arc_dist = arc_dist
         self.line_dist = line_dist
+        # ConnectivitySnapshot cached by IRCHistory.test_for_dissociation (not serialized)
+        self.connectivity = None
+
+    @classmethod
+    def view(cls, storage, row):
+        """Create an IRCpoint for an existing row of a storage"""
+        point = cls.__new__(cls)
+        point._bind(storage, row)
+        point.connectivity = None
+        return point
+
+    @staticmethod
+    def new_storage(capacity=16):
+        return StepArrays(IRCpoint.array_fields, IRCpoint.scalar_fields, capacity)
+
+    def _bind(self, storage, row):
+        self._storage = storage
+        self._row = row
+
+    def _detach(self):
+        storage = IRCpoint.new_storage(capacity=1)
+        row = storage.copy_row(self._storage, self._row)
+        self._bind(storage, row)
 
     def add_pivot(self, q_p, x_p):
         self.q_pivot = q_p
@@ -107,11 +151,24 @@ class IRCHistory(object):
     _running_arc_dist = 0.0
     _running_line_dist = 0.0
 
-    def __init__(self):
+    def __init__(self, capacity=16):
         self.go = True
-        self.irc_points: List[IRCpoint] = []
+        self._irc_points = StepList(IRCpoint.new_storage(capacity))
         self.atom_symbols = None
         self.termination_reason = ""
+        self._reference_connectivity = None
+
+    @property
+    def irc_points(self) -> StepList:
+        return self._irc_points
+
+    @irc_points.setter
+    def irc_points(self, points):
+        """Replace all points. The given points are copied into the (reused) storage"""
+        points = list(points)
+        self._irc_points.clear()
+        for point in points:
+            self._irc_points.append(point)
 
     def set_atom_symbols(self, atom_symbols):  # just for printing
         self.atom_symbols = atom_symbols.copy()  # just for printing
@@ -120,9 +177,8 @@ class IRCHistory(object):
         self._step_size = step_size
         self._direction = direction
 
-    def to_dict(self):
+    def to_dict(self, include_points=True):
         d = {
-            "irc_points": [point.to_dict() for point in self.irc_points],
             "go": self.go,
             "atom_symbols": self.atom_symbols,
             "direction": self._direction,
@@ -131,12 +187,20 @@ class IRCHistory(object):
             "running_arc_dist": self._running_arc_dist,
             "running_line_dist": self._running_line_dist,
         }
+        if include_points:
+            d["irc_point_arrays"] = self.irc_points.storage.to_dict()
         return d
 
     @classmethod
     def from_dict(cls, d):
         irc_history = cls()
-        irc_history.irc_points = [IRCpoint.from_dict(point) for point in d["irc_points"]]
+        if "irc_point_arrays" in d:
+            storage = StepArrays.from_dict(
+                d["irc_point_arrays"], IRCpoint.array_fields, IRCpoint.scalar_fields
+            )
+            irc_history.irc_points = [IRCpoint.view(storage, row) for row in range(len(storage))]
+        else:
+            irc_history.irc_points = [IRCpoint.from_dict(point) for point in d["irc_points"]]
         irc_history.go = d["go"]
         irc_history.atom_symbols = d["atom_symbols"]
         irc_history._direction = d["direction"]
@@ -176,6 +240,7 @@ class IRCHistory(object):
             self._running_step_dist,
             self._running_arc_dist,
             self._running_line_dist,
+            storage=self.irc_points.storage,
         )
         self.irc_points.append(onepoint)
 
@@ -251,6 +316,10 @@ class IRCHistory(object):
         been created. This may be used to terminate the IRC. This method should only be
         called if frag_mode == 'SINGLE'.
 
+        A ConnectivitySnapshot of the reference (old) system is computed once and cached. Each
+        new geometry gets its own snapshot which is stored on the most recent IRC point. When the
+        bond graph is unchanged from the previous point's snapshot, the fragment count is reused.
+
         Returns
         -------
         bool
@@ -259,23 +328,49 @@ class IRCHistory(object):
 
         logger.debug("Checking connectivity for whether dissociation has occured")
 
-        # Repeat the standard procedure for creating a single fragment molecular system
-        orig_connectivity = addIntcos.connectivity_from_distances(old_molsys.geom, old_molsys.Z)
-        orig_molsys = copy.deepcopy(old_molsys)
-        orig_molsys.split_fragments_by_connectivity()
-        scale_dist = orig_molsys.augment_connectivity_to_single_fragment(orig_connectivity)
-        orig_molsys.consolidate_fragments()
+        reference = self._reference_connectivity
+        old_geom = old_molsys.geom
+        if reference is None or not reference.same_system(old_geom, old_molsys.Z):
+            # Repeat the standard procedure for creating a single fragment molecular system
+            reference = ConnectivitySnapshot(old_geom, old_molsys.Z)
+            reference.scale_dist = reference.scale_to_single_fragment()
+            self._reference_connectivity = reference
 
         # Detect the number of fragments current molecular system using the old scale_dist plus
         # 0.4 angstroms. Not bullet proof, just attempts to detect changes in conenctivity while
         # not triggering for small increases in bond lengths
-        new_molsys = Molsys([Frag(old_molsys.Z, new_molsys.geom, old_molsys.masses)])
-        new_molsys.split_fragments_by_connectivity(scale_dist + threshold)
+        covalent_connect = reference.scale_dist + threshold
+        snapshot = reference.at_geometry(new_molsys.geom, covalent_connect)
+
+        previous = self._last_connectivity(covalent_connect)
+        if previous is not None:
+            formed, broken = previous.bond_changes(snapshot)
+            if not formed and not broken:
+                snapshot.reuse_fragments(previous)
+            else:
+                logger.debug(
+                    "Bonds formed: %s. Bonds broken: %s",
+                    [(i + 1, j + 1) for i, j in formed],
+                    [(i + 1, j + 1) for i, j in broken],
+                )
+
+        if self.irc_points:
+            self.irc_points[-1].connectivity = snapshot
 
-        if orig_molsys.nfragments != new_molsys.nfragments:
+        # reference system has been consolidated into a single fragment
+        if snapshot.nfragments != 1:
             return True
         return False
 
+    def _last_connectivity(self, covalent_connect):
+        """Most recent cached snapshot computed with the same bonding threshold (if any)"""
+        for point in reversed(self.irc_points):
+            if point.connectivity is not None:
+                if point.connectivity.covalent_connect == covalent_connect:
+                    return point.connectivity
+                return None
+        return None
+
     def test_for_irc_minimum(self, f_q, energy, fq_rms=1e-5, irc_conv=-0.7):
         """Given current forces, checks if we are at/near a minimum
 
@@ -451,18 +546,179 @@ class IRCHistory(object):
         orthog_f = f_q - (f_q @ p_vec) / (p_vec @ G_m_inv_p) * G_m_inv_p
         return orthog_f
 
-    def recompute_all_internals(self, molsys: Molsys):
-        # make a independent copy of molecular system to change all internal coordinate values
-        # into the new internal basis set
-        tmp_molsys = copy.deepcopy(molsys)
+    def recompute_all_internals(self, molsys: Molsys, threshold=1e-10):
+        """Recompute q, f_q, and q_pivot for every stored IRC point in the (new) internal
+        coordinate basis of molsys.
 
-        # For each step update the irc_point coords, forces coords, and pivot points coords
-        for step in self.irc_points:
-            tmp_molsys.geom = step.x
-            step.q = tmp_molsys.q_array()
-            step.f_q = tmp_molsys.gradient_to_internals(step.f_x)
+        The geometry dependent quantities (q and B) are gathered point by point, the forces
+        are then transformed for all points at once with a stacked generalized inverse of G.
+        molsys's geometry is restored afterwards; no copy of the molecular system is made.
+        """
+
+        if not self.irc_points:
+            return
+
+        saved_geom = molsys.geom.copy()
+        has_pivot = [isinstance(step.x_pivot, np.ndarray) for step in self.irc_points]
+
+        try:
+            q_all, B_all = [], []
+            for step in self.irc_points:
+                molsys.geom = step.x
+                q_all.append(molsys.q_array())
+                B_all.append(molsys.Bmat())
 
             # Last point may not be fully set (could be none)
-            if isinstance(step.x_pivot, np.ndarray):
-                tmp_molsys.geom = step.x_pivot
-                step.q_pivot = tmp_molsys.q_array()
+            q_pivots = []
+            for step, pivot in zip(self.irc_points, has_pivot):
+                if pivot:
+                    molsys.geom = step.x_pivot
+                    q_pivots.append(molsys.q_array())
+        finally:
+            molsys.geom = saved_geom
+
+        f_q_all = batched_gradient_to_internals(
+            np.asarray(B_all), np.asarray([step.f_x for step in self.irc_points]), threshold
+        )
+
+        q_pivots = iter(q_pivots)
+        for step, q, f_q, pivot in zip(self.irc_points, q_all, f_q_all, has_pivot):
+            step.q = q
+            step.f_q = f_q
+            if pivot:
+                step.q_pivot = next(q_pivots)
+
+
+def batched_gradient_to_internals(B, g_x, threshold=1e-10):
+    """Transform a stack of cartesian gradients (or forces) to internals in a single pass.
+    Equivalent to Molsys.gradient_to_internals for each (B, g_x) pair.
+
+    Parameters
+    ----------
+    B : np.ndarray
+        (npoints, nintco, 3nat) B matrices
+    g_x : np.ndarray
+        (npoints, 3nat) cartesian gradients
+    threshold : float
+        eigenvalues of G below this value are not inverted
+
+    Returns
+    -------
+    np.ndarray
+        (npoints, nintco)
+    """
+
+    if B.size == 0:
+        return np.zeros(B.shape[:2])
+
+    G = B @ np.swapaxes(B, 1, 2)
+    evals, evects = np.linalg.eigh(G)
+    inv_evals = np.zeros_like(evals)
+    keep = np.abs(evals) > threshold
+    inv_evals[keep] = 1.0 / evals[keep]
+    Bg = np.einsum("pij,pj->pi", B, g_x)
+    # G^-1 B g = V diag(1/lambda) V^T B g
+    return np.einsum("pij,pj->pi", evects, inv_evals * np.einsum("pji,pj->pi", evects, Bg))
+
+
+class ConnectivitySnapshot(object):
+    """Geometry-only description of the bonding in a molecular system. Holds the atomic numbers,
+    covalent radii, and bond graph, so that connectivity changes along a path can be tested
+    without copying or rebuilding a Molsys.
+
+    Parameters
+    ----------
+    geom : np.ndarray
+        (nat, 3) cartesian geometry
+    Z : list[int]
+        atomic numbers
+    covalent_connect : float, optional
+        scalar for the sum of covalent radii to determine bonding
+    radii : np.ndarray, optional
+        precomputed covalent radii (bohr) for each atom
+    """
+
+    def __init__(self, geom, Z, covalent_connect=1.3, radii=None):
+        self.geom = np.array(geom, dtype=float).reshape(-1, 3)
+        self.Z = np.asarray(Z, dtype=int)
+        if radii is None:
+            radii = np.array([qcel.covalentradii.get(z, missing=4.0) for z in self.Z])
+        self.radii = radii
+        self.covalent_connect = covalent_connect
+        self.scale_dist = covalent_connect
+
+        diff = self.geom[:, None, :] - self.geom[None, :, :]
+        self.R = np.sqrt(np.einsum("ijk,ijk->ij", diff, diff))
+        self.Rcov = self.radii[:, None] + self.radii[None, :]
+        self.bonds = self.R < covalent_connect * self.Rcov
+        np.fill_diagonal(self.bonds, False)
+        self._fragment_labels = None
+
+    def at_geometry(self, geom, covalent_connect=None):
+        """Snapshot of a new geometry for the same atoms. Reuses atomic data."""
+        if covalent_connect is None:
+            covalent_connect = self.covalent_connect
+        return ConnectivitySnapshot(geom, self.Z, covalent_connect, self.radii)
+
+    def same_system(self, geom, Z):
+        return np.array_equal(self.Z, np.asarray(Z)) and np.array_equal(
+            self.geom, np.asarray(geom).reshape(-1, 3)
+        )
+
+    @property
+    def fragment_labels(self):
+        """index of the connected component (fragment) each atom belongs to"""
+        if self._fragment_labels is None:
+            self._fragment_labels = connected_components(self.bonds)
+        return self._fragment_labels
+
+    @property
+    def nfragments(self):
+        if len(self.Z) == 0:
+            return 0
+        return int(self.fragment_labels.max()) + 1
+
+    def reuse_fragments(self, other):
+        """Take fragment assignment from a snapshot with an identical bond graph"""
+        self._fragment_labels = other.fragment_labels
+
+    def bond_changes(self, other):
+        """Compare bond graphs.
+
+        Returns
+        -------
+        tuple(list, list)
+            atom pairs (i < j) of bonds formed and broken going from self to other
+        """
+        formed = np.argwhere(np.triu(other.bonds & ~self.bonds))
+        broken = np.argwhere(np.triu(self.bonds & ~other.bonds))
+        return [tuple(pair) for pair in formed.tolist()], [tuple(pair) for pair in broken.tolist()]
+
+    def scale_to_single_fragment(self):
+        """Scalar of the covalent radii required to join all fragments. Follows
+        Molsys.augment_connectivity_to_single_fragment: fragments are joined through their closest
+        atoms along a minimum spanning tree; the scale is increased by 0.2 until all links are
+        bonds."""
+
+        scale_dist = 1.3
+        if self.nfragments <= 1:
+            return scale_dist
+
+        _, max_ratio = graph.link_components(self.geom, self.fragment_labels, self.radii)
+        while scale_dist < max_ratio:
+            scale_dist += 0.2
+        return scale_dist
+
+
+def connected_components(C):
+    """Label the connected components of a boolean adjacency matrix. Components are numbered
+    in order of their lowest atom index.
+
+    Returns
+    -------
+    np.ndarray
+        (nat, ) component index for each atom
+    """
+
+    i, j = np.nonzero(C)
+    return graph.connected_components(C.shape[0], i, j)
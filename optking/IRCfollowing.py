@@ -5,11 +5,11 @@ from math import acos, sqrt, tan
 import copy
 import numpy as np
 
-from . import IRCdata, convcheck
+from . import IRCdata, convcheck, instrumentation
 from .displace import displace_molsys
 from .exceptions import AlgError
 from .linearAlgebra import symm_mat_eig, symm_mat_inv, symm_mat_root, lowest_eigenvector_symm_mat
-from .printTools import print_array_string, print_mat_string
+from .printTools import lazy_array_string, lazy_mat_string
 from .stepAlgorithms import OptimizationInterface
 from . import log_name
 from . import op
@@ -20,7 +20,6 @@ logger = logging.getLogger(f"{log_name}{__name__}")
 class IntrinsicReactionCoordinate(OptimizationInterface):
     def __init__(self, molsys, history, params):
         super().__init__(molsys, history, params)
-        self.orig_molsys = copy.deepcopy(molsys)
 
         self.params = params
         # grab irc specific information
@@ -68,7 +67,7 @@ class IntrinsicReactionCoordinate(OptimizationInterface):
             if self.irc_step_number == 0:
                 logger.info("\tBeginning IRC from the transition state.")
                 logger.info("\tStepping along lowest Hessian eigenvector.")
-                logger.debug(print_mat_string(H, title="Transformed Hessian in internals."))
+                logger.debug("%s", lazy_mat_string(H, title="Transformed Hessian in internals."))
 
                 # Add the transition state as the first IRC point
                 q_0 = self.molsys.q_array()
@@ -86,10 +85,11 @@ class IntrinsicReactionCoordinate(OptimizationInterface):
                 H_m = G_root @ H @ G_root
                 v_m = lowest_eigenvector_symm_mat(H_m)
 
-                logger.debug(print_mat_string(G_root, title="G^(1/2) Matrix"))
-                logger.debug(print_mat_string(H_m, title="Mass-weighted Hessian"))
+                logger.debug("%s", lazy_mat_string(G_root, title="G^(1/2) Matrix"))
+                logger.debug("%s", lazy_mat_string(H_m, title="Mass-weighted Hessian"))
                 logger.debug(
-                    print_array_string(v_m, title="Lowest eigenvector of Mass-Weighted Internal Coordinate Hessian")
+                    "%s",
+                    lazy_array_string(v_m, title="Lowest eigenvector of Mass-Weighted Internal Coordinate Hessian"),
                 )
                 v = G_root_inv @ v_m
 
@@ -117,8 +117,9 @@ class IntrinsicReactionCoordinate(OptimizationInterface):
                 fq,
                 self.molsys.gradient_to_cartesians(-1 * fq),
             )
-            dq = self.dq_irc(fq, H)
-            logger.info("Dq with full precision %s", print_array_string(dq, form=":.6e"))
+            with instrumentation.timer("step"):
+                dq = self.dq_irc(fq, H)
+            logger.info("Dq with full precision %s", lazy_array_string(dq, form=":.6e"))
             fq_tan = self.irc_history._project_forces(fq, self.molsys)
             logger.info("\nTrue forces: %s\nHypersphere forces:%s", fq, fq_tan)
             q_copy = self.molsys.q_array()
@@ -304,18 +305,18 @@ class IntrinsicReactionCoordinate(OptimizationInterface):
         # G_prime_inv = symm_mat_inv(G_prime, redundant=True, threshold=threshold)
         G_prime_root_inv = symm_mat_inv(G_prime_root, redundant=True, threshold=threshold)
 
-        logger.debug("G prime root matrix: \n" + print_mat_string(G_prime_root))
+        logger.debug("G prime root matrix: \n%s", lazy_mat_string(G_prime_root))
 
         g_M = G_prime_root @ -f_q
-        logger.debug("g_M: \n" + print_array_string(g_M))
+        logger.debug("g_M: \n%s", lazy_array_string(g_M))
 
         # Eq 20 of Gonzalez and Schlegel.
         # Previous bug: G^(1/2) H_q G^(1/2)T
         H_M = G_prime_root @ H_q @ G_prime_root
-        logger.debug("H_M: \n" + print_mat_string(H_M))
+        logger.debug("H_M: \n%s", lazy_mat_string(H_M))
 
         # Compute p_prime, difference from pivot point
-        orig_geom = self.molsys.geom
+        orig_geom = self.molsys.geom.copy()
         self.molsys.geom = self.irc_history.x_pivot()
         q_pivot = self.molsys.q_array()
         self.molsys.geom = orig_geom
@@ -324,11 +325,11 @@ class IntrinsicReactionCoordinate(OptimizationInterface):
         # p_prime = intcosMisc.q_values(o_molsys.intcos, o_molsys.geom) -  \
         #          intcosMisc.q_values(o_molsys.intcos, IRCdata.history.x_pivot())
         p_M = G_prime_root_inv @ p_prime
-        logger.debug("p_M: \n" + print_array_string(p_M))
+        logger.debug("p_M: \n%s", lazy_array_string(p_M))
 
         HMEigValues, HMEigVects = symm_mat_eig(H_M)
-        logger.debug("HMEigValues: \n" + print_array_string(HMEigValues))
-        logger.debug("HMEigVects: \n" + print_mat_string(HMEigVects))
+        logger.debug("HMEigValues: \n%s", lazy_array_string(HMEigValues))
+        logger.debug("HMEigVects: \n%s", lazy_mat_string(HMEigVects))
 
         # Variables for solving lagrangian function
         lb_lagrangian = -100
@@ -428,11 +429,11 @@ class IntrinsicReactionCoordinate(OptimizationInterface):
         tmp = symm_mat_inv(H_M - LambdaI, redundant=True, threshold=threshold)
         dq_M = -tmp @ (g_M - Lambda * p_M)
         logger.debug("g_M - Lambda p_M %s", (g_M - Lambda * p_M))
-        logger.debug("dq_M to next geometry\n" + print_array_string(dq_M))
+        logger.debug("dq_M to next geometry\n%s", lazy_array_string(dq_M))
 
         # Find dq = G^(1/2) dq_M and do displacements.
         dq = G_prime_root @ dq_M
-        logger.info("dq to next geometry\n" + print_array_string(dq))
+        logger.info("dq to next geometry\n%s", lazy_array_string(dq))
 
         return dq
 
@@ -3,7 +3,6 @@ import os
 import sys
 
 from packaging.version import Version
-from logging.config import dictConfig
 from . import lj_functions, loggingconfig
 
 loggers = [name for name in logging.root.manager.loggerDict]
@@ -12,9 +11,9 @@ if "psi4" in loggers or "psi4" in sys.argv[0]:
     log_name = "psi4."
     opt_log.propagate = True
 else:
-    logger = logging.getLogger()
-    dictConfig(loggingconfig.logging_configuration)
-    logger = logging.getLogger(__name__)
+    # nothing is written until an optimization starts or the application configures logging.
+    # see loggingconfig
+    logging.getLogger(__name__).addHandler(logging.NullHandler())
     log_name = ""
 
 from packaging.version import Version
@@ -1,14 +1,16 @@
+import functools
 import json
 import logging
 from copy import deepcopy
-from itertools import combinations, permutations, zip_longest
+from itertools import combinations, zip_longest
 
 import numpy as np
 import qcelemental as qcel
 
-from . import bend, cart, dimerfrag, oofp
+from . import bend, cart, dimerfrag, graph, oofp
 from . import stre, tors, v3d
 from .exceptions import AlgError, OptError
+from .intcoSet import IntcoSet, TYPE_CODES
 from .v3d import are_collinear
 from . import log_name
 from . import op
@@ -20,6 +22,31 @@ from . import misc
 logger = logging.getLogger(f"{log_name}{__name__}")
 
 
+def indexed_intcos(func):
+    """Decorator for functions ``func(C, intcos, ...)`` that append new coordinates to intcos.
+    Duplicate checks (``coord in intcos``) are hash lookups for an IntcoSet. A plain list is
+    indexed once for the duration of the call and the new coordinates are appended to it at the end.
+    """
+
+    @functools.wraps(func)
+    def wrapper(C, intcos, *args, **kwargs):
+        if isinstance(intcos, IntcoSet):
+            return func(C, intcos, *args, **kwargs)
+
+        indexed = IntcoSet(intcos)
+        result = func(C, indexed, *args, **kwargs)
+        intcos.extend(indexed[len(intcos) :])
+        return result
+
+    return wrapper
+
+
+def _neighbors(C):
+    """Lists of the atoms bonded to each atom (nonzero entries in each row of C)"""
+    C = np.asarray(C)
+    return [np.flatnonzero(row).tolist() for row in C]
+
+
 def connectivity_from_distances(geom, Z, covalent_connect=1.3):
     """
     Creates a matrix (1 or 0) to describe molecular connectivity based on
@@ -39,21 +66,14 @@ def connectivity_from_distances(geom, Z, covalent_connect=1.3):
         (nat, nat)
 
     """
-    nat = geom.shape[0]
-    C = np.zeros((len(geom), len(geom)), bool)
-    for i, j in combinations(range(nat), 2):
-        R = v3d.dist(geom[i], geom[j])
-        Rcov = qcel.covalentradii.get(Z[i], missing=4.0) + qcel.covalentradii.get(
-            Z[j], missing=4.0
-        )
-        # logger.debug("Checking atoms %d (Z=%d) and %d (Z=%d); R: %.3f; Rcov: %.3f; %s" %(i,
-        #              Z[i],j,Z[j],R,Rcov, 'Y' if (R<op.Params.covalent_connect*Rcov) else 'N'))
-        if R < covalent_connect * Rcov:
-            C[i, j] = C[j, i] = True
-
+    natom = len(Z)
+    i, j = graph.bonded_pairs(geom, Z, covalent_connect)
+    C = np.zeros((natom, natom), dtype=bool)
+    C[i, j] = C[j, i] = True
     return C
 
 
+@indexed_intcos
 def add_auxiliary_bonds(connectivity, intcos, geom, Z):
     """
     Adds "auxiliary" or pseudo-bond stretches to support 1-5 carbon motions.
@@ -123,6 +143,7 @@ def add_auxiliary_bonds(connectivity, intcos, geom, Z):
     return Nadded
 
 
+@indexed_intcos
 def add_intcos_from_connectivity(C, intcos, geom, ignore_coords=[]):
     """
     Calls add_x_FromConnectivity for each internal coordinate type
@@ -131,7 +152,7 @@ def add_intcos_from_connectivity(C, intcos, geom, ignore_coords=[]):
     C : ndarray
         (nat, nat) matrix desribing connectivity
         see intcosMisc.connectivity_from_distances()
-    intcos : list[simple.Simple]
+    intcos : IntcoSet or list[simple.Simple]
             (nat) list of current internal coordinates (Stre, Bend, Tors)
     geom : ndarray
         (nat, 3) cartesian geometry
@@ -144,6 +165,7 @@ def add_intcos_from_connectivity(C, intcos, geom, ignore_coords=[]):
         add_oofp_from_connectivity(C, intcos, geom)
 
 
+@indexed_intcos
 def add_stre_from_connectivity(C, intcos):
     """
     Adds stretches from connectivity
@@ -152,7 +174,7 @@ def add_stre_from_connectivity(C, intcos):
     ----------
     C : ndarray
         (nat, nat)
-    intcos : list[simple.Simple]
+    intcos : IntcoSet or list[simple.Simple]
         (nat)
     Returns
     -------
@@ -160,11 +182,11 @@ def add_stre_from_connectivity(C, intcos):
     """
 
     # Norig = len(intcos)
-    for i, j in combinations(range(len(C)), 2):
-        if C[i, j]:
-            s = stre.Stre(i, j)
-            if s not in intcos:
-                intcos.append(s)
+    # bonded pairs i < j in row major order
+    for i, j in np.argwhere(np.triu(C, k=1)).tolist():
+        s = stre.Stre(i, j)
+        if s not in intcos:
+            intcos.append(s)
     # return len(intcos) - Norig  # return number added
 
 
@@ -218,6 +240,7 @@ def add_h_bonds(geom, zs: list, num_atoms):
     return h_bonds
 
 
+@indexed_intcos
 def add_bend_from_connectivity(C, intcos, geom, ignore_coords=[]):
     """
     Adds Bends from connectivity
@@ -226,7 +249,7 @@ def add_bend_from_connectivity(C, intcos, geom, ignore_coords=[]):
     ---------
     C : ndarray
         (nat, nat) unitary connectivity matrix
-    intcos : list[simple.Simple]
+    intcos : IntcoSet or list[simple.Simple]
         (nat) list of internal coordinates
     geom : ndarray
         (nat, 3) cartesian geometry
@@ -236,11 +259,13 @@ def add_bend_from_connectivity(C, intcos, geom, ignore_coords=[]):
     """
 
     # Norig = len(intcos)
-    nat = len(geom)
-    for i, j in permutations(range(nat), 2):
-        if C[i, j]:
-            for k in range(i + 1, nat):  # make i<k; the constructor checks too
-                if C[j, k]:
+    neighbors = _neighbors(C)
+    for i in range(len(geom)):
+        for j in neighbors[i]:
+            if j == i:
+                continue
+            for k in neighbors[j]:
+                if k > i:  # make i<k; the constructor checks too
                     try:
                         val = v3d.angle(geom[i], geom[j], geom[k])
                     except AlgError:
@@ -262,6 +287,7 @@ def add_bend_from_connectivity(C, intcos, geom, ignore_coords=[]):
     # return len(intcos) - Norig
 
 
+@indexed_intcos
 def add_tors_from_connectivity(C, intcos, geom):
     """
     Add torisions for all bonds present and determine linearity from existance of
@@ -271,7 +297,7 @@ def add_tors_from_connectivity(C, intcos, geom):
     ----------
     C : ndarray
         (nat, nat) connectivity matrix
-    intcos : list[simple.Simple]
+    intcos : IntcoSet or list[simple.Simple]
         (nat) list of stretches, bends, etc...
     geom : ndarray
         (nat, 3) cartesian geometry
@@ -281,19 +307,24 @@ def add_tors_from_connectivity(C, intcos, geom):
 
     # Norig = len(intcos)
     Natom = len(geom)
+    neighbors = _neighbors(C)
+    # atoms k with C[k, j]
+    bonded_to = _neighbors(np.transpose(C))
 
     # Find i-j-k-l where i-j-k && j-k-l are NOT collinear.
-    for i, j in permutations(range(Natom), 2):
-        if C[i, j]:
-            for k in range(Natom):
-                if C[k, j] and k != i:
+    for i in range(Natom):
+        for j in neighbors[i]:
+            if j == i:
+                continue
+            for k in bonded_to[j]:
+                if k != i:
                     # ensure i-j-k is not collinear; that a regular such bend exists
                     b = bend.Bend(i, j, k)
                     if b not in intcos:
                         continue
 
-                    for l in range(i + 1, Natom):
-                        if C[l, k] and l != j:
+                    for l in bonded_to[k]:
+                        if l > i and l != j:
                             # ensure j-k-l is not collinear
                             b = bend.Bend(j, k, l)
                             if b not in intcos:
@@ -305,10 +336,12 @@ def add_tors_from_connectivity(C, intcos, geom):
 
     # Search for additional torsions around collinear segments.
     # Find collinear fragment j-m-k
-    for j, m in permutations(range(Natom), 2):
-        if C[j, m]:
-            for k in range(j + 1, Natom):
-                if C[k, m]:
+    for j in range(Natom):
+        for m in neighbors[j]:
+            if m == j:
+                continue
+            for k in bonded_to[m]:
+                if k > j:
                     # ignore if regular bend
                     b = bend.Bend(j, m, k)
                     if b in intcos:
@@ -367,7 +400,7 @@ def check_if_oofp_needed(C, intcos, geom):
     # and for which a single atom is connected to all others.
     # This catches cases like BF3, and CH4.
     Natom = len(C)
-    maxNneighbors = max([sum(C[i]) for i in range(Natom)])
+    maxNneighbors = np.sum(C, axis=1).max()
     # num_neighbors = sum([row for row in C])
     # central_atoms = np.argwhere(num_neighbors > 2).flatten()
     # central atoms that could take a oofp
@@ -401,9 +434,10 @@ def check_if_oofp_needed(C, intcos, geom):
         return False
 
 
+@indexed_intcos
 def add_oofp_from_connectivity(C, intcos, geom):
     # Look for:  (terminal atom)-connected to-(tertiary atom)
-    Nneighbors = [sum(C[i]) for i in range(len(C))]
+    Nneighbors = np.sum(C, axis=1).tolist()
     terminal_atoms = [i for i in range(len(Nneighbors)) if Nneighbors[i] == 1]
     errors = []
 
@@ -470,21 +504,22 @@ def similar_oofp_added(indices, intcos) -> bool:
     """ Check whether a torsion with the same central atom and the same three terminal atoms
     already exists. Returns true is so """
 
-    oofps = [intco for intco in intcos if isinstance(intco, oofp.Oofp)]
-    sides_1 = list(map(int, indices[0:1] + indices[2:]))
+    if not isinstance(intcos, IntcoSet):
+        intcos = IntcoSet(intcos)
+
+    sides_1 = sorted(map(int, indices[0:1] + indices[2:]))
     central_1 = indices[1]
 
-    for oofp_obj in oofps:
-        atoms = oofp_obj.atoms
-        sides_2 = list(map(int, atoms[0:1] + atoms[2:]))
-        central_2 = atoms[1]
-
-        if central_1 == central_2:
-            if compare_lists(sorted(sides_1), sorted(sides_2)):
-                # Found a similar oofp. sorted lists of size were equivalent
-                logger.debug(list(sides_1))
-                logger.debug(list(sides_2))
-                return True
+    # compare against all oofps at once using the atom table of the IntcoSet
+    atoms = intcos.atoms[intcos.types == TYPE_CODES["Oofp"]]
+    sides_2 = np.sort(atoms[:, [0, 2, 3]], axis=1)
+    similar = np.flatnonzero((atoms[:, 1] == central_1) & np.all(sides_2 == sides_1, axis=1))
+
+    if similar.size:
+        # Found a similar oofp. sorted lists of size were equivalent
+        logger.debug(sides_1)
+        logger.debug(sides_2[similar[0]].tolist())
+        return True
     return False
 
 
@@ -542,6 +577,7 @@ def linear_bend_check(o_molsys):
     bends_to_remove = []
 
     for frag_index, frag in enumerate(o_molsys.fragments):
+        all_bends = None
         for i, intco in enumerate(frag.intcos):
             if isinstance(intco, bend.Bend):
                 new_val = intco.q(frag.geom)
@@ -558,9 +594,11 @@ def linear_bend_check(o_molsys):
                     # A-C-B doesn't always work. If A(A, B, C) is 0 A(A, C, B) could also be zero
                     # Need to check connectivity to find the most natural set of bends for the
                     # current connectivity.
-                    connect = frag.connectivity_from_distances()
-                    all_bends = []
-                    add_bend_from_connectivity(connect, all_bends, frag._geom)
+                    # The geometry is fixed here so the bends only need to be generated once
+                    if all_bends is None:
+                        connect = frag.connectivity_from_distances()
+                        all_bends = IntcoSet()
+                        add_bend_from_connectivity(connect, all_bends, frag._geom)
 
                     # Now check for permutations of the newly found linear bend
                     if bend.Bend(A, C, B) in all_bends:
@@ -1133,69 +1171,125 @@ def add_dimer_frag_intcos(o_molsys, params):
             df.update_reference_geometry(o_molsys.frag_geom(A), o_molsys.frag_geom(B))
             o_molsys.dimer_intcos.append(df)
 
+    elif params.interfrag_pairs == "NEAREST":
+        add_nearest_dimer_frag_intcos(o_molsys, params)
+
     else:  # autogenerate interfswap_min_maxragment coordinates
         # Tolerance for collinearity of ref points. Can be mad smaller, but its
         # riskier to start wth ref points the make very large angles
         col_tol = params.interfrag_collinear_tol
         for A, B in combinations(range(o_molsys.nfragments), r=2):
-            xyzA = o_molsys.frag_geom(A)
-            xyzB = o_molsys.frag_geom(B)
             # Choose closest two atoms for 1st reference pt.
-            (refA1, refB1) = o_molsys.closest_atoms_between_2_frags(A, B)
-            frag_ref_atomsA = [[refA1]]
-            frag_ref_atomsB = [[refB1]]
-            # Find ref. pt. 2 on A.
-            if not o_molsys.fragments[A].is_atom():
-                for i in range(o_molsys.fragments[A].natom):
-                    if i == refA1 or are_collinear(xyzA[i], xyzA[refA1], xyzB[refB1], col_tol):
-                        continue
-                    refA2 = i
-                    frag_ref_atomsA.append([refA2])
-                    break
-                else:
-                    raise OptError("could not find 2nd atom on fragment {:d}".format(A + 1))
-            # Find ref. pt. 2 on B.
-            if not o_molsys.fragments[B].is_atom():
-                for i in range(o_molsys.fragments[B].natom):
-                    if i == refB1 or are_collinear(xyzB[i], xyzB[refB1], xyzA[refA1], col_tol):
-                        continue
-                    refB2 = i
-                    frag_ref_atomsB.append([refB2])
-                    break
-                else:
-                    raise OptError("could not find 2nd atom on fragment {:d}".format(B + 1))
-            # Find ref. pt. 3 on A.
-            if o_molsys.fragments[A].natom > 2 and not o_molsys.fragments[A].is_linear():
-                for i in range(o_molsys.fragments[A].natom):
-                    if i in [refA1, refA2] or are_collinear(
-                        xyzA[i], xyzA[refA2], xyzA[refA1], col_tol
-                    ):
-                        continue
-                    frag_ref_atomsA.append([i])
-                    break
-                else:
-                    raise OptError("could not find 3rd atom on fragment {:d}".format(A + 1))
-            # Find ref. pt. 3 on B.
-            if o_molsys.fragments[B].natom > 2 and not o_molsys.fragments[B].is_linear():
-                for i in range(o_molsys.fragments[B].natom):
-                    if i in [refB1, refB2] or are_collinear(
-                        xyzB[i], xyzB[refB2], xyzB[refB1], col_tol
-                    ):
-                        continue
-                    frag_ref_atomsB.append([i])
-                    break
-                else:
-                    raise OptError("could not find 3rd atom on fragment {:d}".format(A + 1))
-
-            df = dimerfrag.DimerFrag(A, frag_ref_atomsA, B, frag_ref_atomsB)
-            df.update_reference_geometry(o_molsys.frag_geom(A), o_molsys.frag_geom(B))
-            o_molsys.dimer_intcos.append(df)
+            refA1, refB1 = o_molsys.closest_atoms_between_2_frags(A, B)
+            o_molsys.dimer_intcos.append(auto_dimer_frag(o_molsys, A, B, refA1, refB1, col_tol))
 
         # print('end of add_dimer_frag_intcos')
         # print(o_molsys)
     return
 
 
+def add_nearest_dimer_frag_intcos(o_molsys, params):
+    """Interfragment coordinates between each fragment and its ``interfrag_neighbors`` nearest
+    fragments, plus the pairs of a spanning tree that keeps all fragments connected (see
+    ``graph.fragment_pairs``). The number of coordinates grows linearly with the number of
+    fragments. Pairs whose coordinates fail ``DimerFrag.validate_intcos`` are left out. If that
+    leaves the fragments apart, they are joined through the next closest atom pairs instead."""
+    labels = np.repeat(np.arange(o_molsys.nfragments), o_molsys.frag_natoms)
+    radii = graph.covalent_radii(o_molsys.Z)
+    pairs = graph.fragment_pairs(o_molsys.geom, labels, radii, params.interfrag_neighbors)
+
+    # offsets before the coordinates are added, which change the layout of the system
+    first_atom = [o_molsys.frag_1st_atom(f) for f in range(o_molsys.nfragments)]
+    kept, rejected = [], set()
+
+    def add_pair(A, B, i, j):
+        refA1, refB1 = i - first_atom[A], j - first_atom[B]
+        df = auto_dimer_frag(o_molsys, A, B, refA1, refB1, params.interfrag_collinear_tol)
+        try:
+            df.validate_intcos(o_molsys.frag_geom(A), o_molsys.frag_geom(B))
+        except AlgError as error:
+            logger.warning(
+                "\tLeaving out interfragment coordinates of fragments %d and %d. %s", A + 1, B + 1, error.mesg
+            )
+            rejected.add((min(i, j), max(i, j)))
+            return
+        kept.append((A, B))
+        o_molsys.dimer_intcos.append(df)
+
+    for A, B, i, j in pairs:
+        add_pair(A, B, i, j)
+
+    # link the groups of fragments that are still apart, without the atom pairs that failed
+    while True:
+        A, B = np.array(kept, dtype=int).reshape(-1, 2).T
+        group = graph.connected_components(o_molsys.nfragments, A, B)
+        if group.max() == 0:
+            break
+        links, _ = graph.link_components(o_molsys.geom, group[labels], radii, exclude=rejected)
+        if not links:
+            raise OptError("Could not find valid interfragment coordinates that connect all fragments")
+        for i, j in links:
+            A, B = sorted((int(labels[i]), int(labels[j])))
+            if (A, B) not in kept:  # links through atoms at the same distance
+                add_pair(A, B, *((i, j) if labels[i] == A else (j, i)))
+
+    logger.info(
+        "\tInterfragment coordinates for %d pairs of %d fragments", len(kept), o_molsys.nfragments
+    )
+
+
+def auto_dimer_frag(o_molsys, A, B, refA1, refB1, col_tol):
+    """DimerFrag for fragments A and B with automatic reference atoms. The first reference points
+    are the atoms refA1 and refB1 (indices within their fragments). Further points are the first
+    atoms that are not collinear with the previous points."""
+    xyzA = o_molsys.frag_geom(A)
+    xyzB = o_molsys.frag_geom(B)
+    frag_ref_atomsA = [[refA1]]
+    frag_ref_atomsB = [[refB1]]
+    # Find ref. pt. 2 on A.
+    if not o_molsys.fragments[A].is_atom():
+        for i in range(o_molsys.fragments[A].natom):
+            if i == refA1 or are_collinear(xyzA[i], xyzA[refA1], xyzB[refB1], col_tol):
+                continue
+            refA2 = i
+            frag_ref_atomsA.append([refA2])
+            break
+        else:
+            raise OptError("could not find 2nd atom on fragment {:d}".format(A + 1))
+    # Find ref. pt. 2 on B.
+    if not o_molsys.fragments[B].is_atom():
+        for i in range(o_molsys.fragments[B].natom):
+            if i == refB1 or are_collinear(xyzB[i], xyzB[refB1], xyzA[refA1], col_tol):
+                continue
+            refB2 = i
+            frag_ref_atomsB.append([refB2])
+            break
+        else:
+            raise OptError("could not find 2nd atom on fragment {:d}".format(B + 1))
+    # Find ref. pt. 3 on A.
+    if o_molsys.fragments[A].natom > 2 and not o_molsys.fragments[A].is_linear():
+        for i in range(o_molsys.fragments[A].natom):
+            if i in [refA1, refA2] or are_collinear(xyzA[i], xyzA[refA2], xyzA[refA1], col_tol):
+                continue
+            frag_ref_atomsA.append([i])
+            break
+        else:
+            raise OptError("could not find 3rd atom on fragment {:d}".format(A + 1))
+    # Find ref. pt. 3 on B.
+    if o_molsys.fragments[B].natom > 2 and not o_molsys.fragments[B].is_linear():
+        for i in range(o_molsys.fragments[B].natom):
+            if i in [refB1, refB2] or are_collinear(xyzB[i], xyzB[refB2], xyzB[refB1], col_tol):
+                continue
+            frag_ref_atomsB.append([i])
+            break
+        else:
+            raise OptError("could not find 3rd atom on fragment {:d}".format(B + 1))
+
+    df = dimerfrag.DimerFrag(A, frag_ref_atomsA, B, frag_ref_atomsB)
+    df.update_reference_geometry(xyzA, xyzB)
+    return df
+
+
 def improper_torsion_around_oofp(center, a, b, c, geom):
     """To help compensate for missing the oofp. Create an improper torsion which goes from
     T1-T2-C-T3 where T denotes terminal atoms, C denotes the OOFP center, and T1-C-T3 is linear"""
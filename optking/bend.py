@@ -36,6 +36,8 @@ class Bend(Simple):
         class for evaluating additional external force
     """
 
+    __slots__ = ("_bendType", "_axes_fixed", "_x", "_w")
+
     def __init__(
         self,
         a,
@@ -95,6 +97,10 @@ class Bend(Simple):
         else:
             return True
 
+    @property
+    def key(self):
+        return super().key + (self.bend_type,)
+
     @property
     def axes_fixed(self):
         return self._axes_fixed
@@ -16,6 +16,8 @@ class Cart(Simple):
         set coordinate as 'free', 'frozen', etc.
     """
 
+    __slots__ = ("_xyz",)
+
     def __init__(
         self,
         a,
@@ -64,6 +66,10 @@ class Cart(Simple):
         else:
             return True
 
+    @property
+    def key(self):
+        return super().key + (self.xyz,)
+
     @property
     def xyz(self):
         return self._xyz
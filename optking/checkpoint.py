@@ -0,0 +1,492 @@
+"""Binary checkpoints for the OptHelpers.
+
+A checkpoint is a directory. Array data is written raw (NumPy ``.npy``/``.npz`` and flat binary
+files), the internal coordinates are written as typed index tables, and the trajectory of
+AtomicResults is written once to an append-only JSON lines file which the checkpoint only
+references. Everything else is a small JSON document, ``state.json``.
+
+The step data of ``History`` (and ``IRCHistory``) is mirrored by append-only files. Only the rows
+changed since the previous save are rewritten, so checkpointing every step costs O(step) rather
+than O(history). A helper restored by ``from_checkpoint`` keeps appending to the files it was
+read from.
+
+::
+
+    checkpoint/
+        state.json
+        arrays.npz          hessian and other small arrays
+        molsys.npz          fragment geometries and coordinate tables
+        trajectory.jsonl    one AtomicResult per line
+        history/            one pair of files per History field
+        irc_history/        (IRC only)
+
+Examples
+--------
+>>> opt = optking.CustomHelper(molecule)
+>>> for step in range(30):
+...     ...
+...     opt.take_step()
+...     opt.to_checkpoint("opt.chk")
+>>> opt = optking.CustomHelper.from_checkpoint("opt.chk")
+
+"""
+
+import json
+import logging
+import os
+import pathlib
+
+import numpy as np
+from qcelemental.util.serialization import json_dumps
+
+from .exceptions import OptError
+from .hessianForms import HessianForm
+from .history import Step, StepArrays
+from .IRCdata import IRCpoint
+from . import log_name
+
+logger = logging.getLogger(f"{log_name}{__name__}")
+
+CHECKPOINT_FORMAT = "optking-checkpoint"
+CHECKPOINT_VERSION = 1
+
+# Columns of the coordinate table. atoms are padded with -1
+INTCO_TYPES = ("Stre", "Bend", "Tors", "Oofp", "Cart")
+CONSTRAINTS = ("free", "frozen", "ranged")
+BEND_TYPES = ("REGULAR", "LINEAR", "COMPLEMENT")
+
+
+class ArrayLog(object):
+    """Append-only files mirroring a ``StepArrays``.
+
+    Each array field is stored as ``<name>.f8`` (all rows' values, concatenated) and ``<name>.len``
+    (int64 length of each row; -1 for None). Each scalar field is stored as ``<name>.<dtype>``.
+
+    Parameters
+    ----------
+    directory : pathlib.Path
+    array_fields : dict
+    scalar_fields : dict
+    """
+
+    def __init__(self, directory, array_fields, scalar_fields):
+        self.directory = pathlib.Path(directory)
+        self.array_fields = array_fields
+        self.scalar_fields = {name: np.dtype(dtype) for name, dtype in scalar_fields.items()}
+        self._storage = None
+        self._rows = 0
+        # cumulative number of values written for each array field, per row
+        self._ends = {name: [] for name in array_fields}
+        self._read_state()
+
+    def _file(self, name, suffix):
+        return self.directory / f"{name}.{suffix}"
+
+    def _read_state(self):
+        """Rebuild the number of rows and the end offsets from the files of an existing directory.
+        Only complete rows are counted"""
+        try:
+            rows = min(
+                [self._file(name, "len").stat().st_size // 8 for name in self.array_fields]
+                + [
+                    self._file(name, dtype.str[1:]).stat().st_size // dtype.itemsize
+                    for name, dtype in self.scalar_fields.items()
+                ]
+            )
+        except FileNotFoundError:
+            return
+
+        ends = {}
+        for name in self.array_fields:
+            lengths = np.fromfile(self._file(name, "len"), dtype="<i8", count=rows)
+            ends[name] = np.cumsum(np.maximum(lengths, 0))
+            # values of a row may be missing if a write was interrupted
+            rows = min(rows, np.searchsorted(ends[name], self._file(name, "f8").stat().st_size // 8, "right"))
+
+        self._rows = int(rows)
+        self._ends = {name: ends[name][:rows].tolist() for name in self.array_fields}
+
+    def adopt(self, storage: StepArrays):
+        """Declare that the first rows of the files hold the rows of storage (as after ``load``).
+        The next sync only writes the rows of storage changed after this call."""
+        if storage.size > self._rows:
+            raise OptError(f"{self.directory} holds {self._rows} rows, not {storage.size}")
+        self._storage = storage
+        storage.mark_clean()
+
+    def sync(self, storage: StepArrays):
+        """Write the rows of storage which have changed since the last sync.
+
+        Returns
+        -------
+        int
+            number of rows written
+        """
+
+        if storage is not self._storage:
+            # first write (or a new history object): rewrite everything
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._storage = storage
+            start = 0
+        else:
+            start = min(storage.dirty_from, self._rows)
+
+        self._truncate(start)
+
+        for name in self.array_fields:
+            lengths = storage.lengths[name][start : storage.size]
+            values = storage.arrays[name][start : storage.size]
+            with open(self._file(name, "f8"), "ab") as f:
+                for row, length in enumerate(lengths):
+                    if length > 0:
+                        values[row, :length].astype("<f8").tofile(f)
+            with open(self._file(name, "len"), "ab") as f:
+                lengths.astype("<i8").tofile(f)
+
+            end = self._ends[name][-1] if self._ends[name] else 0
+            for length in lengths:
+                end += max(int(length), 0)
+                self._ends[name].append(end)
+
+        for name, dtype in self.scalar_fields.items():
+            with open(self._file(name, dtype.str[1:]), "ab") as f:
+                storage.scalars[name][start : storage.size].astype(dtype.newbyteorder("<")).tofile(f)
+
+        self._rows = storage.size
+        storage.mark_clean()
+        return storage.size - start
+
+    def _truncate(self, rows):
+        """Drop all rows from rows onwards"""
+        if rows == 0:
+            for name in self.array_fields:
+                for suffix in ("f8", "len"):
+                    open(self._file(name, suffix), "wb").close()
+                self._ends[name] = []
+            for name, dtype in self.scalar_fields.items():
+                open(self._file(name, dtype.str[1:]), "wb").close()
+            return
+
+        for name in self.array_fields:
+            self._ends[name] = self._ends[name][:rows]
+            with open(self._file(name, "f8"), "r+b") as f:
+                f.truncate(8 * self._ends[name][-1])
+            with open(self._file(name, "len"), "r+b") as f:
+                f.truncate(8 * rows)
+        for name, dtype in self.scalar_fields.items():
+            with open(self._file(name, dtype.str[1:]), "r+b") as f:
+                f.truncate(dtype.itemsize * rows)
+
+    def load(self, nrows) -> StepArrays:
+        """Read the first nrows rows into a new StepArrays"""
+        storage = StepArrays(self.array_fields, self.scalar_fields, capacity=max(nrows, 1))
+        storage.size = nrows
+
+        for name in self.array_fields:
+            lengths = np.fromfile(self._file(name, "len"), dtype="<i8", count=nrows)
+            values = np.fromfile(self._file(name, "f8"), dtype="<f8")
+            storage._grow_columns(name, max(int(lengths.max(initial=0)), 0))
+            storage.lengths[name][:nrows] = lengths
+            offsets = np.concatenate(([0], np.cumsum(np.maximum(lengths, 0))))
+            for row, length in enumerate(lengths):
+                if length > 0:
+                    storage.arrays[name][row, :length] = values[offsets[row] : offsets[row + 1]]
+
+        for name, dtype in self.scalar_fields.items():
+            storage.scalars[name][:nrows] = np.fromfile(
+                self._file(name, dtype.str[1:]), dtype=dtype.newbyteorder("<"), count=nrows
+            )
+        return storage
+
+
+class Checkpoint(object):
+    """Write (and read) an OptHelper's state to a checkpoint directory.
+
+    Keep the same Checkpoint object between saves to write incrementally. After ``load``,
+    ``adopt`` the restored helper to keep appending to the existing files.
+
+    Parameters
+    ----------
+    path : Union[str, pathlib.Path]
+        checkpoint directory. Created if needed.
+    """
+
+    def __init__(self, path):
+        self.path = pathlib.Path(path)
+        self.history_log = ArrayLog(self.path / "history", Step.array_fields, Step.scalar_fields)
+        self.irc_log = ArrayLog(
+            self.path / "irc_history", IRCpoint.array_fields, IRCpoint.scalar_fields
+        )
+        self._trajectory_written = 0
+        self._trajectory = None
+        # size (bytes) of the first _trajectory_written lines of the trajectory file
+        self._trajectory_end = 0
+
+    def save(self, helper):
+        """Write the state of helper. Step data and trajectory entries already present in the
+        checkpoint are not rewritten."""
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        arrays = {}
+
+        self.history_log.sync(helper.history.storage)
+        history_state = helper.history.to_dict(include_steps=False)
+        history_state["nsteps"] = len(helper.history)
+
+        hessian = helper._Hq.to_dict() if isinstance(helper._Hq, HessianForm) else helper._Hq
+
+        opt_manager = helper.opt_manager.to_dict()
+        irc_object = opt_manager.get("irc_object")
+        if irc_object is not None:
+            irc_history = helper.opt_manager.opt_method.irc_history
+            self.irc_log.sync(irc_history.irc_points.storage)
+            irc_object["irc_history"] = irc_history.to_dict(include_points=False)
+            irc_object["irc_history"]["npoints"] = len(irc_history.irc_points)
+
+        computer = {
+            key: val
+            for key, val in helper.computer.__dict__.items()
+            if key in ("molecule", "model", "keywords", "program", "energies")
+        }
+        computer["trajectory"] = {
+            "file": "trajectory.jsonl",
+            "count": self._write_trajectory(helper.computer.trajectory),
+        }
+
+        state = {
+            "format": CHECKPOINT_FORMAT,
+            "version": CHECKPOINT_VERSION,
+            "helper": type(helper).__name__,
+            "step_num": helper.step_num,
+            "params": _split_arrays(helper.params.to_dict(by_alias=False), arrays, "params"),
+            "opt_input": helper.opt_input,
+            "computer": computer,
+            "history": history_state,
+            "hessian": _split_arrays(hessian, arrays, "hessian"),
+            "opt_manager": _split_arrays(opt_manager, arrays, "opt_manager"),
+            "molsys": save_molsys(helper.molsys, self.path / "molsys.npz"),
+        }
+
+        np.savez(self.path / "arrays.npz", **arrays)
+        tmp = self.path / "state.json.tmp"
+        with open(tmp, "w") as f:
+            f.write(json_dumps(state))
+        os.replace(tmp, self.path / "state.json")
+        logger.debug("Checkpoint written to %s", self.path)
+
+    def adopt(self, helper):
+        """Continue writing incrementally for helper, restored from this checkpoint by ``load``"""
+        self.history_log.adopt(helper.history.storage)
+        if helper.params.opt_type == "IRC":
+            self.irc_log.adopt(helper.opt_manager.opt_method.irc_history.irc_points.storage)
+        self._trajectory = helper.computer.trajectory
+        self._trajectory_written = len(self._trajectory)
+
+    def _write_trajectory(self, trajectory):
+        """Append new entries of the computer's trajectory. Returns number of entries stored"""
+
+        if trajectory is not self._trajectory or len(trajectory) < self._trajectory_written:
+            self._trajectory = trajectory
+            self._trajectory_written = 0
+            self._trajectory_end = 0
+
+        # lines after the stored entries are left from an interrupted save
+        with open(self.path / "trajectory.jsonl", "r+b" if self._trajectory_end else "wb") as f:
+            f.truncate(self._trajectory_end)
+            f.seek(self._trajectory_end)
+            for entry in trajectory[self._trajectory_written :]:
+                f.write((json_dumps(entry) + "\n").encode())
+            self._trajectory_end = f.tell()
+        self._trajectory_written = len(trajectory)
+        return self._trajectory_written
+
+    def load(self) -> dict:
+        """Read the checkpoint into the dictionary format of ``Helper.to_dict()``
+
+        Returns
+        -------
+        dict
+        """
+
+        try:
+            with open(self.path / "state.json", "r") as f:
+                state = json.load(f)
+        except FileNotFoundError as error:
+            raise OptError(f"No checkpoint found at {self.path}") from error
+
+        if state.get("format") != CHECKPOINT_FORMAT:
+            raise OptError(f"{self.path} is not an optking checkpoint")
+
+        with np.load(self.path / "arrays.npz") as npz:
+            arrays = dict(npz)
+
+        history_state = state["history"]
+        nsteps = history_state.pop("nsteps")
+        history_state["step_arrays"] = self.history_log.load(nsteps).to_dict()
+
+        opt_manager = _join_arrays(state["opt_manager"], arrays)
+        if "irc_object" in opt_manager:
+            irc_history = opt_manager["irc_object"]["irc_history"]
+            npoints = irc_history.pop("npoints")
+            irc_history["irc_point_arrays"] = self.irc_log.load(npoints).to_dict()
+
+        computer = state["computer"]
+        ntraj = computer["trajectory"]["count"]
+        with open(self.path / computer["trajectory"]["file"], "rb") as f:
+            computer["trajectory"] = [json.loads(f.readline()) for _ in range(ntraj)]
+            self._trajectory_end = f.tell()
+
+        return {
+            "step_num": state["step_num"],
+            "params": _join_arrays(state["params"], arrays),
+            "molsys": load_molsys(self.path / "molsys.npz", state["molsys"]),
+            "history": history_state,
+            "computer": computer,
+            "hessian": _join_arrays(state["hessian"], arrays),
+            "opt_input": state["opt_input"],
+            "opt_manager": opt_manager,
+        }
+
+
+def save_molsys(molsys, filename):
+    """Write the fragments of molsys with their coordinates as typed index tables.
+
+    Returns
+    -------
+    dict
+        JSON serializable part of the molecular system (dimer coordinates, external forces)
+    """
+
+    arrays = {}
+    ext_forces = {}
+    for iF, F in enumerate(molsys.fragments):
+        arrays[f"frag{iF}_Z"] = np.asarray(F.Z, dtype=int)
+        arrays[f"frag{iF}_geom"] = F.geom
+        arrays[f"frag{iF}_masses"] = F.masses
+        int_table, float_table, forces = intco_tables(F.intcos)
+        arrays[f"frag{iF}_intco_int"] = int_table
+        arrays[f"frag{iF}_intco_float"] = float_table
+        if forces:
+            ext_forces[str(iF)] = forces
+
+    np.savez(filename, **arrays)
+    return {
+        "file": pathlib.Path(filename).name,
+        "nfragments": molsys.nfragments,
+        "frozen": [F.frozen for F in molsys.fragments],
+        "ext_forces": ext_forces,
+        "dimer_intcos": [DI.to_dict() for DI in molsys.dimer_intcos],
+    }
+
+
+def load_molsys(filename, d):
+    """Read save_molsys() output into the format of ``Molsys.to_dict()``"""
+
+    fragments = []
+    with np.load(filename) as npz:
+        for iF in range(d["nfragments"]):
+            intcos = intco_dicts(
+                npz[f"frag{iF}_intco_int"],
+                npz[f"frag{iF}_intco_float"],
+                d["ext_forces"].get(str(iF), {}),
+            )
+            fragments.append(
+                {
+                    "Z": npz[f"frag{iF}_Z"].tolist(),
+                    "geom": npz[f"frag{iF}_geom"],
+                    "masses": npz[f"frag{iF}_masses"],
+                    "frozen": d["frozen"][iF],
+                    "intcos": intcos,
+                }
+            )
+    return {"fragments": fragments, "dimer_intcos": d["dimer_intcos"]}
+
+
+def intco_tables(intcos):
+    """Describe a list of simple internal coordinates by an integer and a float table.
+
+    Integer columns: type, atom 1-4 (-1 padded), constraint, flag (Stre: inverse, Bend: bend type,
+    Tors/Oofp: near180, Cart: xyz), flag 2 (Bend: axes_fixed). Float columns: range_min, range_max
+    (NaN for None).
+
+    Returns
+    -------
+    tuple(np.ndarray, np.ndarray, dict)
+        (nintco, 8) int table, (nintco, 2) float table, {index: external force formula}
+    """
+
+    int_table = np.full((len(intcos), 8), -1, dtype=int)
+    float_table = np.full((len(intcos), 2), np.nan)
+    ext_forces = {}
+
+    for i, intco in enumerate(intcos):
+        d = intco.to_dict()
+        int_table[i, 0] = INTCO_TYPES.index(d["type"])
+        int_table[i, 1 : 1 + len(d["atoms"])] = d["atoms"]
+        int_table[i, 5] = CONSTRAINTS.index(d["constraint"])
+        if d["type"] == "Stre":
+            int_table[i, 6] = d["inverse"]
+        elif d["type"] == "Bend":
+            int_table[i, 6] = BEND_TYPES.index(d["bend_type"])
+            int_table[i, 7] = d["axes_fixed"]
+        elif d["type"] in ("Tors", "Oofp"):
+            int_table[i, 6] = d["near180"]
+        elif d["type"] == "Cart":
+            int_table[i, 6] = d["xyz"]
+        for col, key in enumerate(("range_min", "range_max")):
+            if d[key] is not None:
+                float_table[i, col] = d[key]
+        if d["ext_force_str"] is not None:
+            ext_forces[str(i)] = d["ext_force_str"]
+
+    return int_table, float_table, ext_forces
+
+
+def intco_dicts(int_table, float_table, ext_forces):
+    """Inverse of intco_tables. Returns a list of dicts suitable for ``Frag.from_dict``"""
+
+    intcos = []
+    for i, (row, (range_min, range_max)) in enumerate(zip(int_table.tolist(), float_table.tolist())):
+        intco_type = INTCO_TYPES[row[0]]
+        d = {
+            "type": intco_type,
+            "atoms": [a for a in row[1:5] if a != -1],
+            "constraint": CONSTRAINTS[row[5]],
+            "range_min": None if np.isnan(range_min) else range_min,
+            "range_max": None if np.isnan(range_max) else range_max,
+            "ext_force_str": ext_forces.get(str(i)),
+        }
+        if intco_type == "Stre":
+            d["inverse"] = bool(row[6])
+        elif intco_type == "Bend":
+            d["bend_type"] = BEND_TYPES[row[6]]
+            d["axes_fixed"] = bool(row[7])
+        elif intco_type in ("Tors", "Oofp"):
+            d["near180"] = row[6]
+        elif intco_type == "Cart":
+            d["xyz"] = row[6]
+        intcos.append(d)
+    return intcos
+
+
+def _split_arrays(obj, arrays, key):
+    """Replace ndarrays in a nested structure by references to entries of arrays"""
+    if isinstance(obj, np.ndarray):
+        arrays[key] = obj
+        return {"__ndarray__": key}
+    elif isinstance(obj, dict):
+        return {k: _split_arrays(v, arrays, f"{key}.{k}") for k, v in obj.items()}
+    elif isinstance(obj, (list, tuple)):
+        return [_split_arrays(v, arrays, f"{key}.{i}") for i, v in enumerate(obj)]
+    return obj
+
+
+def _join_arrays(obj, arrays):
+    """Inverse of _split_arrays"""
+    if isinstance(obj, dict):
+        if set(obj.keys()) == {"__ndarray__"}:
+            return arrays[obj["__ndarray__"]]
+        return {k: _join_arrays(v, arrays) for k, v in obj.items()}
+    elif isinstance(obj, list):
+        return [_join_arrays(v, arrays) for v in obj]
+    return obj
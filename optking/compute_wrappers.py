@@ -7,10 +7,13 @@ from qcelemental.models import AtomicInput, AtomicResult, Molecule
 from qcelemental.util.serialization import json_dumps
 
 from .exceptions import OptError
-from . import log_name
+from . import instrumentation, log_name
 
 logger = logging.getLogger(f"{log_name}{__name__}")
 
+# instrumentation counter for each driver
+DRIVER_COUNTERS = {"energy": "energies", "gradient": "gradients", "hessian": "hessians"}
+
 
 class ComputeWrapper:
     """An implementation of MolSSI's qc schema
@@ -73,6 +76,7 @@ class ComputeWrapper:
         """Abstract style method for child classes"""
         pass
 
+    @instrumentation.timed("compute")
     def compute(self, geom, driver, return_full=True, print_result=False):
         """Perform calculation of type driver
 
@@ -89,6 +93,7 @@ class ComputeWrapper:
         """
 
         self.update_geometry(geom)
+        instrumentation.count(DRIVER_COUNTERS.get(driver, driver))
         ret = self._compute(driver)
         # Decodes the Result Schema to remove numpy elements (Makes ret JSON serializable)
         ret = json.loads(json_dumps(ret))
@@ -1109,6 +1109,338 @@ class DimerFrag(object):
         # if self.d_on(5):
 
 
+class DimerBatch(object):
+    """The interfragment coordinates of all dimers of a molecular system, evaluated together
+
+    The reference points of the dimers are stacked in one array with the six rows of each pseudo
+    fragment (A3, A2, A1, B1, B2, B3). The values and B matrix rows of all coordinates, and the
+    rigid-body moves of fragment B in ``orient``, are computed with array operations instead of a
+    loop over the dimers. The results agree with ``DimerFrag.q``, ``DimerFrag.Bmat`` and
+    ``DimerFrag.orient_fragment``.
+
+    Parameters
+    ----------
+    dimers : list of DimerFrag
+    atom_offsets : array
+        index of the first atom of each fragment in the molecular system
+    """
+
+    def __init__(self, dimers, atom_offsets):
+        self._dimers = dimers
+        self._atom_offsets = np.asarray(atom_offsets)
+        self._A_idx = np.array([DI.A_idx for DI in dimers], dtype=int)
+        self._B_idx = np.array([DI.B_idx for DI in dimers], dtype=int)
+        self._n_arefs = np.array([DI.n_arefs for DI in dimers], dtype=int)
+        self._n_brefs = np.array([DI.n_brefs for DI in dimers], dtype=int)
+
+        # The atoms and weights of the reference points, grouped by dimer.
+        rows, atoms, weights = [], [], []
+        self._ref_start = [0]
+        for d, DI in enumerate(dimers):
+            for frag_idx, refs, pseudo_rows in ((DI.A_idx, DI._Arefs, (2, 1, 0)), (DI.B_idx, DI._Brefs, (3, 4, 5))):
+                for row, rp in zip(pseudo_rows, refs):
+                    rows += len(rp) * [6 * d + row]
+                    atoms += [atom_offsets[frag_idx] + w.atom for w in rp]
+                    weights += [w.weight for w in rp]
+            self._ref_start.append(len(rows))
+        self._ref_row = np.array(rows, dtype=int)
+        self._ref_atom = np.array(atoms, dtype=int)
+        self._ref_weight = np.array(weights)
+
+        # Coordinates by type. The points are rows of the stacked reference points.
+        coords = [(d, slot, coord) for d, DI in enumerate(dimers) for slot, coord in zip(
+            [i for i in range(6) if DI.d_on(i)], DI.pseudo_frag.intcos)]
+        self._coord_dimer = np.array([d for d, _, _ in coords], dtype=int)
+        self._coord_slot = np.array([slot for _, slot, _ in coords], dtype=int)
+        self._kinds = {}
+        for kind, cls, npoints in (("stre", stre.Stre, 2), ("bend", bend.Bend, 3), ("tors", tors.Tors, 4)):
+            index = [k for k, (_, _, coord) in enumerate(coords) if isinstance(coord, cls)]
+            points = [6 * coords[k][0] + np.array(coords[k][2].atoms) for k in index]
+            self._kinds[kind] = (np.array(index, dtype=int), np.array(points, dtype=int).reshape(-1, npoints))
+        if sum(len(index) for index, _ in self._kinds.values()) != len(coords):
+            raise OptError("Unexpected type of interfragment coordinate")
+        if any(coord.bend_type != "REGULAR" for _, _, coord in coords if isinstance(coord, bend.Bend)):
+            raise OptError("Interfragment bends are expected to be regular")
+
+        stre_index = self._kinds["stre"][0]
+        self._inverse = np.array([coords[k][2].inverse for k in stre_index], dtype=bool)
+        self._tors = [coords[k][2] for k in self._kinds["tors"][0]]
+
+        # The (coordinate, point of the coordinate, atom, weight) entries of the chain rule from
+        # the reference points to the Cartesians of the atoms.
+        entries = {}
+        for i, row in enumerate(rows):
+            entries.setdefault(row, []).append(i)
+        chain = []
+        for index, points in self._kinds.values():
+            for k, coord_points in zip(index, points):
+                chain += [(k, j, i) for j, row in enumerate(coord_points) for i in entries[row]]
+        chain = np.array(chain, dtype=int).reshape(-1, 3)
+        self._chain_coord, self._chain_pos = chain[:, 0], chain[:, 1]
+        self._chain_atom, self._chain_weight = self._ref_atom[chain[:, 2]], self._ref_weight[chain[:, 2]]
+
+    @property
+    def ndimers(self):
+        return len(self._dimers)
+
+    @property
+    def num_intcos(self):
+        return len(self._coord_dimer)
+
+    def reference_points(self, geom, dimers=None):
+        """Reference points of the dimers (6 rows per dimer, unused rows are zero)
+
+        Parameters
+        ----------
+        geom : np.ndarray
+            (natom, 3) geometry of the molecular system
+        dimers : slice, optional
+            compute a contiguous range of dimers only. The other rows are left zero.
+        """
+        ref = np.zeros((6 * self.ndimers, 3))
+        entries = slice(None) if dimers is None else slice(self._ref_start[dimers.start], self._ref_start[dimers.stop])
+        for xyz in range(3):
+            ref[:, xyz] = np.bincount(
+                self._ref_row[entries],
+                weights=self._ref_weight[entries] * geom[self._ref_atom[entries], xyz],
+                minlength=len(ref),
+            )
+        return ref
+
+    def q(self, ref):
+        """Values of all interfragment coordinates, given the reference points"""
+        q = np.zeros(self.num_intcos)
+
+        index, points = self._kinds["stre"]
+        R = np.linalg.norm(ref[points[:, 1]] - ref[points[:, 0]], axis=1)
+        q[index] = np.where(self._inverse, 1.0 / R, R)
+
+        index, points = self._kinds["bend"]
+        u, _ = _units(ref[points[:, 0]] - ref[points[:, 1]])
+        v, _ = _units(ref[points[:, 2]] - ref[points[:, 1]])
+        x, _ = _units(u + v)  # angle bisector
+        q[index] = _angles(u, x) + _angles(x, v)
+
+        index, points = self._kinds["tors"]
+        if len(index):
+            tau, bad = _tors(*(ref[points[:, i]] for i in range(4)))
+            if bad.any():
+                # raises the error with the bends to add in place of the torsion
+                i = np.flatnonzero(bad)[0]
+                d = self._coord_dimer[index[i]]
+                self._tors[i].q(ref[6 * d : 6 * d + 6])
+            near180 = np.array([coord.near180 for coord in self._tors])
+            tau[(near180 == -1) & (tau > op.Params.fix_val_near_pi)] -= 2.0 * np.pi
+            tau[(near180 == +1) & (tau < -op.Params.fix_val_near_pi)] += 2.0 * np.pi
+            q[index] = tau
+        return q
+
+    def Bmat(self, ref, B):
+        """Adds the rows of all interfragment coordinates into B (interfragment coordinates,
+        Cartesians of the molecular system), given the reference points"""
+        # derivatives with respect to the (up to 4) reference points of each coordinate
+        dref = np.zeros((self.num_intcos, 4, 3))
+
+        index, points = self._kinds["stre"]
+        eAB, R = _units(ref[points[:, 1]] - ref[points[:, 0]])
+        eAB[self._inverse] *= -1.0 / R[self._inverse, None] ** 2  # -(1/R)^2 * dR/dx
+        dref[index, 0] = -eAB
+        dref[index, 1] = eAB
+
+        index, points = self._kinds["bend"]
+        u, Lu = _units(ref[points[:, 0]] - ref[points[:, 1]])
+        v, Lv = _units(ref[points[:, 2]] - ref[points[:, 1]])
+        w, _ = _units(np.cross(u, v))
+        uXw = np.cross(u, w) / Lu[:, None]
+        wXv = np.cross(w, v) / Lv[:, None]
+        dref[index, 0] = uXw
+        dref[index, 1] = -uXw - wXv
+        dref[index, 2] = wXv
+
+        index, points = self._kinds["tors"]
+        u, Lu = _units(ref[points[:, 0]] - ref[points[:, 1]])
+        v, Lv = _units(ref[points[:, 3]] - ref[points[:, 2]])
+        w, Lw = _units(ref[points[:, 2]] - ref[points[:, 1]])
+        cos_u = np.einsum("ij,ij->i", u, w)
+        cos_v = -np.einsum("ij,ij->i", v, w)
+        sin2_u = 1.0 - cos_u * cos_u
+        sin2_v = 1.0 - cos_v * cos_v
+        # leave zero if 0 or 180 angle
+        ok = (sin2_u > 1.0e-12) & (sin2_v > 1.0e-12)
+        index, sin2_u, sin2_v = index[ok], sin2_u[ok, None], sin2_v[ok, None]
+        uXw = np.cross(u[ok], w[ok])
+        vXw = np.cross(v[ok], w[ok])
+        Lu, Lv, Lw = Lu[ok, None], Lv[ok, None], Lw[ok, None]
+        cos_u, cos_v = cos_u[ok, None], cos_v[ok, None]
+        dref[index, 0] = uXw / (Lu * sin2_u)
+        dref[index, 1] = -uXw / (Lu * sin2_u) + uXw * cos_u / (Lw * sin2_u) + vXw * cos_v / (Lw * sin2_v)
+        dref[index, 2] = vXw / (Lv * sin2_v) - uXw * cos_u / (Lw * sin2_u) - vXw * cos_v / (Lw * sin2_v)
+        dref[index, 3] = -vXw / (Lv * sin2_v)
+
+        cols = 3 * self._chain_atom[:, None] + np.arange(3)
+        values = self._chain_weight[:, None] * dref[self._chain_coord, self._chain_pos]
+        np.add.at(B, (self._chain_coord[:, None], cols), values)
+
+    def orient(self, geom, q_target):
+        """Moves fragment B of each dimer so that its interfragment coordinates have the target
+        values. Each move is one rigid-body transformation of the atoms of B, as in
+        ``DimerFrag.orient_fragment``.
+
+        The dimers are handled in order, as runs of dimers that do not involve a fragment moved
+        earlier in the run. The moves of a run are computed and applied together.
+
+        Parameters
+        ----------
+        geom : np.ndarray
+            (natom, 3) geometry of the molecular system; overwritten
+        q_target : np.ndarray
+            target values of all interfragment coordinates (bohr and radians)
+        """
+        # The z-matrix values placing the reference points of B. These defaults are arbitrary
+        # and only used for fragments with fewer than 3 reference points.
+        values = np.tile([1.0, 0.8, 0.8, 0.8, 0.8, 0.8], (self.ndimers, 1))
+        values[self._coord_dimer, self._coord_slot] = q_target
+        index = self._kinds["stre"][0][self._inverse]
+        values[self._coord_dimer[index], 0] = 1.0 / values[self._coord_dimer[index], 0]
+
+        start = 0
+        while start < self.ndimers:
+            # a run ends before the first dimer that involves a fragment moved in the run
+            moved = set()
+            stop = start
+            while stop < self.ndimers and not moved & {self._A_idx[stop], self._B_idx[stop]}:
+                moved.add(self._B_idx[stop])
+                stop += 1
+            self._orient_run(geom, values, slice(start, stop))
+            start = stop
+
+    def _orient_run(self, geom, values, dimers):
+        """Moves fragment B of dimers that do not depend on each other"""
+        nA, nB = self._n_arefs[dimers], self._n_brefs[dimers]
+        R_AB, theta_A, theta_B, tau, phi_A, phi_B = values[dimers].T
+        ref = self.reference_points(geom, dimers).reshape(-1, 6, 3)[dimers]
+
+        # reference points A1, A2, A3 and B1, B2, B3. Missing points of A are set to something
+        # non-linear so that the z-matrix points can be computed.
+        ref_A = ref[:, [2, 1, 0]]
+        ref_A[nA < 3, 2] = [1.0, 2.0, 3.0]
+        ref_A[nA < 2, 1] = [2.0, 3.0, 4.0]
+        ref_B = ref[:, 3:]
+
+        # target locations of the reference points of B in the coordinate system of A
+        has_2, has_3 = nB > 1, nB > 2
+        R_B1B2 = np.linalg.norm(ref_B[:, 1] - ref_B[:, 0], axis=1)
+        R_B2B3 = np.linalg.norm(ref_B[:, 2] - ref_B[:, 1], axis=1)
+        B_angle = _angles(*(_units(ref_B[has_3, i] - ref_B[has_3, 1], check=False)[0] for i in (0, 2)))
+        final = np.zeros((len(nB), 3, 3))
+        final[:, 0] = _zmat_points(ref_A[:, 2], ref_A[:, 1], ref_A[:, 0], R_AB, theta_A, phi_A)
+        final[has_2, 1] = _zmat_points(ref_A[has_2, 1], ref_A[has_2, 0], final[has_2, 0], R_B1B2[has_2],
+                                       theta_B[has_2], tau[has_2])
+        final[has_3, 2] = _zmat_points(ref_A[has_3, 0], final[has_3, 0], final[has_3, 1], R_B2B3[has_3],
+                                       B_angle, phi_B[has_3])
+
+        # 1) translate B1 onto its target. 2) rotate about B1 to place B2, then 3) about B1-B2
+        # to place B3. Together x' = B1_target + R (x - B1).
+        rotation = np.tile(np.eye(3), (len(nB), 1, 1))
+        e12, _ = _units(ref_B[has_2, 1] - ref_B[has_2, 0])
+        e12b, _ = _units(final[has_2, 1] - final[has_2, 0])
+        angle = np.arccos(np.clip(np.einsum("ij,ij->i", e12, e12b), -1.0, 1.0))
+        turn = np.flatnonzero(has_2)[np.abs(angle) > 1.0e-7]
+        rotation[turn] = _rotation_matrices(np.cross(e12, e12b)[np.abs(angle) > 1.0e-7], angle[np.abs(angle) > 1.0e-7])
+
+        if has_3.any():
+            moved_B = final[has_3, :1] + np.einsum("nij,nkj->nki", rotation[has_3], ref_B[has_3] - ref_B[has_3, :1])
+            angle, bad = _tors(moved_B[:, 2], moved_B[:, 0], moved_B[:, 1], final[has_3, 2])
+            if bad.any():
+                i = np.flatnonzero(bad)[0]
+                v3d.tors(moved_B[i, 2], moved_B[i, 0], moved_B[i, 1], final[has_3, 2][i], indices=[2, 0, 1, 2])
+            turn = np.abs(angle) > 1.0e-10
+            axis = moved_B[turn, 1] - moved_B[turn, 0]
+            index = np.flatnonzero(has_3)[turn]
+            rotation[index] = _rotation_matrices(axis, angle[turn]) @ rotation[index]
+
+        # apply the moves to all atoms of the B fragments
+        first = self._atom_offsets[self._B_idx[dimers]]
+        natom = self._atom_offsets[self._B_idx[dimers] + 1] - first
+        owner = np.repeat(np.arange(len(nB)), natom)
+        atoms = np.arange(natom.sum()) - np.repeat(np.cumsum(natom) - natom, natom) + first[owner]
+        geom[atoms] = final[owner, 0] + np.einsum("nij,nj->ni", rotation[owner], geom[atoms] - ref_B[owner, 0])
+
+
+def _units(v, check=True):
+    """Normalized rows of v and their norms. Raises AlgError for a norm beyond the tolerances
+    of ``v3d.normalize``"""
+    norm = np.linalg.norm(v, axis=1)
+    if check and np.any((norm < 1.0e-8) | (norm > 1.0e15)):
+        raise AlgError("Could not normalize vector. Vector norm beyond tolerance")
+    return v / norm[:, None], norm
+
+
+def _angles(u, v, tol=1.0e-14):
+    """Angles between the unit rows of u and v as in ``v3d._calc_angle``"""
+    dot = np.einsum("ij,ij->i", u, v)
+    phi = np.arccos(np.clip(dot, -1.0, 1.0))
+    phi[dot > 1.0 - tol] = 0.0
+    phi[dot < -1.0 + tol] = np.pi
+    return phi
+
+
+def _tors(A, B, C, D):
+    """Torsions A-B-C-D of rows of points as in ``v3d.tors``, and a mask of the torsions with
+    bends too close to 0 or 180 degrees"""
+    EBA, _ = _units(A - B)
+    ECB, _ = _units(B - C)
+    ECD, _ = _units(D - C)
+    EAB, EBC = -EBA, -ECB
+
+    phi_123 = _angles(EBA, EBC)
+    phi_234 = _angles(ECB, ECD)
+    lim = op.Params.v3d_tors_angle_lim
+    bad = ~((lim < phi_123) & (phi_123 < np.pi - lim) & (lim < phi_234) & (phi_234 < np.pi - lim))
+
+    tmp = np.cross(EBC, ECD)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        tval = np.einsum("ij,ij->i", np.cross(EAB, EBC), tmp) / (np.sin(phi_123) * np.sin(phi_234))
+    tol = op.Params.v3d_tors_cos_tol
+    tau = np.arccos(np.clip(tval, -1.0, 1.0))
+    tau[tval >= 1.0 - tol] = 0.0
+    tau[tval <= -1.0 + tol] = np.pi
+
+    # sign convention of Wilson, Decius and Cross. Range is (-pi,pi].
+    flip = (tau != np.pi) & (np.einsum("ij,ij->i", EAB, tmp) < 0)
+    tau[flip] *= -1
+    return tau, bad
+
+
+def _zmat_points(A, B, C, R_CD, theta_BCD, phi_ABCD):
+    """``orient.zmat_point`` for rows of points and values"""
+    eAB, _ = _units(B - A)
+    eBC, _ = _units(C - B)
+    cosABC = -np.einsum("ij,ij->i", eAB, eBC)
+    sinABC = np.sqrt(np.maximum(1 - cosABC * cosABC, 0.0))
+    if np.any(sinABC - 1.0e-14 < 0.0):
+        raise AlgError("Z-matrix (reference) points cannot be colinear.")
+
+    eY = np.cross(eAB, eBC) / sinABC[:, None]
+    eX = np.cross(eY, eBC)
+    sin_theta = np.sin(theta_BCD)[:, None]
+    return C + R_CD[:, None] * (
+        -eBC * np.cos(theta_BCD)[:, None]
+        + eX * sin_theta * np.cos(phi_ABCD)[:, None]
+        + eY * sin_theta * np.sin(phi_ABCD)[:, None]
+    )
+
+
+def _rotation_matrices(axis, phi):
+    """Matrices of rotations by phi about the axes (rows), as in ``orient.rotate_vector``"""
+    w, _ = _units(axis, check=False)
+    cos_phi, sin_phi = np.cos(phi)[:, None, None], np.sin(phi)[:, None, None]
+    cross = np.zeros((len(w), 3, 3))
+    cross[:, 0, 1], cross[:, 0, 2], cross[:, 1, 2] = -w[:, 2], w[:, 1], -w[:, 0]
+    cross = cross - cross.transpose(0, 2, 1)
+    return cos_phi * np.eye(3) + sin_phi * cross + (1.0 - cos_phi) * np.einsum("ni,nj->nij", w, w)
+
+
 def test_orient(NA, NB, printInfo=False, randomSeed=None):
     """Test the orient_fragment function to see if pre-determined target
     # coordinate values can be met.  Technically, this only tests consistency
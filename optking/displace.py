@@ -11,10 +11,11 @@ from itertools import compress
 from . import intcosMisc
 from .addIntcos import linear_bend_check
 from .bend import Bend
+from .frag import Frag
 from .molsys import Molsys
 from .exceptions import AlgError, OptError
 from .linearAlgebra import abs_max, rms, symm_mat_inv
-from . import log_name
+from . import instrumentation, log_name
 from . import printTools
 
 logger = logging.getLogger(f"{log_name}{__name__}")
@@ -31,6 +32,7 @@ logger = logging.getLogger(f"{log_name}{__name__}")
 
 
 # Displace molecular system
+@instrumentation.timed("displace_molsys")
 def displace_molsys(molsys: Molsys, dq_in, fq=None, **kwargs):
     """Manage internal coordinate step for a molecular system
 
@@ -90,7 +92,11 @@ def displace_molsys(molsys: Molsys, dq_in, fq=None, **kwargs):
                 else:
                     pass  # value within range
 
-    geom_in = molsys.geom
+    active = molsys.active_space()
+    if active is not None:
+        dq_in[~molsys.active_intco_list] = 0.0
+
+    geom_in = molsys.geom.copy()
     q_in = molsys.q_array()  # recompute with limitations above
     q_target = q_in + dq_in
 
@@ -98,35 +104,83 @@ def displace_molsys(molsys: Molsys, dq_in, fq=None, **kwargs):
         if frag.frozen or frag.num_intcos == 0:
             continue
         logger.info("\tDetermining Cartesian step for fragment %d." % (f + 1))
-        dq_frag, conv = displace_frag(frag, dq_in[molsys.frag_intco_slice(f)], **kwargs)
-
-    for i, DI in enumerate(molsys.dimer_intcos):
-        logger.info(
-            "\tTaking step for dimer coordinates of fragments %d and %d."
-            % (DI.A_idx + 1, DI.B_idx + 1)
-        )
-
-        axyz = molsys.frag_geom(DI.A_idx)
-        bxyz = molsys.frag_geom(DI.B_idx)
-        bxyz[:] = DI.orient_fragment(axyz, bxyz, q_target[molsys.dimerfrag_intco_slice(i)])
+        dq_frag = dq_in[molsys.frag_intco_slice(f)]
+        if active is not None:
+            frag, dq_frag, frag_kwargs = _active_frag(molsys, f, dq_frag, kwargs)
+            if frag is None:
+                continue
+            dq_frag, conv = displace_frag(frag, dq_frag, **frag_kwargs)
+        else:
+            dq_frag, conv = displace_frag(frag, dq_frag, **kwargs)
+
+    if molsys.dimer_intcos:
+        logger.info("\tTaking step for dimer coordinates of %d pairs of fragments." % len(molsys.dimer_intcos))
+        molsys.dimer_batch.orient(molsys.geom, q_target[molsys.dimerfrag_1st_intco(0) :])
+
+    geom_final = molsys.geom.copy()
+    if molsys.point_group is not None:
+        # remove the noise of the back-transformation before it accumulates and breaks symmetry
+        geom_final = molsys.point_group.symmetrize(geom_final)
 
-    geom_final = molsys.geom
     # Analyze relative to original input geometry
+    # The report is only built if it is returned or will be logged
+    build_report = return_str or logger.isEnabledFor(logging.INFO)
     molsys.geom = geom_in
     molsys.update_dihedral_orientations()
     molsys.fix_bend_axes()
     q_orig = molsys.q_array()
-    qShow_orig = molsys.q_show_array()
+    qShow_orig = molsys.q_show_array() if build_report else None
 
     molsys.geom = geom_final
     q_final = molsys.q_array()
-    qShow_final = molsys.q_show_array()
+    qShow_final = molsys.q_show_array() if build_report else None
 
     dx = geom_final - geom_in
-
-    dqShow = qShow_final - qShow_orig
     molsys.unfix_bend_axes()
 
+    coordinate_change_report = ""
+    if build_report:
+        coordinate_change_report = _coordinate_change_report(molsys, qShow_orig, qShow_final, fq)
+        logger.info(coordinate_change_report)
+
+    # Return final, total displacement ACHIEVED
+    dq = q_final - q_orig
+
+    linear_list, bends_to_remove = linear_bend_check(molsys)
+    if linear_list:
+        raise AlgError(
+            "New linear angles",
+            new_linear_bends=linear_list,
+            old_bends=bends_to_remove
+        )
+
+    # RAK TODO : remember why I want to return dx and what to do with it.
+    if return_str:
+        return dq, dx, coordinate_change_report
+    else:
+        return dq, dx
+
+
+def _active_frag(molsys, f, dq_frag, kwargs):
+    """Fragment f reduced to its active coordinates, their step and the keyword arguments that
+    keep the frozen atoms in place (see ``Molsys.active_space``). The geometry is shared with
+    fragment f. (None, None, None) if no atom of the fragment moves."""
+    frag = molsys.fragments[f]
+    atoms = slice(molsys.frag_1st_atom(f), molsys.frag_1st_atom(f + 1))
+    moving = np.flatnonzero(~molsys.frozen_atom_list[atoms])
+    if not moving.size:
+        return None, None, None
+
+    active = molsys.active_intco_list[molsys.frag_intco_slice(f)]
+    if len(moving) < frag.natom:
+        frag = Frag(frag.Z, frag.geom, frag.masses, intcos=list(compress(frag.intcos, active)))
+        dq_frag = dq_frag[active]
+    return frag, dq_frag, dict(kwargs, active_atoms=moving)
+
+
+def _coordinate_change_report(molsys, qShow_orig, qShow_final, fq=None):
+    """Table of the coordinates before and after a step in Angstroms or degrees"""
+    dqShow = qShow_final - qShow_orig
     intco_lbls = molsys.intco_lbls
 
     coordinate_change_report = (
@@ -143,7 +197,7 @@ def displace_molsys(molsys: Molsys, dq_in, fq=None, **kwargs):
         coordinate_change_report += (
             "\t           ----------      --------        ------        ------\n"
         )
-        for i in range(len(dq_in)):
+        for i in range(len(qShow_orig)):
             coordinate_change_report += "\t%21s%14.5f%14.5f%14.5f\n" % (
                 intco_lbls[i],
                 qShow_orig[i],
@@ -158,7 +212,7 @@ def displace_molsys(molsys: Molsys, dq_in, fq=None, **kwargs):
         coordinate_change_report += (
             "\t           ----------      --------        ------          ------        ------\n"
         )
-        for i in range(len(dq_in)):
+        for i in range(len(qShow_orig)):
             coordinate_change_report += "\t%21s%14.5f%15.5f%15.5f%14.5f\n" % (
                 intco_lbls[i],
                 qShow_orig[i],
@@ -169,24 +223,7 @@ def displace_molsys(molsys: Molsys, dq_in, fq=None, **kwargs):
     coordinate_change_report += (
         "\t-------------------------------------------------------------------------------\n"
     )
-    logger.info(coordinate_change_report)
-
-    # Return final, total displacement ACHIEVED
-    dq = q_final - q_orig
-
-    linear_list, bends_to_remove = linear_bend_check(molsys)
-    if linear_list:
-        raise AlgError(
-            "New linear angles",
-            new_linear_bends=linear_list,
-            old_bends=bends_to_remove
-        )
-
-    # RAK TODO : remember why I want to return dx and what to do with it.
-    if return_str:
-        return dq, dx, coordinate_change_report
-    else:
-        return dq, dx
+    return coordinate_change_report
 
 
 def displace_frag(frag, dq_in, **kwargs):
@@ -223,7 +260,7 @@ def displace_frag(frag, dq_in, **kwargs):
         "ensure_convergence", kwargs.get("ensure_bt_convergence", False)
     )
 
-    logger.debug("Attempting to take step\n%s", printTools.print_array_string(dq_in))
+    logger.debug("Attempting to take step\n%s", printTools.lazy_array_string(dq_in))
     geom = frag.geom
     dq = dq_in.copy()
     if not frag.num_intcos or not len(geom) or not len(dq_in):
@@ -293,7 +330,9 @@ def displace_frag(frag, dq_in, **kwargs):
     # Fix drift/error in any frozen coordinates
     if any(intco.frozen for intco in frag.intcos) or any(intco.ranged for intco in frag.intcos):
         unmet_constrained_coords, dq_correction = get_unmet_constraints(frag, geom, q_orig)
-        frozen_conv = adjust_unmet_constraints(frag, unmet_constrained_coords, dq_correction, geom)
+        frozen_conv = adjust_unmet_constraints(
+            frag, unmet_constrained_coords, dq_correction, geom, active_atoms=kwargs.get("active_atoms")
+        )
     else:
         frozen_conv = True
 
@@ -301,7 +340,7 @@ def displace_frag(frag, dq_in, **kwargs):
     q_final = intcosMisc.q_values(frag.intcos, geom)
     dq[:] = q_final - q_orig
 
-    if kwargs.get("print_lvl", 1) >= 1:
+    if kwargs.get("print_lvl", 1) >= 1 and logger.isEnabledFor(logging.DEBUG):
         frag_report = "\tReport of back-transformation: (au)\n"
         frag_report += "\n\t  int       q_final         q_target          Error\n"
         frag_report += "\t---------------------------------------------------\n"
@@ -316,7 +355,7 @@ def displace_frag(frag, dq_in, **kwargs):
         frag_report += "\t--------------------------------------------------\n"
         logger.debug(frag_report)
 
-    logger.debug("Achieved dq\n%s", printTools.print_array_string(dq))
+    logger.debug("Achieved dq\n%s", printTools.lazy_array_string(dq))
 
     return dq, conv and frozen_conv
 
@@ -344,7 +383,9 @@ def back_transformation(intcos, geom, dq, **kwargs):
                 q_target[i] = min(1e-5, old_disp * 1e-3) + np.pi
                 dq[i] = q_target[i] - q_orig[i]
 
-    if print_lvl > 1:  # printing is supressed for frozen coordinate cleanup
+    # reports are only built if they will be logged
+    debug = logger.isEnabledFor(logging.DEBUG)
+    if print_lvl > 1 and debug:  # printing is supressed for frozen coordinate cleanup
         target_step_str = "Initial target in back_transformation():\n"
         target_step_str += "          Original         Target           Dq\n"
         for i in range(len(dq)):
@@ -356,7 +397,7 @@ def back_transformation(intcos, geom, dq, **kwargs):
         logger.debug(target_step_str)
     step_iter_str = ""
 
-    if print_lvl > 0:
+    if print_lvl > 0 and debug:
         step_iter_str = "\n\t             Back Transformation Report            "
         step_iter_str += "\n\t---------------------------------------------------\n"
         step_iter_str += "\t Iter        RMS(dx)        Max(dx)        RMS(dq) \n"
@@ -406,9 +447,11 @@ def back_transformation(intcos, geom, dq, **kwargs):
             )
         bt_iter_cnt += 1
 
+    instrumentation.count("back_transformations")
+    instrumentation.count("back_transformation_iterations", bt_iter_cnt)
     bt_final_step = f"\tRMS(dx): {dx_rms: .3e} \tMax(dx): {dx_max: .3e} \tRMS(dq): {dq_rms: .3e}"
     if bt_converged:
-        if print_lvl > 0:
+        if step_iter_str:
             step_iter_str += "\t---------------------------------------------------\n"
             logger.debug(step_iter_str)
 
@@ -419,7 +462,7 @@ def back_transformation(intcos, geom, dq, **kwargs):
         logger.warning(bt_final_step)
 
     if dq_rms > best_dq_rms:
-        if print_lvl > 0:
+        if step_iter_str:
             step_iter_str += "\t---------------------------------------------------\n"
             logger.debug(step_iter_str)
 
@@ -452,6 +495,8 @@ def dq_to_dx(intcos, geom, dq, **kwargs):
     threshold : float
         tolerance for inversion of singular values. This argument corresponds to rcond in
         numpy.linalg.pinv()
+    active_atoms : np.ndarray, optional
+        indices of the atoms that may move. The other atoms are left out of B and stay in place
 
     Returns
     -------
@@ -461,11 +506,15 @@ def dq_to_dx(intcos, geom, dq, **kwargs):
         absolute maximum of cartesian displacement
     """
 
-    print_details = kwargs.get("print_details", False)
+    print_details = kwargs.get("print_details", False) and logger.isEnabledFor(logging.DEBUG)
     threshold = kwargs.get("threshold", 1e-8)
     print_lvl = kwargs.get("print_lvl", 1)
 
     B = intcosMisc.Bmat(intcos, geom)
+    active_atoms = kwargs.get("active_atoms")
+    if active_atoms is not None:
+        cols = (3 * np.asarray(active_atoms)[:, None] + np.arange(3)).ravel()
+        B = B[:, cols]
     G = B @ B.T
     Ginv = symm_mat_inv(G, redundant=True, threshold=threshold, print_lvl=print_lvl)
     dx = B.T @ Ginv @ dq
@@ -499,7 +548,10 @@ def dq_to_dx(intcos, geom, dq, **kwargs):
     if print_details:
         q_old = intcosMisc.q_values(intcos, geom)
 
-    geom += dx.reshape(geom.shape)
+    if active_atoms is not None:
+        geom[active_atoms] += dx.reshape(-1, 3)
+    else:
+        geom += dx.reshape(geom.shape)
 
     if print_details:
         dq_achieved = intcosMisc.q_values(intcos, geom) - q_old
@@ -6,6 +6,7 @@ import qcelemental as qcel
 
 from . import addIntcos, bend, oofp, stre, tors
 from .exceptions import OptError
+from .intcoSet import IntcoSet
 from .printTools import print_array_string, print_mat_string
 from .v3d import are_collinear
 from . import log_name
@@ -26,7 +27,7 @@ class Frag:
         masses : list[float]
             atomic masses
         intcos : list[Simple], optional
-            internal coordinates (stretches, bends, etch...)
+            internal coordinates (stretches, bends, etch...). Stored as an IntcoSet
 
         """
 
@@ -35,9 +36,7 @@ class Frag:
         self._masses = masses
         self._frozen = frozen
 
-        self._intcos = []
-        if intcos:
-            self._intcos = intcos
+        self._intcos = IntcoSet(intcos) if intcos else IntcoSet()
 
     def __str__(self):
         np.set_printoptions(suppress=True, floatmode="fixed", sign=" ")
@@ -85,6 +84,12 @@ class Frag:
             intcos = None
         return cls(Z, geom, masses, intcos, frozen)
 
+    def _share(self, Z, geom, masses):
+        """Replace the atomic data with views into the arrays of a Molsys. Values are unchanged"""
+        self._Z = Z
+        self._geom = geom
+        self._masses = masses
+
     @property
     def natom(self):
         """number of atoms in frag"""
@@ -106,7 +111,7 @@ class Frag:
         return self._masses
 
     @property
-    def intcos(self):
+    def intcos(self) -> IntcoSet:
         """Getter for internal coordinates describing geometry of fragment"""
         return self._intcos
 
@@ -181,7 +186,7 @@ class Frag:
         for h_bond in h_bonds:
             if stre.Stre(h_bond.A, h_bond.B) in self._intcos:
                 self._intcos.pop(self._intcos.index(stre.Stre(h_bond.A, h_bond.B)))
-        self._intcos = h_bonds + self._intcos  # prepend internal coordinates
+        self._intcos = IntcoSet(h_bonds + self._intcos)  # prepend internal coordinates
 
     def show_geom(self):
         geometry = ""
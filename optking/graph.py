@@ -0,0 +1,332 @@
+"""Sparse bond graphs of molecular systems.
+
+Neighbors are found with a cell list, so building the bonds of a system with a bounded density of
+atoms is O(N) instead of the O(N^2) of a distance matrix. Fragments are the connected components
+of the bond graph. ``link_components`` joins fragments through their closest atoms along a minimum
+spanning tree. ``fragment_pairs`` adds the nearest neighbors of each fragment to the tree to choose
+the pairs of fragments for interfragment coordinates.
+"""
+
+import logging
+from itertools import product
+
+import numpy as np
+import qcelemental as qcel
+
+from . import log_name
+
+logger = logging.getLogger(f"{log_name}{__name__}")
+
+# cell offsets which, together with (0, 0, 0), visit each pair of neighboring cells once
+HALF_SHELL = np.array([offset for offset in product((-1, 0, 1), repeat=3) if offset > (0, 0, 0)])
+# below this many atoms all pairs are tested directly
+BRUTE_FORCE_NATOM = 64
+# pairs closer than this multiple of the mean covalent distance are candidates for links between
+# fragments. Fragments that are farther apart are joined through an all pairs search
+LINK_CUTOFF = 3.0
+# links through atoms as close as the closest pair are added as well (avoids breaking symmetry)
+TIE_TOL = 1.0e-10
+
+
+def covalent_radii(Z):
+    """Covalent radii (bohr) of the atoms. 4 bohr for elements without a radius"""
+    elements, atoms = np.unique(np.asarray(Z, dtype=int), return_inverse=True)
+    radii = np.array([qcel.covalentradii.get(int(z), missing=4.0) for z in elements], dtype=float)
+    return radii[atoms.reshape(-1)]
+
+
+def close_pairs(geom, cutoff):
+    """Atom pairs closer than cutoff
+
+    Parameters
+    ----------
+    geom : np.ndarray
+        (nat, 3) cartesian geometry
+    cutoff : float
+
+    Returns
+    -------
+    tuple(np.ndarray, np.ndarray, np.ndarray)
+        first atoms, second atoms (i < j) and distances of the pairs
+    """
+    geom = np.asarray(geom, dtype=float).reshape(-1, 3)
+    natom = len(geom)
+    if natom <= BRUTE_FORCE_NATOM:
+        i, j = np.triu_indices(natom, k=1)
+    else:
+        i, j = _cell_pairs(geom, cutoff)
+
+    R = np.linalg.norm(geom[i] - geom[j], axis=1)
+    close = R < cutoff
+    i, j, R = i[close], j[close], R[close]
+    return np.minimum(i, j), np.maximum(i, j), R
+
+
+def _cell_pairs(geom, cutoff):
+    """Atom pairs in the same or neighboring cells of a grid with spacing cutoff"""
+    cells = np.floor((geom - geom.min(axis=0)) / cutoff).astype(np.int64)
+    dims = cells.max(axis=0) + 1
+
+    def cell_key(cells):
+        return (cells[:, 0] * dims[1] + cells[:, 1]) * dims[2] + cells[:, 2]
+
+    # atoms sorted by cell. Cell keys[k] holds order[starts[k] : starts[k] + counts[k]]
+    keys = cell_key(cells)
+    order = np.argsort(keys, kind="stable")
+    keys, starts, counts = np.unique(keys[order], return_index=True, return_counts=True)
+
+    first, second = [], []
+    for offset in [np.zeros(3, dtype=int), *HALF_SHELL]:
+        neighbor = cells + offset
+        inside = np.flatnonzero(np.all((neighbor >= 0) & (neighbor < dims), axis=1))
+        neighbor_key = cell_key(neighbor[inside])
+        k = np.minimum(np.searchsorted(keys, neighbor_key), len(keys) - 1)
+        occupied = keys[k] == neighbor_key
+        atoms, k = inside[occupied], k[occupied]
+
+        # each atom against all atoms of its neighboring cell
+        n = counts[k]
+        within = np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n)
+        i = np.repeat(atoms, n)
+        j = order[np.repeat(starts[k], n) + within]
+        if not offset.any():
+            keep = i < j
+            i, j = i[keep], j[keep]
+        first.append(i)
+        second.append(j)
+    return np.concatenate(first), np.concatenate(second)
+
+
+def bonded_pairs(geom, Z, covalent_connect=1.3, radii=None):
+    """Atom pairs (i < j) closer than covalent_connect times the sum of their covalent radii.
+    The sparse form of ``addIntcos.connectivity_from_distances``
+
+    Returns
+    -------
+    tuple(np.ndarray, np.ndarray)
+    """
+    if radii is None:
+        radii = covalent_radii(Z)
+    if len(radii) < 2:
+        return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+
+    i, j, R = close_pairs(geom, 2.0 * covalent_connect * radii.max())
+    bonded = R < covalent_connect * (radii[i] + radii[j])
+    return i[bonded], j[bonded]
+
+
+def connected_components(natom, i, j):
+    """Label the connected components of a graph given by its edges (i, j). Components are
+    numbered in order of their lowest atom index.
+
+    Returns
+    -------
+    np.ndarray
+        (natom, ) component index for each atom
+    """
+    i, j = np.asarray(i, dtype=int), np.asarray(j, dtype=int)
+    root = np.arange(natom)
+    while True:
+        # point every atom to the root of its tree
+        while True:
+            jumped = root[root]
+            if np.array_equal(jumped, root):
+                break
+            root = jumped
+
+        ri, rj = root[i], root[j]
+        joined = ri != rj
+        if not joined.any():
+            break
+        # hook the larger root to the smaller. The root of a component is its lowest atom
+        np.minimum.at(root, np.maximum(ri[joined], rj[joined]), np.minimum(ri[joined], rj[joined]))
+
+    return np.unique(root, return_inverse=True)[1].reshape(natom)
+
+
+def link_components(geom, labels, radii, exclude=()):
+    """Atom pairs that join all fragments into one. The fragments are linked along a minimum
+    spanning tree through their closest atoms, measured by the ratio of the distance to the sum
+    of the covalent radii. Pairs of atoms as close as a link's pair are added with it.
+    Fragments that can only be joined through excluded pairs stay apart.
+
+    Parameters
+    ----------
+    geom : np.ndarray
+        (nat, 3) cartesian geometry
+    labels : np.ndarray
+        (nat, ) fragment index of each atom
+    radii : np.ndarray
+        (nat, ) covalent radii
+    exclude : Iterable[tuple(int, int)]
+        atom pairs (i < j) that may not be links
+
+    Returns
+    -------
+    list[tuple(int, int)]
+        atom pairs (i < j) of the links
+    float
+        the largest ratio of distance to covalent distance of a link (0 for a single fragment)
+    """
+    geom = np.asarray(geom, dtype=float).reshape(-1, 3)
+    labels = np.asarray(labels, dtype=int)
+    nfrag = int(labels.max()) + 1 if len(labels) else 0
+    if nfrag <= 1:
+        return [], 0.0
+
+    parent = list(range(nfrag))
+    # excluded pairs as i * nat + j
+    excluded = np.array([i * len(labels) + j for i, j in exclude], dtype=int)
+
+    def find(f):
+        while parent[f] != f:
+            parent[f] = parent[parent[f]]
+            f = parent[f]
+        return f
+
+    def join(candidates):
+        """Kruskal: add the candidate pairs (ratio, i, j) that join two trees, best first"""
+        added = []
+        for ratio, i, j in sorted(candidates):
+            a, b = find(labels[i]), find(labels[j])
+            if a != b:
+                parent[max(a, b)] = min(a, b)
+                added.append((ratio, i, j))
+        return added
+
+    # nearby fragments. The closest pair of each pair of fragments is a candidate
+    i, j, R = close_pairs(geom, LINK_CUTOFF * 2.0 * radii.mean())
+    between = labels[i] != labels[j]
+    if excluded.size:
+        between &= ~np.isin(np.minimum(i, j) * len(labels) + np.maximum(i, j), excluded)
+    i, j, R = i[between], j[between], R[between]
+    ratio = R / (radii[i] + radii[j])
+    frag_pair = np.minimum(labels[i], labels[j]) * nfrag + np.maximum(labels[i], labels[j])
+    order = np.lexsort((ratio, frag_pair))
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = frag_pair[order][1:] != frag_pair[order][:-1]
+    best = order[first]
+    links = join(zip(ratio[best].tolist(), i[best].tolist(), j[best].tolist()))
+
+    # the links and the candidates between the same fragments at the same distance
+    tie = np.zeros(len(frag_pair), dtype=bool)
+    if links:
+        link_i, link_j = np.array([(a, b) for _, a, b in links], dtype=int).T
+        link_pair = np.minimum(labels[link_i], labels[link_j]) * nfrag + np.maximum(labels[link_i], labels[link_j])
+        link_R = np.linalg.norm(geom[link_i] - geom[link_j], axis=1)
+        k = np.argsort(link_pair)
+        k = k[np.minimum(np.searchsorted(link_pair[k], frag_pair), len(k) - 1)]
+        tie = (link_pair[k] == frag_pair) & (np.abs(R - link_R[k]) < TIE_TOL)
+    pairs = list(zip(i[tie].tolist(), j[tie].tolist()))
+
+    # fragments that are still apart. Closest pairs from every tree but the largest to all others
+    trees = np.array([find(f) for f in range(nfrag)])[labels]
+    tree_ids, tree_sizes = np.unique(trees, return_counts=True)
+    if len(tree_ids) > 1:
+        candidates = []
+        for tree in tree_ids[np.argsort(tree_sizes)][:-1]:
+            inside = np.flatnonzero(trees == tree)
+            outside = np.flatnonzero(trees != tree)
+            ratio = _distances(geom, inside, outside) / (radii[inside, None] + radii[None, outside])
+            if excluded.size:
+                keys = np.minimum.outer(inside, outside) * len(labels) + np.maximum.outer(inside, outside)
+                ratio[np.isin(keys, excluded)] = np.inf
+            rows = np.argmin(ratio, axis=0)
+            closest = ratio[rows, np.arange(len(outside))]
+            # the closest atom of each other tree
+            order = np.lexsort((closest, trees[outside]))
+            first = np.ones(len(order), dtype=bool)
+            first[1:] = trees[outside][order][1:] != trees[outside][order][:-1]
+            for b in order[first].tolist():
+                if not np.isfinite(closest[b]):
+                    continue
+                i, j = sorted((int(inside[rows[b]]), int(outside[b])))
+                candidates.append((np.linalg.norm(geom[i] - geom[j]) / (radii[i] + radii[j]), i, j))
+        far_links = join(candidates)
+        links += far_links
+
+        for _, i, j in far_links:
+            A, B = np.flatnonzero(labels == labels[i]), np.flatnonzero(labels == labels[j])
+            R_ij = np.linalg.norm(geom[i] - geom[j])
+            # screen with the fast distances, then test the exact ones
+            for a, b in np.argwhere(np.abs(_distances(geom, A, B) - R_ij) < 1.0e-6):
+                if abs(np.linalg.norm(geom[A[a]] - geom[B[b]]) - R_ij) < TIE_TOL:
+                    pairs.append(tuple(sorted((int(A[a]), int(B[b])))))
+        if excluded.size:
+            excluded_keys = set(excluded.tolist())
+            pairs = [(i, j) for i, j in pairs if i * len(labels) + j not in excluded_keys]
+
+    return sorted(pairs), float(max((ratio for ratio, _, _ in links), default=0.0))
+
+
+def fragment_pairs(geom, labels, radii, neighbors=3):
+    """Pairs of fragments for interfragment coordinates: the pairs joined by ``link_components``
+    and each fragment with its nearest neighbors. Fragments are as close as their closest atoms,
+    measured by the ratio of the distance to the sum of the covalent radii, among the atoms within
+    the link cutoff. Neighbors are only searched within that cutoff, so the number of pairs grows
+    linearly with the number of fragments.
+
+    Parameters
+    ----------
+    geom : np.ndarray
+        (nat, 3) cartesian geometry
+    labels : np.ndarray
+        (nat, ) fragment index of each atom
+    radii : np.ndarray
+        (nat, ) covalent radii
+    neighbors : int
+        number of nearest fragments each fragment is paired with
+
+    Returns
+    -------
+    list[tuple(int, int, int, int)]
+        (A, B, i, j) for fragments A < B with their closest atoms i in A and j in B
+    """
+    geom = np.asarray(geom, dtype=float).reshape(-1, 3)
+    labels = np.asarray(labels, dtype=int)
+    nfrag = int(labels.max()) + 1 if len(labels) else 0
+    if nfrag <= 1:
+        return []
+
+    i, j, R = close_pairs(geom, LINK_CUTOFF * 2.0 * radii.mean())
+    between = labels[i] != labels[j]
+    i, j, R = i[between], j[between], R[between]
+    # atom i in fragment A < B
+    swap = labels[i] > labels[j]
+    i, j = np.where(swap, j, i), np.where(swap, i, j)
+    A, B = labels[i], labels[j]
+    ratio = R / (radii[i] + radii[j])
+
+    # the closest atoms of each pair of fragments
+    order = np.lexsort((ratio, A * nfrag + B))
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = (A * nfrag + B)[order][1:] != (A * nfrag + B)[order][:-1]
+    best = order[first]
+    A, B, i, j, ratio = A[best], B[best], i[best], j[best], ratio[best]
+    contacts = {(a, b): (x, y) for a, b, x, y in zip(A.tolist(), B.tolist(), i.tolist(), j.tolist())}
+
+    # each fragment with its nearest neighbors. rank is the position in the fragment's list
+    frag, other, ratio = np.r_[A, B], np.r_[B, A], np.r_[ratio, ratio]
+    order = np.lexsort((ratio, frag))
+    rank = np.arange(len(order)) - np.searchsorted(frag[order], frag[order])
+    near = order[rank < neighbors]
+    selected = set(zip(np.minimum(frag, other)[near].tolist(), np.maximum(frag, other)[near].tolist()))
+
+    # the spanning tree keeps all fragments connected
+    links, _ = link_components(geom, labels, radii)
+    for x, y in links:
+        if labels[x] > labels[y]:
+            x, y = y, x
+        pair = (int(labels[x]), int(labels[y]))
+        contacts.setdefault(pair, (x, y))
+        selected.add(pair)
+
+    return [(a, b, *contacts[(a, b)]) for a, b in sorted(selected)]
+
+
+def _distances(geom, A, B):
+    """(len(A), len(B)) matrix of distances between the atoms A and B. Uses
+    |a - b|^2 = |a|^2 + |b|^2 - 2 a.b to avoid an (A, B, 3) intermediate"""
+    a, b = geom[A], geom[B]
+    R2 = np.einsum("ij,ij->i", a, a)[:, None] + np.einsum("ij,ij->i", b, b)[None, :] - 2.0 * a @ b.T
+    return np.sqrt(np.maximum(R2, 0.0))
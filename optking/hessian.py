@@ -8,7 +8,8 @@ import qcelemental as qcel
 
 from .bend import Bend
 from .exceptions import OptError
-from .printTools import print_mat_string
+from .misc import average_r_from_periods, hguess_lindh_alpha
+from .printTools import lazy_mat_string
 from .stre import Stre
 from .tors import Tors
 from . import log_name
@@ -33,29 +34,57 @@ def show(H: np.ndarray, oMolsys):
     factors_inv = np.divide(1.0, factors)
     scaled_H = np.einsum("i,ij,j->ij", factors_inv, H, factors_inv)
     scaled_H *= qcel.constants.hartree2aJ
-    logger.info("Hessian in [aJ/Ang^2], [aJ/deg^2], etc.\n" + print_mat_string(scaled_H))
+    logger.info("Hessian in [aJ/Ang^2], [aJ/deg^2], etc.\n%s", lazy_mat_string(scaled_H))
 
 
 # def guess(intcos, geom, Z, connectivity=None, guessType="SIMPLE"):
 def guess(oMolsys, connectivity=None, guessType="SIMPLE"):
-    """Generates diagonal empirical Hessian in a.u.
+    """Generates empirical Hessian in a.u.
 
     Parameters
     ----------
-    intcos : list of Stre, Bend, Tors
-    geom : ndarray
-        cartesian geometry
+    oMolsys : molsys.Molsys
     connectivity : ndarray, optional
         connectivity matrix
     guessType: str, optional
-        the default is SIMPLE. other options: FISCHER, LINDH_SIMPLE, SCHLEGEL
+        the default is SIMPLE. other options: FISCHER, LINDH_SIMPLE, SCHLEGEL, LINDH
+
+    Returns
+    -------
+    np.ndarray
+        (num_intcos, num_intcos) matrix. Diagonal (see guess_diagonal()) except for LINDH, the full
+        model Hessian (see lindh_guess())
+    """
+    if guessType == "LINDH":
+        return lindh_guess(oMolsys)
+    return np.diagflat(guess_diagonal(oMolsys, connectivity, guessType))
+
+
+def guess_diagonal(oMolsys, connectivity=None, guessType="SIMPLE"):
+    """Diagonal of the empirical Hessian in a.u.
+
+    Parameters
+    ----------
+    oMolsys : molsys.Molsys
+    connectivity : ndarray, optional
+        connectivity matrix
+    guessType: str, optional
+        the default is SIMPLE. other options: FISCHER, LINDH_SIMPLE, SCHLEGEL, LINDH
+
+    Returns
+    -------
+    np.ndarray
+        (num_intcos, ) force constant for each internal coordinate
 
     Notes
     -----
     such as
       Schlegel, Theor. Chim. Acta, 66, 333 (1984) and
       Fischer and Almlof, J. Phys. Chem., 96, 9770 (1992).
+    For LINDH, the diagonal of the full model Hessian.
     """
+    if guessType == "LINDH":
+        return np.diag(lindh_guess(oMolsys)).copy()
 
     diag = []
     for F in oMolsys._fragments:
@@ -84,10 +113,223 @@ def guess(oMolsys, connectivity=None, guessType="SIMPLE"):
                 h = 0.111
             diag.append(h)
 
-    H = np.diagflat(np.asarray(diag))
+    return np.asarray(diag, dtype=float)
+
+
+# Lindh, Bernhardsson, Karlstrom and Malmqvist, Chem. Phys. Lett. 241, 423 (1995)
+LINDH_K_STRE = 0.45
+LINDH_K_BEND = 0.15
+LINDH_K_TORS = 0.005
+# alpha and r_ref for periods 1, 2 and 3+ (see misc.hguess_lindh_rho)
+LINDH_ALPHA = np.array([[hguess_lindh_alpha(a, b) for b in (1, 2, 3)] for a in (1, 2, 3)])
+LINDH_R_REF = np.array([[average_r_from_periods(a, b) for b in (1, 2, 3)] for a in (1, 2, 3)])
+# terms whose rho product (stretch, bend or torsion weight) is below this are neglected
+LINDH_THRESHOLD = 1.0e-4
+# smallest diagonal force constant in lindh_guess(). Atoms beyond covalent distances (e.g. in
+# van der Waals complexes) have rho ~ 0 and would otherwise give zero curvature
+LINDH_MIN_FC = 0.005
+# bends with sin(angle) below this are treated as linear (two perpendicular components)
+LINDH_LINEAR_SIN = 0.1
+
+
+def lindh_guess(oMolsys):
+    """Lindh model Hessian transformed to the internal coordinates of oMolsys
+
+    Parameters
+    ----------
+    oMolsys : molsys.Molsys
+
+    Returns
+    -------
+    np.ndarray
+        (num_intcos, num_intcos) with every diagonal element at least LINDH_MIN_FC
+    """
+    H_cart = lindh_cartesian(oMolsys.geom, oMolsys.Z)
+    H = oMolsys.hessian_to_internals(H_cart)
+    diagonal = np.diag(H)
+    H[np.diag_indices_from(H)] = np.maximum(diagonal, LINDH_MIN_FC)
+    return H
+
+
+def lindh_rho(geom, Z):
+    """(natom, natom) Lindh screening factors rho_ij = exp(alpha_ij (r_ref,ij^2 - r_ij^2)).
+    The diagonal is zero"""
+    geom = np.asarray(geom, dtype=float).reshape(-1, 3)
+    periods = np.array([min(qcel.periodictable.to_period(z), 3) - 1 for z in Z], dtype=int)
+    alpha = LINDH_ALPHA[periods[:, None], periods[None, :]]
+    r_ref = LINDH_R_REF[periods[:, None], periods[None, :]]
+
+    diff = geom[:, None, :] - geom[None, :, :]
+    R2 = np.einsum("ijk,ijk->ij", diff, diff)
+    rho = np.exp(-alpha * (R2 - r_ref * r_ref))
+    np.fill_diagonal(rho, 0)
+    return rho
+
+
+def lindh_cartesian(geom, Z, threshold=LINDH_THRESHOLD):
+    """Lindh model Hessian in Cartesian coordinates.
+
+    Every pair, triple and quadruple of atoms contributes a stretch, bend or torsion term
+    k rho_ij [rho_jk [rho_kl]] b b^T, where b is the Wilson B vector of the primitive coordinate.
+    Pairs with rho_ij < threshold are dropped, which gives neighbor lists for the triples and
+    quadruples. Terms are then screened by their own weight. All B vectors are evaluated and
+    accumulated as arrays.
+
+    Parameters
+    ----------
+    geom : np.ndarray
+        (natom, 3) in bohr
+    Z : list[int]
+    threshold : float, optional
+
+    Returns
+    -------
+    np.ndarray
+        (3 natom, 3 natom)
+    """
+    geom = np.asarray(geom, dtype=float).reshape(-1, 3)
+    natom = len(geom)
+    H = np.zeros((3 * natom, 3 * natom))
+
+    rho = lindh_rho(geom, Z)
+    rho[rho < threshold] = 0
+    neighbors = [np.flatnonzero(row) for row in rho]
+
+    # stretches
+    i, j = np.nonzero(np.triu(rho))
+    if len(i) == 0:
+        return H
+    k = LINDH_K_STRE * rho[i, j]
+    _lindh_accumulate(H, np.column_stack((i, j)), k, _stre_b_vectors(geom, i, j))
+
+    # bends i-j-k. All pairs of neighbors of the central atom j
+    triples = [
+        np.column_stack((nb[a], np.full(len(a), center), nb[c]))
+        for center, nb in enumerate(neighbors)
+        for a, c in [np.triu_indices(len(nb), 1)]
+    ]
+    i, j, l = np.concatenate(triples).T
+    k = LINDH_K_BEND * rho[i, j] * rho[j, l]
+    keep = k > LINDH_K_BEND * threshold
+    i, j, l, k = i[keep], j[keep], l[keep], k[keep]
+    b, linear = _bend_b_vectors(geom, i, j, l)
+    _lindh_accumulate(H, np.column_stack((i, j, l))[~linear], k[~linear], b[~linear])
+    for w in _perpendicular_directions(geom, i[linear], j[linear], l[linear]):
+        b_w = _linear_bend_b_vectors(geom, i[linear], j[linear], l[linear], w)
+        _lindh_accumulate(H, np.column_stack((i, j, l))[linear], k[linear], b_w)
+
+    # torsions i-j-k-l about each pair j < k
+    quadruples = []
+    for j, k in zip(*np.nonzero(np.triu(rho))):
+        i = neighbors[j][neighbors[j] != k]
+        l = neighbors[k][neighbors[k] != j]
+        ii, ll = np.meshgrid(i, l, indexing="ij")
+        distinct = ii != ll
+        quadruples.append(
+            np.column_stack(
+                (ii[distinct], np.full(distinct.sum(), j), np.full(distinct.sum(), k), ll[distinct])
+            )
+        )
+    if quadruples:
+        i, j, l, m = np.concatenate(quadruples).T
+        k = LINDH_K_TORS * rho[i, j] * rho[j, l] * rho[l, m]
+        keep = k > LINDH_K_TORS * threshold
+        i, j, l, m, k = i[keep], j[keep], l[keep], m[keep], k[keep]
+        b, linear = _tors_b_vectors(geom, i, j, l, m)
+        _lindh_accumulate(H, np.column_stack((i, j, l, m))[~linear], k[~linear], b[~linear])
+
     return H
 
 
+def _stre_b_vectors(geom, i, j):
+    """(m, 2, 3) derivatives of r_ij"""
+    u = geom[i] - geom[j]
+    u /= np.linalg.norm(u, axis=1)[:, None]
+    return np.stack((u, -u), axis=1)
+
+
+def _bend_b_vectors(geom, i, j, k):
+    """(m, 3, 3) derivatives of the angle i-j-k and a mask of (nearly) linear angles"""
+    u = geom[i] - geom[j]
+    v = geom[k] - geom[j]
+    r_u = np.linalg.norm(u, axis=1)[:, None]
+    r_v = np.linalg.norm(v, axis=1)[:, None]
+    u /= r_u
+    v /= r_v
+    cos = np.clip(np.einsum("ij,ij->i", u, v), -1, 1)[:, None]
+    sin = np.sqrt(1 - cos * cos)
+    linear = sin[:, 0] < LINDH_LINEAR_SIN
+    sin[linear] = 1  # not used
+
+    b_i = (cos * u - v) / (r_u * sin)
+    b_k = (cos * v - u) / (r_v * sin)
+    return np.stack((b_i, -b_i - b_k, b_k), axis=1), linear
+
+
+def _perpendicular_directions(geom, i, j, k):
+    """Two (m, 3) unit vectors perpendicular to each (nearly) linear i-j-k"""
+    axis = geom[k] - geom[i]
+    axis /= np.linalg.norm(axis, axis=1)[:, None]
+    # cross with the Cartesian axis least parallel to the bond axis
+    trial = np.eye(3)[np.argmin(np.abs(axis), axis=1)]
+    w1 = np.cross(axis, trial)
+    w1 /= np.linalg.norm(w1, axis=1)[:, None]
+    return w1, np.cross(axis, w1)
+
+
+def _linear_bend_b_vectors(geom, i, j, k, w):
+    """(m, 3, 3) derivatives of the component of a linear bend i-j-k in the direction w.
+    i and k may be on opposite sides of j (180 degrees) or on the same side (0 degrees)"""
+    u = geom[i] - geom[j]
+    v = geom[k] - geom[j]
+    side = -np.sign(np.einsum("ij,ij->i", u, v))[:, None]
+    b_i = w / np.linalg.norm(u, axis=1)[:, None]
+    b_k = side * w / np.linalg.norm(v, axis=1)[:, None]
+    return np.stack((b_i, -b_i - b_k, b_k), axis=1)
+
+
+def _tors_b_vectors(geom, i, j, k, l):
+    """(m, 4, 3) derivatives of the dihedral i-j-k-l and a mask of torsions with (nearly)
+    linear bends. Blondel and Karplus, J. Comput. Chem. 17, 1132 (1996)"""
+    F = geom[i] - geom[j]
+    G = geom[j] - geom[k]
+    H = geom[l] - geom[k]
+    A = np.cross(F, G)
+    B = np.cross(H, G)
+    A2 = np.einsum("ij,ij->i", A, A)[:, None]
+    B2 = np.einsum("ij,ij->i", B, B)[:, None]
+    G_norm = np.linalg.norm(G, axis=1)[:, None]
+
+    sin_1 = np.sqrt(A2) / (np.linalg.norm(F, axis=1)[:, None] * G_norm)
+    sin_2 = np.sqrt(B2) / (np.linalg.norm(H, axis=1)[:, None] * G_norm)
+    linear = (sin_1[:, 0] < LINDH_LINEAR_SIN) | (sin_2[:, 0] < LINDH_LINEAR_SIN)
+    A2[linear] = B2[linear] = 1  # not used
+
+    FG = np.einsum("ij,ij->i", F, G)[:, None]
+    HG = np.einsum("ij,ij->i", H, G)[:, None]
+    b_i = -G_norm / A2 * A
+    b_l = G_norm / B2 * B
+    b_j = -b_i + FG / (A2 * G_norm) * A - HG / (B2 * G_norm) * B
+    b_k = -b_l - FG / (A2 * G_norm) * A + HG / (B2 * G_norm) * B
+    return np.stack((b_i, b_j, b_k, b_l), axis=1), linear
+
+
+def _lindh_accumulate(H, atoms, k, b):
+    """H += sum_m k_m b_m b_m^T for terms with atoms (m, p) and B vectors b (m, p, 3)"""
+    if len(k) == 0:
+        return
+    ncart = H.shape[0]
+    xyz = np.arange(3)
+    for a in range(atoms.shape[1]):
+        rows = (3 * atoms[:, a, None, None] + xyz[None, :, None]) * ncart
+        for c in range(atoms.shape[1]):
+            cols = 3 * atoms[:, c, None, None] + xyz[None, None, :]
+            blocks = k[:, None, None] * b[:, a, :, None] * b[:, c, None, :]
+            H += np.bincount(
+                (rows + cols).ravel(), weights=blocks.ravel(), minlength=ncart * ncart
+            ).reshape(ncart, ncart)
+
+
 def from_file(filename: Path):
     """Read user provided hessian from disk"""
 
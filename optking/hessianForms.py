@@ -0,0 +1,351 @@
+"""Storage forms for the internal coordinate Hessian.
+
+Guess Hessians are diagonal and each quasi-Newton update adds one or two rank one terms, so
+algorithms that never diagonalize the Hessian (SD, CG, L-BFGS) need not store an (n, n) matrix.
+
+=================  ===========================================================================
+DiagonalHessian    ``diag(d)``
+LowRankHessian     ``diag(d) + U M U^T`` for (n, k) ``U`` and symmetric (k, k) ``M``
+DenseHessian       ``H``
+=================  ===========================================================================
+
+Every form provides ``matvec``, ``quadratic``, ``diagonal``, ``eig``, ``project`` and
+``rank_update``. Newton-Raphson and the RFO family diagonalize the full Hessian and keep using a
+plain ``np.ndarray``; ``to_dense()`` (or ``np.asarray``) converts any form.
+
+Projection with the redundancy and constraint projector ``P`` (``Molsys.projector``, an ndarray
+or a ``linearAlgebra.Projector``) is lazy for the diagonal and low rank forms. The diagonal part is applied as ``P diag(d) P``
+without forming the product; ``U`` is projected when ``project`` is called. Only the most recent
+projector is kept. Coordinates at the limit of a ranged constraint keep their diagonal value and
+are decoupled from all others, as in ``Molsys.project_redundancies_and_constraints``.
+"""
+
+import logging
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+from .exceptions import OptError
+from .linearAlgebra import symm_mat_eig
+from . import log_name
+
+logger = logging.getLogger(f"{log_name}{__name__}")
+
+
+class HessianForm(ABC):
+    """Symmetric (n, n) internal coordinate Hessian in some storage form"""
+
+    @property
+    @abstractmethod
+    def dim(self):
+        """number of internal coordinates, n"""
+        pass
+
+    @property
+    def shape(self):
+        return self.dim, self.dim
+
+    def __len__(self):
+        return self.dim
+
+    def __array__(self, dtype=None, copy=None):
+        H = self.to_dense()
+        return H if dtype is None else H.astype(dtype)
+
+    @abstractmethod
+    def matvec(self, v):
+        """H @ v"""
+        pass
+
+    def quadratic(self, u):
+        """u^T H u"""
+        return np.dot(u, self.matvec(u))
+
+    @abstractmethod
+    def diagonal(self):
+        """(n, ) diagonal of H"""
+        pass
+
+    @abstractmethod
+    def to_dense(self):
+        """(n, n) np.ndarray"""
+        pass
+
+    def eig(self):
+        """Eigenvalues (ascending) and eigenvectors (rows) as in ``linearAlgebra.symm_mat_eig``"""
+        return symm_mat_eig(self.to_dense())
+
+    @abstractmethod
+    def project(self, P=None, fixed=None):
+        """P H P with the ``fixed`` coordinates (boolean mask) decoupled from all others.
+
+        Parameters
+        ----------
+        P : Union[np.ndarray, linearAlgebra.Projector], optional
+            (n, n) projector. None for no projection
+        fixed : np.ndarray, optional
+            (n, ) boolean. Coordinates whose rows and columns are removed except for the diagonal
+
+        Returns
+        -------
+        HessianForm
+        """
+        pass
+
+    @abstractmethod
+    def rank_update(self, U, M):
+        """H + U M U^T as a new HessianForm
+
+        Parameters
+        ----------
+        U : np.ndarray
+            (n, k)
+        M : np.ndarray
+            (k, k) symmetric
+        """
+        pass
+
+    @abstractmethod
+    def to_dict(self):
+        pass
+
+
+class DiagonalHessian(HessianForm):
+    """Diagonal Hessian (e.g. an empirical guess). O(n) storage.
+
+    Parameters
+    ----------
+    values : np.ndarray
+        (n, ) force constants
+    """
+
+    form = "diagonal"
+
+    def __init__(self, values):
+        self.values = np.asarray(values, dtype=float)
+        # projector and decoupled coordinates. See project()
+        self.P = None
+        self.fixed = np.zeros(0, dtype=int)
+        self.fixed_values = np.zeros(0)
+
+    @property
+    def dim(self):
+        return len(self.values)
+
+    @property
+    def projected(self):
+        return self.P is not None or len(self.fixed) > 0
+
+    def matvec(self, v):
+        if not self.projected:
+            return self.values * v
+
+        x = np.array(v, dtype=float)
+        x[self.fixed] = 0
+        w = self.P @ (self.values * (self.P @ x)) if self.P is not None else self.values * x
+        w[self.fixed] = self.fixed_values * v[self.fixed]
+        return w
+
+    def diagonal(self):
+        if self.P is None:
+            diagonal = self.values.copy()
+        else:
+            # P is symmetric: (P D P)_ii = sum_j P_ij^2 d_j
+            P = np.asarray(self.P)
+            diagonal = np.einsum("ij,ij,j->i", P, P, self.values)
+        diagonal[self.fixed] = self.fixed_values
+        return diagonal
+
+    def to_dense(self):
+        if self.P is None:
+            H = np.diag(self.values)
+        else:
+            P = np.asarray(self.P)
+            H = (P * self.values) @ P
+        H[self.fixed, :] = 0
+        H[:, self.fixed] = 0
+        H[self.fixed, self.fixed] = self.fixed_values
+        return H
+
+    def eig(self):
+        """Sorted diagonal and unit vectors unless projected"""
+        if self.projected:
+            return super().eig()
+        order = np.argsort(self.values, kind="stable")
+        evects = np.zeros((self.dim, self.dim))
+        evects[np.arange(self.dim), order] = 1
+        return self.values[order], evects
+
+    def project(self, P=None, fixed=None):
+        fixed = np.flatnonzero(fixed) if fixed is not None else np.zeros(0, dtype=int)
+        new = self._copy()
+        new.fixed_values = self.diagonal()[fixed] if fixed.size else np.zeros(0)
+        new.P = P
+        new.fixed = fixed
+        return new
+
+    def rank_update(self, U, M):
+        new = LowRankHessian(self.values, U, M)
+        new.P, new.fixed, new.fixed_values = self.P, self.fixed, self.fixed_values
+        return new._densify_if_large()
+
+    def _copy(self):
+        new = DiagonalHessian(self.values)
+        new.P, new.fixed, new.fixed_values = self.P, self.fixed, self.fixed_values
+        return new
+
+    def to_dict(self):
+        # the projector is not stored. It is recomputed and applied at every step
+        return {
+            "form": self.form,
+            "values": self.values,
+            "fixed": self.fixed,
+            "fixed_values": self.fixed_values,
+        }
+
+
+class LowRankHessian(DiagonalHessian):
+    """Diagonal plus low rank Hessian ``diag(d) + U M U^T``. O(nk) storage.
+
+    Produced by quasi-Newton updates of a ``DiagonalHessian``. Once the factors would take as much
+    memory as the dense matrix (k >= n / 2), updates return a ``DenseHessian``.
+
+    Parameters
+    ----------
+    values : np.ndarray
+        (n, ) diagonal d
+    U : np.ndarray
+        (n, k)
+    M : np.ndarray
+        (k, k) symmetric
+    """
+
+    form = "low_rank"
+
+    def __init__(self, values, U, M):
+        super().__init__(values)
+        self.U = np.asarray(U, dtype=float).reshape(len(self.values), -1)
+        self.M = np.asarray(M, dtype=float).reshape(self.U.shape[1], self.U.shape[1])
+
+    @property
+    def rank(self):
+        return self.U.shape[1]
+
+    def matvec(self, v):
+        return super().matvec(v) + self.U @ (self.M @ (self.U.T @ v))
+
+    def diagonal(self):
+        return super().diagonal() + np.einsum("ik,kl,il->i", self.U, self.M, self.U)
+
+    def to_dense(self):
+        return super().to_dense() + self.U @ self.M @ self.U.T
+
+    def eig(self):
+        """Eigendecomposition within span(U) if the diagonal is uniform, otherwise dense"""
+        if self.projected or not np.all(self.values == self.values[0]) or self.rank >= self.dim:
+            return symm_mat_eig(self.to_dense())
+
+        # H = c + Q (R M R^T) Q^T. The complement of span(U) has eigenvalue c
+        Q, R = np.linalg.qr(self.U, mode="complete")
+        small_evals, small_evects = np.linalg.eigh(R[: self.rank] @ self.M @ R[: self.rank].T)
+        evals = np.concatenate((self.values[0] + small_evals, np.full(self.dim - self.rank, self.values[0])))
+        evects = np.hstack((Q[:, : self.rank] @ small_evects, Q[:, self.rank :])).T
+        order = np.argsort(evals, kind="stable")
+        return evals[order], evects[order]
+
+    def project(self, P=None, fixed=None):
+        new = super().project(P, fixed)
+        # fixed_values from super() already include the low rank part
+        U = P @ self.U if P is not None else self.U.copy()
+        U[new.fixed] = 0
+        return self._with_base(new, U, self.M)
+
+    def rank_update(self, U, M):
+        U = np.asarray(U, dtype=float).reshape(self.dim, -1)
+        M_new = np.zeros((self.rank + U.shape[1], self.rank + U.shape[1]))
+        M_new[: self.rank, : self.rank] = self.M
+        M_new[self.rank :, self.rank :] = M
+        return self._with_base(self, np.hstack((self.U, U)), M_new)._densify_if_large()
+
+    def _densify_if_large(self):
+        if 2 * self.rank >= self.dim:
+            logger.debug("\tLow rank Hessian has rank %d. Switching to dense storage", self.rank)
+            return DenseHessian(self.to_dense())
+        return self
+
+    def _copy(self):
+        return self._with_base(self, self.U, self.M)
+
+    @staticmethod
+    def _with_base(base, U, M):
+        new = LowRankHessian(base.values, U, M)
+        new.P, new.fixed, new.fixed_values = base.P, base.fixed, base.fixed_values
+        return new
+
+    def to_dict(self):
+        d = super().to_dict()
+        d.update({"U": self.U, "M": self.M})
+        return d
+
+
+class DenseHessian(HessianForm):
+    """Dense (n, n) Hessian
+
+    Parameters
+    ----------
+    H : np.ndarray
+    """
+
+    form = "dense"
+
+    def __init__(self, H):
+        self.H = np.asarray(H, dtype=float)
+
+    @property
+    def dim(self):
+        return self.H.shape[0]
+
+    def matvec(self, v):
+        return self.H @ v
+
+    def diagonal(self):
+        return np.diag(self.H).copy()
+
+    def to_dense(self):
+        return self.H
+
+    def project(self, P=None, fixed=None):
+        H = P @ self.H @ P if P is not None else self.H.copy()
+        if fixed is not None:
+            fixed = np.flatnonzero(fixed)
+            H[fixed, :] = 0
+            H[:, fixed] = 0
+            H[fixed, fixed] = np.diag(self.H)[fixed]
+        return DenseHessian(H)
+
+    def rank_update(self, U, M):
+        U = np.asarray(U, dtype=float).reshape(self.dim, -1)
+        return DenseHessian(self.H + U @ M @ U.T)
+
+    def to_dict(self):
+        return {"form": self.form, "H": self.H}
+
+
+def from_dict(d):
+    """Inverse of ``HessianForm.to_dict()``. A plain array (or None) is returned as is"""
+    if not isinstance(d, dict):
+        return d
+
+    form = d.get("form")
+    if form == "dense":
+        return DenseHessian(d["H"])
+
+    if form == "diagonal":
+        H = DiagonalHessian(d["values"])
+    elif form == "low_rank":
+        H = LowRankHessian(d["values"], d["U"], d["M"])
+    else:
+        raise OptError(f"Unknown Hessian form {form}")
+    H.fixed = np.asarray(d.get("fixed", []), dtype=int)
+    H.fixed_values = np.asarray(d.get("fixed_values", []), dtype=float)
+    return H
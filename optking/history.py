@@ -1,7 +1,7 @@
 """Specifies two classes to store data for an optimization: ``Step`` and ``History``."""
-import copy
 import logging
 import math
+from collections.abc import MutableSequence
 from typing import Union
 
 import numpy as np
@@ -9,36 +9,371 @@ import qcelemental as qcel
 
 from .exceptions import OptError
 from .bend import Bend
+from .hessianForms import HessianForm
 from .molsys import Molsys
-from .linearAlgebra import abs_max, rms, sign_of_double
-from .printTools import print_array_string, print_mat_string
-from . import log_name
+from .linearAlgebra import abs_max
+from .printTools import lazy_array_string, lazy_mat_string, print_array_string, print_mat_string
+from . import instrumentation, log_name
 from . import op
 
 logger = logging.getLogger(f"{log_name}{__name__}")
 
 
+class StepArrays(object):
+    """Preallocated, growable structure-of-arrays storage for per-step data.
+
+    Each array field is kept as one contiguous 2D array (steps x values); each row records its
+    own length so that arrays of different size (e.g. forces before and after the internal
+    coordinates are rebuilt) can be stored together. Scalar fields form a per-step metadata table.
+    Rows are accessed through lightweight views (``Step``, ``IRCpoint``) which read and write
+    directly into the arrays.
+
+    Parameters
+    ----------
+    arrays : dict
+        name of each array field: trailing shape (e.g. 3 for a geometry) or None for 1D data
+    scalars : dict
+        name of each scalar field: numpy dtype. Float fields store None as NaN.
+    capacity : int
+        number of rows to preallocate. Storage doubles when full.
+    """
+
+    def __init__(self, arrays, scalars, capacity=16):
+        self.array_fields = dict(arrays)
+        self.scalar_fields = dict(scalars)
+        self.size = 0
+        # lowest row modified since the last call to mark_clean(). Used for incremental writes
+        self.dirty_from = 0
+        self.capacity = max(int(capacity), 1)
+        self.arrays = {name: np.zeros((self.capacity, 0)) for name in self.array_fields}
+        # length of each stored array. -1 indicates None
+        self.lengths = {name: np.full(self.capacity, -1, dtype=int) for name in self.array_fields}
+        self.scalars = {
+            name: np.zeros(self.capacity, dtype=dtype) for name, dtype in self.scalar_fields.items()
+        }
+
+    def __len__(self):
+        return self.size
+
+    def nbytes(self):
+        """Memory currently allocated for the stored data (bytes)"""
+        total = sum(a.nbytes for a in self.arrays.values())
+        total += sum(a.nbytes for a in self.lengths.values())
+        total += sum(a.nbytes for a in self.scalars.values())
+        return total
+
+    def mark_clean(self):
+        self.dirty_from = self.size
+
+    def _touch(self, row):
+        self.dirty_from = min(self.dirty_from, row)
+
+    def reset(self):
+        """Remove all rows. Allocated memory is kept"""
+        self.size = 0
+        self.dirty_from = 0
+
+    def _grow_rows(self, needed):
+        if needed <= self.capacity:
+            return
+        capacity = self.capacity
+        while capacity < needed:
+            capacity *= 2
+        extra = capacity - self.capacity
+
+        for name, arr in self.arrays.items():
+            self.arrays[name] = np.concatenate((arr, np.zeros((extra, arr.shape[1]))))
+        for name, arr in self.lengths.items():
+            self.lengths[name] = np.concatenate((arr, np.full(extra, -1, dtype=int)))
+        for name, arr in self.scalars.items():
+            self.scalars[name] = np.concatenate((arr, np.zeros(extra, dtype=arr.dtype)))
+        self.capacity = capacity
+
+    def _grow_columns(self, name, width):
+        arr = self.arrays[name]
+        if width > arr.shape[1]:
+            self.arrays[name] = np.pad(arr, ((0, 0), (0, width - arr.shape[1])))
+
+    def new_row(self):
+        """Add an empty row. Returns its index"""
+        self._grow_rows(self.size + 1)
+        row = self.size
+        for arr in self.arrays.values():
+            arr[row] = 0.0
+        for arr in self.lengths.values():
+            arr[row] = -1
+        for name, arr in self.scalars.items():
+            arr[row] = np.nan if arr.dtype.kind == "f" else 0
+        self.size += 1
+        self._touch(row)
+        return row
+
+    def get_array(self, name, row):
+        """View of a stored array (None if not set)"""
+        length = self.lengths[name][row]
+        if length < 0:
+            return None
+        view = self.arrays[name][row, :length]
+        trailing = self.array_fields[name]
+        if trailing is not None:
+            view = view.reshape(-1, trailing)
+        return view
+
+    def set_array(self, name, row, value):
+        self._touch(row)
+        if value is None:
+            self.lengths[name][row] = -1
+            self.arrays[name][row] = 0.0
+            return
+        value = np.asarray(value, dtype=float).ravel()
+        self._grow_columns(name, value.size)
+        self.arrays[name][row, : value.size] = value
+        self.arrays[name][row, value.size :] = 0.0
+        self.lengths[name][row] = value.size
+
+    def get_scalar(self, name, row):
+        val = self.scalars[name][row]
+        if val.dtype.kind == "f":
+            return None if np.isnan(val) else float(val)
+        elif val.dtype.kind == "b":
+            return bool(val)
+        return int(val)
+
+    def set_scalar(self, name, row, value):
+        self._touch(row)
+        if value is None:
+            value = np.nan
+        self.scalars[name][row] = value
+
+    def assign_row(self, row, other, other_row):
+        """Overwrite a row with a copy of a row from another (compatible) storage"""
+        self._touch(row)
+        for name in self.array_fields:
+            self.set_array(name, row, other.get_array(name, other_row))
+        for name in self.scalar_fields:
+            self.scalars[name][row] = other.scalars[name][other_row]
+
+    def copy_row(self, other, other_row):
+        """Append a copy of a row from another (compatible) storage. Returns the new row index"""
+        row = self.new_row()
+        self.assign_row(row, other, other_row)
+        return row
+
+    def delete_row(self, row):
+        """Remove a row, shifting all later rows up by one"""
+        self._touch(row)
+        for arr in list(self.arrays.values()) + list(self.lengths.values()):
+            arr[row : self.size - 1] = arr[row + 1 : self.size]
+        for arr in self.scalars.values():
+            arr[row : self.size - 1] = arr[row + 1 : self.size]
+        self.size -= 1
+
+    def to_dict(self):
+        """Dump the used portion of the storage as a few arrays"""
+        d = {
+            "size": self.size,
+            "arrays": {},
+            "lengths": {},
+            "scalars": {},
+        }
+        for name, arr in self.arrays.items():
+            width = max(int(self.lengths[name][: self.size].max(initial=0)), 0)
+            d["arrays"][name] = arr[: self.size, :width].copy()
+            d["lengths"][name] = self.lengths[name][: self.size].copy()
+        for name, arr in self.scalars.items():
+            d["scalars"][name] = arr[: self.size].copy()
+        return d
+
+    @classmethod
+    def from_dict(cls, d, arrays, scalars):
+        size = d["size"]
+        storage = cls(arrays, scalars, capacity=max(size, 1))
+        storage.size = size
+        for name in storage.array_fields:
+            values = np.asarray(d["arrays"][name], dtype=float).reshape(size, -1 if size else 0)
+            storage._grow_columns(name, values.shape[1])
+            storage.arrays[name][:size, : values.shape[1]] = values
+            storage.lengths[name][:size] = np.asarray(d["lengths"][name], dtype=int)
+        for name in storage.scalar_fields:
+            vals = [np.nan if val is None else val for val in d["scalars"][name]]
+            storage.scalars[name][:size] = np.asarray(vals)
+        return storage
+
+
+class StoredArray(object):
+    """Descriptor exposing one array field of a ``StepArrays`` row"""
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        return obj._storage.get_array(self.name, obj._row)
+
+    def __set__(self, obj, value):
+        obj._storage.set_array(self.name, obj._row, value)
+
+
+class StoredScalar(StoredArray):
+    """Descriptor exposing one scalar field of a ``StepArrays`` row"""
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        return obj._storage.get_scalar(self.name, obj._row)
+
+    def __set__(self, obj, value):
+        obj._storage.set_scalar(self.name, obj._row, value)
+
+
+class StepList(MutableSequence):
+    """List of row views (``Step`` or ``IRCpoint``) sharing a single ``StepArrays``. The i-th
+    view always refers to the i-th row.
+
+    Adding a view that belongs to a different storage copies its data into this storage and
+    rebinds the view. Deleting a row shifts the later rows and updates their views.
+    """
+
+    def __init__(self, storage, items=()):
+        self.storage = storage
+        self._items = []
+        for item in items:
+            self.append(item)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __getitem__(self, index):
+        # slices return a plain list of views
+        return self._items[index]
+
+    def __setitem__(self, index, item):
+        if isinstance(index, slice):
+            raise TypeError("StepList does not support slice assignment")
+        old = self._items[index]
+        if item is old:
+            return
+        row = old._row
+        old._detach()
+        self.storage.assign_row(row, item._storage, item._row)
+        item._bind(self.storage, row)
+        self._items[row] = item
+
+    def __delitem__(self, index):
+        removed = self._items[index]
+        removed = removed if isinstance(removed, list) else [removed]
+        for item in sorted(removed, key=lambda x: x._row, reverse=True):
+            row = item._row
+            item._detach()
+            self.storage.delete_row(row)
+            del self._items[row]
+            for other in self._items[row:]:
+                other._row -= 1
+
+    def append(self, item):
+        if item._storage is self.storage:
+            if item._row == len(self._items) == self.storage.size - 1:
+                # view was created directly in the newest row of this storage
+                self._items.append(item)
+                return
+            raise ValueError("Cannot add a step to the same list twice")
+        row = self.storage.copy_row(item._storage, item._row)
+        item._bind(self.storage, row)
+        self._items.append(item)
+
+    def insert(self, index, item):
+        if index >= len(self._items):
+            self.append(item)
+            return
+        items = self._items[:]
+        items.insert(index, item)
+        self.clear()
+        for item in items:
+            self.append(item)
+
+    def clear(self):
+        for item in self._items:
+            item._detach()
+        self._items = []
+        self.storage.reset()
+
+
 class Step(object):
     """Stores basic data: geometry, forces, step information, etc... for a given step of an
-    Optimization"""
-    def __init__(self, geom, E, forces, cart_grad):
-        self.geom = geom.copy()  # Store as 2D object
+    Optimization. The arrays are views into a ``StepArrays``; a Step created outside of a
+    ``History`` owns a single row storage until appended to one."""
+
+    array_fields = {
+        "geom": 3,
+        "forces": None,
+        "cart_grad": None,
+        "Dq": None,
+        "followedUnitVector": None,
+    }
+    scalar_fields = {
+        "E": float,
+        "projectedDE": float,
+        "oneDgradient": float,
+        "oneDhessian": float,
+        "decent": bool,
+    }
+
+    geom = StoredArray()
+    forces = StoredArray()
+    cart_grad = StoredArray()
+    Dq = StoredArray()
+    followedUnitVector = StoredArray()
+    E = StoredScalar()
+    projectedDE = StoredScalar()
+    oneDgradient = StoredScalar()
+    oneDhessian = StoredScalar()
+    decent = StoredScalar()
+
+    def __init__(self, geom, E, forces, cart_grad, storage=None):
+        if storage is None:
+            storage = Step.new_storage(capacity=1)
+        self._bind(storage, storage.new_row())
+        self.geom = geom  # Store as 2D object
         self.E = E
-        self.forces = forces.copy()
-        self.cart_grad = cart_grad.copy()
+        self.forces = forces
+        self.cart_grad = cart_grad
         self.projectedDE = None
         self.Dq = np.array([])
         self.followedUnitVector = np.array([])
-        self.oneDgradient: Union[float, None] = None
-        self.oneDhessian: Union[float, None] = None
+        self.oneDgradient = None
+        self.oneDhessian = None
         self.hessian: Union[np.ndarray, None] = None
         self.decent = True
         self.crossed_180 = []
 
+    @classmethod
+    def view(cls, storage, row):
+        """Create a Step for an existing row of a storage"""
+        step = cls.__new__(cls)
+        step._bind(storage, row)
+        step.hessian = None
+        step.crossed_180 = []
+        return step
+
+    @staticmethod
+    def new_storage(capacity=16):
+        return StepArrays(Step.array_fields, Step.scalar_fields, capacity)
+
+    def _bind(self, storage, row):
+        self._storage = storage
+        self._row = row
+
+    def _detach(self):
+        """Move data into a private storage (called when the row is removed from a history)"""
+        storage = Step.new_storage(capacity=1)
+        row = storage.copy_row(self._storage, self._row)
+        self._bind(storage, row)
+
     def record(self, projectedDE, Dq, followedUnitVector, oneDgradient, oneDhessian):
         self.projectedDE = projectedDE
-        self.Dq = Dq.copy()
-        self.followedUnitVector = followedUnitVector.copy()
+        self.Dq = Dq
+        self.followedUnitVector = followedUnitVector
         self.oneDgradient = oneDgradient
         self.oneDhessian = oneDhessian
 
@@ -96,9 +431,11 @@ class Step(object):
 
 
 class History(object):
-    """A collection of ``Steps`` objects. Manages updating the hessian."""
-    def __init__(self, params=None):
-        self.steps = []
+    """A collection of ``Steps`` objects. Manages updating the hessian.
+
+    Step data is held in a single ``StepArrays``; ``steps`` is a list of views into it."""
+    def __init__(self, params=None, capacity=16):
+        self._steps = StepList(Step.new_storage(capacity))
         History.stepsSinceLastHessian = 0
 
         if params is None:
@@ -116,6 +453,22 @@ class History(object):
         self.hess_update_limit_max = params.hess_update_limit_max
         self.hess_update_limit_scale = params.hess_update_limit_scale
 
+    @property
+    def steps(self) -> StepList:
+        return self._steps
+
+    @steps.setter
+    def steps(self, steps):
+        """Replace all steps. The given steps are copied into the (reused) storage"""
+        steps = list(steps)
+        self._steps.clear()
+        for step in steps:
+            self._steps.append(step)
+
+    @property
+    def storage(self) -> StepArrays:
+        return self._steps.storage
+
     def __str__(self):
         s = "History of length %d\n" % len(self)
         for i, step in enumerate(self.steps):
@@ -146,7 +499,7 @@ class History(object):
         forces: np.ndarray
         cart_grad: np.ndarray
         """
-        s = Step(geom, E, forces, cart_grad)
+        s = Step(geom, E, forces, cart_grad, storage=self.storage)
         self.steps.append(s)
         self.steps_since_last_hessian += 1
 
@@ -154,14 +507,22 @@ class History(object):
     def append_record(self, projectedDE, Dq, followedUnitVector, oneDgradient, oneDhessian):
         self.steps[-1].record(projectedDE, Dq, followedUnitVector, oneDgradient, oneDhessian)
 
-    def to_dict(self):
-        initial = self.__dict__
+    def to_dict(self, include_steps=True):
         d = {
-            "steps_since_last_hessian": initial.pop("steps_since_last_hessian"),
-            "consecutive_backsteps": initial.pop("consecutive_backsteps"),
-            "steps": [s.to_dict() for s in initial.pop("steps")],
-            "options": initial,
-        }  # place everything else in options
+            "steps_since_last_hessian": self.steps_since_last_hessian,
+            "consecutive_backsteps": self.consecutive_backsteps,
+            "options": {
+                "hess_update": self.hess_update,
+                "hess_update_use_last": self.hess_update_use_last,
+                "hess_update_dq_tol": self.hess_update_dq_tol,
+                "hess_update_den_tol": self.hess_update_den_tol,
+                "hess_update_limit": self.hess_update_limit,
+                "hess_update_limit_max": self.hess_update_limit_max,
+                "hess_update_limit_scale": self.hess_update_limit_scale,
+            },
+        }
+        if include_steps:
+            d["step_arrays"] = self.storage.to_dict()
         return d
 
     @classmethod
@@ -171,7 +532,13 @@ class History(object):
 
         new_history.steps_since_last_hessian = d.get("steps_since_last_hessian", 0)
         new_history.consecutive_backsteps = d.get("consecutive_backsteps", 0)
-        new_history.steps = [Step.from_dict(s) for s in d.get("steps", [])]
+
+        if "step_arrays" in d:
+            storage = StepArrays.from_dict(d["step_arrays"], Step.array_fields, Step.scalar_fields)
+            new_history.steps = [Step.view(storage, row) for row in range(len(storage))]
+        else:
+            # list of Step dictionaries
+            new_history.steps = [Step.from_dict(s) for s in d.get("steps", [])]
 
         return new_history
 
@@ -187,23 +554,37 @@ class History(object):
         opt_summary = ""
         steps = []
 
+        # Columns of the step storage. Unused trailing elements of each row are zero.
+        storage = self.storage
+        nsteps = len(storage)
+        energies = storage.scalars["E"][:nsteps]
+        delta_energies = np.diff(energies, prepend=0.0)
+
+        def row_abs_max_and_rms(name):
+            values = storage.arrays[name][:nsteps]
+            lengths = storage.lengths[name][:nsteps]
+            with np.errstate(invalid="ignore", divide="ignore"):
+                row_max = np.abs(values).max(axis=1, initial=0.0)
+                row_rms = np.sqrt(np.einsum("ij,ij->i", values, values) / lengths)
+            return row_max, row_rms, lengths > 0
+
+        max_forces, rms_forces, have_forces = row_abs_max_and_rms("forces")
+        # For the summary Dq, we do not want to +2*pi for example for the angles,
+        # so we read old Dq used during step.
+        max_disps, rms_disps, _ = row_abs_max_and_rms("Dq")
+
         for i, step in enumerate(self.steps):
-            if i == 0:
-                DE = step.E
-            else:
-                DE = step.E - self.steps[i - 1].E
+            DE = float(delta_energies[i])
 
-            try:
-                max_force = abs_max(step.forces)
-                rms_force = rms(step.forces)
-            except ValueError:
+            if have_forces[i]:
+                max_force = float(max_forces[i])
+                rms_force = float(rms_forces[i])
+            else:
                 max_force = None
                 rms_force = None
 
-            # For the summary Dq, we do not want to +2*pi for example for the angles,
-            # so we read old Dq used during step.
-            max_disp = abs_max(step.Dq)
-            rms_disp = rms(step.Dq)
+            max_disp = float(max_disps[i])
+            rms_disp = float(rms_disps[i])
 
             steps.append(
                 {
@@ -262,12 +643,14 @@ class History(object):
         return
 
     # Use History to update Hessian
+    @instrumentation.timed("hessian_update")
     def hessian_update(self, H, f_q, molsys):
+        """Update H with the steps in history. An np.ndarray is updated in place. A
+        ``HessianForm`` is replaced (``DiagonalHessian`` -> ``LowRankHessian``)"""
         if self.hess_update == "NONE" or len(self.steps) < 1:
             return H
 
         logger.info("\tPerforming %s update." % self.hess_update)
-        Nintco = molsys.num_intcos  # working dimension
 
         q = molsys.q_array()
 
@@ -283,9 +666,13 @@ class History(object):
         # Check each one to see if it is too close (so stable denominators).
         use_steps = []
         i_step = len(self.steps) - 1  # just in case called with only 1 pt.
+        q_old = {}
         while i_step > -1 and len(use_steps) < num_to_use:
             step = self.steps[i_step]
-            dq, dg, dqdg, dqdq, max_change = self.get_update_info(molsys, f_q, q, step)
+            q_old[i_step] = self.q_at_geometry(molsys, step.geom)
+            dq, dg, dqdg, dqdq, max_change = self.get_update_info(
+                molsys, f_q, q, step, q_old[i_step]
+            )
 
             # If there is only one left, take it no matter what.
             if len(use_steps) == 0 and i_step == 0:
@@ -319,106 +706,101 @@ class History(object):
         # Don't update any modes if constraints are enacted.
         frozen = molsys.frozen_intco_list
         ranged = molsys.ranged_intco_list
-        constrained = frozen + ranged
-        C = np.diagflat(constrained)
+        constrained = np.flatnonzero(np.logical_or(frozen, ranged))
 
-        H_new = np.zeros(H.shape)
         for i_step in use_steps:
             step = self.steps[i_step]
-            dq, dg, dqdg, dqdq, max_change = self.get_update_info(molsys, f_q, q, step)
-
-            # See  J. M. Bofill, J. Comp. Chem., Vol. 15, pages 1-11 (1994)
-            #  and Helgaker, JCP 2002 for formula.
-            if self.hess_update == "BFGS":
-                for i in range(Nintco):
-                    for j in range(Nintco):
-                        H_new[i, j] = H[i, j] + dg[i] * dg[j] / dqdg
-
-                Hdq = np.dot(H, dq)
-                dqHdq = np.dot(dq, Hdq)
-
-                for i in range(Nintco):
-                    for j in range(Nintco):
-                        H_new[i, j] -= Hdq[i] * Hdq[j] / dqHdq
-
-            elif self.hess_update == "MS":
-                Z = -1.0 * np.dot(H, dq) + dg
-                qz = np.dot(dq, Z)
-
-                for i in range(Nintco):
-                    for j in range(Nintco):
-                        H_new[i, j] = H[i, j] + Z[i] * Z[j] / qz
-
-            elif self.hess_update == "POWELL":
-                Z = -1.0 * np.dot(H, dq) + dg
-                qz = np.dot(dq, Z)
-
-                for i in range(Nintco):
-                    for j in range(Nintco):
-                        H_new[i, j] = (
-                            H[i, j]
-                            - qz / (dqdq * dqdq) * dq[i] * dq[j]
-                            + (Z[i] * dq[j] + dq[i] * Z[j]) / dqdq
-                        )
-
-            elif self.hess_update == "BOFILL":
-                # Bofill = (1-phi) * MS + phi * Powell
-                Z = -1.0 * np.dot(H, dq) + dg
-                qz = np.dot(dq, Z)
-                zz = np.dot(Z, Z)
-
-                phi = 1.0 - qz * qz / (dqdq * zz)
-                if phi < 0.0:
-                    phi = 0.0
-                elif phi > 1.0:
-                    phi = 1.0
-
-                for i in range(Nintco):  # (1-phi)*MS
-                    for j in range(Nintco):
-                        H_new[i, j] = H[i, j] + (1.0 - phi) * Z[i] * Z[j] / qz
-
-                for i in range(Nintco):  # (phi * Powell)
-                    for j in range(Nintco):
-                        H_new[i, j] += phi * (
-                            -1.0 * qz / (dqdq * dqdq) * dq[i] * dq[j]
-                            + (Z[i] * dq[j] + dq[i] * Z[j]) / dqdq
-                        )
+            dq, dg, dqdg, dqdq, max_change = self.get_update_info(
+                molsys, f_q, q, step, q_old[i_step]
+            )
+            Hdq = H.matvec(dq) if isinstance(H, HessianForm) else np.dot(H, dq)
+            U, M = self.update_terms(Hdq, dq, dg, dqdg, dqdq)
 
             # If the cooordinate is constrained. Don't allow the update to occur.
-            for i in range(Nintco):
-                if C[i, i] == 1:
-                    H_new[i, :] = H_new[:, i] = np.zeros(len(f_q))
-                    H_new[i, i] = H[i, i]
+            U[constrained] = 0
+            if not isinstance(H, HessianForm):
+                # and remove its coupling to the other coordinates
+                diagonal = H[constrained, constrained]
+                H[constrained, :] = 0
+                H[:, constrained] = 0
+                H[constrained, constrained] = diagonal
+
+            if isinstance(H, HessianForm):
+                if self.hess_update_limit:
+                    # the elementwise limit below would need the dense matrix. Scale the whole
+                    # update so that no diagonal element changes by more than its limit instead
+                    change = np.abs(np.einsum("ik,kl,il->i", U, M, U))
+                    maximum = np.maximum(
+                        np.abs(self.hess_update_limit_scale * H.diagonal()), self.hess_update_limit_max
+                    )
+                    too_large = change > maximum
+                    if np.any(too_large):
+                        M = M * np.min(maximum[too_large] / change[too_large])
+                H = H.rank_update(U, M)
+                continue
 
+            H_new = U @ M @ U.T  # change in the Hessian
             if self.hess_update_limit:  # limit changes in H
                 # Changes to the Hessian from the update scheme are limited to the larger of
                 # (hess_update_limit_scale)*(the previous value) and hess_update_limit_max.
-                max_limit = self.hess_update_limit_max
-                scale_limit = self.hess_update_limit_scale
-
-                # Compute change in Hessian
-                H_new[:, :] = H_new - H
-
-                for i in range(Nintco):
-                    for j in range(Nintco):
-                        val = math.fabs(scale_limit * H[i, j])
-                        maximum = max(val, max_limit)
+                maximum = np.maximum(np.abs(self.hess_update_limit_scale * H), self.hess_update_limit_max)
+                H += np.clip(H_new, -maximum, maximum)
+            else:
+                H += H_new
+            # end loop over old geometries
 
-                        if math.fabs(H_new[i, j]) < maximum:
-                            H[i, j] += H_new[i, j]
-                        else:  # limit change to max
-                            H[i, j] += maximum * sign_of_double(H_new[i, j])
+        if isinstance(H, HessianForm):
+            logger.info("\tUpdated Hessian diagonal (in au) \n %s", lazy_array_string(H.diagonal()))
+        else:
+            logger.info("\tUpdated Hessian (in au) \n %s", lazy_mat_string(H))
+        return H
 
-            else:  # only copy H_new into H
-                H[:, :] = H_new
+    def update_terms(self, Hdq, dq, dg, dqdg, dqdq):
+        """Change in the Hessian from the update formula as U M U^T.
 
-            H_new[:, :] = 0  # zero for next step
-            # end loop over old geometries
+        See  J. M. Bofill, J. Comp. Chem., Vol. 15, pages 1-11 (1994)
+        and Helgaker, JCP 2002 for formula.
 
-        logger.info("\tUpdated Hessian (in au) \n %s" % print_mat_string(H))
-        return H
+        Returns
+        -------
+        U : np.ndarray
+            (num_intcos, k) with k = 1 (MS) or 2
+        M : np.ndarray
+            (k, k) symmetric
+        """
+        if self.hess_update == "BFGS":
+            U = np.column_stack((dg, Hdq))
+            M = np.diag([1 / dqdg, -1 / np.dot(dq, Hdq)])
+            return U, M
+
+        Z = -1.0 * Hdq + dg
+        qz = np.dot(dq, Z)
+
+        if self.hess_update == "MS":
+            return Z.reshape(-1, 1), np.array([[1 / qz]])
+
+        if self.hess_update == "POWELL":
+            phi = 1.0
+        elif self.hess_update == "BOFILL":
+            # Bofill = (1-phi) * MS + phi * Powell
+            phi = 1.0 - qz * qz / (dqdq * np.dot(Z, Z))
+            phi = min(max(phi, 0.0), 1.0)
+        else:
+            raise OptError(f"Unknown Hessian update {self.hess_update}")
+
+        # Powell: -qz / dqdq^2 dq dq^T + (Z dq^T + dq Z^T) / dqdq
+        U = np.column_stack((dq, Z))
+        M = np.array(
+            [
+                [-phi * qz / (dqdq * dqdq), phi / dqdq],
+                [phi / dqdq, (1.0 - phi) / qz if phi < 1.0 else 0.0],
+            ]
+        )
+        return U, M
 
-    def get_update_info(self, molsys: Molsys, f: np.ndarray, q: np.ndarray, step: Step):
+    def get_update_info(
+        self, molsys: Molsys, f: np.ndarray, q: np.ndarray, step: Step, q_old: np.ndarray = None
+    ):
         """Get gradient and displacement info for updating the Hessian
 
         Parameters
@@ -427,14 +809,14 @@ class History(object):
         f: np.ndarray
         q: np.ndarray
         step: Step
+        q_old: np.ndarray, optional
+            internal coordinate values at step's geometry. Computed if not provided
 
         """
         f_old = step.forces
-        x_old = step.geom
 
-        old_molsys = copy.deepcopy(molsys)
-        old_molsys.geom = x_old
-        q_old = old_molsys.q_array()
+        if q_old is None:
+            q_old = self.q_at_geometry(molsys, step.geom)
 
         dq = q - q_old
         dg = f_old - f  # gradients -- not forces!
@@ -443,6 +825,56 @@ class History(object):
         max_change = abs_max(dq)
         return dq, dg, dqdg, dqdq, max_change
 
+    def remap_internals(self, molsys: Molsys):
+        """Recompute the forces and steps of all Steps in the (new) internal coordinates of molsys,
+        so that the history survives a rebuild of the coordinates.
+
+        The forces are transformed from the stored Cartesian gradient at the geometry of each step
+        and constraints are projected out of them again. Steps (Dq and the followed unit vector)
+        become the change of the new coordinates to the next geometry; the last step leads to the
+        current geometry of molsys. A last step without a record (the step that failed) is removed,
+        its point is computed again. Indices of bends that crossed 180 degrees refer to the old
+        coordinates and are dropped. molsys's geometry is restored afterwards.
+        """
+        if self.steps and self.steps[-1].projectedDE is None:
+            del self.steps[-1]
+        if not self.steps:
+            return
+
+        # Fix the configuration of torsions, so that the differences of q are reasonable
+        molsys.update_dihedral_orientations()
+
+        saved_geom = molsys.geom.copy()
+        q_all = []
+        try:
+            for step in self.steps:
+                molsys.geom = step.geom
+                q_all.append(molsys.q_array())
+                f_q = molsys.gradient_to_internals(step.cart_grad, -1.0)
+                step.forces = molsys.projector(f_q) @ f_q
+        finally:
+            molsys.geom = saved_geom
+        q_all.append(molsys.q_array())
+
+        for step, q, q_next in zip(self.steps, q_all, q_all[1:]):
+            step.crossed_180 = []
+            step.Dq = q_next - q
+            if len(step.followedUnitVector):
+                norm = np.linalg.norm(step.Dq)
+                step.followedUnitVector = step.Dq / norm if norm > 0.0 else np.zeros_like(step.Dq)
+        self.consecutive_backsteps = 0
+
+    @staticmethod
+    def q_at_geometry(molsys: Molsys, geom: np.ndarray):
+        """Internal coordinate values of molsys at another geometry. The molsys geometry is
+        restored afterwards"""
+        saved_geom = molsys.geom.copy()
+        try:
+            molsys.geom = geom
+            return molsys.q_array()
+        finally:
+            molsys.geom = saved_geom
+
     def summary_string(self):
         output_string = """\n\t==> Optimization Summary <==\n
         \n\tMeasures of convergence in internal coordinates in au. (Any backward steps not shown.)
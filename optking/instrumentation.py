@@ -0,0 +1,202 @@
+"""Wall times and counters for the phases of each optimization step.
+
+Each ``OptimizationManager`` owns a ``StepTimings``. It is the active recorder only while the
+manager (or its OptHelper) computes or takes a step, so several optimizations can be alive in one
+process. The phases below are timed wherever they are called, so ``optimize``, the OptHelpers and
+IRCs are covered alike. Phases nest: the time of ``get_pes_info`` includes its ``compute``,
+``hessian_update`` and ``project_redundancies_and_constraints``.
+
+======================================  =========================================================
+get_pes_info                            ``optimize.get_pes_info``
+compute                                 ``ComputeWrapper.compute`` (the QC program or user values)
+project_redundancies_and_constraints    ``Molsys.project_redundancies_and_constraints``
+hessian_update                          ``History.hessian_update``
+step                                    ``OptimizationAlgorithm.step`` (and ``dq_irc``)
+displace_molsys                         ``displace.displace_molsys``
+make_internal_coords                    ``optimize.make_internal_coords``
+alg_error_handler                       ``OptimizationManager.alg_error_handler`` (coordinate and
+                                        Hessian rebuilds after an AlgError)
+======================================  =========================================================
+
+Each phase also counts its calls. Other counters are ``back_transformations`` and
+``back_transformation_iterations`` (``displace.back_transformation``), ``backsteps``, and
+``gradients``, ``energies`` and ``hessians`` (by the driver passed to ``compute``).
+
+A step is closed at the end of each ``OptimizationManager.take_step``. Its record is passed to
+every registered callback. Because phases nest, the sum of ``record["times"]`` counts nested time
+more than once. ``record["time"]`` is the time of the step spent in phases, with each outermost
+phase counted once
+
+>>> def send(record):
+...     metrics.gauge("optking.step_time", record["time"])
+>>> optking.instrumentation.register_callback(send)
+
+and all records, with totals, are returned in ``OptimizationResult.extras["timings"]``
+
+.. code-block:: python
+
+    {"steps": [{"step": 1, "time": 0.9, "times": {"compute": 0.8, ...}, "counts": {"gradients": 1, ...}}, ...],
+     "totals": {"time": 12.1, "times": {...}, "counts": {...}}}
+
+Times are in seconds.
+"""
+
+import functools
+import logging
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from . import log_name
+
+logger = logging.getLogger(f"{log_name}{__name__}")
+
+_active = None
+_callbacks = []
+
+
+class StepTimings(object):
+    """Accumulates the times and counts of the current step and keeps the record of every step"""
+
+    def __init__(self):
+        self.steps = []
+        self._time = 0.0
+        self._times = defaultdict(float)
+        self._counts = defaultdict(int)
+        # number of phases currently being timed
+        self._depth = 0
+
+    def add_time(self, phase, seconds, outermost=True):
+        """Add the time of one call of phase. Only the time of outermost phases adds to the step time"""
+        if outermost:
+            self._time += seconds
+        self._times[phase] += seconds
+        self._counts[phase] += 1
+
+    def count(self, name, n=1):
+        self._counts[name] += n
+
+    def end_step(self):
+        """Close the current step. Returns its record (None if nothing was recorded)"""
+        if not self._times and not self._counts:
+            return None
+
+        record = {
+            "step": len(self.steps) + 1,
+            "time": self._time,
+            "times": dict(self._times),
+            "counts": dict(self._counts),
+        }
+        self.steps.append(record)
+        self._time = 0.0
+        self._times.clear()
+        self._counts.clear()
+
+        for callback in list(_callbacks):
+            try:
+                callback(record)
+            except Exception as error:  # a metrics sink must never stop an optimization
+                logger.warning("Timing callback %s failed: %s", callback, error)
+        return record
+
+    def summary(self):
+        """Records of all steps and their totals. Closes the current step"""
+        self.end_step()
+        times, counts = defaultdict(float), defaultdict(int)
+        total = 0.0
+        for record in self.steps:
+            total += record.get("time", 0.0)
+            for phase, seconds in record["times"].items():
+                times[phase] += seconds
+            for name, n in record["counts"].items():
+                counts[name] += n
+        return {"steps": self.steps, "totals": {"time": total, "times": dict(times), "counts": dict(counts)}}
+
+    def to_dict(self):
+        return {"steps": self.steps}
+
+    @classmethod
+    def from_dict(cls, d):
+        timings = cls()
+        timings.steps = d.get("steps", [])
+        return timings
+
+
+def activate(timings):
+    """Record into timings (None to stop recording). Returns the previously active recorder"""
+    global _active
+    previous, _active = _active, timings
+    return previous
+
+
+def active():
+    return _active
+
+
+@contextmanager
+def recording(timings):
+    """Record into timings inside the block. The previously active recorder is restored after it"""
+    previous = activate(timings)
+    try:
+        yield timings
+    finally:
+        activate(previous)
+
+
+def recorded(method):
+    """Method decorator. Records into ``self.timings`` while the method runs"""
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with recording(self.timings):
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
+
+@contextmanager
+def timer(phase):
+    """Add the wall time of the block to phase of the active recorder"""
+    if _active is None:
+        yield
+        return
+
+    timings = _active
+    timings._depth += 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings._depth -= 1
+        timings.add_time(phase, time.perf_counter() - start, outermost=timings._depth == 0)
+
+
+def timed(phase):
+    """Decorator form of ``timer``"""
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timer(phase):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def count(name, n=1):
+    """Add n to the counter name of the active recorder"""
+    if _active is not None:
+        _active.count(name, n)
+
+
+def register_callback(callback):
+    """Call ``callback(record)`` at the end of every step. See the module docstring for record"""
+    if callback not in _callbacks:
+        _callbacks.append(callback)
+
+
+def unregister_callback(callback):
+    if callback in _callbacks:
+        _callbacks.remove(callback)
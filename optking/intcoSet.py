@@ -0,0 +1,140 @@
+"""Ordered, hash-indexed container for the simple internal coordinates of a fragment."""
+
+from collections.abc import MutableSequence
+
+import numpy as np
+
+from .simple import Simple
+
+# integer code for each type of simple coordinate in IntcoSet.types
+TYPE_CODES = {"Stre": 0, "HBond": 1, "Bend": 2, "Tors": 3, "Oofp": 4, "Cart": 5}
+
+
+class IntcoSet(MutableSequence):
+    """List of simple internal coordinates (``Stre``, ``Bend``, ``Tors`` ...) with a hash index.
+
+    The coordinates keep their order and are the usual ``Simple`` objects, so an IntcoSet can be
+    used wherever a list of coordinates was used. In addition, the set keeps
+
+    * a dictionary from each coordinate's ``key`` (type, canonical atom tuple and any defining
+      flag such as inverse or bend type) to its position, making ``in`` and ``index`` O(1)
+    * compact integer arrays of type codes and atom indices (padded with -1) for vectorized use
+
+    The defining attributes of a coordinate (atoms, inverse, bend_type, xyz) should not be changed
+    while it is held by an IntcoSet.
+
+    Parameters
+    ----------
+    intcos : Iterable[Simple], optional
+    """
+
+    __slots__ = ("_intcos", "_index", "_types", "_atoms")
+
+    def __init__(self, intcos=()):
+        self._intcos = []
+        self._index = {}
+        self._types = np.zeros(0, dtype=np.int8)
+        self._atoms = np.zeros((0, 4), dtype=np.int32)
+        Simple.revision += 1
+        self.extend(intcos)
+
+    def __repr__(self):
+        return f"IntcoSet({self._intcos!r})"
+
+    def __str__(self):
+        return "[" + ", ".join(str(intco) for intco in self._intcos) + "]"
+
+    def __len__(self):
+        return len(self._intcos)
+
+    def __getitem__(self, index):
+        # slices return a plain list
+        return self._intcos[index]
+
+    def __setitem__(self, index, value):
+        intcos = self._intcos[:]
+        intcos[index] = value
+        self._rebuild(intcos)
+
+    def __delitem__(self, index):
+        intcos = self._intcos[:]
+        del intcos[index]
+        self._rebuild(intcos)
+
+    def __eq__(self, other):
+        if isinstance(other, (IntcoSet, list, tuple)):
+            return self._intcos == list(other)
+        return NotImplemented
+
+    def __add__(self, other):
+        return self._intcos + list(other)
+
+    def __radd__(self, other):
+        return list(other) + self._intcos
+
+    def __contains__(self, intco):
+        if not isinstance(intco, Simple):
+            return False
+        return intco.key in self._index
+
+    def index(self, intco, start=0, stop=None):
+        """Position of intco. Raises ValueError if not present (like list.index)"""
+        if start == 0 and stop is None and isinstance(intco, Simple):
+            try:
+                return self._index[intco.key]
+            except KeyError:
+                raise ValueError(f"{intco} is not in IntcoSet") from None
+        return self._intcos.index(intco, start, len(self) if stop is None else stop)
+
+    def find(self, key):
+        """Position of the coordinate with the given key or -1"""
+        return self._index.get(key, -1)
+
+    def append(self, intco):
+        Simple.revision += 1
+        position = len(self._intcos)
+        self._intcos.append(intco)
+        self._index.setdefault(intco.key, position)
+
+        if position == self._types.shape[0]:
+            extra = max(position, 8)
+            self._types = np.concatenate((self._types, np.zeros(extra, dtype=np.int8)))
+            self._atoms = np.concatenate((self._atoms, np.zeros((extra, 4), dtype=np.int32)))
+        self._types[position], self._atoms[position] = self._encode(intco)
+
+    def insert(self, index, intco):
+        if index >= len(self._intcos):
+            self.append(intco)
+            return
+        intcos = self._intcos[:]
+        intcos.insert(index, intco)
+        self._rebuild(intcos)
+
+    def clear(self):
+        self._rebuild([])
+
+    @property
+    def types(self):
+        """(nintco, ) array of type codes (see TYPE_CODES)"""
+        return self._types[: len(self._intcos)]
+
+    @property
+    def atoms(self):
+        """(nintco, 4) array of atom indices. Unused columns are -1"""
+        return self._atoms[: len(self._intcos)]
+
+    @staticmethod
+    def _encode(intco):
+        atoms = np.full(4, -1, dtype=np.int32)
+        atoms[: len(intco.atoms)] = intco.atoms
+        return TYPE_CODES.get(type(intco).__name__, -1), atoms
+
+    def _rebuild(self, intcos):
+        intcos = list(intcos)
+        Simple.revision += 1
+        self._intcos = []
+        self._index = {}
+        self._types = np.zeros(0, dtype=np.int8)
+        self._atoms = np.zeros((0, 4), dtype=np.int32)
+        for intco in intcos:
+            self.append(intco)
@@ -5,7 +5,7 @@ import numpy as np
 from numpy.linalg import LinAlgError
 
 from .exceptions import OptError
-from .printTools import print_array_string
+from .printTools import lazy_array_string
 from . import log_name
 
 logger = logging.getLogger(f"{log_name}{__name__}")
@@ -139,7 +139,7 @@ def symm_mat_inv(A, redundant=False, threshold=1.0e-8, print_lvl=1) -> np.ndarra
                 if print_lvl > 1:
                     logger.debug(
                         "Eigenvalues for matrix to invert\n%s",
-                        print_array_string(evals, form=":10.2e")
+                        lazy_array_string(evals, form=":10.2e"),
                     )
             except LinAlgError:
                 raise OptError("symm_mat_inv: could not compute eigenvectors")
@@ -197,3 +197,78 @@ def symm_mat_root(A, inverse=None, threshold=1e-10) -> np.ndarray:
 
     root_matrix = np.diagflat(np.sqrt(evals))
     return evects @ root_matrix @ evects.T
+
+
+class Projector:
+    """Orthogonal projector ``P = W (I - R R^T) W^T`` applied as an operator.
+
+    W is an orthonormal (n, k) basis of the space projected onto and R an orthonormal (k, r) basis
+    of the directions within it that are removed, in the coordinates of W. ``P @ x`` and
+    ``x @ P`` cost O(nk) per vector and the (n, n) matrix is only formed by ``to_dense``.
+
+    Parameters
+    ----------
+    W : np.ndarray
+        (n, k) orthonormal columns
+    R : np.ndarray, optional
+        (k, r) orthonormal columns. Default none
+    """
+
+    # ndarray @ Projector calls __rmatmul__ instead of converting the projector
+    __array_ufunc__ = None
+
+    def __init__(self, W, R=None):
+        self.W = W
+        self.R = np.zeros((W.shape[1], 0)) if R is None else R
+
+    @classmethod
+    def onto_range(cls, B, threshold=1.0e-8):
+        """Projector onto the range of B, the space of G = B B^T with eigenvalues above threshold.
+        Only the smaller (ncol, ncol) B^T B is diagonalized"""
+        evals, evects = symm_mat_eig(B.T @ B)
+        # orthonormalize B v / |B v| again, it is inaccurate for small eigenvalues
+        W, _ = np.linalg.qr(B @ evects[evals > threshold].T)
+        return cls(W)
+
+    @property
+    def shape(self):
+        return self.W.shape[0], self.W.shape[0]
+
+    @property
+    def rank(self):
+        return self.W.shape[1] - self.R.shape[1]
+
+    @property
+    def T(self):
+        return self
+
+    def remove(self, rows, threshold=1.0e-8):
+        """Projector with the coordinates ``rows`` removed as well: ``P' - P'C (C P' C)^- C P'``
+        for the selector C of rows. Only the (len(rows), k) rows of W are decomposed"""
+        W_c = self._reduce(self.W[rows].T).T
+        _, s, Vt = np.linalg.svd(W_c, full_matrices=False)
+        R = np.hstack((self.R, Vt[s**2 > threshold].T))
+        return Projector(self.W, R)
+
+    def _reduce(self, y):
+        """(I - R R^T) y"""
+        return y - self.R @ (self.R.T @ y) if self.R.shape[1] else y
+
+    def __matmul__(self, x):
+        return self.W @ self._reduce(self.W.T @ x)
+
+    def __rmatmul__(self, x):
+        # P is symmetric
+        return (self @ np.asarray(x).T).T
+
+    def __getitem__(self, rows):
+        """Rows of P"""
+        return self._reduce(self.W[rows].T).T @ self.W.T
+
+    def to_dense(self):
+        WR = self.W @ self.R
+        return self.W @ self.W.T - WR @ WR.T
+
+    def __array__(self, dtype=None, copy=None):
+        P = self.to_dense()
+        return P if dtype is None else P.astype(dtype)
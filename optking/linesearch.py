@@ -9,7 +9,7 @@ from .displace import displace_molsys
 from .exceptions import AlgError, OptError
 from .history import Step, History
 from .stepAlgorithms import OptimizationInterface
-from . import log_name
+from . import instrumentation, log_name
 
 logger = logging.getLogger(f"{log_name}{__name__}")
 
@@ -121,7 +121,8 @@ class LineSearch(OptimizationInterface):
 
     def take_step(self, fq=None, H=None, energy=None, return_str=False, **kwargs):
         if self.linesearch_steps < 10:
-            dq, self.step_size = self.step(fq, energy, **kwargs)
+            with instrumentation.timer("step"):
+                dq, self.step_size = self.step(fq, energy, **kwargs)
             self.linesearch_steps += 1
         else:
             raise AlgError("Line search did not converge to a solution")
@@ -133,8 +134,8 @@ class LineSearch(OptimizationInterface):
             delta_energy = 0
 
         self.molsys.interfrag_dq_discontinuity_correction(dq)
-        achieved_dq, achieved_dx, return_str = displace_molsys(
-            self.molsys, dq, fq, return_str=True, print_lvl=self.print_lvl
+        achieved_dq, achieved_dx, *report = displace_molsys(
+            self.molsys, dq, fq, return_str=return_str, print_lvl=self.print_lvl
         )
         achieved_dq_norm = np.linalg.norm(achieved_dq)
         logger.info("\tNorm of achieved step-size %15.10f" % achieved_dq_norm)
@@ -147,7 +148,7 @@ class LineSearch(OptimizationInterface):
             raise OptError("Back transformation has failed spectacularly. Smaller step needed")
 
         if return_str:
-            return achieved_dq, return_str
+            return achieved_dq, report[0]
         return achieved_dq
 
     def reset(self):
@@ -1,46 +1,163 @@
 """
 A simple set of functions to compute LJ energies and gradients.
-"""
 
-from itertools import combinations
+Pairs are processed as arrays, a block of atoms at a time, so memory stays bounded for large
+systems. With a cutoff, candidate pairs come from a cell list and the cost grows linearly with the
+number of atoms.
+"""
 
 import numpy as np
 
+# maximum number of candidate pairs held in memory at once
+BLOCK_PAIRS = 2**20
 
-def calc_energy_and_gradient(positions, sigma, epsilon, do_gradient=True):
+
+def calc_energy_and_gradient(positions, sigma, epsilon, do_gradient=True, cutoff=None, do_hessian=False):
     r"""
     Computes the energy and gradient of a expression in the form
     V_{ij} = 4 \epsilon [ (sigma / r) ^ 12 - (sigma / r)^6]
+
+    Parameters
+    ----------
+    positions : np.ndarray
+        (natom, 3)
+    sigma, epsilon : float
+    do_gradient : bool, optional
+    cutoff : float, optional
+        Only pairs closer than cutoff interact. The pair potential is shifted by V(cutoff) so the
+        energy is continuous. Default is all pairs without a shift
+    do_hessian : bool, optional
+        Also return the (3 natom, 3 natom) Hessian. Implies do_gradient
+
+    Returns
+    -------
+    float or tuple
+        E, (E, gradient) or (E, gradient, hessian). gradient is (3 natom, )
     """
 
+    positions = np.asarray(positions, dtype=float).reshape(-1, 3)
     natom = positions.shape[0]
-    # Holds the energy and the energy gradient
-    E = 0.0
+    do_gradient = do_gradient or do_hessian
 
+    E = 0.0
     gradient = np.zeros((natom, 3))
+    hessian = np.zeros((3 * natom, 3 * natom)) if do_hessian else None
 
     sigma6 = sigma**6
     sigma12 = sigma6**2
+    shift = 0.0 if cutoff is None else sigma12 / cutoff**12 - sigma6 / cutoff**6
+    # pair terms of the Hessian are collected over chunks and added together
+    hessian_terms = []
 
-    # Double loop over all particles
-    for i, j in combinations(range(natom), 2):
+    for i, j in pairs(positions, cutoff):
         v_ij = positions[j] - positions[i]
-        r = np.linalg.norm(v_ij)
-        v_ij[:] = v_ij / r
-        r6 = np.power(r, 6)
-        r12 = np.power(r6, 2)
-        E += sigma12 / r12 - sigma6 / r6
+        r2 = np.einsum("ij,ij->i", v_ij, v_ij)
+        if cutoff is not None:
+            inside = r2 < cutoff * cutoff
+            i, j, v_ij, r2 = i[inside], j[inside], v_ij[inside], r2[inside]
+
+        r6 = r2 * r2 * r2
+        r12 = r6 * r6
+        E += np.sum(sigma12 / r12 - sigma6 / r6) - shift * len(r2)
 
         if do_gradient:
-            dVdr = -12 * sigma12 / (r12 * r) + 6 * sigma6 / (r6 * r)
+            # dV/dr / r multiplies the vector from i to j
+            dVdr_r = (-12 * sigma12 / r12 + 6 * sigma6 / r6) / r2
+            f_ij = dVdr_r[:, None] * v_ij
             for xyz in range(3):
-                gradient[i, xyz] -= dVdr * v_ij[xyz]
-                gradient[j, xyz] += dVdr * v_ij[xyz]
+                gradient[:, xyz] += np.bincount(j, f_ij[:, xyz], natom) - np.bincount(i, f_ij[:, xyz], natom)
+
+        if do_hessian:
+            d2Vdr2 = (156 * sigma12 / r12 - 42 * sigma6 / r6) / r2
+            hessian_terms.append((i, j, v_ij / np.sqrt(r2)[:, None], d2Vdr2, dVdr_r))
+            if sum(len(term[0]) for term in hessian_terms) >= BLOCK_PAIRS // 4:
+                _add_pair_hessian(hessian, hessian_terms)
+                hessian_terms = []
+
+    if hessian_terms:
+        _add_pair_hessian(hessian, hessian_terms)
 
     E *= 4.0 * epsilon
 
-    if do_gradient:
-        gradient = 4.0 * epsilon * gradient.reshape(3 * natom)
-        return E, gradient
-    else:
+    if not do_gradient:
         return E
+
+    gradient = 4.0 * epsilon * gradient.reshape(3 * natom)
+    if do_hessian:
+        return E, gradient, 4.0 * epsilon * hessian
+    return E, gradient
+
+
+def pairs(positions, cutoff=None, block_pairs=None):
+    """Generate the atom pairs (i < j) as chunks of index arrays.
+
+    Without a cutoff all pairs are generated, a block of rows at a time. With a cutoff, atoms are
+    binned into cubic cells with sides of at least cutoff, and only pairs in the same or adjacent
+    cells are generated. Their distance may still exceed cutoff.
+
+    Yields
+    ------
+    tuple(np.ndarray, np.ndarray)
+    """
+    natom = len(positions)
+    block_pairs = BLOCK_PAIRS if block_pairs is None else block_pairs
+    if cutoff is None:
+        rows_per_block = max(1, block_pairs // max(natom, 1))
+        for start in range(0, natom, rows_per_block):
+            rows = np.arange(start, min(start + rows_per_block, natom))
+            i, j = np.nonzero(np.arange(natom)[None, :] > rows[:, None])
+            yield rows[i], j
+        return
+
+    cells = np.floor((positions - positions.min(axis=0)) / cutoff).astype(int)
+    shape = cells.max(axis=0) + 1
+    cell_id = np.ravel_multi_index(cells.T, shape)
+
+    order = np.argsort(cell_id, kind="stable")
+    counts = np.bincount(cell_id, minlength=np.prod(shape))
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+
+    offsets = np.array([[a, b, c] for a in (-1, 0, 1) for b in (-1, 0, 1) for c in (-1, 0, 1)])
+    # each pair of distinct cells once (13 half-shell offsets) and each cell with itself
+    half_shell = [offset for offset in offsets if tuple(offset) > (0, 0, 0)]
+
+    atoms_per_block = max(1, block_pairs // max(27 * int(counts.max()), 1))
+    for start in range(0, natom, atoms_per_block):
+        atoms = np.arange(start, min(start + atoms_per_block, natom))
+
+        # same cell: partners later in the sorted order of that cell
+        i, j = _cell_partners(atoms, cells[atoms], order, counts, starts, shape)
+        keep = i < j
+        yield i[keep], j[keep]
+
+        for offset in half_shell:
+            i, j = _cell_partners(atoms, cells[atoms] + offset, order, counts, starts, shape)
+            yield np.minimum(i, j), np.maximum(i, j)
+
+
+def _cell_partners(atoms, neighbor_cells, order, counts, starts, shape):
+    """All (atom, partner) pairs with the partner in the given cell of each atom"""
+    valid = np.all((neighbor_cells >= 0) & (neighbor_cells < shape), axis=1)
+    atoms, neighbor_cells = atoms[valid], neighbor_cells[valid]
+    cell = np.ravel_multi_index(neighbor_cells.T, shape)
+
+    n = counts[cell]
+    i = np.repeat(atoms, n)
+    # position of each partner within its cell
+    within = np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n)
+    j = order[np.repeat(starts[cell], n) + within]
+    return i, j
+
+
+def _add_pair_hessian(hessian, terms):
+    """Add the 3x3 blocks of each pair potential in place. terms are tuples of
+    (i, j, u, d2Vdr2, dVdr_r) for chunks of pairs. u are the unit vectors from i to j"""
+    i, j, u, d2Vdr2, dVdr_r = (np.concatenate(arrays) for arrays in zip(*terms))
+    ncart = hessian.shape[0]
+    blocks = (d2Vdr2 - dVdr_r)[:, None, None] * u[:, :, None] * u[:, None, :]
+    blocks += dVdr_r[:, None, None] * np.eye(3)
+    xyz = np.arange(3)
+    # (i, i), (j, j), (i, j) and (j, i) blocks
+    a, b = np.concatenate((i, j, i, j)), np.concatenate((i, j, j, i))
+    index = (3 * a[:, None, None] + xyz[None, :, None]) * ncart + 3 * b[:, None, None] + xyz[None, None, :]
+    np.add.at(hessian.reshape(-1), index.ravel(), np.concatenate((blocks, blocks, -blocks, -blocks)).ravel())
@@ -1,5 +1,46 @@
-import os
+"""Logging setup for optking.
+
+Importing optking configures nothing. Only a ``NullHandler`` is attached to the ``optking``
+logger. Unless a destination has been chosen, the first optimization sends INFO and above to
+``opt_log.out`` in the working directory, as before. The file is opened when the first record is
+written. ``OPTKING_LOG`` selects a different default destination, e.g. ``OPTKING_LOG=null`` for
+worker processes.
+
+A destination for the whole process
+
+>>> optking.loggingconfig.configure_logging("rotating", filename="optking.log", max_bytes=10**7)
+
+or for a single optimization
+
+>>> with optking.loggingconfig.log_to("memory") as handler:
+...     result = optking.optimize_qcengine(opt_input)
+>>> text = handler.stream.getvalue()
+
+===========  ===================================================================================
+file         ``logging.FileHandler`` (``filename``, default ``opt_log.out``, truncated)
+rotating     ``logging.handlers.RotatingFileHandler`` with ``max_bytes`` and ``backup_count``
+memory       ``logging.StreamHandler`` writing to an ``io.StringIO`` (``handler.stream``)
+stream       ``logging.StreamHandler`` writing to stderr
+null         ``logging.NullHandler``
+===========  ===================================================================================
+
+Configuring the ``optking`` logger with the ``logging`` module (or ``logging_configuration``
+below, through ``logging.config.dictConfig``) works too and disables the default.
+"""
+
+import io
 import logging
+import logging.handlers
+import os
+from contextlib import contextmanager
+
+DEFAULT_LOG_FILE = "opt_log.out"
+DEFAULT_MAX_BYTES = 50 * 2**20
+DESTINATIONS = ("file", "rotating", "memory", "stream", "null")
+
+# handler installed by configure_logging and the number of open log_to blocks
+_handler = None
+_scopes = 0
 
 logging_configuration = {
     "version": 1,
@@ -30,6 +71,7 @@ logging_configuration = {
         "file_log_debug": {
             "class": "logging.FileHandler",
             "mode": "w",
+            "delay": True,
             "formatter": "severity_message",
             "level": "DEBUG",
             "filename": os.path.join(os.getcwd(), "opt_log.out"),
@@ -37,6 +79,7 @@ logging_configuration = {
         "file_log_info": {
             "class": "logging.FileHandler",
             "mode": "w",
+            "delay": True,
             "formatter": "severity_message",
             "level": "INFO",
             "filename": os.path.join(os.getcwd(), "opt_log.out"),
@@ -45,6 +88,7 @@ logging_configuration = {
             "class": "logging.FileHandler",
             "formatter": "message_format",
             "mode": "w",
+            "delay": True,
             "level": "INFO",
             "filename": os.path.join(os.getcwd(), "opt_log.out"),
         },
@@ -58,3 +102,112 @@ logging_configuration = {
     #     "handlers": [logging.handlers.]
     # },
 }
+
+
+def make_handler(destination="file", filename=None, level="INFO", mode="w", max_bytes=None, backup_count=1):
+    """Create a handler for one of ``DESTINATIONS``. File handlers open their file on the first
+    record
+
+    Parameters
+    ----------
+    destination : str
+    filename : str, optional
+        for file and rotating. Default is ``opt_log.out`` in the working directory
+    level : str or int
+    mode : str
+        file mode of the file destination. rotating always appends
+    max_bytes : int, optional
+        size at which a rotating log is rolled over. Default ``DEFAULT_MAX_BYTES``
+    backup_count : int
+        number of rolled over rotating logs to keep
+
+    Returns
+    -------
+    logging.Handler
+    """
+
+    destination = destination.lower()
+    filename = filename or os.path.join(os.getcwd(), DEFAULT_LOG_FILE)
+
+    if destination == "file":
+        handler = logging.FileHandler(filename, mode=mode, delay=True)
+    elif destination == "rotating":
+        max_bytes = DEFAULT_MAX_BYTES if max_bytes is None else max_bytes
+        handler = logging.handlers.RotatingFileHandler(
+            filename, maxBytes=max_bytes, backupCount=backup_count, delay=True
+        )
+    elif destination == "memory":
+        handler = logging.StreamHandler(io.StringIO())
+    elif destination == "stream":
+        handler = logging.StreamHandler()
+    elif destination == "null":
+        return logging.NullHandler()
+    else:
+        raise ValueError(f"Unknown log destination {destination}. Choose from {DESTINATIONS}")
+
+    formatter = logging_configuration["formatters"]["severity_message"]
+    handler.setFormatter(logging.Formatter(formatter["format"], style=formatter["style"]))
+    handler.setLevel(level)
+    return handler
+
+
+def configure_logging(destination="file", level="INFO", **kwargs):
+    """Send optking's log to destination for the rest of the process. Replaces the handler of a
+    previous call. See ``make_handler`` for kwargs
+
+    Returns
+    -------
+    logging.Handler
+    """
+    global _handler
+
+    logger = logging.getLogger("optking")
+    if _handler is not None:
+        logger.removeHandler(_handler)
+        _handler.close()
+
+    _handler = make_handler(destination, level=level, **kwargs)
+    logger.addHandler(_handler)
+    logger.setLevel(level)
+    return _handler
+
+
+@contextmanager
+def log_to(destination="file", level="INFO", **kwargs):
+    """Send optking's log to destination (only) within the block. Yields the handler"""
+    global _scopes
+
+    logger = logging.getLogger("optking")
+    handler = make_handler(destination, level=level, **kwargs)
+    previous_handlers, previous_level = logger.handlers[:], logger.level
+
+    for other in previous_handlers:
+        logger.removeHandler(other)
+    logger.addHandler(handler)
+    logger.setLevel(level)
+    _scopes += 1
+    try:
+        yield handler
+    finally:
+        _scopes -= 1
+        logger.removeHandler(handler)
+        handler.close()  # a StreamHandler leaves its stream open, so a memory log stays readable
+        for other in previous_handlers:
+            logger.addHandler(other)
+        logger.setLevel(previous_level)
+
+
+def is_configured():
+    """Whether any handler other than a NullHandler is attached to the optking logger"""
+    logger = logging.getLogger("optking")
+    return any(not isinstance(handler, logging.NullHandler) for handler in logger.handlers)
+
+
+def ensure_configured():
+    """Apply the default destination (``OPTKING_LOG`` or file) if logging has not been configured.
+    Called at the start of each optimization. Psi4 configures its own logging"""
+    from . import log_name
+
+    if log_name or _scopes or _handler is not None or is_configured():
+        return
+    configure_logging(os.environ.get("OPTKING_LOG", "file"))
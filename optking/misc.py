@@ -5,6 +5,7 @@ import os
 import numpy as np
 import qcelemental as qcel
 
+from . import symmetry
 from .exceptions import OptError
 from . import log_name
 
@@ -27,16 +28,22 @@ def delta(i, j):
         return 0
 
 
-def is_dq_symmetric(oMolsys, Dq):
-    # TODO add symmetry check
-    logger.debug("\tTODO add is_dq_symmetric\n")
-    return True
+def is_dq_symmetric(oMolsys, Dq, tol=symmetry.STEP_SYMMETRY_TOL):
+    """Whether the internal coordinate step Dq is totally symmetric in the point group of oMolsys.
+    Always True without a point group"""
+    basis = oMolsys.symmetric_intco_basis()
+    if basis is None:
+        return True
+    Dq = np.asarray(Dq)
+    asymmetric = Dq - basis @ (basis.T @ Dq)
+    return np.linalg.norm(asymmetric) <= tol * max(np.linalg.norm(Dq), 1.0e-10)
 
 
-def symmetrize_xyz(XYZ):
-    # TODO add symmetrize function
-    logger.debug("\tTODO add symmetrize XYZ\n")
-    return XYZ
+def symmetrize_xyz(XYZ, point_group=None):
+    """Symmetrize the geometry in the point_group (symmetry.PointGroup). Unchanged without one"""
+    if point_group is None:
+        return XYZ
+    return point_group.symmetrize(XYZ)
 
 
 # "Average" bond length given two periods
@@ -1,19 +1,22 @@
 import logging
-from itertools import combinations, permutations
+from itertools import combinations
 from typing import List, Tuple
 
 import numpy as np
 import qcelemental as qcel
 
-from . import dimerfrag, v3d
+from . import dimerfrag, graph, symmetry, v3d
 from .frag import Frag
-from .addIntcos import add_cartesian_intcos, connectivity_from_distances
+from .addIntcos import add_cartesian_intcos
+from .cart import Cart
 from .exceptions import OptError
-from .linearAlgebra import symm_mat_inv
-from .printTools import print_array_string, print_mat_string
-from . import log_name
+from .hessianForms import HessianForm
+from .linearAlgebra import Projector, symm_mat_eig, symm_mat_inv
+from .printTools import lazy_array_string, lazy_mat_string, print_mat_string
+from . import instrumentation, log_name
 from . import op
 from .oofp import Oofp
+from .simple import Simple
 
 logger = logging.getLogger(f"{log_name}{__name__}")
 
@@ -39,6 +42,26 @@ class Molsys(object):
         else:
             self._dimer_intcos = []
 
+        # geometry, masses and Z of all atoms. Each fragment holds views into these arrays
+        self._geom = None
+        self._masses = None
+        self._Z = None
+        self._frag_views = ()
+        self._build_buffers()
+        # (key, offsets and coordinate flags). See _layout
+        self._layout_cache = None
+
+        # symmetry.PointGroup (see detect_symmetry) and the cached symmetric internal basis
+        self._point_group = None
+        self._symmetric_basis = None
+        # (geometry, basis) of the delocalized internal coordinates. See delocalize
+        self._delocalized = None
+        # leave frozen atoms out of steps. See active_subspace
+        self._active_subspace = False
+        self._active_basis = None
+        # (key, linearAlgebra.Projector) of the last projection. See projector
+        self._projector = None
+
         # fixed body fragments defined by Euler/rotation angles
         # self._fb_fragments = []
         # if fb_fragments:
@@ -207,13 +230,84 @@ class Molsys(object):
     #        coords.append(d_coord)
     #    return coords
 
+    def _layout(self):
+        """Prefix sums of the atoms and internal coordinates of the fragments and dimers, and the
+        frozen and ranged flags of all coordinates. The labels are added by ``intco_lbls``.
+
+        Cached until fragments or dimers are added, removed or replaced, a coordinate list is
+        modified or a constraint changes (see ``Simple.revision``). The arrays are read-only.
+        """
+        key = (Simple.revision, tuple(map(id, self._fragments)), tuple(map(id, self._dimer_intcos)))
+        if self._layout_cache is not None and self._layout_cache[0] == key:
+            return self._layout_cache[1]
+
+        all_fragments = self.all_fragments
+        intcos = [coord for F in all_fragments for coord in F.intcos]
+        layout = {
+            "atom_offsets": np.cumsum([0] + [F.natom for F in self._fragments]),
+            "intco_offsets": np.cumsum([0] + [F.num_intcos for F in all_fragments]),
+            "frozen": np.array([coord.frozen for coord in intcos], dtype=bool),
+            "ranged": np.array([coord.ranged for coord in intcos], dtype=bool),
+        }
+        layout["frozen_atoms"] = self._frozen_atoms(layout["atom_offsets"])
+        layout["active_intcos"] = self._active_intcos(layout["frozen_atoms"], layout["atom_offsets"])
+        for array in layout.values():
+            array.flags.writeable = False
+
+        self._layout_cache = (key, layout)
+        return layout
+
+    def _frozen_atoms(self, atom_offsets):
+        """Atoms of frozen fragments and atoms with frozen x, y and z Cartesian coordinates"""
+        frozen = np.zeros(atom_offsets[-1], dtype=bool)
+        for iF, F in enumerate(self._fragments):
+            atoms = slice(atom_offsets[iF], atom_offsets[iF + 1])
+            if F.frozen:
+                frozen[atoms] = True
+                continue
+            frozen_xyz = np.zeros((F.natom, 3), dtype=bool)
+            for coord in F.intcos:
+                if isinstance(coord, Cart) and coord.frozen:
+                    frozen_xyz[coord.atoms[0], coord.xyz] = True
+            frozen[atoms] = frozen_xyz.all(axis=1)
+        return frozen
+
+    def _active_intcos(self, frozen_atoms, atom_offsets):
+        """Coordinates that involve at least one atom that is not frozen"""
+        active = np.ones(sum(F.num_intcos for F in self.all_fragments), dtype=bool)
+        if not frozen_atoms.any():
+            return active
+
+        start = 0
+        for iF, F in enumerate(self._fragments):
+            # the atoms of the coordinates are padded with -1, which picks the appended False
+            moving = np.append(~frozen_atoms[atom_offsets[iF] : atom_offsets[iF + 1]], False)
+            active[start : start + F.num_intcos] = moving[F.intcos.atoms].any(axis=1)
+            start += F.num_intcos
+        for DI in self._dimer_intcos:
+            moving = [~frozen_atoms[atom_offsets[f] : atom_offsets[f + 1]].all() for f in (DI.A_idx, DI.B_idx)]
+            active[start : start + DI.num_intcos] = any(moving)
+            start += DI.num_intcos
+        return active
+
     @property
     def intco_lbls(self):
-        lbls = [str(coord) for f in self._fragments for coord in f.intcos]
-        for DI in self.dimer_intcos:
-            for coord in DI.pseudo_frag.intcos:
-                lbls.append("Dimer({:d},{:d})".format(DI.A_idx + 1, DI.B_idx + 1) + str(coord))
-        return lbls
+        layout = self._layout()
+        if "intco_lbls" not in layout:
+            lbls = [str(coord) for F in self._fragments for coord in F.intcos]
+            for DI in self._dimer_intcos:
+                for coord in DI.pseudo_frag.intcos:
+                    lbls.append("Dimer({:d},{:d})".format(DI.A_idx + 1, DI.B_idx + 1) + str(coord))
+            layout["intco_lbls"] = tuple(lbls)
+        return list(layout["intco_lbls"])
+
+    @property
+    def dimer_batch(self):
+        """DimerBatch evaluating the coordinates of all dimers together. Cached with the layout"""
+        layout = self._layout()
+        if "dimer_batch" not in layout:
+            layout["dimer_batch"] = dimerfrag.DimerBatch(self._dimer_intcos, layout["atom_offsets"])
+        return layout["dimer_batch"]
 
     def frag_1st_atom(self, iF) -> int:
         """Return overall index of first atom in fragment ``iF``, beginning 0,1,...
@@ -221,10 +315,7 @@ class Molsys(object):
 
         if iF > len(self._fragments):
             raise ValueError()
-        start = 0
-        for i in range(0, iF):
-            start += self._fragments[i].natom
-        return start
+        return int(self._layout()["atom_offsets"][iF])
 
     def frag_atom_range(self, iF):
         """Gets range for first and last atom indices for a given fragment"""
@@ -240,10 +331,10 @@ class Molsys(object):
     def atom2frag_index(self, atom_index):
         """For a given atom in the overall molecular system return index of the fragment containing
         that atom"""
-        for iF in range(self.nfragments):
-            if atom_index in self.frag_atom_range(iF):
-                return iF
-        raise OptError("atom2frag_index: atom_index impossibly large")
+        offsets = self._layout()["atom_offsets"]
+        if not 0 <= atom_index < offsets[-1]:
+            raise OptError("atom2frag_index: atom_index impossibly large")
+        return int(np.searchsorted(offsets, atom_index, side="right")) - 1
 
     def atom_list2unique_frag_list(self, atomList):
         """Given a list of atoms, return all the fragments to which they belong"""
@@ -254,43 +345,64 @@ class Molsys(object):
                 fragList.append(f)
         return fragList
 
+    def _build_buffers(self):
+        """Copy the atomic data of the fragments into contiguous arrays and make the fragments
+        hold views into them"""
+        natoms = self.frag_natoms
+        natom = sum(natoms)
+        self._geom = np.zeros((natom, 3))
+        self._masses = np.zeros(natom)
+        self._Z = np.zeros(natom, dtype=int)
+
+        views = []
+        start = 0
+        for F, n in zip(self._fragments, natoms):
+            atoms = slice(start, start + n)
+            self._geom[atoms] = np.reshape(F.geom, (n, 3))
+            self._masses[atoms] = F.masses
+            self._Z[atoms] = F.Z
+            F._share(self._Z[atoms], self._geom[atoms], self._masses[atoms])
+            views.append((F._Z, F._geom, F._masses))
+            start += n
+        self._frag_views = tuple(views)
+
+    def _check_buffers(self):
+        """Rebuild the arrays if fragments were added, removed or replaced, a fragment's arrays
+        were reassigned, or the views were detached by copying"""
+        if len(self._frag_views) != len(self._fragments) or any(
+            F._Z is not Z or F._geom is not geom or F._masses is not masses or geom.base is not self._geom
+            for F, (Z, geom, masses) in zip(self._fragments, self._frag_views)
+        ):
+            self._build_buffers()
+
     @property
     def geom(self):
-        """cartesian geometry [a0]"""
-        geom = np.zeros((self.natom, 3))
-        for iF, F in enumerate(self._fragments):
-            row = self.frag_1st_atom(iF)
-            geom[row : (row + F.natom), :] = F.geom
-        return geom
+        """cartesian geometry [a0]. The array is shared with the fragments: modifying it in
+        place moves the atoms. Copy it to keep a snapshot"""
+        self._check_buffers()
+        return self._geom
 
     @geom.setter
     def geom(self, newgeom):
         """setter for geometry"""
-        for iF, F in enumerate(self._fragments):
-            row = self.frag_1st_atom(iF)
-            F.geom[:] = newgeom[row : (row + F.natom), :]
+        self._check_buffers()
+        self._geom[:] = np.reshape(newgeom, self._geom.shape)
 
     def frag_geom(self, iF):
-        """cartesian geometry for fragment i"""
+        """cartesian geometry for fragment i (a view into :py:attr:`geom`)"""
         return self._fragments[iF].geom
-        # return copy instead?
-        # using in displace_molsys
 
     @property
     def masses(self):
         """array of masses for all atoms"""
-        m = np.zeros(self.natom)
-        for iF, F in enumerate(self._fragments):
-            m[self.frag_atom_slice(iF)] = F.masses
-        return m
+        self._check_buffers()
+        return self._masses
 
     @property
     def Z(self):
-        z = [0 for i in range(self.natom)]
-        for iF, F in enumerate(self._fragments):
-            first = self.frag_1st_atom(iF)
-            z[first : (first + F.natom)] = F.Z
-        return z
+        """array of atomic numbers for all atoms"""
+        self._check_buffers()
+        return self._Z
 
     # Needed?  may make more sense to loop over fragments
     # @property
@@ -304,16 +416,13 @@ class Molsys(object):
     def num_intcos(self) -> int:
         """Computes total number of internal coordinates (either true internals or number of cartesians)
         depending on ``opt_coordinates``"""
-
-        nintco_list = [f.num_intcos for f in self.all_fragments]
-        return sum(nintco_list)
+        return int(self._layout()["intco_offsets"][-1])
 
     @property
     def num_intrafrag_intcos(self):
         """Computes number of internal coordinates but does not include coordinates in pseudo
         fragments"""
-        nintco_list = [f.num_intcos for f in self.fragments]
-        return sum(nintco_list)
+        return int(self._layout()["intco_offsets"][len(self._fragments)])
 
     @property
     def intcos_present(self):
@@ -325,86 +434,95 @@ class Molsys(object):
 
     @property
     def frozen_intco_list(self):
-        """Determine vector with 1 for any frozen internal coordinate"""
-        frozen = np.zeros(self.num_intcos, dtype=bool)
-        cnt = 0
-
-        for f in self.all_fragments:
-            for intco in f.intcos:
-                if intco.frozen:
-                    frozen[cnt] = True
-                cnt += 1
-        return frozen
+        """Read-only boolean vector, True for any frozen internal coordinate"""
+        return self._layout()["frozen"]
 
     @property
     def ranged_intco_list(self):
-        ranged = np.zeros(self.num_intcos, dtype=bool)
-        cnt = 0
+        """Read-only boolean vector, True for any ranged internal coordinate"""
+        return self._layout()["ranged"]
 
-        for f in self.all_fragments:
-            for intco in f.intcos:
-                if intco.ranged:
-                    ranged[cnt] = True
-                cnt += 1
-        return ranged
+    @property
+    def frozen_atom_list(self):
+        """Read-only boolean vector, True for atoms that cannot move: the atoms of frozen
+        fragments and atoms whose x, y and z Cartesian coordinates are all frozen"""
+        return self._layout()["frozen_atoms"]
+
+    @property
+    def active_intco_list(self):
+        """Read-only boolean vector, True for internal coordinates that involve at least one atom
+        that is not frozen"""
+        return self._layout()["active_intcos"]
+
+    @property
+    def active_subspace(self):
+        """Leave frozen atoms, and the coordinates that involve only frozen atoms, out of the
+        transformations, projections and steps. Frozen atoms are then held fixed by construction
+        instead of by constraints. Has no effect without frozen atoms"""
+        return self._active_subspace
+
+    @active_subspace.setter
+    def active_subspace(self, value):
+        self._active_subspace = bool(value)
+        self._active_basis = None
+        self._projector = None
+
+    def active_space(self):
+        """(active coordinates, active Cartesian columns) as index arrays if steps are taken in
+        the active subspace (see ``active_subspace``), else None"""
+        if not self._active_subspace or not self.frozen_atom_list.any():
+            return None
+        return np.flatnonzero(self.active_intco_list), np.flatnonzero(np.repeat(~self.frozen_atom_list, 3))
 
     # Used to zero out forces.  For any ranged intco, indicate frozen if
     # within 0.1% of boundary and its corresponding force is in that direction.
     # Add an additional check to zero the force of a coordinate outside its range to zero
     def ranged_frozen_intco_list(self, fq):
         """Determine vector with 1 for any ranged intco that is at its limit"""
-        qvals = self.q()
         frozen = np.zeros(self.num_intcos, dtype=bool)
-        cnt = 0
-
-        for f in self.all_fragments:
-            for intco in f.intcos:
-                if intco.ranged:
-                    tol = 0.001 * (intco.range_max - intco.range_min)
-                    if (
-                        np.fabs(qvals[cnt] - intco.range_max) < tol
-                        and fq[cnt] > 0
-                        or qvals[cnt] > intco.range_max
-                    ):
-                        frozen[cnt] = True
-                    elif (
-                        np.fabs(qvals[cnt] - intco.range_min) < tol
-                        and fq[cnt] < 0
-                        or qvals[cnt] < intco.range_min
-                    ):
-                        frozen[cnt] = True
-                cnt += 1
-
+        ranged = np.flatnonzero(self.ranged_intco_list)
+        if not ranged.size:
+            return frozen
+
+        intcos = [intco for f in self.all_fragments for intco in f.intcos]
+        range_min = np.array([intcos[i].range_min for i in ranged])
+        range_max = np.array([intcos[i].range_max for i in ranged])
+        tol = 0.001 * (range_max - range_min)
+        q = self.q_array()[ranged]
+        fq = np.asarray(fq)[ranged]
+
+        at_max = (np.fabs(q - range_max) < tol) & (fq > 0) | (q > range_max)
+        at_min = (np.fabs(q - range_min) < tol) & (fq < 0) | (q < range_min)
+        frozen[ranged] = at_max | at_min
         return frozen
 
     def constraint_matrix(self, fq):
         """Returns constraint matrix with 1 on diagonal for frozen coordinates.
         This method used to check for forces being passed in but wasn't being used. Forces now need to be passed in
+        The projections use the indices of ``constrained_intco_list`` instead of this dense matrix
 
         Parameters
         ----------
         fq: np.ndarray forces
 
         """
-        frozen = self.frozen_intco_list
-
-        range_frozen = self.ranged_frozen_intco_list(fq)
-        frozen = np.logical_or(frozen, range_frozen)
+        frozen = self.constrained_intco_list(fq)
 
         if np.any(frozen):
             return np.diagflat(frozen)
         else:
             return None
 
+    def constrained_intco_list(self, fq):
+        """Boolean vector, True for frozen coordinates and ranged coordinates at their limits"""
+        return np.logical_or(self.frozen_intco_list, self.ranged_frozen_intco_list(fq))
+
     def frag_1st_intco(self, iF):
         """returns the index of the first internal coordinate belonging to fragment"""
 
         if iF >= len(self._fragments):
             raise ValueError()
-        start = 0
-        for i in range(0, iF):
-            start += self._fragments[i].num_intcos
-        return start
+        return int(self._layout()["intco_offsets"][iF])
 
     def frag_intco_range(self, iF):
         """range of internal coordinates within the overall set corresponding to a given ``Frag``
@@ -422,10 +540,9 @@ class Molsys(object):
     # returns the total intco row number for the first/start of the dimer coordinate.
     def dimerfrag_1st_intco(self, iDI):
         # we assume the intrafragment coordinates come first
-        N = sum(F.num_intcos for F in self._fragments)
-        for i in range(0, iDI):
-            N += self._dimer_intcos[i].num_intcos
-        return N
+        if iDI > len(self._dimer_intcos):
+            raise ValueError()
+        return int(self._layout()["intco_offsets"][len(self._fragments) + iDI])
 
     def dimerfrag_intco_range(self, iDI):
         start = self.dimerfrag_1st_intco(iDI)
@@ -486,9 +603,9 @@ class Molsys(object):
         vals = []
         for F in self._fragments:
             vals += F.q()
-        self.update_dimer_intco_reference_points()
-        for DI in self._dimer_intcos:
-            vals += DI.q()
+        if self._dimer_intcos:
+            ref = self.update_dimer_intco_reference_points()
+            vals += self.dimer_batch.q(ref).tolist()
         return vals
 
     def q_array(self):
@@ -524,53 +641,26 @@ class Molsys(object):
         del self._fragments[:]
         consolidatedFrag = Frag(Z, g, m)
         self._fragments.append(consolidatedFrag)
+        self._build_buffers()
 
     def split_fragments_by_connectivity(self, covalent_connect=1.3):
         """Split any fragment not connected by bond connectivity."""
-        tempZ = np.copy(self.Z)
-        tempGeom = np.copy(self.geom)
-        tempMasses = np.copy(self.masses)
-
         newFragments = []
         for F in self._fragments:
-            C = connectivity_from_distances(F.geom, F.Z, covalent_connect)
-            atomsToAllocate = list(reversed(range(F.natom)))
-            while atomsToAllocate:
-                frag_atoms = [atomsToAllocate.pop()]
-
-                more_found = True
-                while more_found:
-                    more_found = False
-                    addAtoms = []
-                    for A in frag_atoms:
-                        for B in atomsToAllocate:
-                            if C[A, B]:
-                                if B not in addAtoms:
-                                    addAtoms.append(B)
-                                more_found = True
-                    for a in addAtoms:
-                        frag_atoms.append(a)
-                        atomsToAllocate.remove(a)
-
-                frag_atoms.sort()
-                subNatom = len(frag_atoms)
-                subZ = [0] * subNatom
-                subGeom = np.zeros((subNatom, 3))
-                subMasses = [0] * subNatom
-                for i, I in enumerate(frag_atoms):
-                    subZ[i] = tempZ[I]
-                    subGeom[i, 0:3] = tempGeom[I, 0:3]
-                    subMasses[i] = tempMasses[I]
-                newFragments.append(Frag(subZ, subGeom, subMasses))
+            labels = graph.connected_components(F.natom, *graph.bonded_pairs(F.geom, F.Z, covalent_connect))
+            for label in range(labels.max() + 1 if F.natom else 0):
+                frag_atoms = np.flatnonzero(labels == label)
+                newFragments.append(
+                    Frag(np.array(F.Z)[frag_atoms], F.geom[frag_atoms], np.array(F.masses)[frag_atoms])
+                )
 
         del self._fragments[:]
         self._fragments = newFragments
+        self._build_buffers()
 
     def purge_interfragment_connectivity(self, C):
-        for f1, f2 in permutations([i for i in range(self.nfragments)], 2):
-            for a in self.frag_atom_range(f1):
-                for b in self.frag_atom_range(f2):
-                    C[a, b] = 0.0
+        labels = np.repeat(np.arange(self.nfragments), self.frag_natoms)
+        C[labels[:, None] != labels[None, :]] = 0.0
         return
 
     # Supplements a connectivity matrix to connect all fragments.  Assumes the
@@ -590,72 +680,21 @@ class Molsys(object):
             The scalar of covalent radii required to achieve full connectivity
         """
         logger.debug("\tAugmenting connectivity matrix to join fragments.")
-        fragAtoms = []
-        geom = self.geom
-        for iF, F in enumerate(self._fragments):
-            fragAtoms.append(range(self.frag_1st_atom(iF), self.frag_1st_atom(iF) + F.natom))
-
-        # Which fragments are connected?
-        nF = self.nfragments
-        if self.nfragments == 1:
-            return 1.3
-
-        frag_connectivity = np.zeros((nF, nF), dtype=int)
-        for iF in range(nF):
-            frag_connectivity[iF, iF] = 1
-
-        Z = self.Z
-        i, j = -1, -1
-
         scale_dist = 1.3
-        all_connected = False
-        while not all_connected:
-            for f2 in range(nF):
-                for f1 in range(f2):
-                    if frag_connectivity[f1][f2]:
-                        continue  # already connected
-                    minVal = 1.0e12
-
-                    # Find closest 2 atoms between fragments.
-                    for f1_atom in fragAtoms[f1]:
-                        for f2_atom in fragAtoms[f2]:
-                            tval = v3d.dist(geom[f1_atom], geom[f2_atom])
-                            if tval < minVal:
-                                minVal = tval
-                                i = f1_atom
-                                j = f2_atom
-
-                    Rij = v3d.dist(geom[i], geom[j])
-                    R_i = qcel.covalentradii.get(Z[i], missing=4.0)
-                    R_j = qcel.covalentradii.get(Z[j], missing=4.0)
-                    if Rij > scale_dist * (R_i + R_j):
-                        # ignore this as too far - for starters.  may have A-B-C situation.
-                        continue
-
-                    logger.info("\tConnecting fragments with atoms %d and %d" % (i + 1, j + 1))
-                    C[i][j] = C[j][i] = True
-                    frag_connectivity[f1][f2] = frag_connectivity[f2][f1] = True
-
-                    # Now check for possibly symmetry-related atoms which are just as close
-                    # We need them all to avoid symmetry breaking.
-                    for f1_atom in fragAtoms[f1]:
-                        for f2_atom in fragAtoms[f2]:
-                            if f1_atom == i and f2_atom == j:  # already have this one
-                                continue
-                            tval = v3d.dist(geom[f1_atom], geom[f2_atom])
-                            if np.fabs(tval - minVal) < 1.0e-10:
-                                i = f1_atom
-                                j = f2_atom
-                                logger.info("\tAlso, with atoms %d and %d\n" % (i + 1, j + 1))
-                                C[i][j] = C[j][i] = True
-
-            # Test whether all frags are connected using current distance threshold
-            if any(np.sum(frag_connectivity, axis=0) - nF == 0):
-                logger.info("\tAll fragments are connected in connectivity matrix.")
-                all_connected = True
-            else:
-                scale_dist += 0.2
-                logger.info("\tIncreasing scaling to %6.3f to connect fragments." % scale_dist)
+        if self.nfragments == 1:
+            return scale_dist
+
+        # Join the fragments along a minimum spanning tree through their closest atoms
+        labels = np.repeat(np.arange(self.nfragments), self.frag_natoms)
+        links, max_ratio = graph.link_components(self.geom, labels, graph.covalent_radii(self.Z))
+        for i, j in links:
+            logger.info("\tConnecting fragments with atoms %d and %d" % (i + 1, j + 1))
+            C[i][j] = C[j][i] = True
+        logger.info("\tAll fragments are connected in connectivity matrix.")
+
+        # the scale of the covalent radii at which the links are bonds
+        while scale_dist < max_ratio:
+            scale_dist += 0.2
         return scale_dist
 
     def distance_matrix(self):
@@ -684,10 +723,13 @@ class Molsys(object):
         # self._fb_fragments.clear()
 
     def update_dimer_intco_reference_points(self):
-        for DI in self._dimer_intcos:
-            xA = self.frag_geom(DI.A_idx)
-            xB = self.frag_geom(DI.B_idx)
-            DI.update_reference_geometry(xA, xB)
+        """Sets the reference points of all dimers, and returns them stacked (see ``DimerBatch``)"""
+        if not self._dimer_intcos:
+            return None
+        ref = self.dimer_batch.reference_points(self.geom)
+        for DI, ref_geom in zip(self._dimer_intcos, ref.reshape(-1, 6, 3)):
+            DI.pseudo_frag.geom[:] = ref_geom
+        return ref
 
     def update_dihedral_orientations(self):
         """See description in Fragment class."""
@@ -725,35 +767,39 @@ class Molsys(object):
         B = np.zeros((n_int, n_cart))
 
         for iF, F in enumerate(self._fragments):
-            fB = F.Bmat()
-            cart_offset = 3 * self.frag_1st_atom(iF)
-            intco_offset = self.frag_1st_intco(iF)
-
-            for i in range(F.num_intcos):
-                for xyz in range(3 * F.natom):
-                    B[intco_offset + i, cart_offset + xyz] = fB[i, xyz]
+            B[self.frag_intco_slice(iF), 3 * self.frag_1st_atom(iF) : 3 * self.frag_1st_atom(iF + 1)] = F.Bmat()
 
         if self._dimer_intcos:
-            # xyz = self.geom
-            for i, DI in enumerate(self._dimer_intcos):
-                # print('Aidx:' + str(DI.A_idx) )
-                a_atom1 = self.frag_1st_atom(DI.A_idx)
-                b_atom1 = self.frag_1st_atom(DI.B_idx)
-                a_xyz = self.frag_geom(DI.A_idx)
-                b_xyz = self.frag_geom(DI.B_idx)
-                DI.Bmat(
-                    a_xyz,
-                    b_xyz,
-                    B[self.dimerfrag_intco_slice(i)],
-                    3 * a_atom1,
-                    3 * b_atom1,
-                )  # column offsets
+            ref = self.update_dimer_intco_reference_points()
+            self.dimer_batch.Bmat(ref, B[self.dimerfrag_1st_intco(0) :])
 
         if massWeight:
             sqrtm = np.broadcast_to(np.repeat(np.sqrt(self.masses), 3), (n_int, n_cart))
             B[:] = np.divide(B, sqrtm)
         return B
 
+    def active_Bmat(self):
+        """Rows of the B matrix for the active coordinates and columns for the atoms that are not
+        frozen (see ``active_space``). Only the rows of the active coordinates are computed"""
+        rows, cols = self.active_space()
+        B = np.zeros((len(rows), 3 * self.natom))
+        active = self.active_intco_list
+
+        row = 0
+        for iF, F in enumerate(self._fragments):
+            first_cart = 3 * self.frag_1st_atom(iF)
+            for coord, is_active in zip(F.intcos, active[self.frag_intco_slice(iF)]):
+                if is_active:
+                    coord.DqDx(F.geom, B[row, first_cart : first_cart + 3 * F.natom])
+                    row += 1
+
+        dimer_rows = active[self.dimerfrag_1st_intco(0) :]
+        if dimer_rows.any():
+            B_dimer = np.zeros((len(dimer_rows), 3 * self.natom))
+            self.dimer_batch.Bmat(self.update_dimer_intco_reference_points(), B_dimer)
+            B[row:] = B_dimer[dimer_rows]
+        return B[:, cols]
+
     def q_show_forces(self, forces):
         """Returns scaled forces as array."""
 
@@ -798,6 +844,17 @@ class Molsys(object):
         if not self.intcos_present or self.natom == 0:
             return np.zeros(0)
 
+        B_is_current = B is None
+        active = self.active_space() if B_is_current and not use_masses else None
+        if active is not None:
+            # only the active coordinates and atoms enter. The other forces are zero
+            rows, cols = active
+            B_a = self.active_Bmat()
+            g_q = np.zeros(self.num_intcos)
+            Ginv = symm_mat_inv(B_a @ B_a.T, redundant=True, threshold=threshold)
+            g_q[rows] = coeff * Ginv @ B_a @ np.ravel(g_x)[cols]
+            return g_q
+
         if B is None:
             B = self.Bmat()
 
@@ -806,6 +863,8 @@ class Molsys(object):
             G = B @ u @ B.T
             Ginv = symm_mat_inv(G, redundant=True, threshold=threshold)
             g_q = coeff * Ginv @ B @ u @ g_x
+        elif self.delocalized and B_is_current:
+            g_q = coeff * self._delocalized_inverse(B, threshold) @ g_x
         else:
             G = B @ B.T
             Ginv = symm_mat_inv(G, redundant=True, threshold=threshold)
@@ -813,6 +872,13 @@ class Molsys(object):
 
         return g_q
 
+    def _delocalized_inverse(self, B, threshold=1e-10):
+        """G^- B for B at the current geometry. In the delocalized basis U, G^- = U (U^T G U)^-1 U^T
+        so only a (k, k) matrix is inverted"""
+        basis = self.delocalized_basis()
+        B_d = basis.T @ B
+        return basis @ (symm_mat_inv(B_d @ B_d.T, redundant=True, threshold=threshold) @ B_d)
+
     def hessian_to_internals(self, H, g_x=None, use_masses=False):
         """converts the hessian from cartesian coordinates into internal coordinates
         Hq = A^t (Hxy - Kxy) A, where K_xy = sum_q ( grad_q[I] d^2(q_I)/(dx dy)
@@ -836,14 +902,21 @@ class Molsys(object):
         """
         logger.info("Converting Hessian from cartesians to internals.")
 
-        B = self.Bmat()
-
-        if use_masses:
+        active = None if use_masses else self.active_space()
+        if active is not None:
+            rows, cols = active
+            B_a = self.active_Bmat()
+            Atranspose = symm_mat_inv(B_a @ B_a.T, redundant=True) @ B_a
+        elif use_masses:
+            B = self.Bmat()
             u = np.diag(np.repeat(1.0 / self.masses, 3))
             G = np.dot(np.dot(B, u), B.T)
             Ginv = symm_mat_inv(G, redundant=True)
             Atranspose = np.dot(np.dot(Ginv, B), u)
+        elif self.delocalized:
+            Atranspose = self._delocalized_inverse(self.Bmat(), threshold=1e-8)
         else:
+            B = self.Bmat()
             G = np.dot(B, B.T)
             Ginv = symm_mat_inv(G, redundant=True)
             Atranspose = np.dot(Ginv, B)
@@ -858,24 +931,22 @@ class Molsys(object):
             logger.info("Including force/B-matrix derivative term.\n")
 
             g_q = self.gradient_to_internals(g_x, use_masses=use_masses)
+            # the gradients of inactive coordinates are zero
+            skip = np.zeros(len(g_q), dtype=bool) if active is None else ~self.active_intco_list
 
             for iF, F in enumerate(self._fragments):
                 dq2dx2 = np.zeros((3 * F.natom, 3 * F.natom))
                 geom = F.geom
                 # Find start index for this fragment
-                cart_offset = 3 * self.frag_1st_atom(iF)
+                carts = slice(3 * self.frag_1st_atom(iF), 3 * self.frag_1st_atom(iF + 1))
                 intco_offset = self.frag_1st_intco(iF)
 
                 for iIntco, Intco in enumerate(F.intcos):
+                    if skip[intco_offset + iIntco]:
+                        continue
                     dq2dx2[:] = 0
                     Intco.Dq2Dx2(geom, dq2dx2)  # d^2(q_I)/ dx_i dx_j
-
-                    # Loop over Cartesian pairs in fragment
-                    for a in range(3 * F.natom):
-                        for b in range(3 * F.natom):
-                            Hworking[cart_offset + a, cart_offset + b] -= (
-                                g_q[intco_offset + iIntco] * dq2dx2[a, b]
-                            )
+                    Hworking[carts, carts] -= g_q[intco_offset + iIntco] * dq2dx2
 
             # TODO: dimer coordinates, akin to this
             if self._dimer_intcos:
@@ -891,36 +962,215 @@ class Molsys(object):
             #        DI.Bmat(Axyz, Bxyz, B[self.dimerfrag_intco_slice(i)],
             #            A1stAtom, 3 * B1stAtom)  # column offsets
 
+        if active is not None:
+            Hq = np.zeros((self.num_intcos, self.num_intcos))
+            Hq[np.ix_(rows, rows)] = Atranspose @ Hworking[np.ix_(cols, cols)] @ Atranspose.T
+            return Hq
+
         Hq = np.dot(Atranspose, np.dot(Hworking, Atranspose.T))
         return Hq
 
-    def project_redundancies_and_constraints(self, fq, H, threshold=1e-8):
-        """Project redundancies and constraints out of forces and Hessian"""
-        # compute projection matrix = G G^-1
-        G = self.Gmat()
-        G_inv = symm_mat_inv(G, redundant=True, threshold=threshold)
-        Pprime = G @ G_inv
+    @property
+    def point_group(self):
+        """``symmetry.PointGroup`` of the system or None if symmetry is not used"""
+        return self._point_group
+
+    @point_group.setter
+    def point_group(self, point_group):
+        self._point_group = point_group
+        self._symmetric_basis = None
+        self._projector = None
+
+    def detect_symmetry(self, tol=0.05):
+        """Find and keep the point group of the current geometry. See ``symmetry.find_point_group``"""
+        self.point_group = symmetry.find_point_group(self.geom, self.Z, self.masses, tol)
+        return self.point_group
+
+    def symmetric_intco_basis(self, threshold=1e-8):
+        """Orthonormal (num_intcos, k) basis of the totally symmetric internal coordinate
+        displacements at the current geometry. None without a point group (or only C1)"""
+        if self._point_group is None or self._point_group.order == 1:
+            return None
+
+        key = (self.num_intcos, threshold, self.geom.tobytes())
+        if self._symmetric_basis is None or self._symmetric_basis[0] != key:
+            basis = self._point_group.symmetric_internal_basis(self.Bmat(), threshold)
+            self._symmetric_basis = (key, basis)
+            logger.debug("\t%d of %d internal coordinates are totally symmetric", basis.shape[1], self.num_intcos)
+        return self._symmetric_basis[1]
+
+    @property
+    def delocalized(self):
+        return self._delocalized is not None
+
+    def delocalize(self, threshold=1e-8):
+        """Take steps in delocalized internal coordinates (Baker, Kessi and Delley, J. Chem. Phys.
+        105, 192 (1996)): the eigenvectors of G with eigenvalues above threshold, i.e. the 3N-6
+        (3N-5) nonredundant combinations of the internal coordinates.
+
+        G is diagonalized once here. ``delocalized_basis`` carries the basis to new geometries.
+        """
+        evals, evects = symm_mat_eig(self.Gmat())
+        basis = evects[evals > threshold].T
+        self._delocalized = (self.geom.tobytes(), threshold, basis)
+        self._projector = None
+        logger.info(
+            "\tUsing %d delocalized internal coordinates in place of %d redundant internal coordinates",
+            basis.shape[1],
+            self.num_intcos,
+        )
+        return basis
+
+    def localize(self):
+        """Return to redundant internal coordinates"""
+        self._delocalized = None
+        self._projector = None
+
+    def delocalized_basis(self):
+        """Orthonormal (num_intcos, k) basis of the delocalized internal coordinates at the current
+        geometry. None unless ``delocalize`` was called.
+
+        The range of G at a new geometry is the range of ``G U = B (B^T U)`` for the basis U of the
+        previous geometry. A QR decomposition of it gives the new basis without diagonalizing G.
+        Diagonalizes G again if the coordinates were changed or the geometry moved too far."""
+        if self._delocalized is None:
+            return None
+
+        geom, threshold, basis = self._delocalized
+        if len(basis) != self.num_intcos:
+            return self.delocalize(threshold)
+        if geom == self.geom.tobytes():
+            return basis
+
+        B = self.Bmat()
+        Q, R = np.linalg.qr(B @ (B.T @ basis))
+        diagonal = np.abs(np.diag(R))
+        if diagonal.min() < 1.0e-6 * diagonal.max():
+            logger.info("\tDelocalized internal coordinates lost rank. Rebuilding them")
+            return self.delocalize(threshold)
+
+        self._delocalized = (self.geom.tobytes(), threshold, Q)
+        return Q
+
+    def active_basis(self, threshold=1e-8):
+        """Orthonormal (num_intcos, k) basis of the nonredundant displacements of the active
+        coordinates that move only the atoms which are not frozen (see ``active_space``). Rows of
+        the inactive coordinates are zero. None outside of the active subspace mode.
+
+        Only the (n_active, n_active) G of the active coordinates and atoms is diagonalized."""
+        active = self.active_space()
+        if active is None:
+            return None
+
+        rows, _ = active
+        key = (self.num_intcos, threshold, self.geom.tobytes())
+        if self._active_basis is None or self._active_basis[0] != key:
+            B_a = self.active_Bmat()
+            evals, evects = symm_mat_eig(B_a @ B_a.T)
+            basis = np.zeros((self.num_intcos, np.count_nonzero(evals > threshold)))
+            basis[rows] = evects[evals > threshold].T
+            self._active_basis = (key, basis)
+            logger.debug(
+                "\t%d active internal coordinates span %d nonredundant displacements of %d moving atoms",
+                len(rows),
+                basis.shape[1],
+                np.count_nonzero(~self.frozen_atom_list),
+            )
+        return self._active_basis[1]
+
+    def step_basis(self, threshold=1e-8):
+        """Orthonormal basis of the internal coordinate subspace that steps are taken in. The
+        active subspace if frozen atoms are left out, intersected with the totally symmetric
+        subspace if there is a point group. Else the totally symmetric subspace, else the
+        delocalized internal coordinates, else None (the full redundant space)"""
+        basis = self.active_basis(threshold)
+        symmetric = self.symmetric_intco_basis(threshold)
+        if basis is None:
+            return symmetric if symmetric is not None else self.delocalized_basis()
+        if symmetric is None:
+            return basis
+
+        # principal vectors of the two subspaces with cosines of 1 span the intersection
+        U, cosines, _ = np.linalg.svd(basis.T @ symmetric, full_matrices=False)
+        intersection = basis @ U[:, cosines > 1.0 - 1.0e-6]
+        logger.debug(
+            "	%d of %d active displacements are totally symmetric", intersection.shape[1], basis.shape[1]
+        )
+        return intersection
+
+    def projector(self, fq, threshold=1e-8):
+        """Projector P onto the nonredundant space of the internal coordinates with the
+        constrained coordinates removed. With a point group, only the totally symmetric
+        part of the nonredundant space is kept. With delocalized internal coordinates, the
+        nonredundant space is spanned by their basis. In the active subspace mode only the block
+        of the active coordinates is nonzero.
+
+        P is kept as an orthonormal basis of the space and applied as an operator (see
+        ``linearAlgebra.Projector``). The last projector is cached for the geometry, the
+        coordinates and the constrained coordinates.
+
+        Parameters
+        ----------
+        fq : np.ndarray
+            forces. Used to find ranged coordinates that are at their limits
+        threshold : float
+            eigenvalue threshold for the generalized inverses
+
+        Returns
+        -------
+        linearAlgebra.Projector
+        """
+        constrained = self.constrained_intco_list(fq)
+        self._layout()
+        key = (self._layout_cache[0], self.geom.tobytes(), threshold, constrained.tobytes())
+        if self._projector is not None and self._projector[0] == key:
+            return self._projector[1]
+
+        basis = self.step_basis(threshold)
+        if basis is not None:
+            # symmetric displacements B dx, delocalized and active coordinates are orthonormal
+            # bases of (part of) the range of G. No inverse is needed
+            P = Projector(basis)
+        else:
+            # G G^-1 projects onto the range of G = B B^T, which is the range of B
+            P = Projector.onto_range(self.Bmat(), threshold)
+
         # Add constraints to projection matrix
         # fq is passed to Supplement matrix with ranged variables that are at their limit
-        C = self.constraint_matrix(fq)  # returns None, if aren't any
+        constrained = np.flatnonzero(constrained)
+        if constrained.size:
+            logger.debug("Adding constraints for projection of coordinates %s", constrained + 1)
+            # P = P' - P'C (CP'C)^- CP' with C the diagonal selector of the constrained
+            # coordinates. Only the rows of the basis of P' for the constrained coordinates are needed
+            P = P.remove(constrained, threshold)
 
-        if C is not None:
-            logger.debug("Adding constraints for projection.\n" + print_mat_string(C))
-            CPC = C @ Pprime @ C
-            CPCInv = symm_mat_inv(CPC, redundant=True, threshold=threshold)
-            P = Pprime - Pprime @ C @ CPCInv @ C @ Pprime
-        else:
-            P = Pprime
+        self._projector = (key, P)
+        return P
+
+    def projection_matrix(self, fq, threshold=1e-8):
+        """Dense (num_intcos, num_intcos) projector. See ``projector``"""
+        return self.projector(fq, threshold).to_dense()
+
+    @instrumentation.timed("project_redundancies_and_constraints")
+    def project_redundancies_and_constraints(self, fq, H, threshold=1e-8):
+        """Project redundancies and constraints out of forces and Hessian
+
+        ``H`` may be an np.ndarray or a ``HessianForm``. Diagonal and low rank forms are projected
+        lazily (see ``hessianForms``) so no dense Hessian is formed.
+        """
+        P = self.projector(fq, threshold)
 
         # Project redundancies out of forces.
         # fq~ = P fq
         fq = P @ fq.T
 
         logger.debug(
-            "\n\tInternal forces in au, after projection of redundancies"
-            + " and constraints.\n"
-            + print_array_string(fq)
+            "\n\tInternal forces in au, after projection of redundancies and constraints.\n%s",
+            lazy_array_string(fq),
         )
+        if isinstance(H, HessianForm):
+            return fq, H.project(P, self.ranged_intco_list)
+
         # Project redundancies out of Hessian matrix.
         # Peng, Ayala, Schlegel, JCC 1996 give H -> PHP + 1000(1-P)
         # The second term appears unnecessary and sometimes messes up Hessian updating.
@@ -932,16 +1182,14 @@ class Molsys(object):
         # the hessian. These coordinates are not updated in the hessian update but this makes
         # sure that the projection doesn't add coupling constants involving frozen coordinates
 
-        ranged = self.ranged_intco_list
-        C = np.diagflat(ranged)
-        for i in range(len(fq)):
-            if C[i, i] == 1:
-                tmp = H[i, i].copy()
-                H_new[i, :] = H_new[:, i] = np.zeros(len(fq))
-                H_new[i, i] = tmp
+        ranged = np.flatnonzero(self.ranged_intco_list)
+        if ranged.size:
+            H_new[ranged, :] = 0.0
+            H_new[:, ranged] = 0.0
+            H_new[ranged, ranged] = np.diag(H)[ranged]
 
         if H.size:
-            logger.info("Projected (PHP) Hessian matrix\n" + print_mat_string(H))
+            logger.info("Projected (PHP) Hessian matrix\n%s", lazy_mat_string(H_new))
 
         return fq, H_new
 
@@ -1062,8 +1310,8 @@ class Molsys(object):
         self.update_dihedral_orientations()
         self.fix_bend_axes()
 
-        geom_orig = self.geom  # to restore below
-        coord = self.geom  # returns a copy
+        geom_orig = self.geom.copy()  # to restore below
+        coord = self.geom.copy()
 
         for atom in range(natom):
             for xyz in range(3):
@@ -1142,7 +1390,7 @@ class Molsys(object):
         DISP_SIZE = 0.01
         MAX_ERROR = 10 * DISP_SIZE * DISP_SIZE * DISP_SIZE * DISP_SIZE
 
-        geom_orig = self.geom  # to restore below
+        geom_orig = self.geom.copy()  # to restore below
 
         logger.info("\tTesting Derivative B-matrix numerically.")
         if self._dimer_intcos:
@@ -40,6 +40,8 @@ class Oofp(Simple):
         class for evaluating additional external force
     """
 
+    __slots__ = ("_near180", "neg")
+
     def __init__(
         self,
         a,
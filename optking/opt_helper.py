@@ -15,7 +15,7 @@ import numpy as np
 from optking.IRCfollowing import IntrinsicReactionCoordinate
 import qcelemental as qcel
 
-from . import compute_wrappers, hessian, history, molsys, optwrapper
+from . import checkpoint, compute_wrappers, hessian, hessianForms, history, instrumentation, molsys, optwrapper
 from .convcheck import conv_check
 from .exceptions import OptError, AlgError
 from .optimize import (
@@ -25,7 +25,7 @@ from .optimize import (
     prepare_opt_output,
     OptimizationManager,
 )
-from .printTools import print_geom_grad, welcome
+from .printTools import LazyString, print_geom_grad, welcome
 from . import log_name
 from . import op
 
@@ -127,7 +127,7 @@ class Helper(ABC):
             "molsys": self.molsys.to_dict(),
             "history": self.history.to_dict(),
             "computer": self.computer.__dict__,
-            "hessian": self._Hq,
+            "hessian": self._Hq.to_dict() if isinstance(self._Hq, hessianForms.HessianForm) else self._Hq,
             "opt_input": self.opt_input,
             "opt_manager": self.opt_manager.to_dict(),
         }
@@ -151,7 +151,34 @@ class Helper(ABC):
         helper.history = history.History.from_dict(d.get("history"))
         helper.step_num = d.get("step_num")
         helper.irc_step_num = d.get("irc_step_num")
-        helper._Hq = d.get("hessian")
+        helper._Hq = hessianForms.from_dict(d.get("hessian"))
+        return helper
+
+    def to_checkpoint(self, path):
+        """Write a binary checkpoint (see ``optking.checkpoint``). Repeated calls with the same
+        path only write the data added since the previous call.
+
+        Parameters
+        ----------
+        path: Union[str, pathlib.Path]
+            checkpoint directory
+        """
+
+        path = pathlib.Path(path)
+        chk = getattr(self, "_checkpoint", None)
+        if chk is None or chk.path != path:
+            chk = checkpoint.Checkpoint(path)
+            self._checkpoint = chk
+        chk.save(self)
+
+    @classmethod
+    def from_checkpoint(cls, path):
+        """Recreate a helper from a checkpoint written by ``to_checkpoint``. Later calls of
+        ``to_checkpoint`` with the same path append to it"""
+        chk = checkpoint.Checkpoint(path)
+        helper = cls.from_dict(chk.load())
+        chk.adopt(helper)
+        helper._checkpoint = chk
         return helper
 
     def build_coordinates(self):
@@ -172,14 +199,15 @@ class Helper(ABC):
         """Get the energy, gradient, and hessian. Project redundancies and apply constraints / forces"""
 
         try:
-            if not self.molsys.intcos_present:
-                # opt_manager.molsys is the same object as this molsys
-                make_internal_coords(self.molsys, self.params)
-                logger.debug("Molecular system after make_internal_coords:")
-                logger.info(str(self.molsys))
-
-            self._compute()
-            logger.info("\n\t%s", print_geom_grad(self.geom, self.gX))
+            with instrumentation.recording(self.opt_manager.timings):
+                if not self.molsys.intcos_present:
+                    # opt_manager.molsys is the same object as this molsys
+                    make_internal_coords(self.molsys, self.params)
+                    logger.debug("Molecular system after make_internal_coords:")
+                    logger.info(str(self.molsys))
+
+                self._compute()
+            logger.info("\n\t%s", LazyString(print_geom_grad, self.geom, self.gX))
         except OptError as e:
             logger.critical("A critical error has occured: %s - %s", type(e), e, exc_info=True)
             raise e
@@ -202,7 +230,7 @@ class Helper(ABC):
             logger.critical("A critical error has occured: %s - %s", type(e), e, exc_info=True)
             raise e
 
-        self.new_geom = self.molsys.geom
+        self.new_geom = self.molsys.geom.copy()
         self.step_num += 1
         self.opt_manager.step_number += 1
 
@@ -286,7 +314,7 @@ class Helper(ABC):
 
     @property
     def geom(self):
-        return self.molsys.geom
+        return self.molsys.geom.copy()
 
     @staticmethod
     def attempt_fromiter(array):
@@ -436,7 +464,7 @@ class CustomHelper(Helper):
         helper.history = history.History.from_dict(d.get("history"))
         helper.step_num = d.get("step_num")
         helper.irc_step_num = d.get("irc_step_num")
-        helper._Hq = d.get("hessian")
+        helper._Hq = hessianForms.from_dict(d.get("hessian"))
         helper.computer = compute_wrappers.make_computer_from_dict("user", d.get("computer"))
         helper.opt_manager = OptimizationManager.from_dict(
             d["opt_manager"], helper.molsys, helper.history, helper.params, helper.computer
@@ -471,6 +499,23 @@ class CustomHelper(Helper):
                         "Optking requested a hessian but was not provided one. "
                         "This could be a driver issue"
                     )
+            elif "hessian" not in self.opt_manager.opt_method.requires() and (
+                self.step_num == 0
+                or "hessian_diagonal" in self.opt_manager.opt_method.requires()
+                or len(self._Hq) != self.molsys.num_intcos
+            ):
+                # SD, CG and L-BFGS start from the diagonal guess (never an (n, n) matrix). SD and CG
+                # updates give a low rank correction. L-BFGS only uses the diagonal: nothing to update
+                logger.debug("Guessing hessian diagonal")
+                self._Hq = hessianForms.DiagonalHessian(
+                    hessian.guess_diagonal(self.molsys, guessType=self.params.intrafrag_hess)
+                )
+                self.gX = self.computer.compute(self.geom, driver="gradient", return_full=False)
+                self.fq = self.molsys.gradient_to_internals(self.gX, -1.0)
+                self.fq, self._Hq = self.molsys.apply_external_forces(self.fq, self._Hq)
+                self.fq, self._Hq = self.molsys.project_redundancies_and_constraints(
+                    self.fq, self._Hq
+                )
             elif self.step_num == 0:
                 logger.debug("Guessing hessian")
                 self._Hq = hessian.guess(self.molsys, guessType=self.params.intrafrag_hess)
@@ -644,7 +689,7 @@ class EngineHelper(Helper):
         helper.history = history.History.from_dict(d.get("history"))
         helper.step_num = d.get("step_num")
         helper.irc_step_num = d.get("irc_step_num")
-        helper._Hq = d.get("hessian")
+        helper._Hq = hessianForms.from_dict(d.get("hessian"))
         helper.computer = compute_wrappers.make_computer_from_dict("qc", d.get("computer"))
         helper.opt_manager = OptimizationManager.from_dict(
             d["opt_manager"], helper.molsys, helper.history, helper.params, helper.computer
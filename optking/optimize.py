@@ -20,11 +20,12 @@ import numpy as np
 from optking.compute_wrappers import ComputeWrapper
 from optking.molsys import Molsys
 
-from . import IRCfollowing, addIntcos, hessian, history, intcosMisc, misc
+from . import IRCfollowing, addIntcos, hessian, history, instrumentation, intcosMisc, loggingconfig, misc
 from . import stepAlgorithms
 from . import testB, linesearch
 from .exceptions import AlgError, OptError
-from .printTools import print_array_string, print_geom_grad, print_mat_string
+from .hessianForms import DiagonalHessian, HessianForm
+from .printTools import LazyString, lazy_array_string, lazy_mat_string, print_geom_grad
 from . import log_name
 from . import op
 
@@ -50,6 +51,7 @@ def optimize(o_molsys, computer):
     """
 
     logger = logging.getLogger(__name__)
+    loggingconfig.ensure_configured()
 
     H = 0  # hessian in internals
     fq = 0
@@ -114,6 +116,9 @@ class OptimizationManager(stepAlgorithms.OptimizationInterface):
         super().__init__(molsys, history_object, params)
         self.direction: Union[np.ndarray, None] = None
 
+        if params.use_symmetry and params.opt_type != "IRC" and molsys.point_group is None:
+            molsys.detect_symmetry(params.symm_tol)
+
         method = "IRC" if params.opt_type == "IRC" else params.step_type
         self.opt_method = optimization_factory(method, molsys, self.history, params)
         self.step_number = 0
@@ -136,6 +141,8 @@ class OptimizationManager(stepAlgorithms.OptimizationInterface):
             "protocol": None,
             "step_number": -100,
         }  # Just a number that will never occur naturally
+        # recorded into while this manager computes or takes a step (instrumentation.recorded)
+        self.timings = instrumentation.StepTimings()
 
     def to_dict(self):
         """Convert attributes to serializable form."""
@@ -148,6 +155,7 @@ class OptimizationManager(stepAlgorithms.OptimizationInterface):
             "erase_hessian": self.erase_hessian,
             "check_linesearch": self.check_linesearch,
             "error": self.error,
+            "timings": self.timings.to_dict(),
         }
         if self.linesearch_method:
             d["linesearch_method"] = self.linesearch_method.to_dict()
@@ -174,6 +182,7 @@ class OptimizationManager(stepAlgorithms.OptimizationInterface):
         manager.erase_hessian = d["erase_hessian"]
         manager.check_linesearch = d["check_linesearch"]
         manager.error = d["error"]
+        manager.timings = instrumentation.StepTimings.from_dict(d.get("timings", {}))
 
         if params.opt_type == "IRC":
             manager.opt_method = IRCfollowing.IntrinsicReactionCoordinate.from_dict(
@@ -191,6 +200,7 @@ class OptimizationManager(stepAlgorithms.OptimizationInterface):
 
         return manager
 
+    @instrumentation.recorded
     def start_step(self, H: np.ndarray):
         """Initialize coordinates. Compute needed properties. Print molecular system and property information
 
@@ -236,18 +246,17 @@ class OptimizationManager(stepAlgorithms.OptimizationInterface):
             requirements,
         )
 
-        logger.info("%s", print_geom_grad(self.molsys.geom, g_x))
-
-        self.molsys.q_show()
+        logger.info("%s", LazyString(print_geom_grad, self.molsys.geom, g_x))
 
         if self.params.test_B:
             testB.test_b(self.molsys)
         if self.params.test_derivative_B:
             testB.test_derivative_b(self.molsys)
 
-        logger.info(print_array_string(-g_q, title="Internal forces in au:"))
+        logger.info("%s", lazy_array_string(-g_q, title="Internal forces in au:"))
         return H, -g_q, E
 
+    @instrumentation.recorded
     def take_step(self, fq=None, H=None, energy=None, return_str=False, **kwargs):
         """Take whatever step (normal, linesearch, IRC, constrained IRC) is next.
 
@@ -265,11 +274,13 @@ class OptimizationManager(stepAlgorithms.OptimizationInterface):
 
         self.current_requirements = self.update_requirements()
 
+        # step is (dq, report) if return_str. The report is only built when returned or logged
         if not self.params.linesearch:
-            achieved_dq, returned_str = self.opt_method.take_step(fq, H, energy, return_str=True)
+            step = self.opt_method.take_step(fq, H, energy, return_str=return_str)
         else:
             if self.direction is None:
-                self.direction = self.opt_method.step(fq, H, energy)
+                with instrumentation.timer("step"):
+                    self.direction = self.opt_method.step(fq, H, energy)
 
                 self.linesearch_method.start(self.direction)
 
@@ -289,9 +300,7 @@ class OptimizationManager(stepAlgorithms.OptimizationInterface):
                 self.stashed_hessian = H
                 self.check_linesearch = False
 
-            achieved_dq, returned_str = self.linesearch_method.take_step(
-                fq, H, energy, return_str=True
-            )
+            step = self.linesearch_method.take_step(fq, H, energy, return_str=return_str)
 
             if self.linesearch_method.minimized:
                 logger.info("Linesearch complete. Next step will compute a new direction")
@@ -301,9 +310,8 @@ class OptimizationManager(stepAlgorithms.OptimizationInterface):
                 self.check_linesearch = True
 
         self.requires = self.update_requirements()
-        if return_str:
-            return achieved_dq, returned_str
-        return achieved_dq
+        self.timings.end_step()
+        return step
 
     def update_requirements(self):
         """Get the current requirements for the next step.
@@ -385,8 +393,9 @@ class OptimizationManager(stepAlgorithms.OptimizationInterface):
                 self.protocol.update({"protocol": action})
                 return self.protocol
             elif self.erase_hessian == "stashed":
+                # the Hessian was carried over to new coordinates. Update it with the new gradient
                 self.erase_hessian = ""
-                self.protocol.update({"protocol": "unneeded"})
+                self.protocol.update({"protocol": "update"})
                 return self.protocol
 
         if self.params.cart_hess_read:
@@ -424,11 +433,16 @@ class OptimizationManager(stepAlgorithms.OptimizationInterface):
         self.history.steps_since_last_hessian = 0
         self.history.consecutive_backsteps = 0
 
+    @instrumentation.recorded
+    @instrumentation.timed("alg_error_handler")
     def alg_error_handler(self, H, fq, error):
         """consumes an AlgError. Takes appropriate action"""
 
         logger.error(" Caught AlgError exception\n")
         eraseIntcos = False
+        # Carry the Hessian and history over to the rebuilt coordinates (through cartesians)
+        # instead of erasing them. Not available for dimer coordinates
+        remap = self.params.remap_on_rebuild and not self.molsys.dimer_intcos
 
         if error.back_transformation:
             logger.info("Resetting optimization after critical back-transformation failure")
@@ -439,9 +453,12 @@ class OptimizationManager(stepAlgorithms.OptimizationInterface):
             # New linear bends detected; Add them, and continue at current level.
             # from . import bend # import not currently being used according to IDE
 
-            # Convert the Updated Hessian back into internal coordinates
-            Hx = self.molsys.hessian_to_cartesians(H, -1 * fq)
-            gx = self.molsys.gradient_to_cartesians(-1 * fq)
+            # Convert the Updated Hessian back into internal coordinates. A HessianForm (SD, CG,
+            # L-BFGS) is simply guessed again in the new coordinates
+            keep_hessian = isinstance(H, np.ndarray)
+            if keep_hessian:
+                Hx = self.molsys.hessian_to_cartesians(H, -1 * fq)
+                gx = self.molsys.gradient_to_cartesians(-1 * fq)
 
             # This takes a more heavy handed approach:
             # Collect all the bends involved in our problematic coordinates (oofp or dihedral)
@@ -483,8 +500,9 @@ class OptimizationManager(stepAlgorithms.OptimizationInterface):
             eraseHistory = True
 
             # Convert the Hessian back into the new coordinate system
-            self.H = self.molsys.hessian_to_internals(Hx, gx)
-            self.erase_hessian = "stashed"
+            if keep_hessian:
+                self.H = self.molsys.hessian_to_internals(Hx, gx)
+                self.erase_hessian = "stashed"
         elif self.params.dynamic_level == self.params.dynamic_lvl_max:
             logger.critical(
                 "\n\t Current algorithm/dynamic_level is %d.\n" % self.params.dynamic_level
@@ -496,7 +514,10 @@ class OptimizationManager(stepAlgorithms.OptimizationInterface):
             logger.warning(
                 "\n\t Increasing dynamic_level algorithm to %d.\n" % self.params.dynamic_level
             )
-            logger.warning("\n\t Erasing old history, hessian, intcos.\n")
+            if remap:
+                logger.warning("\n\t Rebuilding intcos. Carrying over history and hessian.\n")
+            else:
+                logger.warning("\n\t Erasing old history, hessian, intcos.\n")
             eraseIntcos = True
             eraseHistory = True
             self.params.update_dynamic_level_params(self.params.dynamic_level)
@@ -504,15 +525,30 @@ class OptimizationManager(stepAlgorithms.OptimizationInterface):
         logger.info("Printing the parameters %s", self.params)
 
         if eraseIntcos:
+            keep_hessian = remap and isinstance(H, np.ndarray)
+            if keep_hessian:
+                Hx = self.molsys.hessian_to_cartesians(H, -1 * fq)
+                gx = self.molsys.gradient_to_cartesians(-1 * fq)
+
             logger.warning(" Erasing coordinates.\n")
             for f in self.molsys.fragments:
                 del f.intcos[:]
             self.molsys._dimer_intcos = []
             self.erase_hessian = "erased"
 
+            if remap:
+                make_internal_coords(self.molsys, self.params)
+            if keep_hessian:
+                self.H = self.molsys.hessian_to_internals(Hx, gx)
+                self.erase_hessian = "stashed"
+
         if eraseHistory:
-            logger.warning(" Erasing history.\n")
-            self.clear()
+            if remap:
+                logger.warning(" Remapping history to the new coordinates.\n")
+                self.history.remap_internals(self.molsys)
+            else:
+                logger.warning(" Erasing history.\n")
+                self.clear()
             # If a method needs to erase the hessian. erase all intcos and start over
 
             if isinstance(self.opt_method, IRCfollowing.IntrinsicReactionCoordinate):
@@ -562,6 +598,7 @@ class OptimizationManager(stepAlgorithms.OptimizationInterface):
             logger.info("\tOptimization Finished\n" + self.history.summary_string())
 
         qc_output = prepare_opt_output(self.molsys, self.computer, rxnpath=rxnpath, error=error)
+        qc_output["extras"]["timings"] = self.timings.summary()
         self.clear()
 
         if self.params.write_trajectory:
@@ -588,11 +625,14 @@ def optimization_factory(method, molsys, history_object, params=None):
         "IRC": IRCfollowing.IntrinsicReactionCoordinate,
         "CONJUGATE": stepAlgorithms.ConjugateGradient,
         "RS_I_RFO": stepAlgorithms.ImageRFO,
+        "LBFGS": stepAlgorithms.LimitedMemoryBFGS,
+        "GDIIS": stepAlgorithms.RFOGDIIS,
     }
 
     return ALGORITHMS.get(method, stepAlgorithms.RestrictedStepRFO)(molsys, history_object, params)
 
 
+@instrumentation.timed("get_pes_info")
 def get_pes_info(
     H: np.ndarray,
     computer: ComputeWrapper,
@@ -654,6 +694,12 @@ def get_pes_info(
             logger.debug("Computing Hessian")
             H, g_x = get_hess_grad(computer, o_molsys)  # get gradient from hessian
 
+        elif hessian_protocol == "unneeded" and "hessian" not in requires:
+            # SD, CG and L-BFGS. Keep the guess diagonal. No (n, n) matrix is needed
+            logger.debug(f"Guessing Hessian diagonal with {str(params.intrafrag_hess)}")
+            H = DiagonalHessian(hessian.guess_diagonal(o_molsys, guessType=params.intrafrag_hess))
+            result = computer.compute(o_molsys.geom, driver=driver, return_full=False)
+            g_x = np.asarray(result) if driver == "gradient" else None
         elif hessian_protocol in ["guess", "unneeded"]:
             # guess hessian compute gradient
             logger.debug(f"Guessing Hessian with {str(params.intrafrag_hess)}")
@@ -682,10 +728,12 @@ def get_pes_info(
     # Remove incredibly small values. This primarly helps makes tests more consistent.
     # eigensolvers give consistent eigenvectors.
     g_q[np.abs(g_q) < np.finfo(float).resolution] = 0
-    H[np.abs(H) < np.finfo(float).resolution] = 0
 
-    if H.size:
-        logger.info(print_mat_string(H, title="Hessian matrix"))
+    if isinstance(H, HessianForm):
+        logger.info("%s", lazy_array_string(H.diagonal(), title=f"Hessian diagonal ({H.form} form)"))
+    elif H.size:
+        H[np.abs(H) < np.finfo(float).resolution] = 0
+        logger.info("%s", lazy_mat_string(H, title="Hessian matrix"))
 
     return H, g_q, g_x, computer.energies[-1]
 
@@ -720,6 +768,7 @@ def get_hess_grad(computer, o_molsys):
     return H, g_cart
 
 
+@instrumentation.timed("make_internal_coords")
 def make_internal_coords(o_molsys: Molsys, params: op.OptParams):
     """
     Add optimization coordinates to molecule system.
@@ -745,7 +794,7 @@ def make_internal_coords(o_molsys: Molsys, params: op.OptParams):
     connectivity = addIntcos.connectivity_from_distances(
         o_molsys.geom, o_molsys.Z, params.covalent_connect
     )
-    logger.debug("Connectivity Matrix\n" + print_mat_string(connectivity))
+    logger.debug("Connectivity Matrix\n%s", lazy_mat_string(connectivity))
 
     if params.frag_mode == "SINGLE":
         try:
@@ -756,12 +805,12 @@ def make_internal_coords(o_molsys: Molsys, params: op.OptParams):
             o_molsys.augment_connectivity_to_single_fragment(connectivity)
             o_molsys.consolidate_fragments()  # collapse into one frag
 
-            if params.opt_coordinates in ["INTERNAL", "REDUNDANT", "BOTH"]:
+            if params.opt_coordinates in ["INTERNAL", "REDUNDANT", "DELOCALIZED", "BOTH"]:
                 o_molsys.fragments[0].add_intcos_from_connectivity(connectivity)
                 if params.add_auxiliary_bonds:
                     o_molsys.fragments[0].add_auxiliary_bonds(connectivity)
         except AlgError as error:
-            o_molsys.fragments[0]._intcos = []
+            o_molsys.fragments[0].intcos.clear()
             if error.oofp_failures or error.linear_bends or error.linear_torsions:
                 params.opt_coordinates = "CARTESIAN"
 
@@ -781,7 +830,7 @@ def make_internal_coords(o_molsys: Molsys, params: op.OptParams):
                 # between fragments
                 o_molsys.purge_interfragment_connectivity(connectivity)
 
-            if params.opt_coordinates in ["INTERNAL", "REDUNDANT", "BOTH"]:
+            if params.opt_coordinates in ["INTERNAL", "REDUNDANT", "DELOCALIZED", "BOTH"]:
                 for iF, F in enumerate(o_molsys.fragments):
                     C = np.ndarray((F.natom, F.natom))
                     C[:] = connectivity[o_molsys.frag_atom_slice(iF), o_molsys.frag_atom_slice(iF)]
@@ -791,7 +840,7 @@ def make_internal_coords(o_molsys: Molsys, params: op.OptParams):
         except AlgError as error:
             if error.oofp_failures or error.linear_bends or error.linear_torsions:
                 for frag in o_molsys.fragments:
-                    frag._intcos = []
+                    frag.intcos.clear()
                 params.opt_coordinates = "CARTESIAN"
 
         if params.opt_coordinates in ["CARTESIAN", "BOTH"]:
@@ -799,6 +848,16 @@ def make_internal_coords(o_molsys: Molsys, params: op.OptParams):
                 F.add_cartesian_intcos()
 
     addIntcos.add_constrained_intcos(o_molsys, params)  # make sure these are in the set
+
+    o_molsys.active_subspace = params.active_subspace
+    if params.opt_coordinates == "DELOCALIZED" and o_molsys.active_space() is not None:
+        # the active basis is already the nonredundant space of the coordinates that can move
+        logger.info("\tUsing the active subspace in place of delocalized internal coordinates")
+        o_molsys.localize()
+    elif params.opt_coordinates == "DELOCALIZED":
+        o_molsys.delocalize()
+    else:
+        o_molsys.localize()
     return
 
 
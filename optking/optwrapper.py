@@ -12,11 +12,12 @@ from pydantic.v1.error_wrappers import ValidationError as v1ValidationError
 
 import optking
 
-from . import caseInsensitiveDict, molsys
+from . import caseInsensitiveDict, loggingconfig, molsys
 from .compute_wrappers import ComputeWrapper, Psi4Computer, QCEngineComputer, UserComputer
 from .exceptions import OptError
 from .optimize import optimize
 from .printTools import welcome
+from .surrogate import run_surrogate_stage
 from . import log_name
 from . import op
 
@@ -163,7 +164,7 @@ def initialize_from_psi4(calc_name, program, computer_type, dertype=None, **xtra
     return params, o_molsys, computer, opt_input
 
 
-def optimize_qcengine(opt_input, computer_type="qc"):
+def optimize_qcengine(opt_input, computer_type="qc", surrogate=None):
     """Try to optimize, find TS, or find IRC of the system as specifed by a QCSchema
     OptimizationInput.
 
@@ -173,6 +174,9 @@ def optimize_qcengine(opt_input, computer_type="qc"):
         Pydantic Schema of the OptimizationInput model.
         see https://github.com/MolSSI/QCElemental/blob/master/qcelemental/models/procedures.py
     computer_type: str
+    surrogate: Callable, optional
+        cheap potential ``surrogate(geom) -> (E, gX)`` to pre-optimize on before the first QC
+        gradient. Overrides the |surrogate| keyword. See :py:mod:`optking.surrogate`
 
     Returns
     -------
@@ -183,12 +187,22 @@ def optimize_qcengine(opt_input, computer_type="qc"):
     if isinstance(opt_input, OptimizationInput):
         opt_input = json.loads(json_dumps(opt_input))  # Remove numpy elements turn into dictionary
     opt_output = copy.deepcopy(opt_input)
+    surrogate_summary, surrogate_dir = {}, None
+    # the surrogate stage changes the molecule and keywords of its own copy. The result reports
+    # the input as submitted
+    stage_input = opt_input
 
-    # Make basic optking molecular system
-    oMolsys = molsys.Molsys.from_schema(opt_input["initial_molecule"])
     try:
-        initialize_options(opt_input["keywords"])
-        computer = make_computer(opt_input, computer_type)
+        params = initialize_options(opt_input["keywords"])
+        surrogate = surrogate if surrogate is not None else params.surrogate
+        if callable(surrogate) or surrogate != "NONE":
+            stage_input = copy.deepcopy(opt_input)
+            surrogate_summary, surrogate_dir = run_surrogate_stage(stage_input, surrogate, params)
+            initialize_options(stage_input["keywords"], silent=True)
+
+        # Make basic optking molecular system
+        oMolsys = molsys.Molsys.from_schema(stage_input["initial_molecule"])
+        computer = make_computer(stage_input, computer_type)
         opt_output = optimize(oMolsys, computer)
     except Exception as error:
         logger.critical("A critical error has occured: %s - %s", type(error), error, exc_info=True)
@@ -198,7 +212,12 @@ def optimize_qcengine(opt_input, computer_type="qc"):
         }
         logger.critical(f"Error placed in qcschema: {opt_output}")
     finally:
+        if surrogate_dir is not None:
+            surrogate_dir.cleanup()
         opt_input.update(opt_output)
+        if surrogate_summary:
+            opt_input.setdefault("extras", {})
+            opt_input["extras"] = {**(opt_input["extras"] or {}), "surrogate": surrogate_summary}
         opt_input.update({"provenance": optking._optking_provenance_stamp})
         opt_input["provenance"]["routine"] = "optimize_qcengine"
         return opt_input
@@ -238,6 +257,7 @@ def make_computer(opt_input: dict, computer_type):
 
 
 def initialize_options(opt_keys, silent=False):
+    loggingconfig.ensure_configured()
     if not silent:
         logger.info(welcome())
 
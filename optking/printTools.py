@@ -9,7 +9,44 @@ import qcelemental as qcel
 # from sys import stdout
 
 
-def print_mat_string(M, Ncol=7, title=None):
+# Larger matrices and arrays are summarized instead of printed in full. None prints everything
+MAX_PRINT_ELEMENTS = 40000
+# default of max_elements. Stands for MAX_PRINT_ELEMENTS at the time of the call
+_MODULE_MAX = object()
+
+
+class LazyString(object):
+    """Defers building a log message until a handler formats it. Messages for disabled levels
+    are never built.
+
+    >>> logger.debug("Hessian\n%s", LazyString(print_mat_string, H))
+
+    """
+
+    def __init__(self, fn, *args, **kwargs):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self._string = None
+
+    def __str__(self):
+        # every handler formats the record. Build the string once
+        if self._string is None:
+            self._string = str(self.fn(*self.args, **self.kwargs))
+        return self._string
+
+
+def lazy_mat_string(M, Ncol=7, title=None):
+    """``print_mat_string`` as a ``LazyString``"""
+    return LazyString(print_mat_string, M, Ncol=Ncol, title=title)
+
+
+def lazy_array_string(M, Ncol=7, title=None, form=":10.6f"):
+    """``print_array_string`` as a ``LazyString``"""
+    return LazyString(print_array_string, M, Ncol=Ncol, title=title, form=form)
+
+
+def print_mat_string(M, Ncol=7, title=None, max_elements=_MODULE_MAX):
     """Formats a Matrix for Logging or Printing
 
     Parameters
@@ -18,6 +55,9 @@ def print_mat_string(M, Ncol=7, title=None):
 
     title : string, optional
         title to include
+    max_elements : int, optional
+        matrices with more elements are summarized. Default is ``MAX_PRINT_ELEMENTS``. None or 0
+        prints everything
 
     Returns
     -------
@@ -28,23 +68,25 @@ def print_mat_string(M, Ncol=7, title=None):
     # if title != "\n":
     #    title = title + "\n"
     # return np.array2string(M, max_line_width=100, precision=6, prefix=title, suffix="\n")
+    M = np.asarray(M)
     s = "\t"
     if title != None:
         s += title + "\n\t"
-    for row in range(M.shape[0]):
-        tab = 0
-        for col in range(M.shape[1]):
-            tab += 1
-            s += " %10.6f" % M[row, col]
-            if tab == Ncol and col != (M.shape[1] - 1):
-                s += "\n\t"
-                tab = 0
-        s += "\n\t"
+
+    max_elements = MAX_PRINT_ELEMENTS if max_elements is _MODULE_MAX else max_elements
+    if max_elements and M.size > max_elements:
+        return s + _summary_string(M, max_elements)
+
+    rows = []
+    for row in M:
+        entries = [" %10.6f" % value for value in row]
+        rows.append("\n\t".join("".join(entries[i : i + Ncol]) for i in range(0, len(entries), Ncol)))
+    s += "".join(row + "\n\t" for row in rows)
     s = s[:-1]
     return s
 
 
-def print_array_string(M, Ncol=7, title=None, form=":10.6f"):
+def print_array_string(M, Ncol=7, title=None, form=":10.6f", max_elements=_MODULE_MAX):
     """Formats Arrays for Logging or Printing
 
     Parameters
@@ -53,6 +95,9 @@ def print_array_string(M, Ncol=7, title=None, form=":10.6f"):
 
     title="\n" : string
         optional title to include
+    max_elements : int, optional
+        longer arrays are summarized. Default is ``MAX_PRINT_ELEMENTS``. None or 0 prints
+        everything
 
     Returns
     -------
@@ -66,18 +111,33 @@ def print_array_string(M, Ncol=7, title=None, form=":10.6f"):
     s = "\t"
     if title != None:
         s += title + "\n\t\t"
-    tab = 0
+
+    max_elements = MAX_PRINT_ELEMENTS if max_elements is _MODULE_MAX else max_elements
+    if max_elements and len(M) > max_elements:
+        return s + _summary_string(np.asarray(M), max_elements)
+
     formstring = "{" + form + "}"
-    for i, entry in enumerate(M):
-        tab += 1
-        s += formstring.format(entry)
-        if tab == Ncol and i != (len(M) - 1):
-            s += "\n\t\t"
-            tab = 0
+    entries = [formstring.format(entry) for entry in M]
+    s += "\n\t\t".join("".join(entries[i : i + Ncol]) for i in range(0, len(entries), Ncol))
     s += "\n"
     return s
 
 
+def _summary_string(M, max_elements):
+    """Shape and statistics of an array too large to print. Includes the diagonal of a square
+    matrix if it is short enough"""
+    s = "%s array with more than %d elements. min %.6f max %.6f rms %.6f\n" % (
+        M.shape,
+        max_elements,
+        np.min(M),
+        np.max(M),
+        np.sqrt(np.mean(np.square(M))),
+    )
+    if M.ndim == 2 and M.shape[0] == M.shape[1] and M.shape[0] <= max_elements:
+        s += print_array_string(np.diagonal(M), title="Diagonal")
+    return s
+
+
 def print_geom_grad(geom, grad):
     Natom = geom.shape[0]
     geometry = [f"{'Geometry (au)':>22}"]
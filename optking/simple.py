@@ -6,6 +6,12 @@ supported_constraint_types = ("free", "frozen", "ranged")
 
 
 class Simple(ABC):
+    __slots__ = ("_atoms", "_constraint", "_range_min", "_range_max", "_ext_force")
+
+    # incremented whenever a constraint changes or an IntcoSet is modified. Caches that depend on
+    # the coordinates and their constraints (see Molsys._layout) are rebuilt when it changes
+    revision = 0
+
     def __init__(self, atoms, constraint, range_min, range_max, ext_force):
         # these lines use the property's and setters below
         self.atoms = atoms  # atom indices for internal definition
@@ -30,6 +36,21 @@ class Simple(ABC):
             raise OptError("Atoms must be iterable list of whole numbers. Received %s instead", values)
         self._atoms = values
 
+    @property
+    def key(self):
+        """Hashable identity of the coordinate: type and atoms (plus any defining flag in
+        subclasses). Coordinates that compare equal have the same key."""
+        return type(self).__name__, tuple(int(a) for a in self._atoms)
+
+    @property
+    def constraint(self):
+        return self._constraint
+
+    @constraint.setter
+    def constraint(self, value):
+        self._constraint = value
+        Simple.revision += 1
+
     @property
     def frozen(self):
         return self.constraint == "frozen"
@@ -18,6 +18,8 @@ NewtonRaphson
     Extension of QuasiNewtonOptimization
 RestrictedStepRFO
     Default minimization algorithm.
+RFOGDIIS
+    RestrictedStepRFO with GDIIS extrapolation over previous geometries when it is safe
 ImageRFO
     Extension of RestrictedStepRFO for transition state finding
 PartitionedRFO
@@ -26,6 +28,8 @@ SteepestDescent
     Basic gradient descent
 ConjugateGradient
     Three varieties of CG are implemented Fletcher, Descent, and Polak. Fletcher is default.
+LimitedMemoryBFGS
+    Quasi-Newton minimization without a stored Hessian (L-BFGS)
 Linesearch
     1-D linesearch by quadratic fit of energies
 
@@ -54,14 +58,15 @@ from typing import Union
 
 import numpy as np
 
-from . import convcheck
+from . import convcheck, instrumentation
 from .displace import displace_molsys
 from .exceptions import AlgError, OptError
+from .hessianForms import HessianForm
 from .history import History
-from .linearAlgebra import symm_mat_eig
+from .linearAlgebra import abs_max, symm_mat_eig, symm_mat_inv
 from .misc import is_dq_symmetric
 from .molsys import Molsys
-from .printTools import print_array_string, print_mat_string
+from .printTools import lazy_array_string, lazy_mat_string, print_array_string
 from . import log_name
 from . import op
 
@@ -108,7 +113,10 @@ class OptimizationInterface(ABC):
 
         # get gradient and hessian in step direction
         grad = -1 * np.dot(fq, unit_dq)  # gradient, not force
-        hess = np.dot(unit_dq, np.dot(H, unit_dq))
+        if isinstance(H, HessianForm):
+            hess = H.quadratic(unit_dq)
+        else:
+            hess = np.dot(unit_dq, np.dot(H, unit_dq))
 
         logger.info("\t|target step| : %15.10f" % dq_norm)
         logger.info("\tgradient     : %15.10f" % grad)
@@ -180,16 +188,18 @@ class OptimizationAlgorithm(OptimizationInterface):
         )
 
         if self.backstep_needed(fq):
+            instrumentation.count("backsteps")
             dq = self.backstep()
         else:
-            dq = self.step(fq, H)
+            with instrumentation.timer("step"):
+                dq = self.step(fq, H)
 
         if self.trust_radius_on:
             dq = self.apply_intrafrag_step_scaling(dq)
             dq = self.apply_interfrag_step_scaling(dq)
 
         self.molsys.interfrag_dq_discontinuity_correction(dq)
-        achieved_dq, achieved_dx, return_str = displace_molsys(
+        achieved_dq, achieved_dx, *report = displace_molsys(
             self.molsys,
             dq,
             fq,
@@ -214,7 +224,7 @@ class OptimizationAlgorithm(OptimizationInterface):
             raise AlgError("opt.py: Step is far too large.")
 
         if return_str:
-            return achieved_dq, return_str
+            return achieved_dq, report[0]
         return achieved_dq
 
     def apply_intrafrag_step_scaling(self, dq):
@@ -614,6 +624,125 @@ class QuasiNewtonRaphson(QuasiNewtonOptimization):
         return dq
 
 
+class LimitedMemoryBFGS(OptimizationAlgorithm):
+    """Limited memory BFGS. No Hessian is stored, projected, updated or diagonalized.
+
+    Notes
+    -----
+    The inverse Hessian is applied to the gradient with the two loop recursion over the last
+    ``lbfgs_memory`` displacements and gradient changes stored in ``History``. The initial inverse
+    Hessian is P D^-1 P where D is the diagonal guess (``intrafrag_hess``) and P projects out
+    redundancies and constraints, so the step is in the nonredundant, unconstrained space. D is
+    rescaled so that D^-1 reproduces the curvature observed in the most recent step.
+
+    Nocedal, Math. Comp. 35, 773 (1980). Liu and Nocedal, Math. Prog. 45, 503 (1989).
+    """
+
+    def __init__(self, molsys, history, params):
+        super().__init__(molsys, history, params)
+        self.memory = params.lbfgs_memory
+        # curvature of the L-BFGS model along the last step. Used in place of a Hessian
+        self.curvature = None
+
+    def requires(self):
+        return "energy", "gradient", "hessian_diagonal"
+
+    def supports_trust_region(self):
+        return True
+
+    def update_pairs(self):
+        """(dq, dg, 1 / dq.dg) for consecutive steps in history. Pairs that would not keep the
+        inverse Hessian positive definite are skipped. The curvature dq.dg is compared to
+        |dq||dg| rather than to an absolute tolerance since soft (e.g. van der Waals) systems have
+        very small gradient changes"""
+
+        steps = self.history.steps[-(self.memory + 1) :]
+        pairs = []
+        for old, new in zip(steps[:-1], steps[1:]):
+            dq = old.Dq
+            if dq is None or len(dq) != len(new.forces):
+                continue
+
+            dg = old.forces - new.forces  # gradients -- not forces!
+            dqdg = np.dot(dq, dg)
+            dqdq = np.dot(dq, dq)
+            if dqdq < self.params.hess_update_den_tol or dqdg < self.params.hess_update_den_tol * sqrt(
+                dqdq * np.dot(dg, dg)
+            ):
+                logger.debug("\tSkipping L-BFGS pair. Denominators too small or negative")
+                continue
+            if abs_max(dq) > self.params.hess_update_dq_tol:
+                logger.debug("\tSkipping L-BFGS pair. Change in internal coordinates is too large")
+                continue
+            pairs.append((dq, dg, 1 / dqdg))
+
+        logger.info("\tUsing %d previous steps for L-BFGS", len(pairs))
+        return pairs
+
+    def step(self, fq, H, *args, **kwargs):
+        """L-BFGS step dq = -Hinv g.
+
+        Parameters
+        ----------
+        fq: np.ndarray
+            projected forces
+        H: hessianForms.DiagonalHessian
+            diagonal Hessian guess
+        """
+        logger.info("Taking L-BFGS Step")
+
+        # the projector of this step's forces, cached by the molecular system
+        P = self.molsys.projector(fq)
+        # the guess is diagonal so it can't be indefinite. Guard against very small values
+        inv_diag = 1 / np.maximum(H.values, 1.0e-4)
+
+        pairs = self.update_pairs()
+        q = -fq
+        alphas = []
+        for dq, dg, rho in reversed(pairs):
+            alpha = rho * np.dot(dq, q)
+            q -= alpha * dg
+            alphas.append(alpha)
+
+        if pairs:
+            # rescale the guess to match the curvature of the latest step (Liu and Nocedal)
+            dq, dg, rho = pairs[-1]
+            inv_diag *= 1 / (rho * np.dot(dg, inv_diag * dg))
+
+        r = P @ (inv_diag * q)
+        for (dq, dg, rho), alpha in zip(pairs, reversed(alphas)):
+            beta = rho * np.dot(dg, r)
+            r += (alpha - beta) * dq
+
+        dq = -r
+        if np.dot(fq, dq) <= 0:
+            logger.warning("\tL-BFGS step is not downhill. Restarting from the diagonal guess")
+            dq = P @ (inv_diag * fq)
+
+        self.curvature = np.dot(fq, dq) / np.dot(dq, dq)
+        return dq
+
+    def step_metrics(self, dq, fq, H):
+        """The Hessian in the step direction is the curvature of the L-BFGS model. The diagonal
+        guess is used if no L-BFGS step has been taken yet (e.g. a backstep after a restart)"""
+        dq_norm = sqrt(np.dot(dq, dq))
+        unit_dq = dq / dq_norm
+
+        grad = -1 * np.dot(fq, unit_dq)  # gradient, not force
+        hess = self.curvature if self.curvature is not None else H.quadratic(unit_dq)
+
+        logger.info("\t|target step| : %15.10f" % dq_norm)
+        logger.info("\tgradient     : %15.10f" % grad)
+        logger.info("\thessian      : %15.10f" % hess)
+
+        return dq_norm, unit_dq, grad, hess
+
+    def expected_energy(self, dq, fq, H):
+        """Quadratic energy model"""
+        dq_norm, unit_dq, proj_grad, proj_hess = self.step_metrics(dq, fq, H)
+        return dq_norm * proj_grad + 0.5 * dq_norm**2 * proj_hess
+
+
 class RFO(QuasiNewtonOptimization, ABC):
     """Standard RFO and base class for RS_RFO, P_RFO, RS_PRFO #TODO"""
 
@@ -678,13 +807,19 @@ class RestrictedStepRFO(RFO):
 
         logger.debug("\tTaking RFO optimization step.")
 
+        # Solve only in the totally symmetric block (with a point group) or the delocalized
+        # internal coordinates. dq is transformed back below
+        basis = self.molsys.step_basis()
+        if basis is not None:
+            fq, H = basis.T @ fq, basis.T @ H @ basis
+
         # Build the original, unscaled RFO matrix.
         RFOmat = RFO.build_rfo_matrix(0, len(H), fq, H)  # use entire hessian for RFO matrix
 
         if self.params.simple_step_scaling:
             e_vectors, e_values = self._intermediate_normalize(RFOmat)
             rfo_root = self._select_rfo_root(
-                self.history.steps[-2].followedUnitVector,
+                self._previous_rfo_vector(basis),
                 e_vectors,
                 e_values,
                 fq,
@@ -694,14 +829,24 @@ class RestrictedStepRFO(RFO):
             converged = False
         else:
             # converge alpha to select step length. Same procedure as above.
-            converged, dq = self._solve_rs_rfo(RFOmat, H, fq)
+            converged, dq = self._solve_rs_rfo(RFOmat, H, fq, basis)
+
+        if basis is not None:
+            dq = basis @ dq
 
         # if converged, trust radius has already been applied through alpha
         self.trust_radius_on = not converged
-        logger.debug("\tFinal scaled step dq:\n\n\t" + print_array_string(dq))
+        logger.debug("\tFinal scaled step dq:\n\n\t%s", lazy_array_string(dq))
         return dq
 
-    def _solve_rs_rfo(self, RFOmat, H, fq):
+    def _previous_rfo_vector(self, basis=None):
+        """RFO vector of the previous step, in the basis of step if given"""
+        vector = self.history.steps[-2].followedUnitVector
+        if basis is not None and len(vector):
+            vector = basis.T @ vector
+        return vector
+
+    def _solve_rs_rfo(self, RFOmat, H, fq, basis=None):
         """Performs an iterative process to determine alpha step scaling parameter and"""
 
         converged = False
@@ -716,7 +861,7 @@ class RestrictedStepRFO(RFO):
         last_evect = np.zeros(dim)
         if self.params.rfo_follow_root and len(self.history.steps) > 1:
             # RFO vector from previous geometry step
-            last_evect[:] = self.history.steps[-2].followedUnitVector
+            last_evect[:] = self._previous_rfo_vector(basis)
         rfo_step_report = ""
 
         # initialize to last step. Will be initialized to meaningful step or OptError will be
@@ -861,18 +1006,15 @@ class RestrictedStepRFO(RFO):
         SRFOevects = np.transpose(scale_mat @ np.transpose(SRFOevects))
 
         if self.print_lvl >= 4:
-            logger.debug("\tScaled RFO matrix.\n\n" + print_mat_string(SRFOmat))
-            logger.debug("\tEigenvectors of scaled RFO matrix.\n\n" + print_mat_string(SRFOevects))
-            logger.debug(
-                "\tEigenvalues of scaled RFO matrix.\n\n\t" + print_array_string(SRFOevals)
-            )
+            logger.debug("\tScaled RFO matrix.\n\n%s", lazy_mat_string(SRFOmat))
+            logger.debug("\tEigenvectors of scaled RFO matrix.\n\n%s", lazy_mat_string(SRFOevects))
+            logger.debug("\tEigenvalues of scaled RFO matrix.\n\n\t%s", lazy_array_string(SRFOevals))
             logger.debug(
-                "\tFirst eigenvector (unnormalized) of scaled RFO matrix.\n\n\t"
-                + print_array_string(SRFOevects[0])
+                "\tFirst eigenvector (unnormalized) of scaled RFO matrix.\n\n\t%s",
+                lazy_array_string(SRFOevects[0]),
             )
             logger.debug(
-                "\tAll intermediate normalized eigenvectors (rows).\n\n"
-                + print_mat_string(SRFOevects)
+                "\tAll intermediate normalized eigenvectors (rows).\n\n%s", lazy_mat_string(SRFOevects)
             )
 
         return SRFOevals, SRFOevects
@@ -929,7 +1071,7 @@ class RestrictedStepRFO(RFO):
             logger.info("\tUsing RFO solution %d." % (rfo_root + 1))
 
         # Print only the lowest eigenvalues/eigenvectors
-        if self.params.print_lvl >= 2:
+        if self.params.print_lvl >= 2 and logger.isEnabledFor(logging.INFO):
             for i, eigval in enumerate(SRFOevals):
                 if i >= self.rfo_root and eigval > -1e-6:
                     break
@@ -945,7 +1087,7 @@ class RestrictedStepRFO(RFO):
 
     def _check_rfo_eigenvector(self, vector, fq, index):
         """Check whether eigenvector of RFO matrix is numerically acceptable for following and of
-        proper symmetry. Double checks max values #TODO add real symmetry check
+        proper symmetry. Double checks max values
 
         Parameters
         ----------
@@ -959,11 +1101,11 @@ class RestrictedStepRFO(RFO):
             logger.warning("\tRejecting RFO root %d because %s", index + 1, mesg)
             return False
 
-        # Check symmetry of root. Leave True if unessecary. Not currently functioning
+        # Check symmetry of root. Roots in the symmetric block (see step) need no check
         symmetric = (
-            True
-            if not self.params.accept_symmetry_breaking
-            else is_dq_symmetric(self.molsys, vector[:-1])
+            self.params.accept_symmetry_breaking
+            or len(vector) - 1 != self.molsys.num_intcos
+            or is_dq_symmetric(self.molsys, vector[:-1])
         )
 
         if not symmetric:
@@ -983,6 +1125,120 @@ class RestrictedStepRFO(RFO):
         return True
 
 
+class RFOGDIIS(RestrictedStepRFO):
+    """Geometry DIIS with RS-RFO as the fallback.
+
+    Notes
+    -----
+    The RS-RFO step is always computed. The new geometry is also extrapolated from the last
+    ``gdiis_max_vectors`` points in history using the quasi-Newton steps e_i = H^-1 f_i as error
+    vectors (Csaszar and Pulay, J. Mol. Struct. 114, 31 (1984)). The GDIIS step replaces the
+    RS-RFO step only if it passes the checks of Farkas and Schlegel, PCCP 4, 11 (2002): the
+    coefficients are not too large, the step is not much longer than the RS-RFO step, and the
+    angle to the RS-RFO step is small. Fewer points are tried before giving up.
+    """
+
+    # minimum cos(angle) between the GDIIS and RS-RFO steps for 2, 3, ... 9+ points
+    cos_thresholds = (0.97, 0.84, 0.71, 0.67, 0.62, 0.56, 0.49, 0.41)
+    max_coefficient_sum = 10.0
+    max_step_ratio = 10.0
+
+    def __init__(self, molsys, history, params):
+        super().__init__(molsys, history, params)
+        self.max_vectors = params.gdiis_max_vectors
+        self.diis_step = False
+
+    def step(self, fq, H, *args, **kwargs):
+        rfo_dq = super().step(fq, H)
+        self.diis_step = False
+
+        # extrapolate only in the quadratic region: the energy went down and RS-RFO did not need
+        # to restrict its step. Otherwise the RS-RFO step (and trust radius) is the safer choice
+        if len(self.history.steps) < 2 or self.history.steps[-1].E > self.history.steps[-2].E:
+            return rfo_dq
+        if np.linalg.norm(rfo_dq) > 0.5 * self.params.intrafrag_trust:
+            return rfo_dq
+
+        # (q_i - q_current, f_i) for the most recent points, newest first
+        points = self.diis_points(fq)
+        if len(points) < 2:
+            return rfo_dq
+
+        Hinv = symm_mat_inv(H, redundant=True)
+        for npoints in range(len(points), 1, -1):
+            dq = self.gdiis_step(points[:npoints], Hinv, rfo_dq)
+            if dq is not None:
+                logger.info("\tTaking GDIIS step from %d points", npoints)
+                self.diis_step = True
+                # GDIIS step is subject to the usual trust radius scaling
+                self.trust_radius_on = True
+                return dq
+
+        logger.info("\tGDIIS extrapolation rejected. Taking RS-RFO step")
+        return rfo_dq
+
+    def diis_points(self, fq):
+        """Positions relative to the current geometry and forces of previous points. Positions are
+        accumulated from the achieved steps so that they share the current coordinate set."""
+
+        points = [(np.zeros(len(fq)), fq)]
+        position = np.zeros(len(fq))
+        for step in reversed(self.history.steps[-self.max_vectors : -1]):
+            if step.Dq is None or len(step.Dq) != len(fq) or len(step.forces) != len(fq):
+                break
+            position = position - step.Dq
+            points.append((position, step.forces))
+        return points
+
+    def gdiis_step(self, points, Hinv, rfo_dq):
+        """Extrapolated step from points or None if the extrapolation is unsafe"""
+
+        npoints = len(points)
+        errors = np.array([Hinv @ forces for _, forces in points])
+
+        # DIIS equations. Minimize |sum_i c_i e_i| subject to sum_i c_i = 1
+        B = np.ones((npoints + 1, npoints + 1))
+        B[-1, -1] = 0
+        B[:-1, :-1] = errors @ errors.T
+        rhs = np.zeros(npoints + 1)
+        rhs[-1] = 1
+
+        # scale the error matrix for conditioning. The last row is the constraint
+        scale = np.max(np.abs(np.diag(B)[:-1]))
+        if scale <= 0:
+            return None
+        B[:-1, :-1] /= scale
+
+        try:
+            coefficients = np.linalg.solve(B, rhs)[:-1]
+        except np.linalg.LinAlgError:
+            logger.debug("\tGDIIS equations with %d points are singular", npoints)
+            return None
+
+        if np.sum(np.abs(coefficients)) > self.max_coefficient_sum:
+            logger.debug("\tGDIIS coefficients too large: %s", coefficients)
+            return None
+
+        # step from the interpolated geometry with the interpolated Newton step
+        positions = np.array([position for position, _ in points])
+        dq = coefficients @ (positions + errors)
+
+        dq_norm = np.linalg.norm(dq)
+        rfo_norm = np.linalg.norm(rfo_dq)
+        if dq_norm == 0 or rfo_norm == 0 or dq_norm > self.max_step_ratio * rfo_norm:
+            logger.debug("\tGDIIS step length %10.5f is unreasonable", dq_norm)
+            return None
+
+        cos_angle = np.dot(dq, rfo_dq) / (dq_norm * rfo_norm)
+        threshold = self.cos_thresholds[min(npoints, len(self.cos_thresholds) + 1) - 2]
+        if cos_angle < threshold:
+            logger.debug("\tGDIIS step too far from the RS-RFO step. cos = %8.5f", cos_angle)
+            return None
+
+        logger.debug("\tGDIIS coefficients: %s", coefficients)
+        return dq
+
+
 class PartitionedRFO(RFO):
     """Partitions the gradient augmented Hessian into eigenvectors to maximize along (direction of the TS)
     and minimize along all other directions. Rational Function or (2x2 Pade approximation)"""
@@ -999,8 +1255,8 @@ class PartitionedRFO(RFO):
         hess_diag = np.diag(h_eig_values)
 
         if self.print_lvl > 2:
-            logger.info("\tEigenvalues of Hessian\n\n\t%s", print_array_string(h_eig_values))
-            logger.info("\tEigenvectors of Hessian (rows)\n%s", print_mat_string(h_eig_vectors))
+            logger.info("\tEigenvalues of Hessian\n\n\t%s", lazy_array_string(h_eig_values))
+            logger.info("\tEigenvectors of Hessian (rows)\n%s", lazy_mat_string(h_eig_vectors))
             logger.debug(
                 "\tFor P-RFO, assuming rfo_root=1, maximizing along lowest eigenvalue of Hessian."
             )
@@ -1012,25 +1268,23 @@ class PartitionedRFO(RFO):
         # number of degrees along which to maximize; assume 1 for now
         mu = 1
         fq_prime = np.dot(h_eig_vectors, fq)  # gradient transformation
-        logger.info(
-            "\tInternal forces in au, in Hevect basis:\n\n\t" + print_array_string(fq_prime)
-        )
+        logger.info("\tInternal forces in au, in Hevect basis:\n\n\t%s", lazy_array_string(fq_prime))
 
         # Build RFO max and Min. Augments each partition of Hessian with corresponding gradient values
         # The lowest mu eigenvalues / vectors will be maximized along. All others will be minimized
         maximize_rfo = RFO.build_rfo_matrix(rfo_root, mu, fq_prime, hess_diag)
         minimize_rfo = RFO.build_rfo_matrix(mu, hdim, fq_prime, hess_diag)
-        logger.info("\tRFO max\n%s", print_mat_string(maximize_rfo))
-        logger.info("\tRFO min\n%s", print_mat_string(minimize_rfo))
+        logger.info("\tRFO max\n%s", lazy_mat_string(maximize_rfo))
+        logger.info("\tRFO min\n%s", lazy_mat_string(minimize_rfo))
 
         rfo_max_evals, rfo_max_evects = symm_mat_eig(maximize_rfo)
         rfo_min_evals, rfo_min_evects = symm_mat_eig(minimize_rfo)
         rfo_max_evects = self._intermediate_normalize(rfo_max_evects)
         rfo_min_evects = self._intermediate_normalize(rfo_min_evects)
-        logger.info("\tRFO min eigenvalues:\n\n\t%s" + print_array_string(rfo_min_evals))
-        logger.info("\tRFO max eigenvalues:\n\n\t%s" + print_array_string(rfo_max_evals))
-        logger.debug("\tRFO max eigenvectors (rows):\n%s", print_mat_string(rfo_max_evects))
-        logger.debug("\tRFO min eigenvectors (rows):\n%s", print_mat_string(rfo_min_evects))
+        logger.info("\tRFO min eigenvalues:\n\n\t%s", lazy_array_string(rfo_min_evals))
+        logger.info("\tRFO max eigenvalues:\n\n\t%s", lazy_array_string(rfo_max_evals))
+        logger.debug("\tRFO max eigenvectors (rows):\n%s", lazy_mat_string(rfo_max_evects))
+        logger.debug("\tRFO min eigenvectors (rows):\n%s", lazy_mat_string(rfo_min_evects))
 
         p_vec = rfo_max_evects[mu, :mu]
         n_vec = rfo_min_evects[rfo_root, : hdim - mu]
@@ -1042,10 +1296,8 @@ class PartitionedRFO(RFO):
 
         prfo_step = np.dot(h_eig_vectors.transpose(), prfo_evect)
 
-        logger.info(
-            "\tRFO step in Hessian Eigenvector Basis\n\n\t" + print_array_string(prfo_evect)
-        )
-        logger.info("\tRFO step in original Basis\n\n\t" + print_array_string(prfo_step))
+        logger.info("\tRFO step in Hessian Eigenvector Basis\n\n\t%s", lazy_array_string(prfo_evect))
+        logger.info("\tRFO step in original Basis\n\n\t%s", lazy_array_string(prfo_step))
 
         return prfo_step
 
@@ -1082,7 +1334,7 @@ class ImageRFO(RestrictedStepRFO):
     def step(self, fq, H, *args, **kwargs):
         H_evals, H_evects = symm_mat_eig(H)
 
-        logger.info("Hessian eigenvalues %s", print_array_string(H_evals))
+        logger.info("Hessian eigenvalues %s", lazy_array_string(H_evals))
 
         # Takes the smallest eigenvalue and the smallest eigenvector and transforms the gradient
         # and hessian so that the reaction mode is being minimized not maximimized
@@ -1100,7 +1352,7 @@ class ImageRFO(RestrictedStepRFO):
         H_image = householder_op @ H
 
         logger.debug("eigenvalue of inverted mode is %s", self.h_tv)
-        logger.debug("Forces transformed with image function %s", print_array_string(fq_image))
+        logger.debug("Forces transformed with image function %s", lazy_array_string(fq_image))
 
         # Use entire matrix 0, len(H). No need to partition
         RFO_image_mat = RFO.build_rfo_matrix(0, len(H), fq_image, H_image)
@@ -1123,7 +1375,7 @@ class ImageRFO(RestrictedStepRFO):
 
         # if converged, trust radius has already been applied through alpha
         self.trust_radius_on = not converged
-        logger.debug("\tFinal scaled step dq:\n\n\t" + print_array_string(dq))
+        logger.debug("\tFinal scaled step dq:\n\n\t%s", lazy_array_string(dq))
         return dq
 
     # def expected_energy(self, dq, fq, H):
@@ -1226,7 +1478,7 @@ def step_matches_forces(dq: np.ndarray, fq: np.ndarray):
     if not np.allclose(dq[indices], 0.0, rtol=0.0, atol=1e-4):
         logger.debug(
             "The step has a non-zero component along a coordinate with near-zero force %s",
-            print_array_string(dq, form=":10.12f"),
+            lazy_array_string(dq, form=":10.12f"),
         )
         return False
 
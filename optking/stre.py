@@ -30,6 +30,8 @@ class Stre(Simple):
         class for evaluating additional external force
     """
 
+    __slots__ = ("_inverse",)
+
     def __init__(
         self,
         a,
@@ -82,6 +84,10 @@ class Stre(Simple):
         else:
             return True
 
+    @property
+    def key(self):
+        return super().key + (self.inverse,)
+
     @property
     def inverse(self):
         return self._inverse
@@ -268,6 +274,8 @@ class Stre(Simple):
 
 
 class HBond(Stre):
+    __slots__ = ()
+
     def __str__(self):
         if self.frozen:
             s = "*"
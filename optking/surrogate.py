@@ -0,0 +1,323 @@
+"""Cheap surrogate potentials and the surrogate pre-optimization stage.
+
+Poor starting structures can cost many QC gradients before the optimizer reaches the quadratic
+region. With |surrogate| set (or a callable passed to ``optimize_qcengine``), the geometry is first
+optimized on a cheap potential. The QC stage then starts from the surrogate minimum and, with
+|surrogate_hessian|, from the Cartesian Hessian of the surrogate at that point.
+
+A surrogate is any callable ``surrogate(geom) -> (E, gX)`` taking the (natom, 3) geometry in bohr
+and returning the energy (hartree) and the (3 natom, ) gradient. If the callable also has a
+``hessian(geom)`` method it is used for the Hessian, otherwise the gradient is finite differenced.
+"""
+
+import json
+import logging
+import pathlib
+import tempfile
+from itertools import combinations
+
+import numpy as np
+import qcelemental as qcel
+
+from .addIntcos import connectivity_from_distances
+from .exceptions import AlgError, OptError
+from . import log_name
+
+logger = logging.getLogger(f"{log_name}{__name__}")
+
+# UFF well depths (kcal/mol). Rappe et al. J. Am. Chem. Soc. 114, 10024 (1992)
+LJ_EPSILON_KCAL = {
+    1: 0.044, 2: 0.056, 5: 0.180, 6: 0.105, 7: 0.069, 8: 0.060, 9: 0.050, 10: 0.042, 14: 0.402,
+    15: 0.305, 16: 0.274, 17: 0.227, 18: 0.185, 35: 0.251, 36: 0.220, 53: 0.339, 54: 0.332,
+}
+LJ_EPSILON_KCAL_DEFAULT = 0.1
+# force constants (hartree / bohr^2 and hartree) of the FF surrogate. Lindh's k_r and k_phi
+FF_K_STRE = 0.45
+FF_K_BEND = 0.15
+# step (bohr) for the finite difference Hessian of a surrogate
+FD_STEP = 0.005
+# smallest curvature (hartree / bohr^2) of internal motions in the Hessian passed to the QC stage.
+# Surrogates may be nearly flat along some coordinates (e.g. torsions in the FF surrogate)
+MIN_CURVATURE = 0.005
+
+_KEYWORDS_NOT_PASSED = ("surrogate", "cart_hess_read", "hessian_file", "full_hess_every", "geom_maxiter")
+
+
+def lj_parameters(Z):
+    """Per-element Lennard-Jones sigma (bohr) and epsilon (hartree).
+
+    sigma puts the minimum of each homonuclear pair at twice the van der Waals radius. epsilon is
+    the UFF well depth (0.1 kcal/mol for elements without one).
+
+    Returns
+    -------
+    tuple(np.ndarray, np.ndarray)
+        (natom, ) sigma and epsilon
+    """
+    radii = np.array([qcel.vdwradii.get(z, missing=2.0 / qcel.constants.bohr2angstroms) for z in Z])
+    sigma = 2.0 * radii / 2 ** (1 / 6)
+    kcal = np.array([LJ_EPSILON_KCAL.get(z, LJ_EPSILON_KCAL_DEFAULT) for z in Z])
+    epsilon = kcal / qcel.constants.hartree2kcalmol
+    return sigma, epsilon
+
+
+def lennard_jones(geom, sigma, epsilon, include=None):
+    """Lennard-Jones energy and gradient with Lorentz-Berthelot mixing
+
+    Parameters
+    ----------
+    geom : np.ndarray
+        (natom, 3)
+    sigma, epsilon : np.ndarray
+        (natom, ) per atom parameters
+    include : np.ndarray, optional
+        (natom, natom) boolean. Pairs to include. Default is all pairs
+
+    Returns
+    -------
+    tuple(float, np.ndarray)
+        energy and (3 natom, ) gradient
+    """
+    geom = np.asarray(geom, dtype=float).reshape(-1, 3)
+    i, j = np.triu_indices(len(geom), 1)
+    if include is not None:
+        keep = include[i, j]
+        i, j = i[keep], j[keep]
+
+    v = geom[j] - geom[i]
+    r = np.linalg.norm(v, axis=1)
+    s6 = ((sigma[i] + sigma[j]) / 2 / r) ** 6
+    eps = np.sqrt(epsilon[i] * epsilon[j])
+
+    E = np.sum(4 * eps * (s6 * s6 - s6))
+    dVdr = 4 * eps * (-12 * s6 * s6 + 6 * s6) / r
+    force = (dVdr / r)[:, None] * v
+    gradient = np.zeros_like(geom)
+    np.add.at(gradient, i, -force)
+    np.add.at(gradient, j, force)
+    return E, gradient.ravel()
+
+
+class LennardJonesSurrogate:
+    """Lennard-Jones between all atoms with per-element parameters (see lj_parameters())"""
+
+    def __init__(self, Z):
+        self.sigma, self.epsilon = lj_parameters(Z)
+
+    def __call__(self, geom):
+        return lennard_jones(geom, self.sigma, self.epsilon)
+
+
+class ForceFieldSurrogate:
+    """Simple force field for covalent molecules.
+
+    Bonds are taken from the starting geometry (``addIntcos.connectivity_from_distances``). Each
+    bond is harmonic about the sum of covalent radii. Each angle is harmonic in its cosine about
+    the starting value, so only the bond lengths and nonbonded contacts are corrected. Atoms more
+    than two bonds apart interact through ``lennard_jones``.
+
+    Parameters
+    ----------
+    geom : np.ndarray
+        (natom, 3) starting geometry
+    Z : list[int]
+    """
+
+    def __init__(self, geom, Z):
+        geom = np.asarray(geom, dtype=float).reshape(-1, 3)
+        connectivity = connectivity_from_distances(geom, Z)
+
+        self.bonds = np.argwhere(np.triu(connectivity))
+        radii = np.array([qcel.covalentradii.get(z, missing=4.0) for z in Z])
+        self.r0 = radii[self.bonds[:, 0]] + radii[self.bonds[:, 1]]
+
+        angles = [
+            (a, center, c)
+            for center in range(len(Z))
+            for a, c in combinations(np.flatnonzero(connectivity[center]), 2)
+        ]
+        self.angles = np.array(angles, dtype=int).reshape(-1, 3)
+        self.cos0 = self._cos(geom)[0]
+
+        bonded = connectivity.astype(int)
+        within_two = (bonded + bonded @ bonded) > 0
+        np.fill_diagonal(within_two, True)
+        self.nonbonded = ~within_two
+        self.sigma, self.epsilon = lj_parameters(Z)
+
+    def _cos(self, geom):
+        """cosines of the angles and their derivatives (nangle, 3, 3)"""
+        a, b, c = self.angles.T
+        u = geom[a] - geom[b]
+        v = geom[c] - geom[b]
+        r_u = np.linalg.norm(u, axis=1)[:, None]
+        r_v = np.linalg.norm(v, axis=1)[:, None]
+        u /= r_u
+        v /= r_v
+        cos = np.einsum("ij,ij->i", u, v)
+        d_a = (v - cos[:, None] * u) / r_u
+        d_c = (u - cos[:, None] * v) / r_v
+        return cos, np.stack((d_a, -d_a - d_c, d_c), axis=1)
+
+    def __call__(self, geom):
+        geom = np.asarray(geom, dtype=float).reshape(-1, 3)
+        E, gradient = lennard_jones(geom, self.sigma, self.epsilon, self.nonbonded)
+        gradient = gradient.reshape(-1, 3)
+
+        a, b = self.bonds.T
+        v = geom[a] - geom[b]
+        r = np.linalg.norm(v, axis=1)
+        E += 0.5 * FF_K_STRE * np.sum((r - self.r0) ** 2)
+        force = (FF_K_STRE * (r - self.r0) / r)[:, None] * v
+        np.add.at(gradient, a, force)
+        np.add.at(gradient, b, -force)
+
+        if len(self.angles):
+            cos, dcos = self._cos(geom)
+            E += 0.5 * FF_K_BEND * np.sum((cos - self.cos0) ** 2)
+            np.add.at(gradient, self.angles, (FF_K_BEND * (cos - self.cos0))[:, None, None] * dcos)
+        return E, gradient.ravel()
+
+
+def make_surrogate(surrogate, geom, Z):
+    """Callable surrogate from the |surrogate| keyword ("LJ" or "FF") or a user callable"""
+    if callable(surrogate):
+        return surrogate
+    if surrogate.upper() == "LJ":
+        return LennardJonesSurrogate(Z)
+    if surrogate.upper() == "FF":
+        return ForceFieldSurrogate(geom, Z)
+    raise OptError(f"Unknown surrogate potential {surrogate}")
+
+
+def cartesian_hessian(surrogate, geom):
+    """Cartesian Hessian of a surrogate. Central differences of the gradient unless the surrogate
+    provides ``hessian(geom)``"""
+    geom = np.asarray(geom, dtype=float).reshape(-1, 3)
+    if hasattr(surrogate, "hessian"):
+        return np.asarray(surrogate.hessian(geom), dtype=float).reshape(geom.size, geom.size)
+
+    H = np.zeros((geom.size, geom.size))
+    for xyz in range(geom.size):
+        displaced = geom.ravel().copy()
+        displaced[xyz] += FD_STEP
+        g_plus = surrogate(displaced.reshape(-1, 3))[1]
+        displaced[xyz] -= 2 * FD_STEP
+        g_minus = surrogate(displaced.reshape(-1, 3))[1]
+        H[xyz] = (np.asarray(g_plus) - np.asarray(g_minus)) / (2 * FD_STEP)
+    return (H + H.T) / 2
+
+
+def condition_hessian(H, geom, min_curvature=MIN_CURVATURE):
+    """Remove translations and rotations from a Cartesian Hessian and raise the curvature of all
+    other motions to at least min_curvature"""
+    geom = np.asarray(geom, dtype=float).reshape(-1, 3)
+    centered = geom - geom.mean(axis=0)
+    rigid = np.zeros((geom.size, 6))
+    for xyz in range(3):
+        rigid[xyz::3, xyz] = 1
+        rigid[:, 3 + xyz] = np.cross(np.eye(3)[xyz], centered).ravel()
+    U, svals, _ = np.linalg.svd(rigid, full_matrices=False)
+    rigid = U[:, svals > 1.0e-8 * svals[0]]  # 5 for linear molecules
+
+    Q = np.eye(geom.size) - rigid @ rigid.T
+    evals, evects = np.linalg.eigh(Q @ H @ Q)
+    internal = np.linalg.norm(rigid.T @ evects, axis=0) < 0.5
+    evals = np.where(internal, np.maximum(evals, min_curvature), 0)
+    return (evects * evals) @ evects.T
+
+
+def pre_optimize(molecule, keywords, surrogate, params):
+    """Optimize on a surrogate potential with a CustomHelper.
+
+    Parameters
+    ----------
+    molecule : dict
+        QCSchema molecule
+    keywords : dict
+        optking keywords of the full optimization. Constraints and algorithm choices are kept
+    surrogate : Union[str, Callable]
+    params : op.OptParams
+        parsed keywords (for the surrogate_* options)
+
+    Returns
+    -------
+    tuple(np.ndarray, Union[np.ndarray, None], dict)
+        geometry (natom, 3) and Cartesian Hessian (None unless |surrogate_hessian|) at the end of
+        the surrogate stage and a summary
+    """
+    from .opt_helper import CustomHelper
+
+    stage_keywords = {
+        key: val
+        for key, val in keywords.items()
+        if key.lower() not in _KEYWORDS_NOT_PASSED and "g_convergence" not in key.lower()
+    }
+    stage_keywords.update(
+        {"g_convergence": params.surrogate_g_convergence, "geom_maxiter": params.surrogate_geom_maxiter}
+    )
+
+    opt = CustomHelper(molecule, stage_keywords, silent=True)
+    fn = make_surrogate(surrogate, opt.geom, opt.molsys.Z)
+    converged = False
+    step = 0
+    for step in range(1, params.surrogate_geom_maxiter + 1):
+        E, gX = fn(opt.geom)
+        opt.E, opt.gX = float(E), np.asarray(gX, dtype=float)
+        try:
+            opt.compute()
+            opt.take_step()
+        except (AlgError, OptError) as error:
+            logger.warning("\tSurrogate optimization stopped at step %d: %s", step, error)
+            break
+        converged = opt.test_convergence() is True
+        if converged:
+            break
+
+    geom = np.array(opt.geom)
+    energies = [float(E) for E in opt.computer.energies]
+    opt.close()
+
+    if not converged:
+        logger.warning("\tSurrogate optimization did not converge in %d steps. Using its last geometry", step)
+    logger.info("\tSurrogate stage: %d steps. Energy %.10f -> %.10f", step, energies[0], energies[-1])
+
+    H = condition_hessian(cartesian_hessian(fn, geom), geom) if params.surrogate_hessian else None
+    summary = {"converged": converged, "steps": step, "energies": energies}
+    return geom, H, summary
+
+
+def run_surrogate_stage(opt_input, surrogate, params):
+    """Pre-optimize ``opt_input`` in place on the surrogate and point the QC stage at the result.
+
+    The initial molecule is replaced by the surrogate minimum. If a Hessian is passed on, it is
+    written as a QCSchema-like json file and read through |cart_hess_read| and |hessian_file|.
+
+    Returns
+    -------
+    tuple(dict, Union[tempfile.TemporaryDirectory, None])
+        summary of the surrogate stage and the directory holding the Hessian (to be cleaned up by
+        the caller after the optimization)
+    """
+    if params.opt_type != "MIN":
+        logger.warning("\tSurrogate pre-optimization is only available for minimizations. Skipping")
+        return {}, None
+
+    molecule = opt_input["initial_molecule"]
+    geom, H, summary = pre_optimize(molecule, opt_input["keywords"], surrogate, params)
+    molecule["geometry"] = geom.ravel().tolist()
+
+    user_hessian = params.cart_hess_read or params.full_hess_every > -1
+    if H is None or user_hessian:
+        return summary, None
+
+    tmpdir = tempfile.TemporaryDirectory()
+    hessian_file = pathlib.Path(tmpdir.name) / "surrogate_hessian.json"
+    with hessian_file.open("w") as f:
+        json.dump({"return_result": H.tolist(), "molecule": {"symbols": molecule["symbols"]}}, f)
+    keywords = {
+        key: val for key, val in opt_input["keywords"].items() if key.lower() not in ("cart_hess_read", "hessian_file")
+    }
+    keywords.update({"cart_hess_read": True, "hessian_file": str(hessian_file)})
+    opt_input["keywords"] = keywords
+    return summary, tmpdir
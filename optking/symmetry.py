@@ -0,0 +1,372 @@
+"""Point group detection and the totally symmetric displacements of a molecule.
+
+``find_point_group`` looks for symmetry operations among rotations about, and reflections through
+planes perpendicular to, axes suggested by the geometry (principal axes of inertia, atoms, and the
+midpoints and differences of equivalent atoms). The operations found are closed into a group, so
+operations about axes that are not tried directly (e.g. the C3 axes of an octahedron) are found
+as products.
+
+With ``use_symmetry`` the ``Molsys`` keeps the ``PointGroup`` of the starting geometry. Steps that
+start at a symmetric geometry and follow the (symmetric) forces stay in the totally symmetric
+subspace of the internal coordinates. ``Molsys.projection_matrix`` therefore projects onto that
+subspace instead of the full nonredundant space, RS-RFO is solved in it, and the BFGS-type updates
+only see symmetric steps and gradient changes. The geometry is symmetrized after every step to
+remove the numerical noise of the back-transformation.
+
+A symmetric geometry has a totally symmetric gradient, so finite differences of the energy are
+only needed along the totally symmetric Cartesian displacements (``findif_displacements`` and
+``findif_gradient``).
+"""
+
+import logging
+from fractions import Fraction
+from itertools import combinations
+
+import numpy as np
+
+from . import log_name
+
+logger = logging.getLogger(f"{log_name}{__name__}")
+
+# highest order of the rotation axes that are tried. Higher orders are found through products
+MAX_AXIS_ORDER = 6
+# largest point group (Ih)
+MAX_OPERATIONS = 120
+# largest component of a step, relative to its length, outside the totally symmetric subspace
+STEP_SYMMETRY_TOL = 1.0e-4
+
+
+class PointGroup(object):
+    """The symmetry operations of a molecule
+
+    Operation i maps the coordinates x (relative to ``center``) of atom a onto those of atom
+    ``permutations[i, a]``: ``rotations[i] @ x[a] ~= x[permutations[i, a]]``
+
+    Parameters
+    ----------
+    name : str
+        Schoenflies symbol. Linear molecules are ``C_inf_v`` or ``D_inf_h`` but only a finite
+        subgroup of their operations is kept
+    rotations : np.ndarray
+        (nop, 3, 3) orthogonal matrices. The first is the identity
+    permutations : np.ndarray
+        (nop, natom)
+    center : np.ndarray
+        (3, ) center of mass
+    """
+
+    def __init__(self, name, rotations, permutations, center):
+        self.name = name
+        self.rotations = np.asarray(rotations, dtype=float)
+        self.permutations = np.asarray(permutations, dtype=int)
+        self.center = np.asarray(center, dtype=float)
+        self._cartesian_basis = None
+
+    def __str__(self):
+        return f"{self.name} ({self.order} operations)"
+
+    @property
+    def order(self):
+        return len(self.rotations)
+
+    @property
+    def natom(self):
+        return self.permutations.shape[1]
+
+    def symmetrize(self, geom):
+        """Average of the images of geom under all operations. geom must be close to symmetric"""
+        geom = np.asarray(geom, dtype=float).reshape(-1, 3)
+        x = geom - self.center
+        symmetric = np.zeros_like(x)
+        for R, perm in zip(self.rotations, self.permutations):
+            symmetric[perm] += x @ R.T
+        return symmetric / self.order + self.center
+
+    def cartesian_projector(self):
+        """(3N, 3N) projector onto the totally symmetric Cartesian displacements"""
+        natom = self.natom
+        P = np.zeros((natom, 3, natom, 3))
+        atoms = np.arange(natom)
+        for R, perm in zip(self.rotations, self.permutations):
+            P[perm, :, atoms, :] += R
+        return P.reshape(3 * natom, 3 * natom) / self.order
+
+    def symmetric_cartesian_basis(self):
+        """Orthonormal (3N, k) basis of the totally symmetric Cartesian displacements"""
+        if self._cartesian_basis is None:
+            evals, evects = np.linalg.eigh(self.cartesian_projector())
+            self._cartesian_basis = evects[:, evals > 0.5]
+        return self._cartesian_basis
+
+    def symmetric_internal_basis(self, B, threshold=1.0e-8):
+        """Orthonormal (nintco, k) basis of the totally symmetric internal coordinate displacements
+
+        Parameters
+        ----------
+        B : np.ndarray
+            (nintco, 3N) Wilson B matrix at a symmetric geometry
+        threshold : float
+            squared singular values of B below threshold (in the symmetric subspace) are redundant.
+            Same meaning as for the eigenvalues of G in ``symm_mat_inv``
+
+        Returns
+        -------
+        np.ndarray
+        """
+        U, s, _ = np.linalg.svd(B @ self.symmetric_cartesian_basis(), full_matrices=False)
+        return U[:, s**2 > threshold]
+
+    def findif_displacements(self, geom, step=0.005):
+        """Geometries displaced by +step and -step along each totally symmetric Cartesian
+        displacement. Their energies give the gradient through ``findif_gradient``
+
+        Returns
+        -------
+        list[np.ndarray]
+            2k geometries. + and - for the first displacement, then the second...
+        """
+        geom = np.asarray(geom, dtype=float).reshape(-1, 3)
+        basis = self.symmetric_cartesian_basis()
+        return [geom + sign * step * d.reshape(-1, 3) for d in basis.T for sign in (1, -1)]
+
+    def findif_gradient(self, energies, step=0.005):
+        """Cartesian gradient (3N, ) from the energies of the geometries of ``findif_displacements``"""
+        energies = np.asarray(energies, dtype=float).reshape(-1, 2)
+        return self.symmetric_cartesian_basis() @ ((energies[:, 0] - energies[:, 1]) / (2 * step))
+
+
+def find_point_group(geom, Z, masses=None, tol=0.05):
+    """Detect the symmetry operations of a molecule
+
+    Parameters
+    ----------
+    geom : np.ndarray
+        (natom, 3) bohr
+    Z : array_like
+        atomic numbers
+    masses : array_like, optional
+        atoms are only equivalent if both their Z and mass agree
+    tol : float
+        largest distance (bohr) between the image of an atom and its equivalent atom
+
+    Returns
+    -------
+    PointGroup
+    """
+
+    geom = np.asarray(geom, dtype=float).reshape(-1, 3)
+    natom = len(geom)
+    Z = np.asarray(Z)
+    masses = np.ones(natom) if masses is None else np.asarray(masses, dtype=float)
+    center = masses @ geom / masses.sum()
+    x = geom - center
+
+    _, labels = np.unique(np.column_stack([Z, np.round(masses, 4)]), axis=0, return_inverse=True)
+    labels = labels.ravel()
+    linear = natom < 3 or np.linalg.svd(x, compute_uv=False)[1] < tol
+
+    # cheap test of a single atom before matching all of them: the atom farthest from the center
+    # among those of its label
+    probe = int(np.argmax(np.linalg.norm(x, axis=1)))
+    probe_images = x[labels == labels[probe]]
+
+    def match(R):
+        """permutation of the operation R or None"""
+        if np.min(np.linalg.norm(probe_images - R @ x[probe], axis=1)) > tol:
+            return None
+        distances = np.linalg.norm((x @ R.T)[:, None, :] - x[None, :, :], axis=2)
+        distances[labels[:, None] != labels[None, :]] = np.inf
+        perm = np.argmin(distances, axis=1)
+        if distances[np.arange(natom), perm].max() > tol or len(np.unique(perm)) != natom:
+            return None
+        return perm
+
+    generators = _Operations(natom)
+
+    def add(R):
+        perm = match(R)
+        if perm is None:
+            return
+        if not linear:
+            R = _fit_operation(x, perm, np.sign(np.linalg.det(R)))
+        generators.add(R, perm)
+
+    add(-np.eye(3))
+    orders = (2,) if linear else range(2, MAX_AXIS_ORDER + 1)
+    for axis in _candidate_axes(x, labels, masses, tol):
+        mirror = np.eye(3) - 2 * np.outer(axis, axis)
+        add(mirror)
+        for n in orders:
+            rotation = _rotation(axis, 2 * np.pi / n)
+            add(rotation)
+            add(mirror @ rotation)
+
+    operations = _close(generators, match, x, linear)
+    if operations is None:
+        logger.warning("Symmetry operations did not close into a point group. Using C1")
+        operations = _Operations(natom)
+
+    rotations, permutations = np.array(operations.rotations), np.array(operations.permutations)
+    if not linear:
+        rotations = _refine(x, rotations, permutations)
+    point_group = PointGroup(_schoenflies(rotations, linear), rotations, permutations, center)
+    logger.info("\tDetected point group %s", point_group)
+    return point_group
+
+
+def _candidate_axes(x, labels, masses, tol):
+    """Unit vectors that may be rotation axes or mirror plane normals"""
+    inertia = masses @ np.einsum("ai,ai->a", x, x) * np.eye(3) - (x.T * masses) @ x
+    axes = list(np.linalg.eigh(inertia)[1].T)
+    axes.extend(x)
+    for a, b in combinations(range(len(x)), 2):
+        if labels[a] == labels[b]:
+            axes.append(x[a] + x[b])
+            axes.append(x[a] - x[b])
+
+    axes = np.array(axes)
+    norms = np.linalg.norm(axes, axis=1)
+    axes = axes[norms > tol] / norms[norms > tol, None]
+    # fix the sign so that parallel and antiparallel axes are duplicates
+    first = np.argmax(np.abs(axes) > 1.0e-6, axis=1)
+    axes *= np.sign(axes[np.arange(len(axes)), first])[:, None]
+    _, unique = np.unique(np.round(axes, 4), axis=0, return_index=True)
+    return axes[np.sort(unique)]
+
+
+def _rotation(axis, angle):
+    """Rodrigues' rotation matrix"""
+    K = np.array([[0, -axis[2], axis[1]], [axis[2], 0, -axis[0]], [-axis[1], axis[0], 0]])
+    return np.eye(3) + np.sin(angle) * K + (1 - np.cos(angle)) * K @ K
+
+
+def _fit_operation(x, perm, det):
+    """Orthogonal matrix with determinant det that best maps x onto x[perm] (Kabsch)"""
+    U, _, Vt = np.linalg.svd(x[perm].T @ x)
+    d = det * np.sign(np.linalg.det(U @ Vt))
+    return U @ np.diag([1, 1, d]) @ Vt
+
+
+class _Operations(object):
+    """Distinct operations, starting with the identity. Operations are looked up by permutation.
+    A planar molecule has different operations (E and the molecular plane) with one permutation"""
+
+    def __init__(self, natom):
+        self.rotations = []
+        self.permutations = []
+        self._by_permutation = {}
+        self.add(np.eye(3), np.arange(natom))
+
+    def __len__(self):
+        return len(self.rotations)
+
+    def __contains__(self, operation):
+        R, perm = operation
+        return any(np.allclose(R, other, atol=0.1) for other in self._by_permutation.get(perm.tobytes(), []))
+
+    def add(self, R, perm):
+        """Add the operation if it is new. Returns whether it was added"""
+        if (R, perm) in self:
+            return False
+        self.rotations.append(R)
+        self.permutations.append(perm)
+        self._by_permutation.setdefault(perm.tobytes(), []).append(R)
+        return True
+
+
+def _refine(x, rotations, permutations, max_iter=50):
+    """Operations of an exactly symmetric geometry close to x. Otherwise the operations found for a
+    slightly asymmetric x do not form an exact group and symmetrize leaves some asymmetry"""
+    for _ in range(max_iter):
+        symmetric = np.zeros_like(x)
+        for R, perm in zip(rotations, permutations):
+            symmetric[perm] += x @ R.T
+        x = symmetric / len(rotations)
+
+        refined = np.array(
+            [_fit_operation(x, perm, np.sign(np.linalg.det(R))) for R, perm in zip(rotations, permutations)]
+        )
+        change = np.abs(refined - rotations).max()
+        rotations = refined
+        if change < 1.0e-14:
+            break
+    return rotations
+
+
+def _close(generators, match, x, linear):
+    """The group generated by the operations. None if the products are not symmetry operations"""
+    group = _Operations(len(x))
+    for R, perm in zip(generators.rotations, generators.permutations):
+        group.add(R, perm)
+
+    i = 0
+    while i < len(group):
+        R1, perm1 = group.rotations[i], group.permutations[i]
+        for R2, perm2 in zip(generators.rotations, generators.permutations):
+            R, perm = R1 @ R2, perm1[perm2]
+            if (R, perm) in group:
+                continue
+            # refit to keep rounding errors from accumulating. The images must still match
+            if not linear:
+                R = _fit_operation(x, perm, np.sign(np.linalg.det(R)))
+            if match(R) is None or len(group) == MAX_OPERATIONS:
+                return None
+            group.add(R, perm)
+        i += 1
+    return group
+
+
+def _axis(R):
+    """Unit rotation axis of a proper rotation"""
+    evals, evects = np.linalg.eig(R)
+    return np.real(evects[:, np.argmin(np.abs(evals - 1))])
+
+
+def _schoenflies(rotations, linear):
+    """Schoenflies symbol of a group of operations"""
+
+    inversion = improper = False
+    axes = []  # (order, axis) of proper rotations
+    mirrors = []  # plane normals
+    for R in rotations:
+        det = np.sign(np.linalg.det(R))
+        proper = det * R
+        angle = np.arccos(np.clip((np.trace(proper) - 1) / 2, -1, 1))
+        if angle < 1.0e-3:
+            inversion |= det < 0
+            continue
+        if det < 0:
+            improper = True
+            if np.isclose(np.trace(R), 1.0, atol=1.0e-3):  # a reflection
+                mirrors.append(_axis(-R))
+            continue
+        axes.append((Fraction(angle / (2 * np.pi)).limit_denominator(2 * MAX_OPERATIONS).denominator, _axis(R)))
+
+    if linear:
+        return "D_inf_h" if inversion else "C_inf_v"
+    if not axes:
+        return "Ci" if inversion else ("Cs" if mirrors else "C1")
+
+    n = max(order for order, _ in axes)
+    high = [axis for order, axis in axes if order >= 3]
+    if any(abs(high[0] @ axis) < 0.99 for axis in high[1:]):
+        # more than one axis of order three or higher
+        orders = {order for order, _ in axes}
+        if 5 in orders:
+            return "Ih" if inversion else "I"
+        if 4 in orders:
+            return "Oh" if inversion else "O"
+        return "Th" if inversion else ("Td" if mirrors else "T")
+
+    principal = next(axis for order, axis in axes if order == n)
+    perpendicular_c2 = any(order == 2 and abs(axis @ principal) < 0.1 for order, axis in axes)
+    sigma_h = any(abs(normal @ principal) > 0.9 for normal in mirrors)
+    sigma_v = any(abs(normal @ principal) < 0.1 for normal in mirrors)
+
+    if perpendicular_c2:
+        return f"D{n}h" if sigma_h else (f"D{n}d" if sigma_v else f"D{n}")
+    if sigma_h:
+        return f"C{n}h"
+    if sigma_v:
+        return f"C{n}v"
+    return f"S{2 * n}" if improper else f"C{n}"
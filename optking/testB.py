@@ -35,8 +35,8 @@ def test_b(oMolsys):
     oMolsys.update_dihedral_orientations()
     oMolsys.fix_bend_axes()
 
-    geom_orig = oMolsys.geom  # to restore below
-    coord = oMolsys.geom  # returns a copy
+    geom_orig = oMolsys.geom.copy()  # to restore below
+    coord = oMolsys.geom.copy()
 
     for atom in range(Natom):
         for xyz in range(3):
@@ -104,7 +104,7 @@ def test_derivative_b(oMolsys):
     DISP_SIZE = 0.01
     MAX_ERROR = 10 * DISP_SIZE * DISP_SIZE * DISP_SIZE * DISP_SIZE
 
-    geom_orig = oMolsys.geom  # to restore below
+    geom_orig = oMolsys.geom.copy()  # to restore below
 
     logger.info("\tTesting Derivative B-matrix numerically.")
     if oMolsys._dimer_intcos:
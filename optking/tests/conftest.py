@@ -24,6 +24,13 @@ def psi4_setup(psi4_threads, psi4_mem):
     psi4.set_num_threads(int(psi4_threads))
     psi4.set_memory(f'{psi4_mem} GB')
 
+@pytest.fixture(scope="function", autouse=True)
+def null_log():
+    # optimizations run without psi4 would write opt_log.out into the working directory
+    from optking import loggingconfig
+    with loggingconfig.log_to("null"):
+        yield
+
 def pytest_addoption(parser):
     parser.addoption(
         "--check_iter",
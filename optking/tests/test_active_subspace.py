@@ -0,0 +1,106 @@
+"""
+Tests leaving frozen atoms and the coordinates between them out of the optimization
+"""
+
+import numpy as np
+import pytest
+
+import optking
+from optking import symmetry
+
+from .utils.molecules import ETHANOL, ETHANOL_Z, distorted_ethanol, ethanol_molsys, optimize
+
+# the methyl group
+FROZEN = "1 xyz 4 xyz 5 xyz 6 xyz"
+
+
+def test_active_space():
+    molsys = ethanol_molsys(optking.op.OptParams(frozen_cartesian=FROZEN, active_subspace=True))
+    moving = [1, 2, 6, 7, 8]
+
+    assert np.flatnonzero(~molsys.frozen_atom_list).tolist() == moving
+    rows, cols = molsys.active_space()
+    inactive = [lbl.strip() for lbl in np.array(molsys.intco_lbls)[~molsys.active_intco_list]]
+    assert "R(1,4)" in inactive and "B(4,1,5)" in inactive and "*X(1)" in inactive
+    assert "R(1,2)" not in inactive and "D(4,1,2,7)" not in inactive
+    assert len(cols) == 3 * len(moving)
+
+    # no rotations or translations are left. All moving atoms are free
+    basis = molsys.step_basis()
+    assert basis.shape == (molsys.num_intcos, 3 * len(moving))
+    assert not basis[~molsys.active_intco_list].any()
+
+    P = molsys.projection_matrix(np.zeros(molsys.num_intcos))
+    np.testing.assert_allclose(P, basis @ basis.T, atol=1.0e-10)
+
+    # the transformations are exact in the moving cartesians
+    rng = np.random.default_rng(3)
+    B_a = molsys.active_Bmat()
+    g_x = rng.normal(size=3 * molsys.natom)
+    g_q = molsys.gradient_to_internals(g_x)
+    assert not g_q[~molsys.active_intco_list].any()
+    np.testing.assert_allclose(B_a.T @ g_q[rows], g_x[cols], atol=1.0e-10)
+
+    H = rng.normal(size=(3 * molsys.natom,) * 2)
+    H_q = molsys.hessian_to_internals(H + H.T)
+    np.testing.assert_allclose(B_a.T @ H_q[np.ix_(rows, rows)] @ B_a, (H + H.T)[np.ix_(cols, cols)], atol=1.0e-8)
+
+    molsys.active_subspace = False
+    assert molsys.active_space() is None and molsys.step_basis() is None
+
+
+@pytest.mark.parametrize("step_type", ["RFO", "LBFGS"])
+def test_active_optimization(step_type):
+    geom = distorted_ethanol()
+    params = {"frozen_cartesian": FROZEN, "step_type": step_type, "g_convergence": "gau"}
+    opt, result = optimize(geom, ETHANOL_Z, {**params, "active_subspace": True})
+    _, reference = optimize(geom, ETHANOL_Z, {**params, "step_type": "LBFGS"})
+
+    assert result["success"]
+    assert len(result["energies"]) < 50
+    assert result["energies"][-1] == pytest.approx(reference["energies"][-1], abs=1.0e-6)
+
+    # the frozen atoms did not move at all
+    final = np.array(result["final_molecule"]["geometry"]).reshape(-1, 3)
+    np.testing.assert_allclose(final[[0, 3, 4, 5]], geom[[0, 3, 4, 5]], atol=1.0e-8)
+
+
+def test_symmetric_active_space():
+    # the frozen methyl group is symmetric about the mirror plane of ethanol. C2, O3 and H9 move
+    # in the plane, H7 and H8 as mirror images
+    molsys = optking.Molsys.from_schema(
+        {"symbols": ["C", "C", "O"] + ["H"] * 6, "geometry": ETHANOL.ravel(), "fix_com": True, "fix_orientation": True}
+    )
+    optking.make_internal_coords(molsys, optking.op.OptParams(frozen_cartesian=FROZEN, active_subspace=True))
+    active = molsys.active_basis()
+    assert molsys.detect_symmetry().name == "Cs"
+    symmetric = molsys.symmetric_intco_basis()
+
+    basis = molsys.step_basis()
+    assert basis.shape == (molsys.num_intcos, 9)
+    np.testing.assert_allclose(basis.T @ basis, np.eye(9), atol=1.0e-10)
+    np.testing.assert_allclose(active @ (active.T @ basis), basis, atol=1.0e-10)
+    np.testing.assert_allclose(symmetric @ (symmetric.T @ basis), basis, atol=1.0e-10)
+
+
+def test_symmetric_active_optimization():
+    params = {"frozen_cartesian": FROZEN, "active_subspace": True, "g_convergence": "gau"}
+    opt, result = optimize(ETHANOL, ETHANOL_Z, {**params, "use_symmetry": True})
+    _, reference = optimize(ETHANOL, ETHANOL_Z, params)
+
+    assert opt.molsys.point_group.name == "Cs"
+    assert result["success"]
+    assert result["energies"][-1] == pytest.approx(reference["energies"][-1], abs=1.0e-6)
+    final = np.array(result["final_molecule"]["geometry"]).reshape(-1, 3)
+    np.testing.assert_allclose(final[[0, 3, 4, 5]], ETHANOL[[0, 3, 4, 5]], atol=1.0e-8)
+    assert symmetry.find_point_group(final, ETHANOL_Z, tol=1.0e-8).name == "Cs"
+
+
+def test_delocalized_active_space():
+    # the active basis is the nonredundant space of the moving atoms. Delocalized coordinates are
+    # not built for it
+    molsys = ethanol_molsys(
+        optking.op.OptParams(frozen_cartesian=FROZEN, active_subspace=True, opt_coordinates="DELOCALIZED")
+    )
+    assert not molsys.delocalized
+    assert molsys.step_basis().shape[1] == 15
@@ -0,0 +1,165 @@
+"""
+Tests writing and restarting from binary checkpoints
+"""
+
+import numpy as np
+import pytest
+from qcelemental.models import Molecule
+
+import optking
+from optking import checkpoint
+from optking.bend import Bend
+from optking.cart import Cart
+from optking.stre import Stre
+from optking.tors import Tors
+
+ar6 = np.array(
+    [
+        [0.0, 0.0, 0.0],
+        [7.1, 0.2, 0.0],
+        [0.3, 6.8, -0.2],
+        [0.1, -0.2, 7.2],
+        [6.9, 7.0, 0.3],
+        [7.2, -0.1, 6.8],
+    ]
+)
+
+
+def lj_step(opt):
+    E, gX = optking.lj_functions.calc_energy_and_gradient(opt.geom, 6.4, 0.0004, True)
+    opt.E = E
+    opt.gX = gX
+    opt.compute()
+    opt.take_step()
+    return E
+
+
+def test_intco_tables():
+    intcos = [
+        Stre(0, 1, inverse=True),
+        Bend(0, 1, 2, constraint="frozen", bend_type="LINEAR"),
+        Tors(0, 1, 2, 3, constraint="ranged", range_min=0.1, range_max=1.0),
+        Cart(2, "y"),
+    ]
+    int_table, float_table, ext_forces = checkpoint.intco_tables(intcos)
+    assert int_table.dtype.kind == "i"
+    assert int_table.shape == (4, 8)
+
+    dicts = checkpoint.intco_dicts(int_table, float_table, ext_forces)
+    assert dicts == [intco.to_dict() | {"atoms": list(intco.atoms)} for intco in intcos]
+
+
+@pytest.fixture
+def writes(monkeypatch):
+    """Rows written by each ArrayLog.sync and the number of trajectory entries and state documents
+    serialized"""
+    writes = {"rows": [], "json": 0}
+    sync = checkpoint.ArrayLog.sync
+    json_dumps = checkpoint.json_dumps
+
+    def spy_sync(self, storage):
+        rows = sync(self, storage)
+        writes["rows"].append(rows)
+        return rows
+
+    def spy_json(obj):
+        writes["json"] += 1
+        return json_dumps(obj)
+
+    monkeypatch.setattr(checkpoint.ArrayLog, "sync", spy_sync)
+    monkeypatch.setattr(checkpoint, "json_dumps", spy_json)
+    return writes
+
+
+def ar6_helper():
+    mol = Molecule(symbols=["Ar"] * 6, geometry=ar6.ravel(), fix_com=True, fix_orientation=True)
+    return optking.CustomHelper(mol, {"frozen_distance": "1 2"})
+
+
+def test_checkpoint_appends(tmp_path, writes):
+    opt = ar6_helper()
+    chk = tmp_path / "opt.chk"
+
+    for step in range(5):
+        lj_step(opt)
+        writes["rows"].clear()
+        writes["json"] = 0
+        opt.to_checkpoint(chk)
+        # the new step and the record of the previous one. One trajectory entry and state.json
+        assert writes["rows"] == [min(step + 1, 2)]
+        assert writes["json"] == 2
+
+    assert (chk / "history" / "E.f8").stat().st_size == 8 * len(opt.history)
+    assert len((chk / "trajectory.jsonl").read_text().splitlines()) == len(opt.history)
+
+
+def test_checkpoint_appends_after_restore(tmp_path, writes):
+    reference = ar6_helper()
+    opt = ar6_helper()
+    chk = tmp_path / "opt.chk"
+    for _ in range(4):
+        lj_step(reference)
+        lj_step(opt)
+    opt.to_checkpoint(chk)
+    traj_start = (chk / "trajectory.jsonl").read_bytes()
+
+    opt = optking.CustomHelper.from_checkpoint(chk)
+    lj_step(reference)
+    lj_step(opt)
+    writes["rows"].clear()
+    writes["json"] = 0
+    opt.to_checkpoint(chk)
+
+    assert writes["rows"] == [2]
+    assert writes["json"] == 2
+    assert (chk / "trajectory.jsonl").read_bytes().startswith(traj_start)
+
+    restored = optking.CustomHelper.from_checkpoint(chk)
+    assert len(restored.history) == len(reference.history) == 5
+    assert np.allclose(restored.history.storage.scalars["E"][:5], reference.history.storage.scalars["E"][:5])
+    assert len(restored.computer.trajectory) == 5
+
+
+def test_checkpoint_interrupted_save(tmp_path):
+    # rows and trajectory lines written after the last state.json are replaced
+    opt = ar6_helper()
+    chk = tmp_path / "opt.chk"
+    for _ in range(3):
+        lj_step(opt)
+    opt.to_checkpoint(chk)
+    with open(chk / "history" / "E.f8", "ab") as f:
+        f.write(b"\0" * 12)
+    with open(chk / "trajectory.jsonl", "a") as f:
+        f.write('{"incomplete": \n')
+
+    opt = optking.CustomHelper.from_checkpoint(chk)
+    lj_step(opt)
+    opt.to_checkpoint(chk)
+    restored = optking.CustomHelper.from_checkpoint(chk)
+    assert (chk / "history" / "E.f8").stat().st_size == 8 * 4
+    assert len((chk / "trajectory.jsonl").read_text().splitlines()) == 4
+    assert np.allclose(restored.history.storage.scalars["E"][:4], opt.history.storage.scalars["E"][:4])
+
+
+def test_checkpoint_restart(tmp_path):
+    mol = Molecule(symbols=["Ar"] * 6, geometry=ar6.ravel(), fix_com=True, fix_orientation=True)
+    params = {"frozen_distance": "1 2"}
+
+    reference = optking.CustomHelper(mol, params)
+    opt = optking.CustomHelper(mol, params)
+    chk = tmp_path / "opt.chk"
+
+    for step in range(4):
+        E_ref = lj_step(reference)
+        E = lj_step(opt)
+        opt.to_checkpoint(chk)
+        opt = optking.CustomHelper.from_checkpoint(chk)
+
+        assert E == pytest.approx(E_ref, abs=1e-12)
+        assert np.allclose(opt.geom, reference.geom)
+        assert len(opt.history) == len(reference.history)
+
+    # one history row and trajectory entry per step
+    nsteps = len(reference.history)
+    assert (chk / "history" / "E.f8").stat().st_size == 8 * nsteps
+    assert len((chk / "trajectory.jsonl").read_text().splitlines()) == nsteps
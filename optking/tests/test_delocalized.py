@@ -0,0 +1,46 @@
+"""
+Tests the delocalized internal coordinates against the redundant internal coordinates they are
+built from
+"""
+
+import numpy as np
+import pytest
+
+import optking
+from optking.linearAlgebra import symm_mat_inv
+
+from .utils.molecules import ETHANOL_Z, distorted_ethanol, ethanol_molsys, optimize
+
+
+def test_delocalized_basis():
+    molsys = ethanol_molsys(optking.op.OptParams(opt_coordinates="DELOCALIZED"))
+    natom = molsys.natom
+
+    # a new geometry. The basis is carried over without diagonalizing G
+    molsys.geom = molsys.geom + np.random.default_rng(5).normal(scale=0.05, size=(natom, 3))
+    basis = molsys.delocalized_basis()
+    G = molsys.Gmat()
+
+    assert basis.shape == (molsys.num_intcos, 3 * natom - 6)
+    np.testing.assert_allclose(basis.T @ basis, np.eye(3 * natom - 6), atol=1.0e-10)
+    np.testing.assert_allclose(basis @ basis.T, G @ symm_mat_inv(G, redundant=True), atol=1.0e-8)
+
+    g_x = np.random.default_rng(6).normal(size=3 * natom)
+    redundant = molsys.gradient_to_internals(g_x, B=molsys.Bmat())
+    np.testing.assert_allclose(molsys.gradient_to_internals(g_x), redundant, atol=1.0e-10)
+
+    molsys.localize()
+    assert molsys.step_basis() is None
+
+
+@pytest.mark.parametrize("step_type", ["RFO", "LBFGS"])
+def test_delocalized_optimization(step_type):
+    geom = distorted_ethanol()
+    opt, result = optimize(geom, ETHANOL_Z, {"opt_coordinates": "DELOCALIZED", "step_type": step_type})
+    _, reference = optimize(geom, ETHANOL_Z, {"step_type": step_type})
+
+    assert opt.molsys.delocalized
+    assert result["success"]
+    # the same nonredundant space, so the same steps
+    assert len(result["energies"]) == len(reference["energies"])
+    assert result["energies"][-1] == pytest.approx(reference["energies"][-1], abs=1.0e-8)
@@ -0,0 +1,106 @@
+"""
+Tests evaluating the interfragment coordinates of all dimers together against the coordinates of
+the individual dimers
+"""
+
+import numpy as np
+import pytest
+import qcelemental as qcel
+
+import optking
+from optking.dimerfrag import DimerBatch, DimerFrag
+from optking.exceptions import AlgError
+
+from .utils.molecules import water_cluster
+
+
+def reference_dimers(dimers, geom, atom_offsets, q_target):
+    """Values, B matrix and oriented geometry with one dimer at a time"""
+    geom = geom.copy()
+    frag_geom = [geom[atom_offsets[i] : atom_offsets[i + 1]] for i in range(len(atom_offsets) - 1)]
+    q, B = [], []
+    for DI in dimers:
+        DI.update_reference_geometry(frag_geom[DI.A_idx], frag_geom[DI.B_idx])
+        q += DI.q()
+        B_dimer = np.zeros((DI.num_intcos, geom.size))
+        cols = [3 * atom_offsets[DI.A_idx], 3 * atom_offsets[DI.B_idx]]
+        DI.Bmat(frag_geom[DI.A_idx], frag_geom[DI.B_idx], B_dimer, *cols)
+        B.append(B_dimer)
+
+    start = 0
+    for DI in dimers:
+        target = q_target[start : start + DI.num_intcos]
+        frag_geom[DI.B_idx][:] = DI.orient_fragment(frag_geom[DI.A_idx], frag_geom[DI.B_idx], target)
+        start += DI.num_intcos
+    return np.array(q), np.vstack(B), geom
+
+
+def compare(dimers, geom, atom_offsets, rng):
+    batch = DimerBatch(dimers, atom_offsets)
+    ref = batch.reference_points(geom)
+    q = batch.q(ref)
+    B = np.zeros((batch.num_intcos, geom.size))
+    batch.Bmat(ref, B)
+
+    # the values at a nearby geometry
+    q_target = batch.q(batch.reference_points(geom + rng.uniform(-0.1, 0.1, size=geom.shape)))
+    oriented = geom.copy()
+    batch.orient(oriented, q_target)
+
+    q_ref, B_ref, oriented_ref = reference_dimers(dimers, geom, atom_offsets, q_target)
+    np.testing.assert_allclose(q, q_ref, atol=1.0e-12)
+    np.testing.assert_allclose(B, B_ref, atol=1.0e-12)
+    np.testing.assert_allclose(oriented, oriented_ref, atol=1.0e-10)
+    # the last dimer meets its targets. Earlier ones may have been moved again
+    last = batch.num_intcos - dimers[-1].num_intcos
+    np.testing.assert_allclose(batch.q(batch.reference_points(oriented))[last:], q_target[last:], atol=1.0e-8)
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_weighted_reference_points(seed):
+    # fragments with 1 to 3 reference points of random atoms and weights. Fragments are moved
+    # more than once and moved fragments are used by later dimers
+    rng = np.random.default_rng(seed)
+    natoms = [4, 3, 2, 1, 5]
+    atom_offsets = np.cumsum([0] + natoms)
+    geom = np.vstack([rng.uniform(0.0, 3.0, size=(n, 3)) + 6.0 * i for i, n in enumerate(natoms)])
+
+    def ref_points(natom):
+        atoms = []
+        while len(atoms) < min(natom, 3):
+            points = sorted(rng.choice(natom, size=rng.integers(1, min(natom, 3) + 1), replace=False).tolist())
+            if points not in atoms:
+                atoms.append(points)
+        return atoms, [rng.uniform(0.1, 0.9, size=len(a)).tolist() for a in atoms]
+
+    dimers = []
+    for A, B in [(0, 1), (0, 2), (1, 2), (2, 3), (0, 4), (3, 4), (1, 4)]:
+        while True:
+            (A_atoms, A_weights), (B_atoms, B_weights) = ref_points(natoms[A]), ref_points(natoms[B])
+            DI = DimerFrag(A, A_atoms, B, B_atoms, A_weights, B_weights)
+            try:
+                DI.validate_intcos(*(geom[atom_offsets[i] : atom_offsets[i + 1]] for i in (A, B)))
+                break
+            except AlgError:
+                pass
+        # inverse distances for some of the dimers
+        DI.pseudo_frag.intcos[0].inverse = bool((seed + A) % 2)
+        dimers.append(DI)
+    compare(dimers, geom, atom_offsets, rng)
+
+
+def test_water_cluster():
+    geom, Z = water_cluster(27)
+    molecule = qcel.models.Molecule(
+        symbols=[qcel.periodictable.to_E(z) for z in Z], geometry=geom.ravel(), fix_com=True, fix_orientation=True
+    )
+    molsys = optking.Molsys.from_schema(molecule.dict())
+    optking.make_internal_coords(molsys, optking.op.OptParams(frag_mode="MULTI", interfrag_pairs="NEAREST"))
+    atom_offsets = [molsys.frag_1st_atom(i) for i in range(28)]
+    compare(molsys.dimer_intcos, molsys.geom, atom_offsets, np.random.default_rng(1))
+
+    # the molecular system uses the same values and B matrix rows
+    dimer_rows = slice(molsys.dimerfrag_1st_intco(0), None)
+    q_ref, B_ref, _ = reference_dimers(molsys.dimer_intcos, molsys.geom, atom_offsets, molsys.q_array()[dimer_rows])
+    np.testing.assert_allclose(molsys.q_array()[dimer_rows], q_ref, atol=1.0e-12)
+    np.testing.assert_allclose(molsys.Bmat()[dimer_rows], B_ref, atol=1.0e-12)
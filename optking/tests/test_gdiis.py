@@ -0,0 +1,30 @@
+"""
+Tests the RS-RFO + GDIIS hybrid step on Lennard-Jones clusters (no QC program needed)
+"""
+
+import numpy as np
+import pytest
+
+from .utils.molecules import EPSILON, lj_cluster, optimize_lj
+
+
+@pytest.mark.parametrize("natom", [3, 4])
+def test_gdiis_matches_rfo(natom):
+    params = {"g_convergence": "gau_tight"}
+    E_rfo, _, _ = optimize_lj(lj_cluster(natom), params)
+    E_gdiis, _, result = optimize_lj(lj_cluster(natom), {"step_type": "GDIIS", **params})
+
+    assert result["success"]
+    assert E_gdiis == pytest.approx(E_rfo, rel=1.0e-5)
+    assert E_gdiis == pytest.approx(-EPSILON * {3: 3, 4: 6}[natom], rel=1.0e-5)
+
+
+def test_gdiis_frozen_distance():
+    molecule = lj_cluster(4)
+    R_start = np.linalg.norm(molecule.geometry[0] - molecule.geometry[1])
+
+    params = {"step_type": "GDIIS", "gdiis_max_vectors": 3, "frozen_distance": "1 2"}
+    _, geom, result = optimize_lj(molecule, params)
+
+    assert result["success"]
+    assert np.linalg.norm(geom[0] - geom[1]) == pytest.approx(R_start, abs=1.0e-5)
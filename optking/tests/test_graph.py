@@ -0,0 +1,148 @@
+"""
+Tests the sparse bond graph: neighbor search, fragments and the links that join them
+"""
+
+import numpy as np
+import pytest
+import qcelemental as qcel
+
+import optking
+from optking import graph
+from optking.addIntcos import connectivity_from_distances
+from optking.dimerfrag import DimerFrag
+from optking.exceptions import AlgError, OptError
+
+from .utils.molecules import two_ethanols, water_cluster
+
+
+@pytest.mark.parametrize("natom", [10, 200])
+def test_close_pairs(natom):
+    geom = np.random.default_rng(natom).uniform(0.0, 20.0, size=(natom, 3))
+    i, j, R = graph.close_pairs(geom, 3.0)
+
+    R_all = np.linalg.norm(geom[:, None] - geom[None], axis=2)
+    expected = np.argwhere(np.triu(R_all < 3.0, k=1))
+    assert sorted(zip(i.tolist(), j.tolist())) == [tuple(pair) for pair in expected.tolist()]
+    assert np.allclose(R, R_all[i, j])
+
+
+def test_fragments():
+    geom, Z = water_cluster(27)
+    C = connectivity_from_distances(geom, Z)
+    labels = graph.connected_components(len(Z), *np.nonzero(C))
+    assert np.array_equal(labels, np.repeat(np.arange(27), 3))
+
+    # the links form a tree that joins the waters
+    radii = graph.covalent_radii(Z)
+    links, max_ratio = graph.link_components(geom, labels, radii)
+    assert len(links) >= 26
+    i, j = np.array(links).T
+    assert np.all(labels[i] != labels[j])
+    assert graph.connected_components(len(Z), np.r_[np.nonzero(C)[0], i], np.r_[np.nonzero(C)[1], j]).max() == 0
+    assert max_ratio == pytest.approx(max(np.linalg.norm(geom[i] - geom[j], axis=1) / (radii[i] + radii[j])))
+
+
+def test_far_fragments():
+    # the molecules are beyond the neighbor search. 0-4, 0-5 and 1-5 are equally long
+    geom = np.array([[0, 0, 0], [1.4, 0, 0], [30, 0, 0], [31.4, 0, 0], [-0.7, 30, 0], [0.7, 30, 0]])
+    labels = np.array([0, 0, 1, 1, 2, 2])
+    links, max_ratio = graph.link_components(geom, labels, np.full(6, 0.6))
+    assert links == [(0, 4), (0, 5), (1, 2), (1, 5)]
+    assert max_ratio == pytest.approx(np.hypot(0.7, 30) / 1.2)
+
+    # the next closest pair between the same molecules, or else between other molecules
+    links, _ = graph.link_components(geom, labels, np.full(6, 0.6), exclude=[(0, 4), (0, 5), (1, 5)])
+    assert links == [(1, 2), (1, 4)]
+    links, _ = graph.link_components(geom, labels, np.full(6, 0.6), exclude=[(0, 4), (0, 5), (1, 4), (1, 5)])
+    assert links == [(1, 2), (2, 5)]
+
+
+def test_augment_connectivity():
+    molsys = two_ethanols()
+    molsys.consolidate_fragments()
+    molsys.split_fragments_by_connectivity()
+    assert molsys.frag_natoms == [9, 9]
+
+    C = connectivity_from_distances(molsys.geom, molsys.Z)
+    scale_dist = molsys.augment_connectivity_to_single_fragment(C)
+    assert graph.connected_components(molsys.natom, *np.nonzero(C)).max() == 0
+    assert scale_dist >= 1.3 and (scale_dist - 1.3) / 0.2 == pytest.approx(round((scale_dist - 1.3) / 0.2))
+
+
+def test_single_fragment_optimization():
+    geom, Z = water_cluster(4, spacing=5.2)
+    molecule = qcel.models.Molecule(
+        symbols=[qcel.periodictable.to_E(z) for z in Z], geometry=geom.ravel(), fix_com=True, fix_orientation=True
+    )
+    molsys = optking.Molsys.from_schema(molecule.dict())
+    optking.make_internal_coords(molsys, optking.op.OptParams(frag_mode="SINGLE"))
+    assert molsys.nfragments == 1
+    assert molsys.num_intcos > 4 * 3
+
+
+def test_fragment_pairs():
+    geom, Z = water_cluster(64)
+    labels = np.repeat(np.arange(64), 3)
+    radii = graph.covalent_radii(Z)
+    pairs = graph.fragment_pairs(geom, labels, radii, neighbors=3)
+
+    # a connected graph of the fragments with a linear number of edges
+    A, B, i, j = np.array(pairs).T
+    assert np.all(A < B) and np.array_equal(labels[i], A) and np.array_equal(labels[j], B)
+    assert 63 <= len(pairs) <= 3 * 64 + 63
+    assert graph.connected_components(64, A, B).max() == 0
+
+    # through the closest atoms of the fragments within the neighbor search
+    cutoff = graph.LINK_CUTOFF * 2.0 * radii.mean()
+    for a, b, x, y in pairs[:10]:
+        R = np.linalg.norm(geom[3 * a : 3 * a + 3, None] - geom[None, 3 * b : 3 * b + 3], axis=2)
+        ratio = R / (radii[3 * a : 3 * a + 3, None] + radii[None, 3 * b : 3 * b + 3])
+        assert np.linalg.norm(geom[x] - geom[y]) / (radii[x] + radii[y]) == pytest.approx(ratio[R < cutoff].min())
+
+    assert len(graph.fragment_pairs(geom, labels, radii, neighbors=0)) == 63
+
+
+def test_nearest_dimer_coordinates():
+    geom, Z = water_cluster(27)
+    molecule = qcel.models.Molecule(
+        symbols=[qcel.periodictable.to_E(z) for z in Z], geometry=geom.ravel(), fix_com=True, fix_orientation=True
+    )
+    molsys = optking.Molsys.from_schema(molecule.dict())
+    optking.make_internal_coords(molsys, optking.op.OptParams(frag_mode="MULTI", interfrag_pairs="NEAREST"))
+
+    assert molsys.nfragments == 27
+    assert 26 <= len(molsys.dimer_intcos) < 27 * 26 // 2
+    A, B = np.array([(DI.A_idx, DI.B_idx) for DI in molsys.dimer_intcos]).T
+    assert graph.connected_components(27, A, B).max() == 0
+    # water has three reference points, so there are six coordinates per pair
+    assert molsys.num_intcos == 27 * 3 + 6 * len(molsys.dimer_intcos)
+
+
+def test_nearest_dimer_coordinates_invalid_link(monkeypatch):
+    # coordinates between the first two waters are invalid. The third water joins them
+    geom, Z = water_cluster(3)
+    molecule = qcel.models.Molecule(
+        symbols=[qcel.periodictable.to_E(z) for z in Z], geometry=geom.ravel(), fix_com=True, fix_orientation=True
+    )
+    validate_intcos = DimerFrag.validate_intcos
+
+    def fail_first_pair(self, Ageom, Bgeom):
+        if (self.A_idx, self.B_idx) == (0, 1):
+            raise AlgError("invalid")
+        return validate_intcos(self, Ageom, Bgeom)
+
+    monkeypatch.setattr(DimerFrag, "validate_intcos", fail_first_pair)
+    params = optking.op.OptParams(frag_mode="MULTI", interfrag_pairs="NEAREST", interfrag_neighbors=1)
+    molsys = optking.Molsys.from_schema(molecule.dict())
+    optking.make_internal_coords(molsys, params)
+    assert sorted((DI.A_idx, DI.B_idx) for DI in molsys.dimer_intcos) == [(0, 2), (1, 2)]
+
+    # two waters cannot be joined
+    molecule = qcel.models.Molecule(
+        symbols=[qcel.periodictable.to_E(z) for z in Z[:6]],
+        geometry=geom[:6].ravel(),
+        fix_com=True,
+        fix_orientation=True,
+    )
+    with pytest.raises(OptError):
+        optking.make_internal_coords(optking.Molsys.from_schema(molecule.dict()), params)
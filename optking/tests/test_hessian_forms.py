@@ -0,0 +1,122 @@
+"""
+Tests the diagonal, low rank and dense Hessian forms against dense linear algebra
+"""
+
+import numpy as np
+import pytest
+
+import optking
+from optking import hessianForms
+from optking.hessianForms import DenseHessian, DiagonalHessian, LowRankHessian
+
+from .utils.molecules import EPSILON, SIGMA, lj_cluster
+
+
+def projector(n, rank, rng):
+    B = rng.normal(size=(n, rank))
+    return B @ np.linalg.pinv(B)
+
+
+def dense_projection(H, P, fixed):
+    """Molsys.project_redundancies_and_constraints for a dense Hessian"""
+    H_new = P @ H @ P
+    for i in np.flatnonzero(fixed):
+        H_new[i, :] = H_new[:, i] = 0
+        H_new[i, i] = H[i, i]
+    return H_new
+
+
+@pytest.fixture
+def forms():
+    rng = np.random.default_rng(7)
+    n = 12
+    d = rng.uniform(0.1, 1.0, n)
+    U = rng.normal(size=(n, 2))
+    M = np.array([[0.3, 0.1], [0.1, -0.2]])
+    dense = np.diag(d) + U @ M @ U.T
+    return rng, n, {
+        "diagonal": (DiagonalHessian(d), np.diag(d)),
+        "low_rank": (LowRankHessian(d, U, M), dense),
+        "dense": (DenseHessian(dense), dense),
+    }
+
+
+@pytest.mark.parametrize("form", ["diagonal", "low_rank", "dense"])
+def test_form_operations(forms, form):
+    rng, n, cases = forms
+    H, dense = cases[form]
+    v = rng.normal(size=n)
+
+    assert np.allclose(H.matvec(v), dense @ v)
+    assert H.quadratic(v) == pytest.approx(v @ dense @ v)
+    assert np.allclose(H.diagonal(), np.diag(dense))
+    assert np.allclose(np.asarray(H), dense)
+
+    evals, evects = H.eig()
+    assert np.allclose(evals, np.linalg.eigvalsh(dense))
+    assert np.allclose(evects.T @ np.diag(evals) @ evects, dense)
+
+
+@pytest.mark.parametrize("form", ["diagonal", "low_rank", "dense"])
+def test_form_projection(forms, form):
+    rng, n, cases = forms
+    H, dense = cases[form]
+    P = projector(n, 8, rng)
+    fixed = np.zeros(n, dtype=bool)
+    fixed[[2, 5]] = True
+    v = rng.normal(size=n)
+
+    expected = dense_projection(dense, P, fixed)
+    projected = H.project(P, fixed)
+    assert np.allclose(projected.to_dense(), expected)
+    assert np.allclose(projected.matvec(v), expected @ v)
+    assert np.allclose(projected.diagonal(), np.diag(expected))
+
+    # updates after projection are added to the projected matrix
+    u = rng.normal(size=(n, 1))
+    u[fixed] = 0
+    updated = projected.rank_update(u, np.array([[0.5]]))
+    assert np.allclose(updated.matvec(v), (expected + 0.5 * u @ u.T) @ v)
+
+
+def test_low_rank_uniform_eig():
+    rng = np.random.default_rng(3)
+    U = rng.normal(size=(10, 3))
+    H = LowRankHessian(np.full(10, 0.5), U, np.diag([1.0, -0.1, 0.2]))
+    evals, evects = H.eig()
+    assert np.allclose(evals, np.linalg.eigvalsh(H.to_dense()))
+    assert np.allclose(evects @ evects.T, np.eye(10))
+    assert np.allclose(evects.T @ np.diag(evals) @ evects, H.to_dense())
+
+
+def test_rank_update_switches_to_dense():
+    H = DiagonalHessian(np.ones(6))
+    H = H.rank_update(np.ones((6, 2)), np.eye(2))
+    assert isinstance(H, LowRankHessian)
+    H = H.rank_update(np.arange(6.0).reshape(6, 1), np.eye(1))
+    assert isinstance(H, DenseHessian)
+    assert np.allclose(H.H, np.eye(6) + 2 + np.outer(np.arange(6.0), np.arange(6.0)))
+
+
+@pytest.mark.parametrize("form", ["diagonal", "low_rank", "dense"])
+def test_form_dict(forms, form):
+    rng, n, cases = forms
+    H, _ = cases[form]
+    fixed = np.zeros(n, dtype=bool)
+    fixed[3] = True
+    H = H.project(None, fixed)
+    H_new = hessianForms.from_dict(H.to_dict())
+    assert type(H_new) is type(H)
+    assert np.allclose(H_new.to_dense(), H.to_dense())
+
+
+@pytest.mark.parametrize("update", ["BFGS", "MS", "POWELL", "BOFILL"])
+def test_sd_low_rank_updates(update):
+    """SD and CG never form a dense Hessian. The updated guess stays diagonal + low rank"""
+    opt = optking.CustomHelper(lj_cluster(5), {"step_type": "SD", "hess_update": update})
+    for _ in range(3):
+        opt.E, opt.gX = optking.lj_functions.calc_energy_and_gradient(opt.geom, SIGMA, EPSILON, True)
+        opt.compute()
+        opt.take_step()
+    assert isinstance(opt._Hq, LowRankHessian)
+    assert isinstance(optking.CustomHelper.from_dict(opt.to_dict())._Hq, LowRankHessian)
@@ -0,0 +1,163 @@
+"""
+Tests the array backed storage of History steps and remapping the history to new coordinates
+"""
+
+import numpy as np
+import pytest
+
+import optking
+from optking import stepAlgorithms, surrogate
+from optking.exceptions import AlgError
+from optking.history import History, Step
+
+from .utils.molecules import ETHANOL_Z, distorted_ethanol, ethanol_molsys, optimize
+
+
+def fill_history(nsteps, nintco=3):
+    rng = np.random.default_rng(11)
+    history = History(capacity=2)
+    for i in range(nsteps):
+        history.append(rng.random((3, 3)), -1.0 - 0.01 * i, rng.random(nintco), rng.random(9))
+        history.append_record(-0.001, rng.random(nintco), rng.random(nintco), None, None)
+    return history
+
+
+def test_steps_are_views():
+    history = fill_history(5)
+
+    assert len(history) == 5
+    assert history.storage.capacity == 8
+    assert np.shares_memory(history.steps[2].geom, history.storage.arrays["geom"])
+
+    history.steps[-2].decent = False
+    assert history.storage.scalars["decent"][3] == False
+    assert history.steps[-1].oneDgradient is None
+
+
+def test_delete_and_reset():
+    history = fill_history(6)
+    energies = [step.E for step in history.steps]
+
+    last = history.steps[-1]
+    del history.steps[1]
+    assert [step.E for step in history.steps] == energies[:1] + energies[2:]
+    assert [step._row for step in history.steps] == list(range(5))
+
+    history.reset_to_most_recent()
+    assert len(history) == 1
+    assert history.steps[0] is last
+    assert history.steps[0].E == energies[-1]
+    assert history.steps[0].projectedDE is None
+
+
+def test_variable_length_rows():
+    history = fill_history(2, nintco=3)
+    history.append(np.zeros((3, 3)), -2.0, np.ones(6), np.zeros(9))
+
+    assert history.steps[0].forces.shape == (3,)
+    assert history.steps[-1].forces.shape == (6,)
+    assert len(history.steps[-1].Dq) == 0
+
+
+@pytest.mark.parametrize("legacy", [False, True])
+def test_history_dict_roundtrip(legacy):
+    history = fill_history(4)
+    if legacy:
+        d = {"steps": [step.to_dict() for step in history.steps]}
+    else:
+        d = history.to_dict()
+    new_history = History.from_dict(d)
+
+    assert len(new_history) == len(history)
+    for old, new in zip(history.steps, new_history.steps):
+        assert old.E == new.E
+        assert np.allclose(old.geom, new.geom)
+        assert np.allclose(old.Dq, new.Dq)
+        assert old.projectedDE == new.projectedDE
+    assert history.summary() == new_history.summary()
+
+
+def test_append_external_step():
+    history = fill_history(1)
+    step = Step(np.zeros((3, 3)), -3.0, np.ones(3), np.zeros(9))
+    step.distance = 0.5
+    history.steps.append(step)
+
+    assert history.steps[-1].E == -3.0
+    assert history.steps[-1].distance == 0.5
+    assert step._storage is history.storage
+
+
+def test_irc_history_dict_roundtrip():
+    from optking.IRCdata import IRCHistory
+
+    rng = np.random.default_rng(5)
+    irc_history = IRCHistory()
+    irc_history.set_atom_symbols(["O", "H", "H"])
+    irc_history.set_step_size_and_direction(0.2, "FORWARD")
+    for i in range(3):
+        x = rng.random((3, 3))
+        irc_history.add_irc_point(i, rng.random(3), x, rng.random(3), rng.random(9), -1.0 - i)
+    irc_history.add_pivot_point(rng.random(3), rng.random((3, 3)), step=0)
+
+    new_history = IRCHistory.from_dict(irc_history.to_dict())
+    assert new_history.rxnpath_dict() == irc_history.rxnpath_dict()
+    assert new_history.q_pivot(step=0) is not None
+    assert new_history.x_pivot() is None
+
+
+def test_remap_internals():
+    molsys = ethanol_molsys(optking.op.OptParams())
+    potential = surrogate.ForceFieldSurrogate(molsys.geom, ETHANOL_Z)
+    rng = np.random.default_rng(4)
+    geoms = [molsys.geom + rng.normal(scale=0.02, size=molsys.geom.shape) for _ in range(4)]
+
+    history = History()
+    for i, geom in enumerate(geoms):
+        molsys.geom = geom
+        E, g_x = potential(geom)
+        f_q = molsys.gradient_to_internals(g_x.ravel(), -1.0)
+        history.append(geom, E, f_q, molsys.gradient_to_cartesians(-1 * f_q))
+        if i < 3:  # the last step failed
+            dq = rng.random(len(f_q))
+            history.append_record(-0.001, dq, dq / np.linalg.norm(dq), None, None)
+
+    # redundant internals and cartesians
+    for F in molsys.fragments:
+        del F.intcos[:]
+    optking.make_internal_coords(molsys, optking.op.OptParams(opt_coordinates="BOTH"))
+    history.remap_internals(molsys)
+
+    assert len(history) == 3
+    assert np.array_equal(molsys.geom, geoms[-1])
+    for i, step in enumerate(history.steps):
+        assert len(step.forces) == molsys.num_intcos
+        # the cartesian gradient is reproduced by the new coordinates
+        molsys.geom = geoms[i]
+        np.testing.assert_allclose(molsys.gradient_to_cartesians(-1 * step.forces), step.cart_grad, atol=1.0e-8)
+        q = molsys.q_array()
+        molsys.geom = geoms[i + 1]
+        np.testing.assert_allclose(step.Dq, molsys.q_array() - q, atol=1.0e-12)
+        assert np.linalg.norm(step.followedUnitVector) == pytest.approx(1.0)
+
+
+def test_rebuild_after_back_transformation(monkeypatch):
+    displace_molsys = stepAlgorithms.displace_molsys
+    calls = []
+
+    def failing_displace_molsys(*args, **kwargs):
+        calls.append(True)
+        if len(calls) == 4:
+            raise AlgError("Back transformation failed", back_transformation=True)
+        return displace_molsys(*args, **kwargs)
+
+    monkeypatch.setattr(stepAlgorithms, "displace_molsys", failing_displace_molsys)
+    _, remapped = optimize(distorted_ethanol(), ETHANOL_Z, {"remap_on_rebuild": True})
+    calls.clear()
+    _, erased = optimize(distorted_ethanol(), ETHANOL_Z, {"remap_on_rebuild": False})
+    monkeypatch.undo()
+    _, reference = optimize(distorted_ethanol(), ETHANOL_Z, {})
+
+    # the Hessian and the steps before the failure are kept. Starting over takes longer
+    assert len(remapped["energies"]) < len(erased["energies"])
+    assert remapped["energies"][-1] == pytest.approx(reference["energies"][-1], abs=1.0e-6)
@@ -0,0 +1,111 @@
+"""
+Tests the per step timings and counters of an optimization
+"""
+
+import pytest
+
+import qcelemental as qcel
+
+import optking
+from optking import instrumentation, surrogate
+
+from .utils.molecules import ETHANOL_Z, distorted_ethanol, optimize_ethanol
+
+
+@pytest.fixture
+def records():
+    records = []
+    instrumentation.register_callback(records.append)
+    yield records
+    instrumentation.unregister_callback(records.append)
+
+
+@pytest.mark.parametrize("step_type", ["RFO", "LBFGS"])
+def test_step_timings(step_type, records):
+    result = optimize_ethanol({"step_type": step_type})
+    timings = result["extras"]["timings"]
+    steps, totals = timings["steps"], timings["totals"]
+
+    assert result["success"]
+    assert records == steps
+    assert len(steps) == len(result["energies"])
+    assert totals["counts"]["gradients"] == len(result["energies"])
+    for record in steps:
+        # a new step or a backstep
+        assert record["counts"].get("step", 0) + record["counts"].get("backsteps", 0) == 1
+        assert record["counts"]["displace_molsys"] == 1
+        assert record["counts"]["back_transformation_iterations"] >= record["counts"]["back_transformations"]
+        assert all(seconds >= 0 for seconds in record["times"].values())
+        # nested phases are counted once in the step time
+        assert max(record["times"].values()) <= record["time"] <= sum(record["times"].values())
+
+    # the first Hessian is guessed. Later ones are updated
+    assert "hessian_update" not in steps[0]["counts"]
+    if step_type == "RFO":
+        assert all(record["counts"]["hessian_update"] == 1 for record in steps[1:])
+    assert totals["times"]["step"] == pytest.approx(sum(record["times"].get("step", 0) for record in steps))
+    assert totals["time"] == pytest.approx(sum(record["time"] for record in steps))
+
+
+def test_failing_callback(records):
+    def broken(record):
+        raise RuntimeError("metrics server is down")
+
+    instrumentation.register_callback(broken)
+    try:
+        result = optimize_ethanol()
+    finally:
+        instrumentation.unregister_callback(broken)
+
+    assert result["success"]
+    assert len(records) == len(result["extras"]["timings"]["steps"])
+
+
+def test_inactive():
+    # nothing is recorded outside of an optimization
+    assert instrumentation.active() is None
+    with instrumentation.timer("step"):
+        instrumentation.count("gradients")
+    optimize_ethanol()
+    assert instrumentation.active() is None
+
+
+def test_interleaved_helpers():
+    # two helpers alive together each record only their own steps, and only while they run
+    helpers = []
+    for seed in (1, 2):
+        geom = distorted_ethanol(seed)
+        molecule = qcel.models.Molecule(
+            symbols=[qcel.periodictable.to_E(z) for z in ETHANOL_Z],
+            geometry=geom.ravel(),
+            fix_com=True,
+            fix_orientation=True,
+        )
+        helpers.append((optking.CustomHelper(molecule), surrogate.ForceFieldSurrogate(geom, ETHANOL_Z)))
+    assert instrumentation.active() is None
+
+    for _ in range(3):
+        for opt, potential in helpers:
+            opt.E, opt.gX = potential(opt.geom)
+            opt.compute()
+            assert instrumentation.active() is None
+            opt.take_step()
+            assert instrumentation.active() is None
+
+    for opt, _ in helpers:
+        steps = opt.opt_manager.timings.steps
+        assert len(steps) == 3
+        assert all(record["counts"]["gradients"] == 1 for record in steps)
+        assert all(record["counts"]["displace_molsys"] == 1 for record in steps)
+
+
+def test_recording_restores():
+    outer, inner = instrumentation.StepTimings(), instrumentation.StepTimings()
+    with instrumentation.recording(outer):
+        with instrumentation.recording(inner):
+            instrumentation.count("gradients")
+        assert instrumentation.active() is outer
+        instrumentation.count("gradients", 2)
+    assert instrumentation.active() is None
+    assert inner.end_step()["counts"] == {"gradients": 1}
+    assert outer.end_step()["counts"] == {"gradients": 2}
@@ -0,0 +1,95 @@
+"""
+Tests the hash indexed container of simple internal coordinates
+"""
+
+import copy
+
+import numpy as np
+import pytest
+
+from optking.bend import Bend
+from optking.cart import Cart
+from optking.frag import Frag
+from optking.intcoSet import IntcoSet, TYPE_CODES
+from optking.stre import HBond, Stre
+from optking.tors import Tors
+
+
+def test_lookup():
+    intcos = IntcoSet([Stre(0, 1), Stre(1, 2), Bend(0, 1, 2), Tors(0, 1, 2, 3), Cart(3, "x")])
+
+    assert Stre(1, 0) in intcos
+    assert Stre(0, 1, inverse=True) not in intcos
+    assert HBond(0, 1) not in intcos
+    assert Bend(2, 1, 0) in intcos
+    assert Bend(0, 1, 2, bend_type="LINEAR") not in intcos
+    assert intcos.index(Tors(3, 2, 1, 0)) == 3
+    assert intcos.find(Stre(1, 2).key) == 1
+    assert intcos.find(Cart(3, "y").key) == -1
+
+    with pytest.raises(ValueError):
+        intcos.index(Stre(0, 2))
+
+
+def test_arrays_follow_edits():
+    intcos = IntcoSet([Stre(0, 1), Bend(0, 1, 2)])
+    intcos.append(Tors(0, 1, 2, 3))
+    intcos.insert(0, HBond(2, 4))
+    del intcos[1]
+
+    codes = [TYPE_CODES[name] for name in ("HBond", "Bend", "Tors")]
+    assert intcos.types.tolist() == codes
+    assert intcos.atoms.tolist() == [[2, 4, -1, -1], [0, 1, 2, -1], [0, 1, 2, 3]]
+    assert intcos.index(Bend(0, 1, 2)) == 1
+
+    intcos[:] = [Stre(3, 4)]
+    assert intcos == [Stre(3, 4)]
+    assert intcos.atoms.tolist() == [[3, 4, -1, -1]]
+
+
+def test_list_behavior():
+    intcos = IntcoSet([Stre(0, 1), Bend(0, 1, 2)])
+    assert isinstance(intcos[:1], list)
+    assert [HBond(0, 2)] + intcos == [HBond(0, 2), Stre(0, 1), Bend(0, 1, 2)]
+    assert copy.deepcopy(intcos) == intcos
+
+    frag = Frag(np.array([1, 8, 1]), np.zeros((3, 3)), np.ones(3), [Stre(0, 1), Stre(1, 2)])
+    assert isinstance(frag.intcos, IntcoSet)
+    assert Stre(2, 1) in Frag.from_dict(frag.to_dict()).intcos
+
+
+def test_generation_from_list():
+    """Generating into a plain list or an IntcoSet gives the same coordinates in the same order"""
+    from optking import addIntcos, op
+
+    op.Params = op.OptParams(include_oofp=True)
+    # ethane-like chain with a near linear H-C-C
+    geom = np.array(
+        [
+            [0.0, 0.0, 0.0],
+            [2.9, 0.0, 0.0],
+            [-2.0, 0.0, 0.1],
+            [-0.7, 1.7, -1.0],
+            [-0.7, -1.7, -1.0],
+            [3.6, 1.7, 1.0],
+            [3.6, -1.7, 1.0],
+            [3.6, 0.0, -1.9],
+        ]
+    )
+    Z = [6, 6, 1, 1, 1, 1, 1, 1]
+    C = addIntcos.connectivity_from_distances(geom, Z)
+
+    as_list = [Stre(0, 1)]
+    addIntcos.add_intcos_from_connectivity(C, as_list, geom)
+    as_set = IntcoSet([Stre(0, 1)])
+    addIntcos.add_intcos_from_connectivity(C, as_set, geom)
+
+    assert isinstance(as_list, list)
+    assert as_list == as_set
+    assert len(set(intco.key for intco in as_set)) == len(as_set)
+
+    oofp_atoms = [tuple(a) for a in as_set.atoms[as_set.types == TYPE_CODES["Oofp"]].tolist()]
+    T, V, side1, side2 = oofp_atoms[0]
+    assert addIntcos.similar_oofp_added([side1, V, T, side2], as_set)
+    assert addIntcos.similar_oofp_added([side1, V, T, side2], as_list)
+    assert not addIntcos.similar_oofp_added([T, side1, V, side2], as_set)
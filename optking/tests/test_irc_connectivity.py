@@ -0,0 +1,70 @@
+"""
+Tests the geometry-only connectivity snapshots used to detect dissociation along an IRC
+and the batched recomputation of the IRC points' internal coordinates.
+"""
+
+import copy
+
+import numpy as np
+import pytest
+
+from optking import IRCdata
+from optking.frag import Frag
+from optking.molsys import Molsys
+
+Z = [8, 1, 1]
+H2O = np.array([[0.0, 0.0, 0.0], [1.8, 0.0, 0.0], [-0.45, 1.74, 0.0]])
+
+
+def make_molsys(geom):
+    molsys = Molsys([Frag(Z, geom, np.ones(3))])
+    molsys.fragments[0].add_intcos_from_connectivity()
+    return molsys
+
+
+@pytest.mark.parametrize("R_OH, dissociated", [(1.8, False), (2.5, False), (6.0, True)])
+def test_dissociation(R_OH, dissociated):
+    old_molsys = make_molsys(H2O)
+    geom = H2O.copy()
+    geom[1, 0] = R_OH
+    new_molsys = make_molsys(geom)
+
+    irc_history = IRCdata.IRCHistory()
+    assert irc_history.test_for_dissociation(new_molsys, old_molsys) == dissociated
+
+
+def test_bond_changes():
+    snapshot = IRCdata.ConnectivitySnapshot(H2O, Z)
+    geom = H2O.copy()
+    geom[1, 0] = 6.0
+    stretched = snapshot.at_geometry(geom)
+
+    assert snapshot.nfragments == 1
+    assert stretched.nfragments == 2
+    formed, broken = snapshot.bond_changes(stretched)
+    assert formed == []
+    assert broken == [(0, 1)]
+
+
+def test_recompute_all_internals():
+    molsys = make_molsys(H2O)
+    rng = np.random.default_rng(7)
+
+    irc_history = IRCdata.IRCHistory()
+    irc_history.set_atom_symbols(["O", "H", "H"])
+    irc_history.set_step_size_and_direction(0.2, "FORWARD")
+    for i in range(3):
+        x = H2O + rng.normal(scale=0.05, size=H2O.shape)
+        irc_history.add_irc_point(i, None, x, None, rng.normal(size=9), 0.0)
+        irc_history.add_pivot_point(None, x + 0.01)
+
+    ref_molsys = copy.deepcopy(molsys)
+    irc_history.recompute_all_internals(molsys)
+
+    assert np.allclose(molsys.geom, H2O)
+    for point in irc_history.irc_points:
+        ref_molsys.geom = point.x
+        assert np.allclose(point.q, ref_molsys.q_array())
+        assert np.allclose(point.f_q, ref_molsys.gradient_to_internals(point.f_x))
+        ref_molsys.geom = point.x_pivot
+        assert np.allclose(point.q_pivot, ref_molsys.q_array())
@@ -0,0 +1,50 @@
+"""
+Tests the limited memory BFGS step on Lennard-Jones clusters (no QC program needed)
+"""
+
+import numpy as np
+import pytest
+
+from optking.linearAlgebra import Projector
+
+from .utils.molecules import EPSILON, lj_cluster, optimize_lj
+
+
+@pytest.mark.parametrize("natom", [3, 4])
+def test_lbfgs_matches_rfo(natom):
+    """Small LJ clusters have a single minimum. L-BFGS should find the same one as RFO"""
+    params = {"g_convergence": "gau_tight"}
+    E_rfo, _, _ = optimize_lj(lj_cluster(natom), params)
+    E_lbfgs, _, result = optimize_lj(lj_cluster(natom), {"step_type": "LBFGS", **params})
+
+    assert result["success"]
+    assert E_lbfgs == pytest.approx(E_rfo, rel=1.0e-5)
+    assert E_lbfgs == pytest.approx(-EPSILON * {3: 3, 4: 6}[natom], rel=1.0e-5)
+
+
+def test_lbfgs_frozen_distance():
+    molecule = lj_cluster(4)
+    R_start = np.linalg.norm(molecule.geometry[0] - molecule.geometry[1])
+
+    params = {"step_type": "LBFGS", "lbfgs_memory": 4, "frozen_distance": "1 2"}
+    _, geom, result = optimize_lj(molecule, params)
+
+    assert result["success"]
+    assert np.linalg.norm(geom[0] - geom[1]) == pytest.approx(R_start, abs=1.0e-5)
+
+
+def test_lbfgs_projects_once(monkeypatch):
+    # the step reuses the projector of the forces. No (n, n) projector is formed
+    calls = []
+    onto_range = Projector.onto_range.__func__
+
+    def counting_onto_range(cls, B, threshold=1.0e-8):
+        calls.append(B.shape)
+        return onto_range(cls, B, threshold)
+
+    monkeypatch.setattr(Projector, "onto_range", classmethod(counting_onto_range))
+    monkeypatch.setattr(Projector, "to_dense", lambda self: pytest.fail("dense projector"))
+    _, _, result = optimize_lj(lj_cluster(5), {"step_type": "LBFGS"})
+
+    assert result["success"]
+    assert len(calls) == len(result["trajectory"])
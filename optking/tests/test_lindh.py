@@ -0,0 +1,105 @@
+"""
+Tests the vectorized Lindh model Hessian against a loop over the simple internal coordinates
+"""
+
+import itertools
+
+import numpy as np
+import pytest
+from qcelemental.models import Molecule
+
+import optking
+from optking import hessian
+from optking.bend import Bend
+from optking.stre import Stre
+from optking.tors import Tors
+
+from .utils.molecules import ETHANOL, ETHANOL_Z, lj_cluster, optimize_lj
+
+
+def reference_lindh(geom, Z, threshold=hessian.LINDH_THRESHOLD):
+    """Sum over all stretches, bends and torsions built from the optking coordinate classes"""
+    natom = len(Z)
+    rho = hessian.lindh_rho(geom, Z)
+    rho[rho < threshold] = 0
+    H = np.zeros((3 * natom, 3 * natom))
+
+    def add(intco, k):
+        dqdx = np.zeros(3 * natom)
+        intco.DqDx(geom, dqdx)
+        H[:] += k * np.outer(dqdx, dqdx)
+
+    def linear(a, b, c):
+        u = geom[a] - geom[b]
+        v = geom[c] - geom[b]
+        cos = np.dot(u, v) / np.linalg.norm(u) / np.linalg.norm(v)
+        return np.sqrt(1 - cos**2) < hessian.LINDH_LINEAR_SIN
+
+    for i, j in itertools.combinations(range(natom), 2):
+        if rho[i, j]:
+            add(Stre(i, j), hessian.LINDH_K_STRE * rho[i, j])
+
+    for i, j, k in itertools.permutations(range(natom), 3):
+        weight = rho[i, j] * rho[j, k]
+        if i < k and weight > threshold and not linear(i, j, k):
+            add(Bend(i, j, k), hessian.LINDH_K_BEND * weight)
+
+    for i, j, k, l in itertools.permutations(range(natom), 4):
+        weight = rho[i, j] * rho[j, k] * rho[k, l]
+        if j < k and weight > threshold and not (linear(i, j, k) or linear(j, k, l)):
+            add(Tors(i, j, k, l), hessian.LINDH_K_TORS * weight)
+    return H
+
+
+def test_lindh_matches_reference():
+    H = hessian.lindh_cartesian(ETHANOL, ETHANOL_Z)
+    assert np.allclose(H, reference_lindh(ETHANOL, ETHANOL_Z), atol=1.0e-10)
+
+
+def test_lindh_invariances():
+    H = hessian.lindh_cartesian(ETHANOL, ETHANOL_Z)
+    evals = np.linalg.eigvalsh(H)
+
+    assert np.allclose(H, H.T)
+    # translations and rotations have zero curvature, everything else is positive
+    assert np.allclose(evals[:6], 0, atol=1.0e-8)
+    assert np.all(evals[6:] > 1.0e-3)
+
+    rotation = np.linalg.qr(np.random.default_rng(2).normal(size=(3, 3)))[0]
+    R = np.kron(np.eye(len(ETHANOL_Z)), rotation)
+    H_rotated = hessian.lindh_cartesian(ETHANOL @ rotation.T + 1.5, ETHANOL_Z)
+    assert np.allclose(H_rotated, R @ H @ R.T, atol=1.0e-10)
+
+
+def test_lindh_linear_molecule():
+    """CO2. The bends are linear and must still get curvature in both directions"""
+    geom = np.array([[0, 0, -2.2], [0, 0, 0], [0, 0, 2.2]])
+    evals = np.linalg.eigvalsh(hessian.lindh_cartesian(geom, [8, 6, 8]))
+
+    # 3 translations and 2 rotations
+    assert np.allclose(evals[:5], 0, atol=1.0e-8)
+    assert np.all(np.isfinite(evals)) and np.all(evals[5:] > 1.0e-3)
+
+
+def test_lindh_guess_internals():
+    molecule = Molecule(symbols=ETHANOL_Z, geometry=ETHANOL.ravel(), fix_com=True, fix_orientation=True)
+    opt = optking.CustomHelper(molecule, {"intrafrag_hess": "LINDH"})
+    H = hessian.guess(opt.molsys, guessType="LINDH")
+
+    assert H.shape == (opt.molsys.num_intcos, opt.molsys.num_intcos)
+    assert np.allclose(H, H.T)
+    # positive definite within the 3N - 6 nonredundant combinations
+    evals = np.linalg.eigvalsh(H)
+    assert np.all(evals > -1.0e-10)
+    assert np.sum(evals > 1.0e-3) >= 3 * len(ETHANOL_Z) - 6
+    assert np.allclose(hessian.guess_diagonal(opt.molsys, guessType="LINDH"), np.diag(H))
+
+
+def test_lindh_lj_cluster():
+    """Ar atoms are beyond the screening threshold. The diagonal floor keeps the guess usable"""
+    params = {"g_convergence": "gau_tight"}
+    E_ref, _, _ = optimize_lj(lj_cluster(4), params)
+    E, _, result = optimize_lj(lj_cluster(4), {"intrafrag_hess": "LINDH", **params})
+
+    assert result["success"]
+    assert E == pytest.approx(E_ref, rel=1.0e-5)
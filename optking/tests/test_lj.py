@@ -2,6 +2,8 @@
 Tests the LJ functions
 """
 
+from itertools import combinations
+
 import optking
 import pytest
 import numpy as np
@@ -28,3 +30,76 @@ def test_lj_energy(R, ref):
             "test_lj_energy for R=%.2f did not match reference (comp = %12.10f, ref = %12.10f)."
             % (R, energy, ref)
         )
+
+
+def loop_energy_and_gradient(positions, sigma, epsilon, cutoff=None):
+    """Pair by pair reference"""
+    E = 0.0
+    gradient = np.zeros_like(positions)
+    shift = 0.0 if cutoff is None else (sigma / cutoff) ** 12 - (sigma / cutoff) ** 6
+    for i, j in combinations(range(len(positions)), 2):
+        v_ij = positions[j] - positions[i]
+        r = np.linalg.norm(v_ij)
+        if cutoff is not None and r >= cutoff:
+            continue
+        E += (sigma / r) ** 12 - (sigma / r) ** 6 - shift
+        dVdr = -12 * sigma**12 / r**13 + 6 * sigma**6 / r**7
+        gradient[i] -= dVdr * v_ij / r
+        gradient[j] += dVdr * v_ij / r
+    return 4 * epsilon * E, 4 * epsilon * gradient.ravel()
+
+
+@pytest.mark.parametrize("cutoff", [None, 7.0, 50.0])
+def test_lj_matches_loop(cutoff, monkeypatch):
+    positions = np.random.default_rng(0).uniform(0, 20, (60, 3))
+    E_ref, g_ref = loop_energy_and_gradient(positions, 3.0, 0.01, cutoff)
+
+    # small blocks to exercise the chunking
+    for block_pairs in [optking.lj_functions.BLOCK_PAIRS, 50]:
+        monkeypatch.setattr(optking.lj_functions, "BLOCK_PAIRS", block_pairs)
+        E, g = optking.lj_functions.calc_energy_and_gradient(positions, 3.0, 0.01, cutoff=cutoff)
+        assert E == pytest.approx(E_ref, rel=1.0e-12)
+        assert np.allclose(g, g_ref, rtol=1.0e-12, atol=1.0e-14)
+
+
+def test_cell_list_pairs():
+    positions = np.random.default_rng(1).uniform(0, 15, (200, 3))
+    pairs = set()
+    for i, j in optking.lj_functions.pairs(positions, cutoff=4.0, block_pairs=1000):
+        assert np.all(i < j)
+        pairs.update(zip(i.tolist(), j.tolist()))
+
+    close = {
+        (i, j)
+        for i, j in combinations(range(200), 2)
+        if np.linalg.norm(positions[i] - positions[j]) < 4.0
+    }
+    assert close <= pairs
+
+
+def test_lj_hessian():
+    positions = np.random.default_rng(2).uniform(0, 8, (8, 3))
+    E, g, H = optking.lj_functions.calc_energy_and_gradient(positions, 3.0, 0.01, do_hessian=True)
+
+    step = 1.0e-6
+    H_fd = np.zeros_like(H)
+    for xyz in range(positions.size):
+        plus, minus = positions.ravel().copy(), positions.ravel().copy()
+        plus[xyz] += step
+        minus[xyz] -= step
+        g_plus = optking.lj_functions.calc_energy_and_gradient(plus.reshape(-1, 3), 3.0, 0.01)[1]
+        g_minus = optking.lj_functions.calc_energy_and_gradient(minus.reshape(-1, 3), 3.0, 0.01)[1]
+        H_fd[xyz] = (g_plus - g_minus) / (2 * step)
+
+    assert np.allclose(H, H.T)
+    assert np.allclose(H, H_fd, atol=1.0e-6 * np.abs(H).max())
+
+
+@pytest.mark.parametrize("cutoff", [None, 7.0])
+def test_lj_hessian_chunks(cutoff, monkeypatch):
+    # the pair blocks are added once at the end or whenever enough pairs have been collected
+    positions = np.random.default_rng(3).uniform(0, 20, (60, 3))
+    H_ref = optking.lj_functions.calc_energy_and_gradient(positions, 3.0, 0.01, cutoff=cutoff, do_hessian=True)[2]
+    monkeypatch.setattr(optking.lj_functions, "BLOCK_PAIRS", 50)
+    H = optking.lj_functions.calc_energy_and_gradient(positions, 3.0, 0.01, cutoff=cutoff, do_hessian=True)[2]
+    assert np.allclose(H, H_ref, rtol=1.0e-12, atol=1.0e-14 * np.abs(H_ref).max())
@@ -0,0 +1,82 @@
+"""
+Tests that importing optking writes nothing and that the log can be sent to each destination
+"""
+
+import logging
+import os
+import subprocess
+import sys
+
+import pytest
+
+import optking
+from optking import loggingconfig
+
+from .utils.molecules import optimize_ethanol
+
+
+@pytest.fixture
+def restore_logging():
+    logger = logging.getLogger("optking")
+    handlers, level = logger.handlers[:], logger.level
+    yield
+    if loggingconfig._handler is not None:
+        logger.removeHandler(loggingconfig._handler)
+        loggingconfig._handler.close()
+        loggingconfig._handler = None
+    logger.handlers[:] = handlers
+    logger.setLevel(level)
+
+
+def test_import_writes_nothing(tmp_path):
+    code = "import logging, optking; logging.getLogger('optking').warning('warning')"
+    package_root = os.path.dirname(os.path.dirname(os.path.abspath(optking.__file__)))
+    path = [package_root] + [p for p in os.environ.get("PYTHONPATH", "").split(os.pathsep) if p]
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(path)}
+    subprocess.run([sys.executable, "-c", code], cwd=tmp_path, check=True, env=env)
+    assert not os.listdir(tmp_path)
+
+
+def test_memory(restore_logging):
+    handlers = logging.getLogger("optking").handlers[:]
+    with loggingconfig.log_to("memory") as handler:
+        result = optimize_ethanol()
+    text = handler.stream.getvalue()
+
+    assert result["success"]
+    assert "OPTKING" in text and "Preparing OptimizationResult" in text
+    assert not handler.stream.closed
+    # other handlers are restored and no default was installed
+    assert logging.getLogger("optking").handlers == handlers
+
+
+def test_rotating(tmp_path, restore_logging):
+    filename = str(tmp_path / "optking.log")
+    loggingconfig.configure_logging("rotating", filename=filename, max_bytes=20000, backup_count=2)
+    optimize_ethanol()
+    assert loggingconfig.is_configured()
+
+    files = sorted(os.listdir(tmp_path))
+    assert files == ["optking.log", "optking.log.1", "optking.log.2"]
+    assert all(os.path.getsize(tmp_path / f) <= 20000 for f in files)
+
+
+def test_null(tmp_path, monkeypatch, restore_logging):
+    monkeypatch.chdir(tmp_path)
+    with loggingconfig.log_to("null"):
+        optimize_ethanol()
+    assert not os.listdir(tmp_path)
+
+    with pytest.raises(ValueError):
+        loggingconfig.make_handler("syslog")
+
+
+def test_default_file(tmp_path, monkeypatch, restore_logging):
+    monkeypatch.chdir(tmp_path)
+    # outside of conftest's null log
+    monkeypatch.setattr(loggingconfig, "_scopes", 0)
+    logger = logging.getLogger("optking")
+    logger.handlers[:] = [h for h in logger.handlers if isinstance(h, logging.NullHandler)]
+
+    optimize_ethanol()
+    assert os.listdir(tmp_path) == [loggingconfig.DEFAULT_LOG_FILE]
@@ -0,0 +1,135 @@
+"""
+Tests the contiguous geometry, mass and Z arrays of Molsys shared with its fragments and the
+cached atom and coordinate offsets, and the constraint projection
+"""
+
+import copy
+
+import numpy as np
+import pytest
+
+import optking
+from optking.frag import Frag
+from optking.linearAlgebra import symm_mat_inv
+from optking.stre import Stre
+
+from .utils.molecules import ETHANOL_Z, ethanol_molsys, two_ethanols
+
+
+def test_fragment_views():
+    molsys = two_ethanols()
+    natom = len(ETHANOL_Z)
+    geom = molsys.geom
+
+    # no copies. Fragments see changes of the molecular geometry and vice versa
+    assert molsys.geom is geom
+    assert all(np.shares_memory(F.geom, geom) for F in molsys.fragments)
+    geom[natom] += 0.1
+    assert np.array_equal(molsys.fragments[1].geom[0], geom[natom])
+    molsys.fragments[0].geom[0] = 0.0
+    assert not geom[0].any()
+
+    molsys.geom = np.zeros(3 * molsys.natom)
+    assert molsys.geom is geom and not molsys.fragments[1].geom.any()
+
+    assert np.array_equal(molsys.Z, ETHANOL_Z * 2)
+    assert np.array_equal(molsys.masses, molsys.Z)
+    assert np.shares_memory(molsys.fragments[1].Z, molsys.Z)
+
+
+def test_rebuild():
+    molsys = two_ethanols()
+    snapshot = molsys.geom.copy()
+
+    # copies are independent of the original
+    other = copy.deepcopy(molsys)
+    other.geom += 1.0
+    assert np.array_equal(molsys.geom, snapshot)
+    assert np.array_equal(other.fragments[0].geom, snapshot[: len(ETHANOL_Z)] + 1.0)
+    assert np.shares_memory(other.fragments[0].geom, other.geom)
+
+    # new fragments get views into new arrays
+    molsys.consolidate_fragments()
+    assert molsys.nfragments == 1
+    assert np.array_equal(molsys.geom, snapshot)
+    molsys.split_fragments_by_connectivity()
+    assert molsys.nfragments == 2
+    assert np.array_equal(molsys.geom, snapshot)
+    assert all(np.shares_memory(F.geom, molsys.geom) for F in molsys.fragments)
+
+    molsys.fragments.append(Frag([18], np.zeros((1, 3)), [39.9]))
+    assert molsys.geom.shape == (2 * len(ETHANOL_Z) + 1, 3)
+    assert molsys.Z[-1] == 18
+
+
+def test_layout():
+    molsys = two_ethanols()
+    natom = len(ETHANOL_Z)
+    for F in molsys.fragments:
+        F.intcos.extend([Stre(0, 1), Stre(0, 2)])
+
+    assert [molsys.frag_1st_atom(i) for i in range(3)] == [0, natom, 2 * natom]
+    assert molsys.atom2frag_index(natom - 1) == 0 and molsys.atom2frag_index(natom) == 1
+    assert molsys.frag_intco_slice(1) == slice(2, 4)
+    assert molsys.num_intcos == 4
+    assert not molsys.frozen_intco_list.any()
+    assert [lbl.strip() for lbl in molsys.intco_lbls] == ["R(1,2)", "R(1,3)"] * 2
+
+    # changes of the coordinates or their constraints are seen
+    molsys.fragments[0].intcos.append(Stre(1, 2))
+    molsys.fragments[1].intcos[1].freeze()
+    assert molsys.frag_1st_intco(1) == 3
+    assert molsys.dimerfrag_1st_intco(0) == molsys.num_intcos == 5
+    assert np.array_equal(molsys.frozen_intco_list, [False, False, False, False, True])
+    assert np.array_equal(molsys.ranged_frozen_intco_list(np.zeros(5)), np.zeros(5, dtype=bool))
+    assert molsys.intco_lbls[2].strip() == "R(2,3)"
+
+
+@pytest.mark.parametrize("coordinates", ["REDUNDANT", "DELOCALIZED"])
+def test_constraint_projection(coordinates):
+    params = optking.op.OptParams(
+        opt_coordinates=coordinates, frozen_distance="1 2", frozen_bend="1 2 3", ranged_dihedral="4 1 2 3 100.0 150.0"
+    )
+    molsys = ethanol_molsys(params)
+    fq = np.random.default_rng(2).normal(size=molsys.num_intcos)
+    constrained = molsys.constrained_intco_list(fq)
+    # the dihedral is outside of its range
+    assert np.count_nonzero(constrained) == 3 and constrained[molsys.ranged_intco_list].all()
+
+    # the projector with the dense diagonal constraint matrix
+    basis = molsys.step_basis()
+    if basis is None:
+        G = molsys.Gmat()
+        Pprime = G @ symm_mat_inv(G, redundant=True)
+    else:
+        Pprime = basis @ basis.T
+    C = molsys.constraint_matrix(fq)
+    reference = Pprime - Pprime @ C @ symm_mat_inv(C @ Pprime @ C, redundant=True) @ C @ Pprime
+
+    P = molsys.projection_matrix(fq)
+    np.testing.assert_allclose(P, reference, atol=1.0e-10)
+    np.testing.assert_allclose(P[constrained], 0.0, atol=1.0e-10)
+    np.testing.assert_allclose(P @ P, P, atol=1.0e-8)
+
+
+def test_projector_operator():
+    molsys = ethanol_molsys(optking.op.OptParams(frozen_distance="1 2", frozen_bend="1 2 3"))
+    fq = np.random.default_rng(4).normal(size=molsys.num_intcos)
+    P = molsys.projector(fq)
+    dense = P.to_dense()
+
+    rng = np.random.default_rng(5)
+    v, M = rng.normal(size=molsys.num_intcos), rng.normal(size=(molsys.num_intcos, 4))
+    np.testing.assert_allclose(P @ v, dense @ v, atol=1.0e-12)
+    np.testing.assert_allclose(P @ M, dense @ M, atol=1.0e-12)
+    np.testing.assert_allclose(M.T @ P, M.T @ dense, atol=1.0e-12)
+    np.testing.assert_allclose(P[[0, 3]], dense[[0, 3]], atol=1.0e-12)
+    assert P.rank == np.linalg.matrix_rank(dense, tol=1.0e-8)
+
+    # cached until the geometry or the constraints change
+    assert molsys.projector(fq) is P
+    molsys.geom = molsys.geom + 0.01
+    assert molsys.projector(fq) is not P
+    P = molsys.projector(fq)
+    molsys.fragments[0].intcos[0].unfreeze()
+    assert molsys.projector(fq) is not P
@@ -0,0 +1,68 @@
+"""
+Tests the array formatting and lazy log messages of printTools
+"""
+
+import logging
+
+import numpy as np
+import pytest
+
+from optking import printTools
+
+
+def test_print_mat_string():
+    M = np.arange(9, dtype=float).reshape(1, 9)
+    expected = (
+        "\tM\n\t   0.000000   1.000000   2.000000   3.000000   4.000000   5.000000   6.000000"
+        "\n\t   7.000000   8.000000\n"
+    )
+    assert printTools.print_mat_string(M, title="M") == expected
+    assert printTools.print_array_string(np.arange(3.0)) == "\t  0.000000  1.000000  2.000000\n"
+
+
+@pytest.mark.parametrize("n", [150, 300])
+def test_summary(n):
+    H = np.diag(np.arange(1.0, n + 1))
+    full = printTools.print_mat_string(H, max_elements=None if n == 150 else n * n)
+    summary = printTools.print_mat_string(H)
+
+    assert len(full.splitlines()) >= n
+    if n * n > printTools.MAX_PRINT_ELEMENTS:
+        assert "array with more than" in summary
+        assert f"{float(n):10.6f}" in summary  # the diagonal is still shown
+        assert len(summary) < len(full) / 10
+    else:
+        assert summary == full
+
+    vector = np.ones(printTools.MAX_PRINT_ELEMENTS + 1)
+    assert "array with more than" in printTools.print_array_string(vector)
+    assert "array with more than" not in printTools.print_array_string(vector, max_elements=None)
+    assert "array with more than" not in printTools.print_array_string(vector, max_elements=0)
+
+
+def test_print_everything(monkeypatch):
+    n = 250
+    H = np.eye(n)
+    assert n * n > printTools.MAX_PRINT_ELEMENTS
+    assert "array with more than" not in printTools.print_mat_string(H, max_elements=None)
+    assert "array with more than" in printTools.print_mat_string(H, max_elements=n)
+
+    monkeypatch.setattr(printTools, "MAX_PRINT_ELEMENTS", None)
+    assert "array with more than" not in printTools.print_mat_string(H)
+
+
+def test_lazy_string(caplog):
+    calls = []
+
+    def report(M):
+        calls.append(M)
+        return printTools.print_mat_string(M)
+
+    logger = logging.getLogger("optking.tests.lazy")
+    with caplog.at_level(logging.INFO, logger="optking.tests.lazy"):
+        logger.debug("H\n%s", printTools.LazyString(report, np.eye(2)))
+        assert not calls
+
+        logger.info("H\n%s", printTools.LazyString(report, np.eye(2)))
+        assert len(calls) == 1
+    assert "1.000000" in caplog.text
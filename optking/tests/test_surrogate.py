@@ -0,0 +1,136 @@
+"""
+Tests the surrogate potentials and the surrogate pre-optimization stage of optimize_qcengine.
+The QC program is replaced by an analytic potential
+"""
+
+import copy
+
+import numpy as np
+import pytest
+import qcelemental as qcel
+
+import optking
+from optking import optwrapper, surrogate
+from optking.compute_wrappers import UserComputer
+
+from .utils.molecules import ETHANOL_Z, distorted_ethanol
+
+
+def finite_difference_gradient(fn, geom, step=1.0e-5):
+    gradient = np.zeros(geom.size)
+    for xyz in range(geom.size):
+        plus, minus = geom.ravel().copy(), geom.ravel().copy()
+        plus[xyz] += step
+        minus[xyz] -= step
+        gradient[xyz] = (fn(plus.reshape(-1, 3))[0] - fn(minus.reshape(-1, 3))[0]) / (2 * step)
+    return gradient
+
+
+class ExpensivePotential(surrogate.ForceFieldSurrogate):
+    """Stands in for the QC program. Same topology as the FF surrogate, different minimum"""
+
+    def __init__(self, geom, Z):
+        super().__init__(geom, Z)
+        self.r0 *= 1.03
+        self.cos0 *= 0.95
+
+
+@pytest.fixture
+def qc_stage(monkeypatch):
+    """Route the "qc" computer of optimize_qcengine to ExpensivePotential and count gradients"""
+    potential = ExpensivePotential(distorted_ethanol(), ETHANOL_Z)
+    calls = []
+
+    class AnalyticComputer(UserComputer):
+        def _compute(self, driver):
+            calls.append(driver)
+            E, gX = potential(np.reshape(self.molecule["geometry"], (-1, 3)))
+            self.external_energy, self.external_gradient = float(E), gX
+            return super()._compute(driver)
+
+    make_computer = optwrapper.make_computer
+
+    def make_analytic_computer(opt_input, computer_type):
+        if computer_type == "user":
+            return make_computer(opt_input, computer_type)
+        molecule = copy.deepcopy(opt_input["initial_molecule"])
+        return AnalyticComputer(molecule, opt_input["input_specification"]["model"], {}, "analytic")
+
+    monkeypatch.setattr(optwrapper, "make_computer", make_analytic_computer)
+    return calls
+
+
+def ethanol_input(keywords):
+    return {
+        "initial_molecule": {
+            "symbols": [qcel.periodictable.to_E(z) for z in ETHANOL_Z],
+            "geometry": distorted_ethanol().ravel().tolist(),
+            "fix_com": True,
+            "fix_orientation": True,
+        },
+        "input_specification": {"model": {"method": "analytic"}, "driver": "gradient", "keywords": {}},
+        "keywords": {"g_convergence": "gau", **keywords},
+    }
+
+
+@pytest.mark.parametrize("name", ["LJ", "FF"])
+def test_surrogate_gradients(name):
+    geom = distorted_ethanol()
+    fn = surrogate.make_surrogate(name, geom, ETHANOL_Z)
+    assert np.allclose(fn(geom)[1], finite_difference_gradient(fn, geom), atol=1.0e-7)
+
+
+def test_lj_surrogate_matches_lj_functions():
+    geom = np.random.default_rng(4).normal(scale=4.0, size=(5, 3))
+    sigma, epsilon = surrogate.lj_parameters([18] * 5)
+    E, gX = surrogate.lennard_jones(geom, sigma, epsilon)
+    E_ref, gX_ref = optking.lj_functions.calc_energy_and_gradient(geom, sigma[0], epsilon[0])
+
+    assert E == pytest.approx(E_ref)
+    assert np.allclose(gX, gX_ref)
+
+
+def test_condition_hessian():
+    geom = distorted_ethanol()
+    fn = surrogate.make_surrogate("FF", geom, ETHANOL_Z)
+    evals = np.linalg.eigvalsh(surrogate.condition_hessian(surrogate.cartesian_hessian(fn, geom), geom))
+
+    assert np.allclose(evals[:6], 0, atol=1.0e-10)
+    assert np.all(evals[6:] >= surrogate.MIN_CURVATURE - 1.0e-10)
+
+
+def test_surrogate_stage_saves_gradients(qc_stage):
+    reference = optwrapper.optimize_qcengine(ethanol_input({}))
+    n_reference = len(qc_stage)
+    qc_stage.clear()
+
+    result = optwrapper.optimize_qcengine(ethanol_input({"surrogate": "FF"}))
+
+    assert reference["success"] and result["success"]
+    assert result["energies"][-1] == pytest.approx(reference["energies"][-1], abs=1.0e-6)
+    assert len(qc_stage) < n_reference
+    assert result["extras"]["surrogate"]["converged"]
+
+
+def test_callable_surrogate(qc_stage):
+    fn = surrogate.ForceFieldSurrogate(distorted_ethanol(), ETHANOL_Z)
+    result = optwrapper.optimize_qcengine(ethanol_input({"surrogate_hessian": False}), surrogate=fn)
+
+    assert result["success"]
+    assert result["extras"]["surrogate"]["steps"] > 1
+    # the QC stage starts from the surrogate minimum
+    start = np.reshape(result["trajectory"][0]["molecule"]["geometry"], (-1, 3))
+    assert np.allclose(fn(start)[1], 0, atol=1.0e-3)
+
+
+def test_result_reports_submitted_input(qc_stage):
+    # the surrogate stage works on a copy. Its molecule and Hessian file are not reported
+    opt_input = ethanol_input({"surrogate": "FF"})
+    submitted = copy.deepcopy(opt_input)
+    result = optwrapper.optimize_qcengine(opt_input)
+
+    assert result["success"]
+    assert result["initial_molecule"] == submitted["initial_molecule"]
+    assert result["keywords"] == submitted["keywords"]
+    # the QC stage started from the surrogate minimum
+    assert result["trajectory"][0]["molecule"]["geometry"] != submitted["initial_molecule"]["geometry"]
@@ -0,0 +1,95 @@
+"""
+Tests point group detection and optimizations restricted to the totally symmetric coordinates
+"""
+
+import numpy as np
+import pytest
+
+import optking
+from optking import lj_functions, symmetry
+
+from .utils.molecules import optimize
+
+
+def ring(n, r, z=0.0, phase=0.0):
+    return [[r * np.cos(phase + 2 * np.pi * k / n), r * np.sin(phase + 2 * np.pi * k / n), z] for k in range(n)]
+
+
+MOLECULES = {
+    "C1": ([[0.1, 0.2, 0.0], [1.9, -0.3, 0.2], [-0.5, 1.7, 0.4], [0.3, -0.6, 2.1]], [6, 1, 9, 17]),
+    "Cs": ([[0.0, 0.0, 0.0], [1.8, 0.0, 0.0], [-0.6, 3.0, 0.0]], [8, 1, 17]),
+    "C2v": ([[0.0, 0.0, 0.12], [0.0, 1.43, -0.96], [0.0, -1.43, -0.96]], [8, 1, 1]),
+    "C3v": ([[0.0, 0.0, 0.2]] + ring(3, 1.8, -0.5), [7, 1, 1, 1]),
+    "D3d": (
+        [[0.0, 0.0, 1.45], [0.0, 0.0, -1.45]] + ring(3, 1.9, 2.1) + ring(3, 1.9, -2.1, np.pi / 3),
+        [6, 6] + [1] * 6,
+    ),
+    "D6h": (ring(6, 2.6) + ring(6, 4.6), [6] * 6 + [1] * 6),
+    "Td": ([[0, 0, 0], [1, 1, 1], [1, -1, -1], [-1, 1, -1], [-1, -1, 1]], [6, 1, 1, 1, 1]),
+    "Oh": ([[0, 0, 0], [3, 0, 0], [-3, 0, 0], [0, 3, 0], [0, -3, 0], [0, 0, 3], [0, 0, -3]], [16] + [9] * 6),
+    "D_inf_h": ([[0, 0, 0], [0, 0, 2.2], [0, 0, -2.2]], [6, 8, 8]),
+}
+ORDERS = {"C1": 1, "Cs": 2, "C2v": 4, "C3v": 6, "D3d": 12, "D6h": 24, "Td": 24, "Oh": 48, "D_inf_h": 8}
+
+
+@pytest.mark.parametrize("name", MOLECULES)
+def test_find_point_group(name):
+    geom, Z = MOLECULES[name]
+    rotation = np.linalg.qr(np.random.default_rng(3).normal(size=(3, 3)))[0]
+    geom = np.array(geom, dtype=float) @ rotation.T + [0.3, -1.0, 2.0]
+
+    point_group = symmetry.find_point_group(geom, Z)
+    assert point_group.name == name
+    assert point_group.order == ORDERS[name]
+    np.testing.assert_allclose(point_group.symmetrize(geom), geom, atol=1.0e-10)
+
+    P = point_group.cartesian_projector()
+    np.testing.assert_allclose(P @ P, P, atol=1.0e-10)
+
+    # a small distortion is within the tolerance and is removed by symmetrize
+    distorted = geom + np.random.default_rng(4).normal(scale=0.005, size=geom.shape)
+    symmetrized = symmetry.find_point_group(distorted, Z).symmetrize(distorted)
+    assert symmetry.find_point_group(symmetrized, Z, tol=1.0e-8).name == name
+
+
+def test_findif_gradient():
+    # LJ octahedron. Its gradient is totally symmetric: one displacement (breathing) suffices
+    geom = np.array(MOLECULES["Oh"][0][1:], dtype=float) * 2.5
+    point_group = symmetry.find_point_group(geom, [18] * 6)
+
+    displacements = point_group.findif_displacements(geom, step=1.0e-4)
+    energies = [lj_functions.calc_energy_and_gradient(g, 6.0, 0.01, do_gradient=False) for g in displacements]
+    _, gradient = lj_functions.calc_energy_and_gradient(geom, 6.0, 0.01)
+
+    assert len(displacements) == 2
+    np.testing.assert_allclose(point_group.findif_gradient(energies, step=1.0e-4), gradient, atol=1.0e-8)
+
+
+@pytest.mark.parametrize("step_type", ["RFO", "LBFGS"])
+def test_symmetric_optimization(step_type):
+    # benzene with too long bonds. Two of its internal coordinates are totally symmetric
+    geom, Z = np.array(ring(6, 2.9) + ring(6, 4.6)), [6] * 6 + [1] * 6
+    opt, result = optimize(geom, Z, {"use_symmetry": True, "step_type": step_type})
+    _, reference = optimize(geom, Z, {"step_type": step_type})
+
+    assert opt.molsys.point_group.name == "D6h"
+    assert opt.molsys.symmetric_intco_basis().shape == (opt.molsys.num_intcos, 2)
+    assert result["success"]
+    assert result["energies"][-1] == pytest.approx(reference["energies"][-1], abs=1.0e-8)
+
+    final = np.array(result["final_molecule"]["geometry"]).reshape(-1, 3)
+    assert symmetry.find_point_group(final, Z, tol=1.0e-8).name == "D6h"
+
+
+def test_is_dq_symmetric():
+    geom, Z = np.array(MOLECULES["C2v"][0]), MOLECULES["C2v"][1]
+    molsys = optking.Molsys.from_schema(
+        {"symbols": ["O", "H", "H"], "geometry": geom.ravel(), "fix_com": True, "fix_orientation": True}
+    )
+    optking.make_internal_coords(molsys, optking.op.OptParams())
+    assert optking.misc.is_dq_symmetric(molsys, np.array([0.1, 0.0, 0.0]))
+
+    molsys.detect_symmetry()
+    # stretches and bend
+    assert optking.misc.is_dq_symmetric(molsys, np.array([0.1, 0.1, 0.05]))
+    assert not optking.misc.is_dq_symmetric(molsys, np.array([0.1, -0.1, 0.0]))
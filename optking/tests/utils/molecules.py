@@ -0,0 +1,129 @@
+"""
+Molecules and optimization loops shared by the tests that need no QC program
+"""
+
+import numpy as np
+import qcelemental as qcel
+from qcelemental.models import Molecule
+
+import optking
+from optking import surrogate
+from optking.frag import Frag
+from optking.molsys import Molsys
+
+# ethanol, bohr
+ETHANOL_Z = [6, 6, 8, 1, 1, 1, 1, 1, 1]
+ETHANOL = np.array(
+    [
+        [-1.751, -0.167, 0.000],
+        [0.926, 1.039, 0.000],
+        [2.777, -0.946, 0.000],
+        [-3.058, 1.424, 0.000],
+        [-2.064, -1.377, 1.670],
+        [-2.064, -1.377, -1.670],
+        [1.216, 2.264, 1.671],
+        [1.216, 2.264, -1.671],
+        [4.405, -0.115, 0.000],
+    ]
+)
+
+# Lennard-Jones parameters of argon
+SIGMA = 6.4
+EPSILON = 0.0004
+
+
+def distorted_ethanol(seed=1):
+    return ETHANOL + np.random.default_rng(seed).normal(scale=0.25, size=ETHANOL.shape)
+
+
+def ethanol_molsys(params):
+    geom = distorted_ethanol()
+    molecule = qcel.models.Molecule(
+        symbols=[qcel.periodictable.to_E(z) for z in ETHANOL_Z],
+        geometry=geom.ravel(),
+        fix_com=True,
+        fix_orientation=True,
+    )
+    molsys = optking.Molsys.from_schema(molecule.dict())
+    optking.make_internal_coords(molsys, params)
+    return molsys
+
+
+def two_ethanols():
+    geom = distorted_ethanol()
+    masses = [1.0 * z for z in ETHANOL_Z]
+    frags = [Frag(list(ETHANOL_Z), geom.copy(), masses), Frag(list(ETHANOL_Z), geom + 8.0, masses)]
+    return Molsys(frags)
+
+
+def optimize(geom, Z, params):
+    """Optimize on the force field surrogate of the molecule. Returns the helper and the result"""
+    potential = surrogate.ForceFieldSurrogate(geom, Z)
+    molecule = qcel.models.Molecule(
+        symbols=[qcel.periodictable.to_E(z) for z in Z],
+        geometry=np.ravel(geom),
+        fix_com=True,
+        fix_orientation=True,
+    )
+
+    opt = optking.CustomHelper(molecule, params={"g_convergence": "gau_tight", **params})
+    for _ in range(50):
+        opt.E, opt.gX = potential(opt.geom)
+        opt.compute()
+        opt.take_step()
+        if opt.status() == "CONVERGED":
+            break
+    return opt, opt.close()
+
+
+def optimize_ethanol(params=None):
+    geom = distorted_ethanol()
+    potential = surrogate.ForceFieldSurrogate(geom, ETHANOL_Z)
+    molecule = qcel.models.Molecule(
+        symbols=[qcel.periodictable.to_E(z) for z in ETHANOL_Z],
+        geometry=geom.ravel(),
+        fix_com=True,
+        fix_orientation=True,
+    )
+
+    opt = optking.CustomHelper(molecule, params={"g_convergence": "gau", **(params or {})})
+    for _ in range(50):
+        opt.E, opt.gX = potential(opt.geom)
+        opt.compute()
+        opt.take_step()
+        if opt.status() == "CONVERGED":
+            break
+    return opt.close()
+
+
+def lj_cluster(natom, seed=3):
+    rng = np.random.default_rng(seed)
+    corners = np.array([[0, 0, 0], [7, 0, 0], [0, 7, 0], [0, 0, 7], [7, 7, 0], [7, 0, 7]], dtype=float)
+    geom = corners[:natom] + rng.normal(scale=0.3, size=(natom, 3))
+    return Molecule(symbols=["Ar"] * natom, geometry=geom.ravel(), fix_com=True, fix_orientation=True)
+
+
+def optimize_lj(molecule, params, maxiter=100):
+    opt = optking.CustomHelper(molecule, params)
+    for _ in range(maxiter):
+        opt.E, opt.gX = optking.lj_functions.calc_energy_and_gradient(opt.geom, SIGMA, EPSILON, True)
+        opt.compute()
+        opt.take_step()
+        if opt.test_convergence() is True:
+            break
+    E = opt.E
+    result = opt.close()
+    return E, opt.geom, result
+
+
+def water_cluster(n_water, spacing=5.6, seed=1):
+    """Randomly oriented waters on a cubic grid. Geometry (bohr) and Z"""
+    rng = np.random.default_rng(seed)
+    side = int(np.ceil(n_water ** (1 / 3)))
+    water = np.array([[0.0, 0.0, 0.0], [1.81, 0.0, 0.0], [-0.45, 1.75, 0.0]])
+    geom = []
+    for i in range(n_water):
+        center = spacing * np.array([i // side**2, (i // side) % side, i % side], dtype=float)
+        rotation = np.linalg.qr(rng.normal(size=(3, 3)))[0]
+        geom.append(water @ rotation.T + center)
+    return np.vstack(geom), np.array([8, 1, 1] * n_water)
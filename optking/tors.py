@@ -37,6 +37,8 @@ class Tors(Simple):
         class for evaluating additional external force
     """
 
+    __slots__ = ("_near180",)
+
     def __init__(
         self,
         a,
@@ -85,8 +85,9 @@ class OptParams(BaseModel):
     print_lvl: int = Field(ge=1, le=5, default=1, alias="PRINT")
     """An integer between 1 (least printing) and 5 (most printing). This has been largely, but not
     entirely, replaced by using the logging modules `DEBUG` and `INFO` levels.
-    Consider changing the logging handler in the `loggingconfig.py` or if using a program like
-    as Psi4 change the logging level from the command line. `psi4 --loglevel=10...`"""
+    Consider choosing a log destination and level with `optking.loggingconfig.configure_logging` (e.g.
+    `configure_logging("file", level="DEBUG")`) or if using a program like Psi4 change the logging
+    level from the command line. `psi4 --loglevel=10...`"""
 
     # Print all optimization parameters.
     # printxopt_params: bool = False
@@ -98,26 +99,26 @@ class OptParams(BaseModel):
 	`STEP_TYPE` is provided, and the two are inconsistent. If both are provided but are
 	inconsistent, an error will be raised.
 
-    +--------------------------------------------------------------+
-    | Allowed `opt_type` and `step_type` values                    |
-    +============+=================================================+
-    | `opt_type` | compatible `step_type`                          |
-    +------------+--------------+----+----+------------+-----------+
-    | MIN        | **RFO**      | NR | SD | LINESEARCH | Conjugate |
-    +------------+--------------+----+----+------------+-----------+
-    | TS         | **RS_I_RFO** | P_RFO                            |
-    +------------+--------------+----------------------------------+
-    | IRC        | N/A                                             |
-    +------------+-------------------------------------------------+
+    +------------------------------------------------------------------------------+
+    | Allowed `opt_type` and `step_type` values                                    |
+    +============+=================================================================+
+    | `opt_type` | compatible `step_type`                                          |
+    +------------+--------------+----+----+------------+-----------+-------+-------+
+    | MIN        | **RFO**      | NR | SD | LINESEARCH | Conjugate | LBFGS | GDIIS |
+    +------------+--------------+----+----+------------+-----------+-------+-------+
+    | TS         | **RS_I_RFO** | P_RFO                                            |
+    +------------+--------------+--------------------------------------------------+
+    | IRC        | N/A                                                             |
+    +------------+-----------------------------------------------------------------+
 
     """
 
     # Geometry optimization step type, e.g., Newton-Raphson or Rational Function Optimization
     step_type: str = Field(
-        pattern=re.compile(r"^(?:RFO|RS_I_RFO|P_RFO|NR|SD|LINESEARCH|CONJUGATE)$", flags=re.IGNORECASE),
+        pattern=re.compile(r"^(?:RFO|RS_I_RFO|P_RFO|NR|SD|LINESEARCH|CONJUGATE|LBFGS|GDIIS)$", flags=re.IGNORECASE),
         default="RFO",
     )
-    """One of `["RFO", "RS_I_RFO", "P_RFO", "NR", "SD", "LINESEARCH", "CONJUGATE"]`. If `OPT_TYPE`
+    """One of `["RFO", "RS_I_RFO", "P_RFO", "NR", "SD", "LINESEARCH", "CONJUGATE", "LBFGS", "GDIIS"]`. If `OPT_TYPE`
     is set to `TS` and `STEP_TYPE` is not specified. `STEP_TYPE` will be set to `RS_I_RFO`."""
 
     # What program to use for evaluating gradients and energies
@@ -139,6 +140,16 @@ class OptParams(BaseModel):
     )
     """One of "POLAK", "FLETCHER", or "DESCENT". Change how the step direction is calculated."""
 
+    # Number of previous steps kept by the limited-memory BFGS step.
+    lbfgs_memory: int = Field(ge=1, default=10)
+    """Number of previous (displacement, gradient change) pairs used by `STEP_TYPE = LBFGS`.
+    No Hessian matrix is stored. The diagonal guess from `INTRAFRAG_HESS` is the initial Hessian."""
+
+    # Number of previous geometries used by the GDIIS extrapolation
+    gdiis_max_vectors: int = Field(ge=2, default=5)
+    """Maximum number of geometries (including the current one) used to extrapolate the step for
+    `STEP_TYPE = GDIIS`. The RS-RFO step is taken whenever the extrapolation is judged unsafe."""
+
     # Geometry optimization coordinates to use.
     # REDUNDANT and INTERNAL are synonyms and the default.
     # DELOCALIZED are the coordinates of Baker.
@@ -151,9 +162,11 @@ class OptParams(BaseModel):
         ),
         default="INTERNAL",
     )
-    """One of `["REDUNDANT", "INTERNAL", "CARTESIAN", "BOTH"]`. `"INTERNAL"` is just a synonym for
-    `"REDUNDANT"`. `"BOTH"` utilizes a full set of redundant internal coordinates (3N - 6+) +
-    Cartesian (3N) = (6N - 6+) coordinates."""
+    """One of `["REDUNDANT", "INTERNAL", "DELOCALIZED", "CARTESIAN", "BOTH"]`. `"INTERNAL"` is just a
+    synonym for `"REDUNDANT"`. `"BOTH"` utilizes a full set of redundant internal coordinates
+    (3N - 6+) + Cartesian (3N) = (6N - 6+) coordinates. `"DELOCALIZED"` builds the redundant
+    internal coordinates and takes steps in their 3N - 6 nonredundant combinations (see
+    `Molsys.delocalize`)."""
 
     # Do follow the initial RFO vector after the first step?
     rfo_follow_root: bool = False
@@ -170,6 +183,17 @@ class OptParams(BaseModel):
     not rigorous and if the only reasonable step is symmetry breaking it will be taken. This keyword
     affects optking's symmetrization not Psi4's"""
 
+    # Detect the point group and step only in the totally symmetric internal coordinates
+    use_symmetry: bool = False
+    """Detect the molecular point group (see `optking.symmetry`). Forces, Hessians and RFO steps are
+    restricted to the totally symmetric combinations of the internal coordinates and the geometry
+    is symmetrized after every step. Not used for IRCs, which leave the point group of the TS"""
+
+    # Tolerance (bohr) for atoms to be considered symmetry equivalent
+    symm_tol: float = Field(gt=0.0, default=0.05)
+    """Largest distance (bohr) between an atom and the image of its equivalent atom for an
+    operation to be accepted as a symmetry operation by `use_symmetry`"""
+
     # TODO This needs a validator to check the allowed values as well as set dynamic_lvl_max depending
     # upon dynamic_lvl
     # Starting level for dynamic optimization (0=nondynamic, higher=>more conservative)
@@ -211,6 +235,13 @@ class OptParams(BaseModel):
     """How large `dynamic_lvl` is allowed to grow. If `dynamic_lvl` $> 0$, `dynamic_lvl`
     will default to 6"""
 
+    remap_on_rebuild: bool = True
+    """Carry the Hessian and the step history over to the new internal coordinates when they are
+    rebuilt after a failed back-transformation, new linear bends or an increase of `dynamic_lvl`.
+    The Hessian is transformed through cartesians and the forces of past steps are recomputed from
+    their cartesian gradients. If False, the history is erased and, unless linear bends were
+    added, the Hessian is guessed (or computed) again. Not available for interfragment coordinates"""
+
     # IRC step size in bohr(amu)^(?:){1/2})$.
     irc_step_size: float = Field(gt=0.0, default=0.2)
     """Specifies the distance between each converged point along the IRC reaction path in $bohr amu^{1/2}$"""
@@ -346,6 +377,16 @@ class OptParams(BaseModel):
     Example: `"1 XYZ 2 XY 2 Z"` --> Freezes `CART(1, X)`, `CART(1, Y)`, `CART(1, Z)`, `CART(2, X)`,
     etc..."""
 
+    # Leave frozen atoms out of the optimization
+    active_subspace: bool = False
+    """Remove atoms that cannot move (all of `X`, `Y` and `Z` frozen by `frozen_cartesian`, or
+    frozen fragments) and the coordinates that only involve such atoms from the B matrix, the
+    projections and the steps. Frozen atoms are then held fixed by construction. For large systems
+    with a small moving region the cost of a step scales with the moving region only. With
+    `use_symmetry`, steps are taken in the totally symmetric part of the active subspace. With
+    `opt_coordinates` DELOCALIZED, the active subspace takes the place of the delocalized internal
+    coordinates."""
+
     # constrain ALL torsions to be frozen.
     freeze_all_dihedrals: bool = False
     """A shortcut to request that all dihedrals should be frozen."""
@@ -432,8 +473,6 @@ class OptParams(BaseModel):
 
     # Should an xyz trajectory file be kept (useful for visualization)?
     # P.print_trajectory_xyz = uod.get('PRINT_TRAJECTORY_XYZ', False)
-    # Symmetry tolerance for testing whether a mode is symmetric.
-    # P.symm_tol("SYMM_TOL", 0.05)
     #
     # SUBSECTION Convergence Control.
 
@@ -452,6 +491,34 @@ class OptParams(BaseModel):
     |flexible_g_convergence| is also on.
     See Table :ref:`Geometry Convergence <table:optkingconv>` for details."""
 
+    # Cheap potential to pre-optimize on before the first gradient of the QC program
+    surrogate: str = Field(pattern=re.compile(r"^(?:NONE|LJ|FF)$", flags=re.IGNORECASE), default="NONE")
+    """Converge on a cheap surrogate potential before computing any QC gradients. Only used by
+    `optimize_qcengine` for minimizations. One of `["NONE", "LJ", "FF"]`. `LJ` is a Lennard-Jones
+    potential between all atoms with per-element parameters (for atomic and van der Waals clusters).
+    `FF` is a simple force field: harmonic bonds (to the sum of covalent radii) and angles (to
+    their starting values) plus Lennard-Jones between atoms more than two bonds apart. A python
+    callable may also be passed to `optimize_qcengine(surrogate=...)`. See `optking.surrogate`"""
+
+    # Convergence criteria for the surrogate stage
+    surrogate_g_convergence: str = Field(
+        pattern=re.compile(
+            r"^(?:QCHEM|MOLPRO|GAU|GAU_LOOSE|GAU_TIGHT|GAU_VERYTIGHT|TURBOMOLE|CFOUR|NWCHEM_LOOSE|INTERFRAG_TIGHT)$",
+            flags=re.IGNORECASE,
+        ),
+        default="GAU_LOOSE",
+    )
+    """`G_CONVERGENCE` used while optimizing on the |surrogate| potential"""
+
+    # Maximum number of surrogate steps
+    surrogate_geom_maxiter: int = Field(gt=0, default=200)
+    """Maximum number of steps on the |surrogate| potential"""
+
+    # Start the QC stage from the Hessian of the surrogate
+    surrogate_hessian: bool = True
+    """Pass the Cartesian Hessian of the |surrogate| potential at its minimum to the QC stage as the
+    initial Hessian. Otherwise the QC stage guesses (|intrafrag_hess|) as usual"""
+
     # _conv_rms_force = -1
     # _conv_rms_disp = -1
     # _conv_max_DE = -1
@@ -550,7 +617,10 @@ class OptParams(BaseModel):
         default="SCHLEGEL",
     )
     """Model Hessian to guess intrafragment force constants. One of `["SCHLEGEL", "FISCHER",
-    "SIMPLE", "LINDH", "LINDH_SIMPLE"]`"""
+    "SIMPLE", "LINDH", "LINDH_SIMPLE"]`. `LINDH` is the full (nondiagonal) Lindh model Hessian,
+    evaluated in Cartesian coordinates for all distance-screened stretches, bends and torsions and
+    then transformed to the internal coordinates. `LINDH_SIMPLE` uses only its diagonal stretch,
+    bend and torsion terms for the coordinates present."""
 
     # Re-estimate the Hessian at every step, i.e., ignore the currently stored Hessian.
     h_guess_every: bool = False
@@ -625,6 +695,19 @@ class OptParams(BaseModel):
     """Used for determining which atoms in a system are too collinear to be chosen as default
     reference atoms. We avoid collinearity. Greater is more restrictive."""
 
+    # Which pairs of fragments get automatic interfragment coordinates
+    interfrag_pairs: str = Field(
+        pattern=re.compile(r"^(?:ALL|NEAREST)$", flags=re.IGNORECASE), default="ALL"
+    )
+    """One of ["ALL", "NEAREST"]. Which pairs of fragments get automatic interfragment
+    coordinates. "ALL" pairs every fragment with every other. "NEAREST" pairs each fragment with
+    its `interfrag_neighbors` nearest fragments and adds the pairs of a spanning tree so all
+    fragments stay connected. The number of coordinates then grows linearly with the number of
+    fragments. Not used with `interfrag_coords` or `frag_ref_atoms`."""
+
+    interfrag_neighbors: int = Field(ge=0, default=3)
+    """Number of nearest fragments each fragment is paired with for `interfrag_pairs="NEAREST"`"""
+
     # Let the user submit a dictionary (or array of dictionaries) for
     # the interfrag coordinates. Validation occurs below
     interfrag_coords: list[dict] = []
@@ -772,7 +855,7 @@ class OptParams(BaseModel):
         then change the other keyword to have the appropriate keyword"""
 
         set_vars = self._raw_input
-        min_step_types = ["RFO", "NR", "SD", "CONJUGATE", "LINESEARCH"]
+        min_step_types = ["RFO", "NR", "SD", "CONJUGATE", "LINESEARCH", "LBFGS", "GDIIS"]
         ts_step_types = ["RS_I_RFO", "P_RFO"]
 
         if "OPT_TYPE" in set_vars and "STEP_TYPE" in set_vars:
@@ -914,8 +997,9 @@ class OptParams(BaseModel):
             self.full_hess_every = 0
             # self.cart_hess_read = True  # not sure about this one - test
 
-        # if steepest-descent, then make much larger default
-        if self.step_type == "SD" and "consecutive_backsteps" not in set_vars:
+        # if steepest-descent or L-BFGS, then make much larger default. Backsteps are their only
+        # protection against overshooting since there is no Hessian model to restrict the step
+        if self.step_type in ["SD", "LBFGS"] and "consecutive_backsteps" not in set_vars:
             self.consecutive_backsteps_allowed = 10
 
         # For RFO step, eigenvectors of augmented Hessian are divided by the last